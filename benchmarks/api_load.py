@@ -0,0 +1,127 @@
+'''
+Load test for the `echoscript api` server.
+
+Sends `--requests` transcription jobs from `--concurrency` client threads,
+each waiting for its result, and reports the throughput, the p50/p99
+latency of completed jobs and the number of 429 rejections. Rejected
+requests are retried after the `Retry-After` delay when `--retry` is set.
+
+Usage:
+    echoscript api --port 8000 --workers 2 &
+    python benchmarks/api_load.py audio.mp3 [--url http://127.0.0.1:8000] [--requests 50] [--concurrency 8]
+'''
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+
+def percentile(values, q):
+    '''
+    The q-th percentile of values with linear interpolation.
+    '''
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Client:
+    def __init__(self, url, audio, upload, options, retry):
+        url = urlsplit(url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.audio = audio
+        self.upload = upload
+        self.options = options
+        self.retry = retry
+        self.local = threading.local()
+        if upload:
+            with open(audio, 'rb') as f:
+                self.data = f.read()
+
+    def connection(self):
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=3600)
+        return self.local.conn
+
+    def post(self):
+        query = {**self.options, 'wait': 3600}
+        if self.upload:
+            body, headers = self.data, {'Content-Type': 'application/octet-stream'}
+        else:
+            body = json.dumps({'audio': os.path.abspath(self.audio), **self.options})
+            headers = {'Content-Type': 'application/json'}
+        conn = self.connection()
+        try:
+            conn.request('POST', f'/jobs?{urlencode(query)}', body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (ConnectionError, http.client.HTTPException):
+            conn.close()
+            raise
+        return response
+
+    def __call__(self, _):
+        '''
+        Run one job.
+
+        Returns:
+            tuple[int, float, int]: (status, latency in seconds, number of 429 rejections)
+        '''
+        start, rejected = time.perf_counter(), 0
+        while True:
+            response = self.post()
+            if response.status != 429 or not self.retry:
+                break
+            rejected += 1
+            time.sleep(float(response.getheader('Retry-After', 1)))
+        return response.status, time.perf_counter() - start, rejected + (response.status == 429)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('-m', '--model-name', default='tiny')
+    parser.add_argument('-f', '--fmt', default=None)
+    parser.add_argument('-l', '--language', default=None)
+    parser.add_argument('--upload', action='store_true', help='Upload the audio instead of sending its path')
+    parser.add_argument('--retry', action='store_true', help='Retry rejected requests after Retry-After')
+    args = parser.parse_args()
+
+    options = {'model_name': args.model_name}
+    if args.fmt: options['fmt'] = args.fmt
+    if args.language: options['language'] = args.language
+    client = Client(args.url, args.audio, args.upload, options, args.retry)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(executor.map(client, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    failed = sum(status not in (200, 429) for status, _, _ in results)
+    rejected = sum(count for _, _, count in results)
+    print(f'requests:   {args.requests} ({args.concurrency} concurrent)')
+    print(f'completed:  {len(latencies)}, rejected (429): {rejected}, failed: {failed}')
+    print(f'throughput: {len(latencies) / elapsed:.2f} req/s over {elapsed:.1f} s')
+    if latencies:
+        print(f'latency:    p50 {percentile(latencies, 50):.2f} s, p99 {percentile(latencies, 99):.2f} s, '
+              f'mean {statistics.mean(latencies):.2f} s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+'''
+Benchmark batched decoding of many short clips against the sequential loop.
+
+Cuts the given audio into clips of `--clip-seconds`, transcribes them one by
+one with `model.transcribe` and then with `Audio2Text.transcribe_many` at
+each batch size, and reports clips per second, the real-time factor and the
+speedup over the sequential loop. The result cache is disabled throughout.
+
+Usage:
+    python benchmarks/batched_decode.py audio.mp3 [-m base] [--clip-seconds 10] [--clips 32] [--batch-sizes 1 4 8 16]
+'''
+import argparse
+import sys
+import time
+
+import torch
+import whisper
+
+from echoscript import Audio2Text
+
+
+def cut_clips(paths, clip_seconds, n_clips):
+    '''
+    Cut audio files into clips, repeating the files when they are too short.
+    '''
+    audio = [whisper.load_audio(path) for path in paths]
+    size = int(clip_seconds * whisper.audio.SAMPLE_RATE)
+    clips = [waveform[start:start + size] for waveform in audio for start in range(0, len(waveform), size)]
+    clips = [clip for clip in clips if len(clip) > size // 4]
+    if not clips:
+        raise ValueError('The audio is too short.')
+    return [clips[i % len(clips)] for i in range(n_clips)]
+
+
+def report(name, elapsed, n_clips, audio_seconds, baseline=None):
+    speedup = '' if baseline is None else f'  {baseline / elapsed:5.2f}x'
+    print(f'{name:<16} {elapsed:8.2f} s  {n_clips / elapsed:8.2f} clips/s  RTF {elapsed / audio_seconds:.3f}{speedup}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='+')
+    parser.add_argument('-m', '--model-name', default='base')
+    parser.add_argument('-l', '--language', default='en')
+    parser.add_argument('--clip-seconds', type=float, default=10)
+    parser.add_argument('--clips', type=int, default=32)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--threads', type=int, default=None, help='The torch thread count')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    clips = cut_clips(args.audio, args.clip_seconds, args.clips)
+    audio_seconds = sum(len(clip) for clip in clips) / whisper.audio.SAMPLE_RATE
+    model = Audio2Text.load_whisper_model(args.model_name)
+    fp16 = model.device != torch.device('cpu')
+    print(f'{len(clips)} clips, {audio_seconds:.0f} audio-seconds, model {args.model_name} on {model.device}')
+
+    start = time.perf_counter()
+    for clip in clips:
+        model.transcribe(clip, language=args.language, fp16=fp16)
+    baseline = time.perf_counter() - start
+    report('sequential', baseline, len(clips), audio_seconds)
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        Audio2Text().transcribe_many(clips, args.model_name, language=args.language,
+                                     batch_size=batch_size, cache=False, fp16=fp16)
+        report(f'batch_size={batch_size}', time.perf_counter() - start, len(clips), audio_seconds, baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
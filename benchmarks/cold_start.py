@@ -0,0 +1,101 @@
+'''
+Load time and memory of models loaded with `whisper.load_model` against memory-mapped converted checkpoints.
+
+Starts `--processes` fresh processes at once for each way of loading the
+model on the CPU. Each one loads the model, decodes one window so that all
+weights are read, and reports its load time, resident set size (RSS) and
+proportional set size (PSS, which splits shared pages between the processes
+that map them) while all of them hold the model. The first converted load
+runs alone in a temporary `$ECHOSCRIPT_HOME`, since it converts the checkpoint,
+and the following loads map the converted file. RSS and PSS are read from
+`/proc/self/smaps_rollup`, so they are only reported on Linux.
+
+Usage:
+    python benchmarks/cold_start.py [-m base] [--processes 2]
+'''
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def memory(field):
+    '''
+    A field of `/proc/self/smaps_rollup` in MiB, or None.
+    '''
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def run(mode, model_name, barrier, results):
+    import numpy as np
+    import torch
+    import whisper
+
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    if mode == 'whisper':
+        model = whisper.load_model(model_name, device='cpu')
+    else:
+        from echoscript.weights import load_model
+
+        model = load_model(model_name)
+    load_time = time.perf_counter() - start
+
+    mel = whisper.log_mel_spectrogram(np.zeros(whisper.audio.N_SAMPLES, dtype=np.float32), model.dims.n_mels)
+    model.decode(mel, whisper.DecodingOptions(language='en', fp16=False, sample_len=8))
+    # Measure while every process holds the model, so shared pages are split between them.
+    barrier.wait()
+    results.put({'load': load_time, 'rss': memory('Rss'), 'pss': memory('Pss')})
+    barrier.wait()
+
+
+def measure(context, mode, model_name, processes):
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=run, args=(mode, model_name, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    stats = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    def mean(key):
+        values = [stat[key] for stat in stats if stat[key] is not None]
+        return statistics.mean(values) if values else float('nan')
+
+    return mean('load'), mean('rss'), mean('pss')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-m', '--model-name', default='base')
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as home:
+        os.environ['ECHOSCRIPT_HOME'] = home
+        rows = [
+            ('whisper.load_model', measure(context, 'whisper', args.model_name, args.processes)),
+            ('first load (converts)', measure(context, 'converted', args.model_name, 1)),
+            ('memory-mapped', measure(context, 'converted', args.model_name, args.processes)),
+        ]
+
+    print(f'{args.model_name}, {args.processes} processes')
+    print(f'{"load":<22} {"time":>7} {"RSS/process":>12} {"PSS/process":>12}')
+    for name, (load_time, rss, pss) in rows:
+        print(f'{name:<22} {load_time:6.2f}s {rss:8.0f} MiB {pss:8.0f} MiB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
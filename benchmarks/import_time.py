@@ -0,0 +1,45 @@
+'''
+Import-time benchmark for the echoscript CLI entry points.
+
+Runs each entry point in a fresh interpreter with `python -X importtime`,
+reports the median import time and fails if an entry point exceeds the
+budget or imports a heavy dependency (torch, whisper, gradio, ...).
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 300] [--repeat 5]
+'''
+import argparse
+import statistics
+import sys
+
+
+ENTRY_POINTS = {
+    'import echoscript': 'import echoscript',
+    'echoscript --help': "from echoscript.cli import cli; cli(['--help'])",
+    'echoscript list --models': "from echoscript.cli import cli; cli(['list', '--models'])",
+    'echoscript list --langs': "from echoscript.cli import cli; cli(['list', '--langs'])",
+}
+
+
+def main():
+    from echoscript.bench import HEAVY_MODULES, import_profile
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for name, code in ENTRY_POINTS.items():
+        runs = [import_profile(code) for _ in range(args.repeat)]
+        median = statistics.median(ms for ms, _ in runs)
+        heavy = sorted(set.union(*(packages for _, packages in runs)) & set(HEAVY_MODULES))
+        ok = median <= args.budget_ms and not heavy
+        failed |= not ok
+        print(f'{"ok  " if ok else "FAIL"} {name:<28} {median:8.1f} ms'
+              + (f'  heavy imports: {", ".join(heavy)}' if heavy else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+'''
+Real-time factor and word error rate of the decode option presets.
+
+Transcribes the audio with each preset, reports the median real-time factor
+(transcription time / audio duration, lower is faster) over `--repeat` runs
+and the word error rate against a reference transcript. The model is loaded
+before timing and the result cache is disabled.
+
+Usage:
+    python benchmarks/presets.py [This_is_an_example.mp3] [-m tiny] [-l en] [--reference "This is an example."]
+'''
+import argparse
+import re
+import statistics
+import sys
+import time
+
+import whisper
+
+from echoscript import Audio2Text
+
+
+def normalize(text: str) -> list:
+    '''
+    Lowercase, drop punctuation and split into words.
+    '''
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    '''
+    The word-level edit distance between two transcripts divided by the reference length.
+    '''
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    distances = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp in enumerate(hypothesis, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous + (ref != hyp),
+            )
+    return distances[-1] / max(len(reference), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='?', default='This_is_an_example.mp3')
+    parser.add_argument('-m', '--model-name', default='tiny')
+    parser.add_argument('-l', '--language', default='en')
+    parser.add_argument('--reference', default='This is an example.', help='The reference transcript')
+    parser.add_argument('--reference-file', default=None, help='Read the reference transcript from a file')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    reference = args.reference
+    if args.reference_file is not None:
+        with open(args.reference_file, encoding='utf-8') as f:
+            reference = f.read()
+
+    audio = whisper.load_audio(args.audio)
+    duration = len(audio) / whisper.audio.SAMPLE_RATE
+    Audio2Text.load_whisper_model(args.model_name)
+    print(f'{args.audio}: {duration:.1f} s, model {args.model_name}')
+    print(f'{"preset":<10} {"RTF":>7} {"WER":>7}  transcript')
+
+    for preset in Audio2Text.available_presets:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            text = Audio2Text().transcribe(audio, args.model_name, language=args.language,
+                                           cache=False, preset=preset)
+            times.append(time.perf_counter() - start)
+        rtf = statistics.median(times) / duration
+        print(f'{preset:<10} {rtf:7.3f} {word_error_rate(reference, text):7.1%}  {text.strip()[:60]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
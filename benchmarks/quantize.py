@@ -0,0 +1,77 @@
+'''
+Speed, memory and transcript difference of int8 quantized models against fp32.
+
+Loads each variant of the model in a fresh process on the CPU, then reports
+the load time, the median real-time factor (transcription time / audio
+duration, lower is faster) over `--repeat` runs, the peak resident set size
+of the process and the word error rate of the transcript against the fp32
+transcript. The first int8 load quantizes the model and caches it under
+`$ECHOSCRIPT_HOME/models`, run the benchmark twice to see the cached load time.
+
+Usage:
+    python benchmarks/quantize.py [This_is_an_example.mp3] [-m base] [-l en] [--repeat 3] [--threads 4]
+'''
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+from presets import word_error_rate
+
+
+def run(model_name, audio_path, language, repeat, threads):
+    import torch
+    import whisper
+
+    from echoscript import Audio2Text
+
+    if threads:
+        torch.set_num_threads(threads)
+    audio = whisper.load_audio(audio_path)
+    start = time.perf_counter()
+    Audio2Text.load_whisper_model(model_name, device='cpu')
+    load_time = time.perf_counter() - start
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = Audio2Text().transcribe(audio, model_name, language=language, cache=False, temperature=0.0)
+        times.append(time.perf_counter() - start)
+    return {
+        'load': load_time,
+        'rtf': statistics.median(times) / (len(audio) / whisper.audio.SAMPLE_RATE),
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'text': text,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='?', default='This_is_an_example.mp3')
+    parser.add_argument('-m', '--model-name', default='base')
+    parser.add_argument('-l', '--language', default='en')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None, help='The torch thread count')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    print(f'{"model":<16} {"load":>7} {"RTF":>7} {"speedup":>8} {"peak RSS":>10} {"WER vs fp32":>12}')
+    for model_name in (args.model_name, f'{args.model_name}:int8'):
+        with context.Pool(1) as pool:
+            results[model_name] = result = pool.apply(
+                run, (model_name, args.audio, args.language, args.repeat, args.threads))
+        baseline = results[args.model_name]
+        print(f'{model_name:<16} {result["load"]:6.2f}s {result["rtf"]:7.3f} '
+              f'{baseline["rtf"] / result["rtf"]:7.2f}x {result["rss"]:7.0f} MiB '
+              f'{word_error_rate(baseline["text"], result["text"]):11.1%}')
+
+    for model_name, result in results.items():
+        print(f'\n{model_name}: {result["text"].strip()}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
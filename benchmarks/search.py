@@ -0,0 +1,117 @@
+'''
+Size and load time of columnar transcripts against `json` results, and phrase search latency.
+
+Generates a synthetic archive of `--files` transcripts with `--segments`
+segments each, shaped like Whisper results (about 30 tokens and the decode
+scores per segment), and writes each one as a `json` result and as a
+columnar transcript (`.ects`). It reports the size on disk and the time to
+load every transcript and read its segment times and texts in both forms,
+the time to build the search index and its size, and the median and 99th
+percentile latency of `--queries` searches for phrases taken from the archive
+against scanning the `json` results for them.
+
+Usage:
+    python benchmarks/search.py [--files 1000] [--segments 200] [--queries 200]
+'''
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def synthetic_result(rng, words, n_segments):
+    segments = []
+    for i in range(n_segments):
+        text = ' ' + ' '.join(rng.choices(words, k=rng.randint(6, 16))) + '.'
+        segments.append({
+            'id': i, 'seek': i // 6 * 3000, 'start': i * 5.0, 'end': i * 5.0 + 4.8, 'text': text,
+            'tokens': [rng.randrange(50257) for _ in range(30)], 'temperature': 0.0,
+            'avg_logprob': rng.uniform(-1, 0), 'compression_ratio': rng.uniform(1, 2),
+            'no_speech_prob': rng.random(),
+        })
+    return {'text': ''.join(segment['text'] for segment in segments), 'segments': segments, 'language': 'en'}
+
+
+def size(paths):
+    return sum(os.path.getsize(path) for path in paths) / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--segments', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from echoscript.columnar import ColumnarTranscript
+    from echoscript.search import SearchIndex
+
+    rng = random.Random(args.seed)
+    words = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(2, 9))) for _ in range(20000)]
+    with tempfile.TemporaryDirectory() as root:
+        json_paths, columnar_paths, phrases = [], [], []
+        for i in range(args.files):
+            result = synthetic_result(rng, words, args.segments)
+            json_paths.append(os.path.join(root, f'{i:06d}.json'))
+            columnar_paths.append(os.path.join(root, f'{i:06d}.ects'))
+            with open(json_paths[-1], 'w') as f:
+                json.dump(result, f)
+            ColumnarTranscript.from_result(result).save(columnar_paths[-1])
+            if len(phrases) < args.queries:
+                segment_words = rng.choice(result['segments'])['text'].split()
+                start = rng.randrange(len(segment_words) - 2)
+                phrases.append(' '.join(segment_words[start:start + 3]))
+
+        start = time.perf_counter()
+        for path in json_paths:
+            with open(path) as f:
+                segments = json.load(f)['segments']
+            [(segment['start'], segment['end'], segment['text']) for segment in segments]
+        json_load = time.perf_counter() - start
+        start = time.perf_counter()
+        for path in columnar_paths:
+            transcript = ColumnarTranscript.load(path)
+            transcript.start.tolist(), transcript.end.tolist(), transcript.texts()
+        columnar_load = time.perf_counter() - start
+
+        index_path = os.path.join(root, 'search.idx')
+        start = time.perf_counter()
+        SearchIndex.build(columnar_paths).save(index_path)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = SearchIndex.load(index_path)
+        open_index = time.perf_counter() - start
+        latencies = []
+        for phrase in phrases:
+            start = time.perf_counter()
+            assert index.search(phrase, limit=20)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+        # Scanning the json results for a few of the phrases, the way to search without an index.
+        start = time.perf_counter()
+        for phrase in phrases[:3]:
+            for path in json_paths:
+                with open(path) as f:
+                    [segment for segment in json.load(f)['segments'] if phrase in segment['text']]
+        scan = (time.perf_counter() - start) / 3
+
+        print(f'{args.files} transcripts, {args.files * args.segments} segments')
+        print(f'{"":<22} {"size":>10} {"load all":>10}')
+        print(f'{"json results":<22} {size(json_paths):6.1f} MiB {json_load:9.2f}s')
+        print(f'{"columnar (.ects)":<22} {size(columnar_paths):6.1f} MiB {columnar_load:9.2f}s')
+        print(f'index: {size([index_path]):.1f} MiB, built in {build:.2f}s, opened in {open_index * 1000:.2f} ms')
+        print(f'search: median {statistics.median(latencies) * 1000:.2f} ms, '
+              f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, '
+              f'scanning the json results {scan * 1000:.0f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
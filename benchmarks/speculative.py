@@ -0,0 +1,63 @@
+'''
+Speed of greedy decoding with a draft model against plain greedy decoding.
+
+Transcribes the audio greedily (temperature 0) with the model alone and with
+each draft model, reporting the median real-time factor (transcription time /
+audio duration, lower is faster) over `--repeat` runs, the wall-time speedup,
+the share of drafted tokens the model accepted, the tokens decoded per pass
+of the model decoder and whether the transcript is the same as without a
+draft model.
+
+Usage:
+    python benchmarks/speculative.py [This_is_an_example.mp3] [-m medium] [-d tiny -d base] [-l en] [--repeat 3]
+'''
+import argparse
+import statistics
+import sys
+import time
+
+
+def run(audio, model_name, language, repeat, draft_model=None):
+    from echoscript import Audio2Text
+
+    engine = Audio2Text()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = engine.transcribe(audio, model_name, language=language, cache=False, temperature=0.0,
+                                 draft_model=draft_model)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), text, engine.draft_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='?', default='This_is_an_example.mp3')
+    parser.add_argument('-m', '--model-name', default='medium')
+    parser.add_argument('-d', '--draft-model', action='append', default=None)
+    parser.add_argument('-l', '--language', default='en')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    import whisper
+
+    from echoscript import Audio2Text
+
+    audio = whisper.load_audio(args.audio)
+    duration = len(audio) / whisper.audio.SAMPLE_RATE
+    # Load the models up front so that the first run does not include the load time.
+    for model_name in (args.model_name, *(args.draft_model or ['tiny'])):
+        Audio2Text.load_whisper_model(model_name)
+
+    baseline, expected, _ = run(audio, args.model_name, args.language, args.repeat)
+    print(f'{"draft model":<12} {"RTF":>7} {"speedup":>8} {"accepted":>9} {"tokens/pass":>12} {"same text":>10}')
+    print(f'{"-":<12} {baseline / duration:7.3f} {1:7.2f}x {"-":>9} {1:12.2f} {"-":>10}')
+    for draft_model in args.draft_model or ['tiny']:
+        median, text, report = run(audio, args.model_name, args.language, args.repeat, draft_model)
+        print(f'{draft_model:<12} {median / duration:7.3f} {baseline / median:7.2f}x '
+              f'{report["acceptance_rate"]:9.1%} {report["speedup"]:12.2f} {str(text == expected):>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,20 @@
 
+import importlib
+
 from .audio2text import audio2text, Audio2Text
 
-__all__ = ['audio2text', 'Audio2Text']
+__all__ = ['audio2text', 'Audio2Text', 'TranscriptionPool', 'transcribe_long', 'transcribe_live']
 __version__ = '0.1.1'
+
+# Modules importing torch/whisper are loaded on first attribute access.
+_LAZY_ATTRS = {
+    'TranscriptionPool': '.pool',
+    'transcribe_long': '.longform',
+    'transcribe_live': '.live',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        return getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
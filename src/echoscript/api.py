@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import math
+import os
+
+from collections import OrderedDict
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from echoscript import tracing
+from echoscript.audio2text import QUANTIZATIONS, Audio2Text, model_variant
+from echoscript.scheduler import QueueFull, Scheduler, transcribe_job
+
+
+logger = logging.getLogger(__name__)
+
+# The options of a transcription request, strings in both query parameters and JSON bodies.
+REQUEST_OPTIONS = ('model_name', 'quantize', 'fmt', 'language', 'preset')
+
+
+class HTTPError(Exception):
+    '''
+    An error answered with an HTTP status and a JSON `{"error": message}` body.
+    '''
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+def _option(value):
+    '''
+    Map empty and `None`/`null` strings of query parameters to None.
+    '''
+    if value in (None, '', 'None', 'null'):
+        return None
+    return value
+
+
+def check_options(model_name, fmt, language, preset=None):
+    '''
+    Validate the model, format, language and preset of a request.
+
+    Raises:
+        HTTPError: 400 for an invalid option.
+    '''
+    if not Audio2Text.is_model_available(model_name):
+        raise HTTPError(400, f'Model `{model_name}` is not available.')
+    if fmt not in Audio2Text.available_formats:
+        raise HTTPError(400, f'Format `{fmt}` is not supported.')
+    if language is not None and not Audio2Text.is_language_available(language):
+        raise HTTPError(400, f'Language `{language}` is not available.')
+    if preset is not None and preset not in Audio2Text.available_presets:
+        raise HTTPError(400, f'Preset `{preset}` is not available.')
+
+
+class TranscriptionAPI:
+    '''
+    A headless HTTP/JSON transcription server on asyncio.
+
+    Jobs run on a `Scheduler`, so the API shares the process-wide model cache
+    and the queueing behaviour of the Gradio app. When the queue is full a
+    submission is answered with `429 Too Many Requests` and a `Retry-After`
+    estimate instead of being buffered.
+
+    Endpoints:
+        POST /jobs: Submit a job. Either a JSON body `{"audio": path, "model_name", "fmt", "language", "preset"}`
+            or the raw audio file as the body with the options as query parameters. `quantize=int8`
+            runs the int8 variant of the model.
+            Add `?wait=SECONDS` to wait for the result. Answers 202 with the job status,
+            or 200 with the result when it finished within the wait.
+        GET /jobs/{id}: The job status, `?wait=SECONDS` waits for the job to finish first.
+        GET /jobs/{id}/result: The result, 202 while the job is pending, 500 if it failed.
+        GET /health: The scheduler statistics.
+        GET /metrics: Job counts, per-stage timings and real-time factors in the Prometheus text format.
+
+    Example:
+        >>> api = TranscriptionAPI(max_queue=16, workers=2)
+        >>> api.run('127.0.0.1', 8000)
+    '''
+
+    def __init__(self,
+                 max_queue: int = 32,
+                 workers: int = 1,
+                 model_concurrency: int = 1,
+                 max_jobs: int = 1024,
+                 max_body: int = 512 * 1024 * 1024,
+                 runner=transcribe_job):
+        '''
+        Args:
+            max_queue (int, optional): The maximum number of queued jobs. Defaults to 32.
+            workers (int, optional): The number of concurrent jobs. Defaults to 1.
+            model_concurrency (int, optional): The maximum number of concurrent jobs per model. Defaults to 1.
+            max_jobs (int, optional): The number of finished jobs kept for status and result requests. Defaults to 1024.
+            max_body (int, optional): The maximum size of a request body in bytes. Defaults to 512 MiB.
+            runner (callable, optional): The job runner of the scheduler, see `Scheduler`.
+        '''
+        self.scheduler = Scheduler(max_queue=max_queue,
+                                   workers=workers,
+                                   model_concurrency=model_concurrency,
+                                   runner=runner)
+        self.max_jobs = max_jobs
+        self.max_body = max_body
+        self.jobs = OrderedDict()
+        self.metrics = tracing.add_hook(tracing.PrometheusMetrics())
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000):
+        '''
+        Start listening.
+
+        Returns:
+            asyncio.Server: The server, use port 0 and `server.sockets` to listen on a free port.
+        '''
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_forever(self, host: str = '127.0.0.1', port: int = 8000):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host: str = '127.0.0.1', port: int = 8000):
+        '''
+        Serve until interrupted, then shut down the scheduler.
+        '''
+        try:
+            asyncio.run(self.serve_forever(host, port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.scheduler.shutdown(wait=False)
+            tracing.remove_hook(self.metrics)
+
+    async def handle(self, reader, writer):
+        '''
+        Serve the requests of one connection, keeping it alive between requests.
+        '''
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, payload, extra = await self.route(method, target, headers, body)
+                except HTTPError as e:
+                    status, payload, extra = e.status, {'error': e.message}, e.headers
+                except Exception:
+                    logger.exception('Failed to handle %s %s', method, target)
+                    status, payload, extra = 500, {'error': 'Internal server error.'}, {}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.write_response(writer, status, payload, extra, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            self.write_response(writer, e.status, {'error': e.message}, e.headers, keep_alive=False)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception('Failed to read a request')
+            self.write_response(writer, 500, {'error': 'Internal server error.'}, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        '''
+        Read an HTTP/1.1 request.
+
+        Returns:
+            tuple[str, str, dict, bytes] | None: (method, target, headers, body), None at the end of the connection.
+        '''
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line.')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, 'Chunked requests are not supported, send a Content-Length.')
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length.')
+        if length > self.max_body:
+            raise HTTPError(413, f'The request body exceeds {self.max_body} bytes.')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    def write_response(writer, status, payload, headers=None, keep_alive=True):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8'
+        lines = [
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+            f'Content-Type: {content_type}',
+            f'Content-Length: {len(body)}',
+            f'Connection: {"keep-alive" if keep_alive else "close"}',
+            *(f'{name}: {value}' for name, value in (headers or {}).items()),
+        ]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def route(self, method, target, headers, body):
+        '''
+        Dispatch a request.
+
+        Returns:
+            tuple[int, dict | str, dict]: (status, JSON payload or plain text, extra headers)
+        '''
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['health'] and method == 'GET':
+            return 200, {'status': 'ok', **self.scheduler.stats()}, {}
+        if parts == ['metrics'] and method == 'GET':
+            return 200, self.metrics.render(), {}
+        if parts == ['jobs'] and method == 'POST':
+            return await self.submit(headers, query, body)
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and method == 'GET':
+            job = self.get_job(parts[1])
+            if len(parts) == 2:
+                await self.wait(job, query.get('wait'))
+                return 200, self.describe(job), {}
+            if parts[2] == 'result':
+                return self.result(job)
+        raise HTTPError(404, f'No route for {method} {url.path}.')
+
+    async def submit(self, headers, query, body):
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        if content_type == 'application/json':
+            try:
+                options = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(400, 'The request body is not valid JSON.')
+            if not isinstance(options, dict):
+                raise HTTPError(400, 'The request body must be a JSON object.')
+            for name in REQUEST_OPTIONS:
+                if not isinstance(options.get(name), (str, type(None))):
+                    raise HTTPError(400, f'The `{name}` option must be a string.')
+            audio = options.get('audio')
+            if not isinstance(audio, str) or not os.path.isfile(audio):
+                raise HTTPError(400, 'The `audio` path does not exist.')
+        else:
+            if not body:
+                raise HTTPError(400, 'Send the audio file as the request body or a JSON body with an `audio` path.')
+            options = query
+            audio = body
+
+        model_name = _option(options.get('model_name')) or 'base'
+        quantize = _option(options.get('quantize'))
+        if quantize is not None:
+            if quantize not in QUANTIZATIONS:
+                raise HTTPError(400, f'Quantization `{quantize}` is not supported.')
+            model_name = model_variant(model_name, quantize)
+        fmt = _option(options.get('fmt'))
+        language = _option(options.get('language'))
+        preset = _option(options.get('preset'))
+        check_options(model_name, fmt, language, preset)
+        trace = tracing.Trace(source='api', model_name=model_name, language=language, fmt=fmt)
+        try:
+            with tracing.activate(trace):
+                job = self.scheduler.submit(audio, model_name=model_name, fmt=fmt, language=language, preset=preset)
+        except QueueFull as e:
+            trace.finish('rejected')
+            raise HTTPError(429, str(e), {'Retry-After': str(self.retry_after())})
+        job.future.add_done_callback(lambda future: tracing.finish_future(trace, future))
+        self.add_job(job)
+
+        await self.wait(job, query.get('wait'))
+        if job.done() and not job.future.cancelled() and job.future.exception() is None:
+            return 200, {**self.describe(job), 'result': job.result()}, {}
+        return 202, self.describe(job), {'Location': f'/jobs/{job.id}'}
+
+    def result(self, job):
+        if not job.done():
+            return 202, self.describe(job), {}
+        if job.future.cancelled():
+            raise HTTPError(410, f'Job {job.id} was cancelled.')
+        error = job.future.exception()
+        if error is not None:
+            raise HTTPError(500, f'Job {job.id} failed: {error}')
+        return 200, {**self.describe(job), 'result': job.result()}, {}
+
+    @staticmethod
+    async def wait(job, timeout):
+        '''
+        Wait up to `timeout` seconds for a job without blocking the event loop.
+        '''
+        if timeout is None or job.done():
+            return
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            raise HTTPError(400, f'Invalid wait `{timeout}`.')
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.CancelledError:
+            if not job.future.cancelled():
+                raise
+        except Exception:
+            # Timeouts and job failures are reported by the job status.
+            pass
+
+    def describe(self, job) -> dict:
+        status = {
+            'id': job.id,
+            'status': job.status,
+            'model_name': job.model_name,
+            'position': self.scheduler.position(job),
+            'eta': self.scheduler.eta(job),
+        }
+        if job.status == 'failed':
+            status['error'] = str(job.future.exception())
+        return status
+
+    def add_job(self, job):
+        '''
+        Register a job, forgetting the oldest finished jobs beyond `max_jobs`.
+        '''
+        self.jobs[job.id] = job
+        excess = len(self.jobs) - self.max_jobs
+        if excess > 0:
+            for id in [id for id, old in self.jobs.items() if old.done()][:excess]:
+                del self.jobs[id]
+
+    def get_job(self, id):
+        try:
+            return self.jobs[int(id)]
+        except (KeyError, ValueError):
+            raise HTTPError(404, f'Job {id} does not exist.')
+
+    def retry_after(self) -> int:
+        '''
+        Estimate the seconds until the queue has room, from the mean job duration.
+        '''
+        durations = list(self.scheduler.stats()['durations'].values())
+        if not durations:
+            return 1
+        return max(math.ceil(sum(durations) / len(durations) / self.scheduler.workers), 1)
@@ -1,9 +1,39 @@
 
-import whisper
+import os
 import warnings
 
-from echoscript.utils import segments2subtitle
+from echoscript import formats, tracing
+from echoscript.model_cache import get_model_cache
+from echoscript.result_cache import cache_key, get_result_cache, hash_audio
 from echoscript.utils import classproperty
+from echoscript.utils import whisper_constant
+
+
+_DTYPES = {
+    'fp32': 'float32',
+    'fp16': 'float16',
+    'int8': 'qint8',
+}
+
+# Quantized model variants, loaded as `<model>:<scheme>`, e.g. `base:int8`.
+QUANTIZATIONS = ('int8',)
+
+# Named decode options trading accuracy for speed. `balanced` is the Whisper
+# default: greedy decoding with temperature fallback on failed windows.
+PRESETS = {
+    'fast': {
+        'temperature': 0.0,
+        'condition_on_previous_text': False,
+    },
+    'balanced': {
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    },
+    'accurate': {
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'beam_size': 5,
+        'best_of': 5,
+    },
+}
 
 
 class Audio2Text:
@@ -11,6 +41,13 @@ class Audio2Text:
     Class for audio transcription using the Whisper model.
     '''
 
+    # The speech and skipped seconds of the last transcription with a voice activity detector.
+    vad_report = None
+    # The language of the last transcription streamed with `iter_segments`.
+    language = None
+    # The token counts of the last transcription with a draft model, see `echoscript.speculative.SpeculativeStats`.
+    draft_report = None
+
     @classproperty
     def available_models(self):
         '''
@@ -19,7 +56,34 @@ class Audio2Text:
         Returns:
             list[str]: A list of all available Whisper models.
         '''
-        return whisper.available_models() 
+        return list(whisper_constant('__init__', '_MODELS'))
+
+    @classproperty
+    def available_model_variants(self):
+        '''
+        A list of all available Whisper models followed by their quantized variants, e.g. `base:int8`.
+
+        Returns:
+            list[str]: A list of all model names accepted by `load_whisper_model`.
+        '''
+        return [
+            variant
+            for model in Audio2Text.available_models
+            for variant in (model, *(f'{model}:{scheme}' for scheme in QUANTIZATIONS))
+        ]
+
+    @staticmethod
+    def is_model_available(model_name):
+        '''
+        Check if a model or a quantized model variant is available.
+
+        Args:
+            model_name (str): The model name, e.g. `base` or `base:int8`.
+
+        Returns:
+            bool: True if the model is available, False otherwise.
+        '''
+        return model_name in Audio2Text.available_model_variants
 
     @classproperty
     def available_languages(self):
@@ -31,7 +95,7 @@ class Audio2Text:
                 - key: Corresponding ISO 639-1 code
                 - value: Language name
         '''
-        langs = whisper.tokenizer.LANGUAGES
+        langs = whisper_constant('tokenizer', 'LANGUAGES')
         langs['zh-tw'] = 'Taiwan'
         langs = {
             code: lang.capitalize()
@@ -47,8 +111,18 @@ class Audio2Text:
         Returns:
             list[str]: A list of all available formats.
         '''
-        return ('json', 'vtt', 'srt', None)
+        return ('json', *formats.available_formats())
     
+    @classproperty
+    def available_presets(self):
+        '''
+        A list of all decode option presets, from fastest to most accurate.
+
+        Returns:
+            list[str]: A list of all presets.
+        '''
+        return list(PRESETS)
+
     @staticmethod
     def is_language_available(language):
         '''
@@ -65,39 +139,104 @@ class Audio2Text:
         if language.capitalize() in available_languages.values(): return True
         return False
 
+    @classproperty
+    def model_cache(self):
+        '''
+        The process-wide cache of loaded Whisper models.
+
+        Returns:
+            ModelCache: The shared model cache, see `ModelCache.stats` for hit/miss/load-time counters.
+        '''
+        return get_model_cache()
+
     @staticmethod
-    def load_whisper_model(model_name='base'):
+    def load_whisper_model(model_name='base', device=None, dtype=None, use_cache=True, replica=0):
         '''
         Load the Whisper model.
 
+        Loaded models are kept in a process-wide LRU cache keyed on
+        (model_name, device, dtype), so repeated calls reuse the same model.
+        The `fp32` and `fp16` weights are memory-mapped from a checkpoint
+        converted to that precision on the first load. On the CPU, processes on
+        the same host share one copy of them in the page cache; on a GPU they
+        are copied to the device, see `echoscript.weights.load_model`. `int8`
+        applies dynamic int8 quantization to the linear layers on the CPU, see
+        `echoscript.quantize.load_quantized_model`.
+
         Args:
-            model_name (str, optional): The name of the Whisper model to load. Defaults to 'base'.
+            model_name (str, optional): The name of the Whisper model to load, `<model>:int8` for the
+                int8 variant. Defaults to 'base'.
+            device (str, optional): The torch device to load the model on, use `None` for cuda if available else cpu. Defaults to None.
+            dtype (str, optional): The weight precision {`fp32`, `fp16`, `int8`}, use `None` for `fp32`. Defaults to None.
+            use_cache (bool, optional): Whether to use the shared model cache. Defaults to True.
+            replica (int, optional): The index of an independent cached copy of the model, for concurrent use. Defaults to 0.
 
         Returns:
             whisper.Model: The loaded Whisper model.
         '''
-        if model_name not in Audio2Text.available_models:
+        if not Audio2Text.is_model_available(model_name):
             raise ValueError(f'Whisper model `{model_name}` is not available.')
-        
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore', FutureWarning)
-            model = whisper.load_model(model_name)
-        return model
+
+        model_name, _, scheme = model_name.partition(':')
+        dtype = scheme or dtype or 'fp32'
+        if dtype not in _DTYPES:
+            raise ValueError(f'Dtype `{dtype}` is not supported.')
+
+        import torch
+
+        if dtype == 'int8':
+            if device is not None and str(device) != 'cpu':
+                raise ValueError('int8 models only run on the CPU.')
+            device = 'cpu'
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+        def load():
+            if dtype == 'int8':
+                from echoscript.quantize import load_quantized_model
+
+                return load_quantized_model(model_name)
+            from echoscript.weights import load_model
+
+            return load_model(model_name, device=device, dtype=dtype)
+
+        if not use_cache: return load()
+        key = (model_name, str(device), dtype)
+        if replica: key += (replica,)
+        return get_model_cache().get(key, load)
     
     def transcribe(self,
                    audio,
                    model_name: str = 'base',
                    fmt: str = None,
                    language: str = None,
+                   cache: bool = True,
+                   replica: int = 0,
+                   preset: str = None,
+                   vad=None,
+                   checkpoint=None,
+                   draft_model: str = None,
                    **kwargs):
         '''
         Transcribe an audio file using the loaded model.
 
         Args:
-            audio (str | ndarray | Tensor): The audio to transcribe. Can be a file path, bytes of audio data, or a URL.
-            fmt (str, optional): The format of the audio, supported formats {`json`, `vtt`, `srt`, `None`}. Defaults to None.
+            audio (str | bytes | BinaryIO | ndarray | Tensor): The audio to transcribe. Can be a file path, encoded
+                audio as bytes or a binary file object (`-` for stdin), or a 16 kHz waveform, see `echoscript.ingest`.
+            fmt (str, optional): The output format, `json` or a format of `echoscript.formats`, e.g. `srt`, `vtt`,
+                `tsv`, `jsonl` or `words` (word timestamps). Use `None` for plain text. Defaults to None.
             language (str, optional): The language of the audio, use `None` for multilingual. Defaults to None.
-            **kwargs: Additional keyword arguments to pass to the model's transcribe method.
+            cache (bool, optional): Whether to serve and store the result in the on-disk result cache. Defaults to True.
+            replica (int, optional): The model replica to use, see `load_whisper_model`. Defaults to 0.
+            preset (str, optional): The decode option preset {`fast`, `balanced`, `accurate`}, see `decode_options`. Defaults to None.
+            vad (bool | str | callable, optional): Transcribe only the speech found by this voice activity
+                detector, see `echoscript.vad.get_vad`. The amount of skipped audio is stored in `vad_report`. Defaults to None.
+            checkpoint (bool | str, optional): Decode window by window, committing the progress to a checkpoint
+                file and resuming from it when the same job is run again, see `iter_segments`. Defaults to None.
+            draft_model (str, optional): Speed up greedy decoding with this smaller model drafting tokens for the
+                model to check, see `echoscript.speculative`. The tokens are the same as without it, and the
+                acceptance rate is stored in `draft_report`. Defaults to None.
+            **kwargs: Decode options to pass to the model's transcribe method, e.g. `beam_size` or `temperature`.
 
         Returns:
             str: The transcribed text
@@ -107,30 +246,459 @@ class Audio2Text:
 
         if fmt is not None and fmt not in self.available_formats:
             raise ValueError(f'Format `{fmt}` is not supported.')
+
+        if draft_model is not None and not self.is_model_available(draft_model):
+            raise ValueError(f'Model `{draft_model}` is not available.')
         
+        with tracing.trace(source='python', model_name=model_name, language=language, fmt=fmt):
+            if checkpoint:
+                from echoscript.streaming import collect_segments
+
+                if fmt != 'json' and formats.get_formatter(fmt).words:
+                    raise ValueError(f'Format `{fmt}` needs word timestamps, which cannot be checkpointed.')
+                segments = list(self.iter_segments(audio, model_name, language, cache=cache, preset=preset,
+                                                   vad=vad, checkpoint=checkpoint, draft_model=draft_model,
+                                                   **kwargs))
+                result = collect_segments(segments, self.language)
+                if self.vad_report is not None: result['vad'] = self.vad_report
+                with tracing.stage('format'):
+                    return self.format_result(result, fmt)
+
+            options = decode_options(preset, **kwargs)
+            if fmt != 'json' and formats.get_formatter(fmt).words:
+                options.setdefault('word_timestamps', True)
+            language, initial_prompt = process_language(language, options.pop('initial_prompt', None))
+            detector = _get_vad(vad)
+            audio = _ingest(audio, keep_bytes=True)
+            self.vad_report = None
+            self.draft_report = None
+            result_cache, key = None, None
+            if cache:
+                with tracing.stage('cache'):
+                    result_cache = get_result_cache()
+                    # Without `draft_model`, which does not change the result.
+                    key = _result_cache_key(audio, model_name, language, initial_prompt,
+                                            _vad_options(options, detector))
+                    result = result_cache.get(key) if key is not None else None
+                if result is not None:
+                    tracing.annotate(cached=True)
+                    self.vad_report = result.get('vad')
+                    with tracing.stage('format'):
+                        return self.format_result(result, fmt)
+
+            audio = _ingest(audio, paths=True)
+            tracing.annotate(audio_duration=_duration(audio))
+            self.model_name = model_name
+            with tracing.stage('model_load'):
+                self.model = self.load_whisper_model(model_name, replica=replica)
+                model = self._with_draft_model(draft_model, replica)
+            options.setdefault('fp16', self.model.device.type != 'cpu')
+            timeline = None
+            if detector is not None:
+                with tracing.stage('vad'):
+                    audio, timeline = self._detect_speech(audio, detector)
+
+            if timeline is not None and timeline.n_speech == 0:
+                result = {'text': '', 'segments': [], 'language': language}
+            else:
+                with tracing.stage('inference'), tracing.instrument_model(model, fallbacks=True):
+                    result = model.transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+                self._report_draft(model)
+            if timeline is not None:
+                result = {
+                    **result,
+                    'segments': [timeline.remap_segment(segment) for segment in result['segments']],
+                    'vad': self.vad_report,
+                }
+            if key is not None: _store_result(result_cache, key, result)
+            with tracing.stage('format'):
+                return self.format_result(result, fmt)
+
+    def iter_segments(self,
+                      audio,
+                      model_name: str = 'base',
+                      language: str = None,
+                      cache: bool = True,
+                      preset: str = None,
+                      vad=None,
+                      checkpoint=None,
+                      draft_model: str = None,
+                      **kwargs):
+        '''
+        Transcribe an audio file, yielding segments as each 30-second window is decoded.
+
+        With `checkpoint`, the segments and decoder state are committed to a
+        sidecar file after each window, see `echoscript.checkpoint.Checkpoint`.
+        Running the same job again (same audio, model and options) first yields
+        the committed segments and then continues decoding after the last
+        committed window, giving the same segments as an uninterrupted run.
+        The checkpoint is removed once the transcription completes.
+
+        Args:
+            audio (str | bytes | BinaryIO | ndarray | Tensor): The audio to transcribe, see `transcribe`.
+            model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+            language (str, optional): The language of the audio, use `None` for multilingual. Defaults to None.
+            cache (bool, optional): Whether to serve and store the result in the on-disk result cache. Defaults to True.
+            preset (str, optional): The decode option preset, see `decode_options`. Defaults to None.
+            vad (bool | str | callable, optional): Transcribe only the speech found by this voice activity detector,
+                see `transcribe`. Defaults to None.
+            checkpoint (bool | str, optional): Resume from and update a checkpoint file, True for one under
+                `$ECHOSCRIPT_HOME/cache/checkpoints` named after the job. Defaults to None.
+            draft_model (str, optional): The model drafting tokens for greedy decoding, see `transcribe`. Defaults to None.
+            **kwargs: Decode options to pass to `echoscript.streaming.iter_transcribe`.
+
+        Yields:
+            dict: The segments of the `json` result, in order.
+        '''
+        from echoscript.checkpoint import Checkpoint
+        from echoscript.streaming import collect_segments, iter_transcribe
+
+        if language is not None and not self.is_language_available(language):
+            raise ValueError(f'Language `{language}` is not available.')
+
+        if draft_model is not None and not self.is_model_available(draft_model):
+            raise ValueError(f'Model `{draft_model}` is not available.')
+
+        options = decode_options(preset, **kwargs)
+        language, initial_prompt = process_language(language, options.pop('initial_prompt', None))
+        detector = _get_vad(vad)
+        audio = _ingest(audio, keep_bytes=True)
+        self.vad_report = None
+        self.draft_report = None
+        result_cache, key = None, None
+        if cache:
+            with tracing.stage('cache'):
+                result_cache = get_result_cache()
+                key = _result_cache_key(audio, model_name, language, initial_prompt, _vad_options(options, detector))
+                result = result_cache.get(key) if key is not None else None
+            if result is not None:
+                tracing.annotate(cached=True)
+                self.vad_report = result.get('vad')
+                self.language = result.get('language')
+                yield from result['segments']
+                return
+
+        resume, commit = None, None
+        if checkpoint:
+            checkpoint_key = key or _result_cache_key(audio, model_name, language, initial_prompt,
+                                                      _vad_options(options, detector))
+            if checkpoint_key is None:
+                raise ValueError('Only audio with a content hash and a cacheable VAD can be checkpointed.')
+            checkpoint = Checkpoint(checkpoint_key, checkpoint if isinstance(checkpoint, str) else None)
+            resume = checkpoint.load()
+            pending = []
+
+            def commit(window):
+                checkpoint.commit(pending, window)
+                pending.clear()
+
+        audio = _ingest(audio)
+        tracing.annotate(audio_duration=_duration(audio))
         self.model_name = model_name
-        self.model = self.load_whisper_model(model_name)
-        language, initial_prompt = _process_language(language)
-        result = self.model.transcribe(audio, language=language, initial_prompt=initial_prompt)
+        with tracing.stage('model_load'):
+            self.model = self.load_whisper_model(model_name)
+            model = self._with_draft_model(draft_model)
+        timeline = None
+        if detector is not None:
+            with tracing.stage('vad'):
+                audio, timeline = self._detect_speech(audio, detector)
+
+        state, segments = {'language': language}, []
+        if resume is not None:
+            tracing.annotate(resumed_segments=len(resume['segments']))
+            segments.extend(resume['segments'])
+            yield from resume['segments']
+        if timeline is None or timeline.n_speech > 0:
+            # Stages are not timed across `yield`, which would include the time the caller takes.
+            with tracing.instrument_model(model):
+                for segment in iter_transcribe(model, audio,
+                                               language=language,
+                                               initial_prompt=initial_prompt,
+                                               state=state,
+                                               resume=resume,
+                                               checkpoint=commit,
+                                               **options):
+                    if timeline is not None:
+                        segment = timeline.remap_segment(segment)
+                    segments.append(segment)
+                    if commit is not None: pending.append(segment)
+                    yield segment
+            self._report_draft(model)
+
+        self.language = state.get('language')
+        if key is not None:
+            result = collect_segments(segments, self.language)
+            if timeline is not None: result['vad'] = self.vad_report
+            _store_result(result_cache, key, result)
+        if checkpoint: checkpoint.remove()
+
+    def transcribe_many(self,
+                        audios,
+                        model_name: str = 'base',
+                        fmt: str = None,
+                        language: str = None,
+                        batch_size: int = 8,
+                        cache: bool = True,
+                        preset: str = None,
+                        **kwargs) -> list:
+        '''
+        Transcribe several audio inputs, decoding their 30-second windows in batches on one model.
+
+        This is faster than calling `transcribe` in a loop for many short
+        clips, see `echoscript.batched.transcribe_batched` for how the
+        windows of longer inputs are decoded.
+
+        Args:
+            audios (Iterable[str | bytes | BinaryIO | ndarray | Tensor]): The audio to transcribe, see `transcribe`.
+            model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+            fmt (str, optional): The output format, see `transcribe`. Word-level formats are not supported. Defaults to None.
+            language (str, optional): The language of the audio, use `None` to detect it per input. Defaults to None.
+            batch_size (int, optional): The number of windows decoded together. Defaults to 8.
+            cache (bool, optional): Whether to serve and store the results in the on-disk result cache. Defaults to True.
+            preset (str, optional): The decode option preset, see `decode_options`. Defaults to None.
+            **kwargs: Decode options to pass to `echoscript.batched.transcribe_batched`.
+
+        Returns:
+            list[str | dict]: The transcription of each input, in order.
+        '''
+        if language is not None and not self.is_language_available(language):
+            raise ValueError(f'Language `{language}` is not available.')
+
+        if fmt is not None and fmt not in self.available_formats:
+            raise ValueError(f'Format `{fmt}` is not supported.')
+        if fmt != 'json' and formats.get_formatter(fmt).words:
+            raise ValueError(f'Format `{fmt}` needs word timestamps, which batched decoding does not support.')
+
+        with tracing.trace(source='python', model_name=model_name, language=language, fmt=fmt):
+            audios = [_ingest(audio, keep_bytes=True) for audio in audios]
+            tracing.annotate(inputs=len(audios))
+            options = decode_options(preset, **kwargs)
+            language, initial_prompt = process_language(language, options.pop('initial_prompt', None))
+            results = [None] * len(audios)
+            keys = [None] * len(audios)
+            if cache:
+                with tracing.stage('cache'):
+                    result_cache = get_result_cache()
+                    for i, audio in enumerate(audios):
+                        keys[i] = _result_cache_key(audio, model_name, language, initial_prompt,
+                                                    {**options, 'batched': True})
+                        results[i] = result_cache.get(keys[i]) if keys[i] is not None else None
+
+            pending = [i for i, result in enumerate(results) if result is None]
+            if pending:
+                from echoscript.batched import transcribe_batched
+
+                self.model_name = model_name
+                with tracing.stage('model_load'):
+                    self.model = self.load_whisper_model(model_name)
+                with tracing.stage('inference'), tracing.instrument_model(self.model):
+                    transcribed = transcribe_batched(self.model, (_ingest(audios[i]) for i in pending),
+                                                     batch_size=batch_size,
+                                                     language=language,
+                                                     initial_prompt=initial_prompt,
+                                                     **options)
+                for i, result in zip(pending, transcribed):
+                    results[i] = result
+                    if keys[i] is not None: _store_result(result_cache, keys[i], result)
+
+            with tracing.stage('format'):
+                return [self.format_result(result, fmt) for result in results]
+
+    def _with_draft_model(self, draft_model, replica=0):
+        '''
+        Wrap the loaded model to decode greedily with the draft model, see `echoscript.speculative.SpeculativeModel`.
+        '''
+        if draft_model is None:
+            return self.model
+        from echoscript.speculative import SpeculativeModel
+
+        return SpeculativeModel(self.model, self.load_whisper_model(draft_model, replica=replica))
+
+    def _report_draft(self, model):
+        '''
+        Store the token counts of a draft model in `draft_report` and the active trace.
+        '''
+        if model is self.model:
+            return
+        self.draft_report = model.stats.report()
+        tracing.annotate(draft_acceptance_rate=round(model.stats.acceptance_rate, 4),
+                         draft_speedup=round(model.stats.speedup, 4))
+
+    def _detect_speech(self, audio, detector):
+        '''
+        Run the voice activity detector, storing the amount of skipped audio in `vad_report`.
+
+        Returns:
+            tuple[ndarray, SpeechTimeline]: The concatenated speech and its timeline.
+        '''
+        from echoscript.vad import detect_speech
+
+        audio, timeline = detect_speech(audio, detector)
+        self.vad_report = timeline.report()
+        return audio, timeline
+
+    @staticmethod
+    def format_result(result, fmt=None):
+        '''
+        Convert a raw Whisper result into the requested format.
+
+        Args:
+            result (dict): The result returned by the model's transcribe method.
+            fmt (str, optional): The output format, `json` or a format of `echoscript.formats`. Defaults to None.
+
+        Returns:
+            str | dict: The formatted transcription, the raw result for `json`.
+        '''
         if fmt == 'json': return result
-        if fmt in ('vtt', 'srt'): 
-            return segments2subtitle(result['segments'], fmt=fmt)
-        return result['text']
+        if fmt is None: return result['text']
+        return formats.get_formatter(fmt).format(result['segments'])
+
 
+def decode_options(preset: str = None, **kwargs) -> dict:
+    '''
+    Merge a decode option preset with explicit decode options.
+
+    Args:
+        preset (str, optional): The preset {`fast`, `balanced`, `accurate`}, use `None` for the Whisper defaults. Defaults to None.
+        **kwargs: Decode options of `whisper.transcribe`, overriding the preset.
 
-def _process_language(language):
+    Returns:
+        dict: The decode options.
+    '''
+    if preset is not None and preset not in PRESETS:
+        raise ValueError(f'Preset `{preset}` is not available.')
+    return {**PRESETS.get(preset, {}), **kwargs}
+
+
+def model_variant(model_name: str, quantize: str = None) -> str:
+    '''
+    The name of a quantized model variant.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        quantize (str, optional): The quantization {`int8`}, use `None` for the model itself. Defaults to None.
+
+    Returns:
+        str: `<model_name>:<quantize>`, or `model_name` without quantization.
+    '''
+    if quantize is None:
+        return model_name
+    if quantize not in QUANTIZATIONS:
+        raise ValueError(f'Quantization `{quantize}` is not supported.')
+    return f'{model_name}:{quantize}'
+
+
+def loaded_models() -> list:
+    '''
+    The model names, e.g. `base` or `base:int8`, of the models in the model cache of this process.
+    '''
+    return sorted({
+        model_variant(key[0], key[2]) if key[2] in QUANTIZATIONS else key[0]
+        for key in get_model_cache().keys()
+    })
+
+
+def process_language(language, prompt=None):
     '''
     Process the language code. Try to support zh-tw.
 
     Args:
         language (str): The language code to process.
+        prompt (str, optional): The initial prompt given by the user. Defaults to None.
 
     Returns:
         tuple[str, str]: (language, prompt)
     '''
     if language in ('zh-tw', 'Taiwan'):
-        return 'zh', '使用繁體中文回答: '
-    return language, None
+        return 'zh', '使用繁體中文回答: ' + (prompt or '')
+    return language, prompt
+
+
+def _ingest(audio, keep_bytes=False, paths=False):
+    '''
+    Decode encoded audio given as bytes, a binary file object or `-` (stdin) with `echoscript.ingest`.
+
+    Paths and waveforms are returned as they are, and so are bytes with `keep_bytes`,
+    which the result cache hashes without decoding them. With `paths`, local files
+    are decoded too, so that the trace records the decoding time and the audio duration.
+    '''
+    if isinstance(audio, str) and audio != '-' and not (paths and os.path.isfile(audio)):
+        return audio
+    if keep_bytes and isinstance(audio, (bytes, bytearray, memoryview)):
+        return audio
+    if not (isinstance(audio, (str, bytes, bytearray, memoryview)) or hasattr(audio, 'read')):
+        return audio
+    from echoscript.ingest import load_audio
+
+    return load_audio(audio)
+
+
+def _duration(audio):
+    '''
+    The duration in seconds of a 16 kHz waveform, None for a path.
+    '''
+    if isinstance(audio, str):
+        return None
+    return len(audio) / 16000
+
+
+def _get_vad(vad):
+    '''
+    Resolve the voice activity detector, importing the VAD module only when one is requested.
+    '''
+    if vad is None or vad is False:
+        return None
+    from echoscript.vad import get_vad
+
+    return get_vad(vad)
+
+
+def _vad_options(options, detector):
+    '''
+    The options identifying a result in the result cache, including the voice activity detector.
+
+    Returns:
+        dict | None: The options, or None if the detector has no stable description, see `vad_key`.
+    '''
+    if detector is None:
+        return options
+    from echoscript.vad import vad_key
+
+    key = vad_key(detector)
+    return None if key is None else {**options, 'vad': key}
+
+
+def _result_cache_key(audio, model_name, language, initial_prompt, options):
+    '''
+    Build the result cache key of a transcription.
+
+    Returns:
+        str | None: The cache key, or None if the audio cannot be hashed (e.g. a URL) or the options are None.
+    '''
+    import whisper
+
+    if options is None:
+        return None
+    try:
+        audio_hash = hash_audio(audio)
+    except OSError:
+        return None
+    return cache_key(audio_hash,
+                     model_name=model_name,
+                     language=language,
+                     initial_prompt=initial_prompt,
+                     options=options,
+                     whisper=whisper.__version__)
+
+
+def _store_result(result_cache, key, result):
+    '''
+    Store a result in the result cache, a failed write only warns.
+    '''
+    try:
+        result_cache.put(key, result)
+    except OSError as e:
+        warnings.warn(f'Failed to write the result cache: {e}')
 
 
 def audio2text(audio, model_name='base', fmt=None, language=None, **kwargs):
@@ -138,11 +706,11 @@ def audio2text(audio, model_name='base', fmt=None, language=None, **kwargs):
     Transcribe an audio file using the Whisper model.
 
     Args:
-        audio (str | ndarray | Tensor): The audio to transcribe. Can be a file path, bytes of audio data, or a URL.
+        audio (str | bytes | BinaryIO | ndarray | Tensor): The audio to transcribe, see `Audio2Text.transcribe`.
         model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
         fmt (str, optional): The format of the audio, supported formats {`srt`, `None`}. Defaults to None.
         language (str, optional): The language of the audio, use `None` for multilingual. Defaults to None.
-        **kwargs: Additional keyword arguments to pass to the model's transcribe method.
+        **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`, e.g. `preset` or decode options.
 
     Returns:
         str: The transcribed text
@@ -0,0 +1,392 @@
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+
+from echoscript import formats
+from echoscript.audio2text import Audio2Text
+from echoscript.media import MediaCache, Prefetcher, get_backend, is_remote
+
+
+AUDIO_EXTENSIONS = (
+    '.aac', '.flac', '.m4a', '.mkv', '.mov', '.mp3', '.mp4',
+    '.ogg', '.opus', '.wav', '.webm', '.wma',
+)
+
+FORMAT_EXTENSIONS = {fmt: formats.extension(fmt) for fmt in Audio2Text.available_formats}
+
+
+def is_audio_file(path: str) -> bool:
+    '''
+    Check if a path looks like an audio or video file by its extension.
+
+    Args:
+        path (str): The path to check.
+
+    Returns:
+        bool: True if the extension is a known audio/video extension.
+    '''
+    return os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
+
+
+def read_manifest(path: str) -> list:
+    '''
+    Read a manifest file with one audio path per line.
+
+    Blank lines and lines starting with `#` are ignored. Relative paths are
+    resolved against the directory of the manifest, URLs are kept as they are.
+
+    Args:
+        path (str): The manifest file.
+
+    Returns:
+        list[str]: The audio paths listed in the manifest.
+    '''
+    root = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [
+        line if os.path.isabs(line) or is_remote(line) else os.path.join(root, line)
+        for line in lines
+        if line and not line.startswith('#')
+    ]
+
+
+def collect_audio_files(sources) -> list:
+    '''
+    Expand directories, glob patterns and manifest files into audio paths.
+
+    Args:
+        sources (Iterable[str]): Each source is either a directory (searched
+            recursively for audio files), an audio file, a manifest file with
+            one path or URL per line, a glob pattern, or a URL such as a YouTube video.
+
+    Returns:
+        list[str]: The audio paths and URLs, in order and without duplicates.
+    '''
+    files = []
+    for source in sources:
+        if is_remote(source):
+            files.append(source)
+        elif os.path.isdir(source):
+            for root, dirs, names in os.walk(source):
+                dirs.sort()
+                files.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if is_audio_file(name)
+                )
+        elif os.path.isfile(source):
+            files.extend([source] if is_audio_file(source) else read_manifest(source))
+        else:
+            files.extend(sorted(glob.glob(source, recursive=True)))
+    return list(dict.fromkeys(files))
+
+
+def output_path(audio: str, fmt: str = None, output_dir: str = None) -> str:
+    '''
+    The path of the transcript written for an audio file.
+
+    Transcripts of URLs are named after their source id, e.g. `youtube-<video id>.srt`.
+
+    Args:
+        audio (str): The audio file or URL.
+        fmt (str, optional): The output format. Defaults to None.
+        output_dir (str, optional): The output directory, use `None` to write next to the audio file,
+            or to the working directory for URLs. Defaults to None.
+
+    Returns:
+        str: The output path.
+    '''
+    _, source_id = get_backend(audio)
+    if source_id is not None:
+        stem, directory = source_id, output_dir or '.'
+    else:
+        stem = os.path.splitext(os.path.basename(audio))[0]
+        directory = os.path.dirname(audio) if output_dir is None else output_dir
+    return os.path.join(directory, stem + formats.extension(fmt))
+
+
+def output_paths(files, fmt: str = None, output_dir: str = None) -> dict:
+    '''
+    The paths of the transcripts written for a batch of audio files, see `output_path`.
+
+    With `output_dir`, local files keep their directory layout below the
+    deepest directory that contains all of them, so `a/talk.mp3` and
+    `b/talk.mp3` are written to `<output_dir>/a/talk.txt` and
+    `<output_dir>/b/talk.txt`.
+
+    Args:
+        files (Iterable[str]): The audio files or URLs.
+        fmt (str, optional): The output format. Defaults to None.
+        output_dir (str, optional): The output directory, use `None` to write next to each audio file. Defaults to None.
+
+    Returns:
+        dict[str, str]: The output path of each file.
+
+    Raises:
+        ValueError: If two files would be written to the same transcript, e.g. `talk.mp3` and `talk.wav`.
+    '''
+    files = list(files)
+    local = [os.path.dirname(os.path.abspath(audio)) for audio in files if get_backend(audio)[1] is None]
+    root = os.path.commonpath(local) if output_dir is not None and local else None
+
+    outputs, sources = {}, {}
+    for audio in files:
+        directory = output_dir
+        if root is not None and get_backend(audio)[1] is None:
+            directory = os.path.normpath(os.path.join(output_dir, os.path.relpath(
+                os.path.dirname(os.path.abspath(audio)), root)))
+        outputs[audio] = output = output_path(audio, fmt, directory)
+        other = sources.setdefault(os.path.abspath(output), audio)
+        if other != audio:
+            raise ValueError(f'{other} and {audio} would both be transcribed to {output}.')
+    return outputs
+
+
+def write_transcript(text, filename: str):
+    '''
+    Write a transcript to a file, dict results are written as JSON.
+
+    Args:
+        text (str | dict): The transcript.
+        filename (str): The output file.
+    '''
+    with open(filename, 'w', encoding='utf-8') as f:
+        if isinstance(text, dict):
+            json.dump(text, f, ensure_ascii=False)
+        else:
+            f.write(text)
+
+
+def transcribe_file(audio, model_name='base', fmt=None, language=None, **kwargs):
+    '''
+    Transcribe one audio input and measure its duration.
+
+    Args:
+        audio (str | ndarray): The audio to transcribe, a file path or a waveform.
+        model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+        fmt (str, optional): The output format. Defaults to None.
+        language (str, optional): The language of the audio. Defaults to None.
+        **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+    Returns:
+        tuple[str | dict, float]: The transcript and the audio duration in seconds.
+    '''
+    import whisper
+
+    if isinstance(audio, str):
+        audio = whisper.load_audio(audio)
+    text = Audio2Text().transcribe(audio, model_name, fmt, language, **kwargs)
+    return text, len(audio) / whisper.audio.SAMPLE_RATE
+
+
+def _write(text, output):
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_transcript(text, output)
+    return output
+
+
+def batch_pipeline(model_name='base',
+                   fmt=None,
+                   language=None,
+                   output_dir=None,
+                   prefetch: int = 2,
+                   decode_workers: int = 1,
+                   infer_workers: int = 1,
+                   outputs: dict = None,
+                   **kwargs):
+    '''
+    Build the pipeline transcribing files in this process: fetch, decode, infer and write.
+
+    The `fetch` stage downloads URLs into the media cache, `decode` decodes
+    the audio with ffmpeg, `infer` transcribes the waveform and `write`
+    writes the transcript. Each stage runs on its own threads, so the next
+    files are downloaded and decoded while one is transcribed.
+
+    Args:
+        model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+        fmt (str, optional): The output format. Defaults to None.
+        language (str, optional): The language of the audio. Defaults to None.
+        output_dir (str, optional): The output directory, see `output_path`. Defaults to None.
+        prefetch (int, optional): The number of URLs downloaded ahead. Defaults to 2.
+        decode_workers (int, optional): The number of concurrent ffmpeg decodes. Defaults to 1.
+        infer_workers (int, optional): The number of concurrent transcriptions, each on its own model replica. Defaults to 1.
+        outputs (dict[str, str], optional): The transcript path of each file, see `output_paths`, instead of
+            `output_path` with `output_dir`. Defaults to None.
+        **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+    Returns:
+        Pipeline: The pipeline, run it on the audio files or URLs. Each item flows as a dict with
+            `audio`, `path`, `duration`, `text` and `output`.
+    '''
+    import whisper
+
+    from echoscript.pipeline import Pipeline, Stage
+
+    cache = MediaCache()
+    replicas, local = itertools.count(), threading.local()
+
+    def fetch(audio):
+        item = {'audio': audio, 'path': audio, 'pinned': False}
+        if is_remote(audio):
+            item['path'] = cache.fetch(audio)
+            cache.pin(item['path'])
+            item['pinned'] = True
+        return item
+
+    def decode(item):
+        item['waveform'] = whisper.load_audio(item['path'])
+        item['duration'] = len(item['waveform']) / whisper.audio.SAMPLE_RATE
+        return item
+
+    def infer(item):
+        if not hasattr(local, 'replica'):
+            local.replica = next(replicas)
+        waveform = item.pop('waveform')
+        item['text'] = Audio2Text().transcribe(waveform, model_name, fmt, language, replica=local.replica, **kwargs)
+        return item
+
+    def write(item):
+        audio = item['audio']
+        output = outputs[audio] if outputs is not None else output_path(audio, fmt, output_dir)
+        item['output'] = _write(item.pop('text'), output)
+        return item
+
+    return Pipeline([
+        Stage('fetch', fetch, workers=max(prefetch, 1), queue_size=max(prefetch, 1)),
+        Stage('decode', decode, workers=decode_workers),
+        Stage('infer', infer, workers=infer_workers),
+        Stage('write', write),
+    ])
+
+
+def _iter_pipeline(pipeline, files):
+    for audio, item, error in pipeline.run(files):
+        if isinstance(item, dict) and item['pinned']:
+            MediaCache.unpin(item['path'])
+        if error is not None:
+            yield audio, None, None, error
+        else:
+            yield audio, item['output'], item['duration'], None
+
+
+def _iter_pool(files, model_name, fmt, language, outputs, workers, threads_per_worker, prefetch=2, **kwargs):
+    from echoscript.pool import TranscriptionPool
+
+    running = {}
+
+    def finished(future):
+        audio, path = running.pop(future)
+        if is_remote(audio): prefetcher.cache.unpin(path)
+        try:
+            text, duration = future.result()
+            return audio, _write(text, outputs[audio]), duration, None
+        except Exception as e:
+            return audio, None, None, e
+
+    with Prefetcher(workers=max(prefetch, 1), ahead=prefetch) as prefetcher:
+        try:
+            with TranscriptionPool(workers, threads_per_worker, model_name) as pool:
+                # Each file is queued as soon as it is downloaded. The worker processes read the downloads,
+                # which stay pinned until their job is done, and at most `prefetch` jobs wait for a worker.
+                for audio, path in prefetcher.iter_fetched(files, unpin=False):
+                    if isinstance(path, Exception):
+                        yield audio, None, None, path
+                        continue
+                    running[pool.submit(path, fmt, language, **kwargs)] = (audio, path)
+                    while len(running) >= pool.workers + prefetch:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield finished(future)
+                for future in as_completed(list(running)):
+                    yield finished(future)
+        finally:
+            # Only reached with jobs left when the batch is interrupted, the pool has stopped by now.
+            for audio, path in running.values():
+                if is_remote(audio): prefetcher.cache.unpin(path)
+
+
+def transcribe_batch(files,
+                     model_name: str = 'base',
+                     fmt: str = None,
+                     language: str = None,
+                     output_dir: str = None,
+                     callback=None,
+                     workers: int = None,
+                     threads_per_worker: int = None,
+                     prefetch: int = 2,
+                     decode_workers: int = 1,
+                     infer_workers: int = 1,
+                     **kwargs) -> dict:
+    '''
+    Transcribe many audio files with a single loaded model.
+
+    In this process, the files flow through `batch_pipeline`, so downloading
+    and decoding the next files overlaps with transcribing the current one.
+
+    Args:
+        files (Iterable[str]): The audio files or URLs to transcribe.
+        model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+        fmt (str, optional): The output format, supported formats {`json`, `vtt`, `srt`, `None`}. Defaults to None.
+        language (str, optional): The language of the audio, use `None` for multilingual. Defaults to None.
+        output_dir (str, optional): The output directory, use `None` to write next to each input, see
+            `output_paths`. Defaults to None.
+        callback (callable, optional): Called as `callback(audio, output, error)` after each file.
+        workers (int, optional): The number of worker processes, use `None` to transcribe in this process. Defaults to None.
+        threads_per_worker (int, optional): The torch thread count of each worker process. Defaults to None.
+        prefetch (int, optional): The number of URLs downloaded ahead of the one being transcribed. Defaults to 2.
+        decode_workers (int, optional): The number of concurrent ffmpeg decodes in this process. Defaults to 1.
+        infer_workers (int, optional): The number of concurrent transcriptions in this process,
+            each on its own model replica. Defaults to 1.
+        **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+    Returns:
+        dict: Batch statistics
+            - files: Number of files transcribed successfully
+            - failed: List of (audio, error message) for failed files
+            - audio_seconds: Total duration of the transcribed audio
+            - wall_seconds: Total wall-clock time
+            - speed: audio_seconds / wall_seconds
+            - stages: The per-stage statistics of the pipeline, see `Pipeline.stats`, without worker processes
+
+    Raises:
+        ValueError: If two files would be written to the same transcript, before any file is transcribed.
+    '''
+    files = list(files)
+    outputs = output_paths(files, fmt, output_dir)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    pipeline = None
+    if workers is None:
+        pipeline = batch_pipeline(model_name, fmt, language, output_dir, prefetch, decode_workers, infer_workers,
+                                  outputs=outputs, **kwargs)
+        results = _iter_pipeline(pipeline, files)
+    else:
+        results = _iter_pool(files, model_name, fmt, language, outputs, workers, threads_per_worker, prefetch,
+                             **kwargs)
+
+    stats = {'files': 0, 'failed': [], 'audio_seconds': 0.0}
+    start = time.perf_counter()
+    for audio, output, duration, error in results:
+        if error is not None:
+            stats['failed'].append((audio, str(error)))
+            if callback is not None: callback(audio, None, error)
+            continue
+
+        stats['files'] += 1
+        stats['audio_seconds'] += duration
+        if callback is not None: callback(audio, output, None)
+
+    stats['wall_seconds'] = time.perf_counter() - start
+    stats['speed'] = stats['audio_seconds'] / max(stats['wall_seconds'], 1e-9)
+    if pipeline is not None:
+        stats['stages'] = pipeline.stats()
+    return stats
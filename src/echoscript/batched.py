@@ -0,0 +1,182 @@
+from collections import defaultdict
+
+import torch
+
+from whisper.audio import (
+    HOP_LENGTH,
+    N_FRAMES,
+    N_SAMPLES,
+    SAMPLE_RATE,
+    log_mel_spectrogram,
+    pad_or_trim,
+)
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+
+from echoscript import tracing
+from echoscript.ingest import is_stream, load_audio
+from echoscript.streaming import (
+    UNSUPPORTED_OPTIONS,
+    collect_segments,
+    is_silent,
+    make_segment,
+    needs_fallback,
+    split_window,
+)
+
+
+def iter_windows(model, audio):
+    '''
+    Split audio into consecutive 30-second log-mel windows.
+
+    Args:
+        model (whisper.Whisper): The Whisper model, for its number of mel bins.
+        audio (str | bytes | BinaryIO | ndarray | Tensor): The path to the audio file, encoded audio or the 16 kHz waveform.
+
+    Yields:
+        tuple[int, int, Tensor]: (seek, number of content frames, padded mel window) of each window.
+    '''
+    if isinstance(audio, str) or is_stream(audio):
+        audio = load_audio(audio)
+    with tracing.stage('mel'):
+        mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+    for seek in range(0, content_frames, N_FRAMES):
+        segment_size = min(N_FRAMES, content_frames - seek)
+        yield seek, segment_size, pad_or_trim(mel[:, seek:seek + segment_size], N_FRAMES)
+
+
+def _options_at(options, temperature):
+    options = {**options}
+    if temperature > 0:
+        options.pop('beam_size', None)
+        options.pop('patience', None)
+    else:
+        options.pop('best_of', None)
+    return DecodingOptions(**options, temperature=temperature)
+
+
+def transcribe_batched(model,
+                       audios,
+                       *,
+                       batch_size: int = 8,
+                       verbose=None,
+                       temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+                       compression_ratio_threshold=2.4,
+                       logprob_threshold=-1.0,
+                       no_speech_threshold=0.6,
+                       condition_on_previous_text=True,
+                       initial_prompt=None,
+                       carry_initial_prompt=False,
+                       **decode_options) -> list:
+    '''
+    Transcribe several audio inputs, running the encoder and decoder on batches of 30-second windows.
+
+    Every input is cut into consecutive 30-second windows, and windows of the
+    same language, from one input or from different ones, are decoded
+    together. Unlike `whisper.transcribe`, the windows are decoded
+    independently: each window is prompted with `initial_prompt` only and the
+    next window starts 30 seconds later rather than at the last timestamp.
+    For inputs shorter than 30 seconds this makes no difference. A window
+    failing the compression ratio or log probability thresholds is decoded
+    again on its own at the next temperature.
+
+    Args:
+        model (whisper.Whisper): The Whisper model.
+        audios (Iterable[str | ndarray | Tensor]): The paths to the audio files or the 16 kHz waveforms.
+        batch_size (int, optional): The number of windows decoded together. Defaults to 8.
+        verbose, condition_on_previous_text, carry_initial_prompt: Accepted for compatibility with `whisper.transcribe`, ignored.
+        temperature (float | tuple[float, ...]): The temperatures tried in turn when decoding fails.
+        compression_ratio_threshold (float): Treat the decoding as failed above this gzip compression ratio.
+        logprob_threshold (float): Treat the decoding as failed below this average log probability.
+        no_speech_threshold (float): Skip a window as silent above this no-speech probability.
+        initial_prompt (str): The prompt of every window.
+        **decode_options: Keyword arguments of `whisper.DecodingOptions`.
+
+    Returns:
+        list[dict]: A Whisper-style result with `text`, `segments` and `language` per input, in order.
+    '''
+    for name, disabled in UNSUPPORTED_OPTIONS.items():
+        if decode_options.pop(name, disabled) != disabled:
+            raise ValueError(f'Option `{name}` is not supported when batching.')
+
+    dtype = torch.float16 if decode_options.get('fp16', True) else torch.float32
+    if model.device == torch.device('cpu'):
+        dtype = torch.float32
+    if dtype == torch.float32:
+        decode_options['fp16'] = False
+
+    language = decode_options.pop('language', None)
+    if language is None and not model.is_multilingual:
+        language = 'en'
+    task = decode_options.get('task', 'transcribe')
+    decode_options['prompt'] = initial_prompt
+    temperatures = [temperature] if isinstance(temperature, (int, float)) else list(temperature)
+
+    segments = defaultdict(list)
+    languages = {}
+    queues = defaultdict(list)
+    undetected = []
+
+    def detect(pending):
+        mels = torch.stack([windows[0][2] for _, windows in pending]).to(model.device).to(dtype)
+        _, probs = model.detect_language(mels)
+        for (index, windows), prob in zip(pending, probs):
+            languages[index] = max(prob, key=prob.get)
+            queues[languages[index]].extend((index, *window) for window in windows)
+
+    def decode(language, batch):
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                  language=language, task=task)
+        options = {**decode_options, 'language': language}
+        mels = torch.stack([mel for *_, mel in batch]).to(model.device).to(dtype)
+        results = model.decode(mels, _options_at(options, temperatures[0]))
+        tracing.count('windows', len(batch))
+        for (index, seek, segment_size, mel), result in zip(batch, results):
+            for t in temperatures[1:]:
+                if not needs_fallback(result, compression_ratio_threshold, logprob_threshold, no_speech_threshold):
+                    break
+                tracing.count('fallbacks')
+                result = model.decode(mel.to(model.device).to(dtype), _options_at(options, t))
+            if is_silent(result, logprob_threshold, no_speech_threshold):
+                continue
+            time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+            spans, _ = split_window(torch.tensor(result.tokens), tokenizer, time_offset, segment_size)
+            segments[index].extend(
+                make_segment(tokenizer, seek, start, end, tokens, result)
+                for start, end, tokens in spans
+            )
+
+    def flush(partial=False):
+        for language, queue in queues.items():
+            while len(queue) >= batch_size or (partial and queue):
+                decode(language, queue[:batch_size])
+                del queue[:batch_size]
+
+    n_audios = 0
+    for index, audio in enumerate(audios):
+        n_audios += 1
+        windows = list(iter_windows(model, audio))
+        if not windows:
+            continue
+        if language is None:
+            undetected.append((index, windows))
+            if len(undetected) >= batch_size:
+                detect(undetected)
+                undetected = []
+        else:
+            languages[index] = language
+            queues[language].extend((index, *window) for window in windows)
+        flush()
+
+    if undetected:
+        detect(undetected)
+    flush(partial=True)
+
+    return [
+        collect_segments(
+            [{'id': i, **segment} for i, segment in enumerate(segments[index])],
+            languages.get(index, language),
+        )
+        for index in range(n_audios)
+    ]
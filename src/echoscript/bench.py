@@ -0,0 +1,360 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from echoscript.audio2text import Audio2Text
+
+
+SAMPLE_RATE = 16000
+EXAMPLE_AUDIO = 'This_is_an_example.mp3'
+
+# The benchmark suites, in the order they run.
+SUITES = ('startup', 'format', 'decode', 'mel', 'model')
+
+
+def synthetic_audio(kind: str = 'tone', seconds: float = 10.0, sr: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    '''
+    Generate a deterministic test waveform.
+
+    Args:
+        kind (str, optional): `tone` for an amplitude-modulated chord with pauses, `noise` for white noise. Defaults to 'tone'.
+        seconds (float, optional): The duration. Defaults to 10.
+        sr (int, optional): The sample rate. Defaults to 16000.
+        seed (int, optional): The seed of the noise. Defaults to 0.
+
+    Returns:
+        ndarray: The float32 waveform in [-1, 1].
+    '''
+    t = np.arange(int(seconds * sr)) / sr
+    if kind == 'tone':
+        chord = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) / 3
+        envelope = np.clip(np.sin(2 * np.pi * 0.5 * t), 0, None)
+        audio = 0.5 * chord * envelope
+    elif kind == 'noise':
+        audio = np.random.default_rng(seed).normal(0, 0.1, len(t)).clip(-1, 1)
+    else:
+        raise ValueError(f'Synthetic audio `{kind}` is not supported.')
+    return audio.astype(np.float32)
+
+
+def wav_bytes(audio, sr: int = SAMPLE_RATE) -> bytes:
+    '''
+    Encode a waveform as 16-bit PCM WAV in memory.
+    '''
+    import io
+    import wave
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_segments(n: int = 100_000) -> list:
+    '''
+    Generate `n` consecutive segments of about 3 seconds with short texts.
+    '''
+    return [
+        {'start': i * 3.07, 'end': i * 3.07 + 2.9, 'text': f' Synthetic segment number {i} of the benchmark.'}
+        for i in range(n)
+    ]
+
+
+def measure(fn, repeat: int = 3, warmup: int = 0) -> float:
+    '''
+    The median wall time of `fn()` in seconds over `repeat` runs.
+    '''
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+# Dependencies that the CLI entry points must not import, see `import_profile`.
+HEAVY_MODULES = ('gradio', 'numba', 'numpy', 'pytubefix', 'torch', 'whisper')
+
+
+def import_profile(code: str):
+    '''
+    Run `code` in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        tuple[float, set[str]]: The total import time in milliseconds and the imported top-level packages.
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    total_us, packages = 0, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        packages.add(name.strip().split('.')[0])
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def metric(value: float, unit: str = 's', better: str = 'lower') -> dict:
+    '''
+    A benchmark result, `better` tells whether lower or higher values are better.
+    '''
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def bench_startup(repeat: int = 3) -> dict:
+    '''
+    The wall time of `echoscript --help` in a fresh interpreter.
+    '''
+    cmd = [sys.executable, '-c', "from echoscript.cli import cli; cli(['--help'])"]
+    seconds = measure(lambda: subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True), repeat, warmup=1)
+    return {'startup.help': metric(seconds)}
+
+
+def bench_format(n_segments: int = 100_000, repeat: int = 3) -> dict:
+    '''
+    The time of `segments2subtitle` on synthetic segments, per format.
+    '''
+    from echoscript.utils import segments2subtitle
+
+    segments = synthetic_segments(n_segments)
+    return {
+        f'format.{fmt}': metric(measure(lambda: segments2subtitle(segments, fmt), repeat))
+        for fmt in ('srt', 'vtt')
+    }
+
+
+def bench_decode(sources: dict, repeat: int = 3) -> dict:
+    '''
+    The real-time factor of decoding encoded audio with ffmpeg, see `echoscript.ingest.load_audio`.
+
+    Args:
+        sources (dict[str, bytes]): The encoded audio by name.
+    '''
+    from echoscript.ingest import load_audio
+
+    results = {}
+    for name, data in sources.items():
+        duration = len(load_audio(data)) / SAMPLE_RATE
+        results[f'decode.{name}'] = metric(measure(lambda: load_audio(data), repeat) / duration, 'rtf')
+    return results
+
+
+def bench_mel(repeat: int = 3) -> dict:
+    '''
+    The time of the log-mel spectrogram of a 30-second window.
+    '''
+    from whisper.audio import log_mel_spectrogram
+
+    audio = synthetic_audio('noise', 30)
+    return {
+        f'mel.{n_mels}': metric(measure(lambda: log_mel_spectrogram(audio, n_mels), repeat, warmup=1))
+        for n_mels in (80, 128)
+    }
+
+
+def bench_model(model_name: str, audios: dict, repeat: int = 3) -> dict:
+    '''
+    Load time, encoder and decoder throughput and transcription speed of a model on the CPU.
+
+    Args:
+        model_name (str): The model or model variant, e.g. `base` or `base:int8`.
+        audios (dict[str, ndarray]): The 16 kHz waveforms to transcribe, by name.
+    '''
+    import torch
+    import whisper
+
+    from whisper.audio import N_SAMPLES, log_mel_spectrogram, pad_or_trim
+
+    load = lambda use_cache: Audio2Text.load_whisper_model(model_name, device='cpu', use_cache=use_cache)
+    results = {
+        f'model.{model_name}.load_cold': metric(measure(lambda: load(False), repeat)),
+        f'model.{model_name}.load_warm': metric(measure(lambda: load(True), repeat, warmup=1)),
+    }
+    model = load(True)
+
+    audio = next(iter(audios.values()))
+    mel = pad_or_trim(log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES), 3000)[None]
+    with torch.no_grad():
+        seconds = measure(lambda: model.embed_audio(mel), repeat, warmup=1)
+    results[f'model.{model_name}.encode'] = metric(seconds, 's/window')
+
+    options = whisper.DecodingOptions(language='en', temperature=0.0, fp16=False)
+    n_tokens = len(model.decode(mel, options)[0].tokens)
+    seconds = measure(lambda: model.decode(mel, options), repeat)
+    results[f'model.{model_name}.decode'] = metric(max(n_tokens, 1) / seconds, 'tokens/s', 'higher')
+
+    for name, waveform in audios.items():
+        duration = len(waveform) / SAMPLE_RATE
+        transcribe = lambda: Audio2Text().transcribe(waveform, model_name, language='en', cache=False,
+                                                     temperature=0.0, fp16=False)
+        results[f'model.{model_name}.transcribe.{name}'] = metric(measure(transcribe, repeat) / duration, 'rtf')
+    return results
+
+
+def run_benchmarks(models=('tiny',),
+                   suites=SUITES,
+                   audio: str = EXAMPLE_AUDIO,
+                   repeat: int = 3,
+                   n_segments: int = 100_000,
+                   callback=None) -> dict:
+    '''
+    Run the benchmark suites.
+
+    The audio benchmarks use `audio` (the bundled example by default) when it
+    can be decoded, and generated tone and noise audio in any case.
+
+    Args:
+        models (Iterable[str], optional): The models of the `model` suite. Defaults to ('tiny',).
+        suites (Iterable[str], optional): The suites to run, see `SUITES`. Defaults to all.
+        audio (str, optional): An audio file to benchmark decoding and transcription with. Defaults to the example mp3.
+        repeat (int, optional): The number of timed runs, the median is reported. Defaults to 3.
+        n_segments (int, optional): The number of synthetic segments of the `format` suite. Defaults to 100000.
+        callback (callable, optional): Called with `(suite, metrics)` after each suite.
+
+    Returns:
+        dict: `{'meta': {...}, 'results': {name: {'value', 'unit', 'better'}}, 'skipped': {suite: reason}}`.
+    '''
+    for suite in suites:
+        if suite not in SUITES:
+            raise ValueError(f'Benchmark suite `{suite}` is not available.')
+
+    report = {'meta': environment(), 'results': {}, 'skipped': {}}
+    waveforms = {'tone': synthetic_audio('tone'), 'noise': synthetic_audio('noise')}
+    encoded = {'wav': wav_bytes(waveforms['tone'])}
+    if audio is not None and os.path.isfile(audio):
+        with open(audio, 'rb') as f:
+            encoded['example'] = f.read()
+
+    def run(suite, fn, *args):
+        try:
+            metrics = fn(*args)
+        except (OSError, RuntimeError) as e:
+            report['skipped'][suite] = str(e)
+            return
+        report['results'].update(metrics)
+        if callback is not None: callback(suite, metrics)
+
+    for suite in SUITES:
+        if suite not in suites:
+            continue
+        if suite == 'startup':
+            run(suite, bench_startup, repeat)
+        elif suite == 'format':
+            run(suite, bench_format, n_segments, repeat)
+        elif suite == 'decode':
+            run(suite, bench_decode, encoded, repeat)
+        elif suite == 'mel':
+            run(suite, bench_mel, repeat)
+        elif suite == 'model':
+            if 'example' in encoded:
+                try:
+                    from echoscript.ingest import load_audio
+
+                    waveforms = {'example': load_audio(encoded['example']), **waveforms}
+                except RuntimeError as e:
+                    report['skipped']['model.example'] = str(e)
+            for model_name in models:
+                run(f'model.{model_name}', bench_model, model_name, waveforms, repeat)
+    return report
+
+
+def environment() -> dict:
+    '''
+    The versions and hardware the benchmarks ran on.
+    '''
+    from echoscript import __version__
+
+    meta = {
+        'echoscript': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    for package in ('torch', 'whisper', 'numpy'):
+        module = sys.modules.get(package)
+        if module is None:
+            try:
+                module = __import__(package)
+            except ImportError:
+                continue
+        meta[package] = getattr(module, '__version__', None)
+    return meta
+
+
+def save_report(report: dict, path: str):
+    '''
+    Write a benchmark report as JSON.
+    '''
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path: str) -> dict:
+    '''
+    Read a benchmark report written by `save_report`.
+    '''
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    '''
+    Compare benchmark results with a baseline.
+
+    A metric regresses when it is more than `threshold` (a fraction) worse
+    than the baseline, slower for times and lower for throughputs.
+
+    Args:
+        baseline (dict): The baseline report, see `run_benchmarks`.
+        current (dict): The current report.
+        threshold (float, optional): The tolerated relative change. Defaults to 0.1.
+
+    Returns:
+        list[dict]: A row per metric with `name`, `baseline`, `current`, `change` (relative, positive is
+            worse) and `status` {`ok`, `regression`, `improvement`, `new`, `missing`}.
+    '''
+    before, after = baseline['results'], current['results']
+    rows = []
+    for name in sorted(before.keys() | after.keys()):
+        if name not in before or name not in after:
+            rows.append({'name': name, 'baseline': before.get(name, {}).get('value'),
+                         'current': after.get(name, {}).get('value'), 'change': None,
+                         'status': 'new' if name not in before else 'missing'})
+            continue
+        old, new = before[name]['value'], after[name]['value']
+        change = (new - old) / old if old else 0.0
+        if after[name].get('better', 'lower') == 'higher':
+            change = -change
+        status = 'regression' if change > threshold else 'improvement' if change < -threshold else 'ok'
+        rows.append({'name': name, 'baseline': old, 'current': new, 'change': change, 'status': status})
+    return rows
+
+
+def format_comparison(rows: list) -> str:
+    '''
+    Format the rows of `compare` as a table.
+    '''
+    lines = [f'{"benchmark":<40} {"baseline":>12} {"current":>12} {"change":>8}  status']
+    for row in rows:
+        value = lambda v: '-' if v is None else f'{v:.4g}'
+        change = '-' if row['change'] is None else f'{row["change"]:+.1%}'
+        lines.append(f'{row["name"]:<40} {value(row["baseline"]):>12} {value(row["current"]):>12} '
+                     f'{change:>8}  {row["status"]}')
+    return '\n'.join(lines)
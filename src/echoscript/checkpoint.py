@@ -0,0 +1,123 @@
+import json
+import os
+
+from echoscript.utils import get_echoscript_home
+
+
+class Checkpoint:
+    '''
+    An append-only sidecar file with the progress of a streaming transcription.
+
+    The first line identifies the job by its result cache key (audio hash,
+    model and options). Each further line commits one 30-second window: the
+    segments it produced and the decoder state after it (`seek`, `language`,
+    the prompt reset position and the random number generator state), see
+    `echoscript.streaming.iter_transcribe`. Lines are flushed and synced as
+    they are written, and a torn last line is ignored when loading, so a job
+    killed at any point resumes from its last committed window.
+
+    Example:
+        >>> checkpoint = Checkpoint(key)
+        >>> resume = checkpoint.load()  # None for a new job
+        >>> checkpoint.commit(segments, state)
+        >>> checkpoint.remove()  # once the result is complete
+    '''
+
+    VERSION = 1
+
+    def __init__(self, key: str, path: str = None):
+        '''
+        Args:
+            key (str): The result cache key of the transcription.
+            path (str, optional): The checkpoint file. Defaults to `$ECHOSCRIPT_HOME/cache/checkpoints/<key>.jsonl`.
+        '''
+        self.key = key
+        self.path = path or os.path.join(get_echoscript_home(), 'cache', 'checkpoints', f'{key}.jsonl')
+        self._f = None
+        self._valid = None
+
+    def load(self):
+        '''
+        Read the committed progress of the job.
+
+        Returns:
+            dict | None: The decoder state of the last committed window with all committed `segments`,
+                or None if there is no checkpoint of this job.
+        '''
+        self._valid = None
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.read().split(b'\n')
+        except OSError:
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if not isinstance(header, dict) or header.get('key') != self.key or header.get('version') != self.VERSION:
+            return None
+
+        offset = len(lines[0]) + 1
+        state, segments = None, []
+        # The last element follows the last newline, so it is empty or a torn line.
+        # A malformed record is treated like a torn line, the job continues from the record before it.
+        for line in lines[1:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not (isinstance(record, dict) and isinstance(record.get('state'), dict)
+                    and isinstance(record.get('segments'), list)):
+                break
+            state = record['state']
+            segments.extend(record['segments'])
+            offset += len(line) + 1
+
+        self._valid = offset
+        if state is None:
+            return None
+        return {**state, 'segments': segments}
+
+    def commit(self, segments, state: dict):
+        '''
+        Durably append a window.
+
+        Args:
+            segments (list[dict]): The segments of the window.
+            state (dict): The decoder state after the window.
+        '''
+        if self._f is None:
+            self._open()
+        line = json.dumps({'state': state, 'segments': segments}, ensure_ascii=False) + '\n'
+        self._f.write(line.encode('utf-8'))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def remove(self):
+        '''
+        Delete the checkpoint, e.g. once the transcription is complete.
+        '''
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _open(self):
+        '''
+        Continue a loaded checkpoint, dropping a torn last line, or start a new one.
+        '''
+        if self._valid is not None:
+            self._f = open(self.path, 'r+b')
+            self._f.truncate(self._valid)
+            self._f.seek(self._valid)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._f = open(self.path, 'wb')
+        self._f.write(json.dumps({'key': self.key, 'version': self.VERSION}).encode() + b'\n')
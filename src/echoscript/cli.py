@@ -1,46 +1,158 @@
 
 import click
+import os
 import sys
+import time
 
-from echoscript import audio2text, Audio2Text
-from echoscript.gradio_app import TranscriptionApp
-from echoscript.utils import get_yt_audio
+from echoscript import audio2text, formats, tracing, Audio2Text
+from echoscript.audio2text import PRESETS, QUANTIZATIONS, model_variant
+from echoscript.batch import collect_audio_files, output_paths, transcribe_batch, write_transcript
+from echoscript.media import MediaCache, is_remote
+from echoscript.result_cache import get_result_cache
+from echoscript.utils import TranscriptWriter
+
+
+FORMAT_HELP = 'The output format. Supported formats {%s}' % ', '.join(
+    f'`{fmt}`' for fmt in Audio2Text.available_formats
+)
+
+
+class AudioSource(click.Path):
+    '''
+    An existing audio file, `-` for stdin, or a remote source such as a YouTube URL.
+    '''
+
+    name = 'audio'
+
+    def __init__(self):
+        super().__init__(exists=True, allow_dash=True)
+
+    def convert(self, value, param, ctx):
+        if is_remote(value):
+            return value
+        return super().convert(value, param, ctx)
+
+
+def with_decode_options(command):
+    '''
+    Add the decode option flags shared by the transcription commands.
+    '''
+    options = [
+        click.option('--preset', help='The decode option preset, from fastest to most accurate',
+                     type=click.Choice(tuple(PRESETS)), default=None),
+        click.option('--beam-size', help='Decode with beam search of this width instead of greedily',
+                     type=click.IntRange(min=1), default=None),
+        click.option('--best-of', help='The number of candidates when sampling at a non-zero temperature',
+                     type=click.IntRange(min=1), default=None),
+        click.option('--temperature', help='The sampling temperature, repeat to try several in turn when decoding fails',
+                     type=click.FloatRange(min=0), multiple=True),
+        click.option('--condition-on-previous-text/--no-condition-on-previous-text',
+                     help='Prompt each 30-second window with the previous output', default=None),
+        click.option('--fp16/--fp32', help='The decoding precision, defaults to fp16 on GPU and fp32 on CPU', default=None),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def decode_kwargs(preset=None, temperature=(), **options):
+    '''
+    Collect the decode option flags that were given into keyword arguments of `Audio2Text.transcribe`.
+    '''
+    kwargs = {name: value for name, value in options.items() if value is not None}
+    if temperature:
+        kwargs['temperature'] = temperature[0] if len(temperature) == 1 else temperature
+    if preset is not None:
+        kwargs['preset'] = preset
+    return kwargs
 
 
 @click.group(invoke_without_command=True)
-@click.option('-a', '--audio', help='The audio file or youtube URL to transcribe', type=click.Path(exists=True))
+@click.option('-a', '--audio', help='The audio file or youtube/http URL to transcribe, `-` reads the audio from stdin',
+              type=AudioSource())
 @click.option('-m', '--model-name', help='The name of the Whisper model to use', default='base')
-@click.option('-f', '--fmt', help='The format of the audio. Supported formats {`json`, `vtt`, `srt`, `None`}', default=None)
+@click.option('-q', '--quantize', help='Run the model with dynamic int8 quantization on the CPU',
+              type=click.Choice(QUANTIZATIONS), default=None)
+@click.option('-f', '--fmt', help=FORMAT_HELP, default=None)
 @click.option('-l', '--language', '--lang', help='The language of the audio', default=None)
 @click.option('-o', '--filename', help='The filename of the output file', default=None)
+@click.option('--chunk-length', help='Split long audio at silence into chunks of about this many seconds '
+              'and transcribe them in parallel', type=click.FloatRange(min=30), default=None)
+@click.option('-j', '--workers', help='The number of worker processes for --chunk-length',
+              type=click.IntRange(min=1), default=None)
+@click.option('--cache/--no-cache', help='Serve and store results in the on-disk result cache', default=True)
+@click.option('--resume', help='Checkpoint the progress after each 30-second window and resume an interrupted run '
+              'of the same job from it', is_flag=True)
+@click.option('--draft-model', help='Speed up greedy decoding with this smaller model drafting tokens for the '
+              'main model to check, with the same output', default=None)
+@click.option('--vad', help='Skip silence with voice activity detection and report the skipped audio', is_flag=True)
+@click.option('--vad-method', help='The voice activity detector for --vad', default='energy')
 @click.option('-v', '--verbose/--no-verbose', help='Verbose mode', is_flag=True, default=True)
+@click.option('--metrics-out', help='Append the per-stage timings of each transcription job to this JSON Lines file',
+              type=click.Path(dir_okay=False), default=None)
+@with_decode_options
 @click.pass_context
-def cli(ctx, audio, model_name, fmt, language, filename, verbose):
+def cli(ctx, audio, model_name, quantize, fmt, language, filename, chunk_length, workers, cache, resume,
+        draft_model, vad, vad_method, verbose, metrics_out, **decode):
     '''
     CLI tool for audio transcription and model/language listing.
     '''
+    if metrics_out is not None:
+        hook = tracing.add_hook(tracing.JSONLinesWriter(metrics_out))
+        ctx.call_on_close(lambda: tracing.remove_hook(hook))
+
     if ctx.invoked_subcommand is None:
         if audio is None:
             click.echo('Please provide an audio file. '
                        'Use echoscript --help for more information.')
             sys.exit(1)
 
-        if fmt not in Audio2Text.available_formats:
-            click.echo(f'Format {fmt} is not supported. '
-                       'Use echoscript --help for more information.')
-            sys.exit(1)
+        model_name = model_variant(model_name, quantize)
+        check_options(model_name, fmt, language)
 
-        if model_name not in Audio2Text.available_models:
-            click.echo(f'Model {model_name} is not available. '
-                       'Use echoscript list --models to see available models.')
-            sys.exit(1)
+        kwargs = decode_kwargs(**decode)
+        if draft_model is not None:
+            if not Audio2Text.is_model_available(draft_model):
+                click.echo(f'Model {draft_model} is not available. '
+                           'Use echoscript list --models to see available models.')
+                sys.exit(1)
+            kwargs['draft_model'] = draft_model
+        if vad:
+            from echoscript.vad import available_vads
 
-        if language is not None and not Audio2Text.is_language_available(language):
-            click.echo(f'Language {language} is not available. '
-                       'Use echoscript list --langs to see available languages.')
-            sys.exit(1)
+            if vad_method not in available_vads():
+                click.echo(f'VAD {vad_method} is not available. '
+                           f'Available VADs: {", ".join(available_vads())}.')
+                sys.exit(1)
+            kwargs['vad'] = vad_method
+        if resume:
+            if chunk_length is not None or (fmt != 'json' and formats.get_formatter(fmt).words):
+                click.echo('--resume cannot be used with --chunk-length or word-level formats.')
+                sys.exit(1)
+            # The checkpoint is a sidecar of the output file, or named after the job in the cache directory.
+            kwargs['checkpoint'] = f'{filename}.checkpoint' if filename is not None else True
+
+        transcribe(audio, model_name, fmt, language, filename, verbose, chunk_length, workers, cache, **kwargs)
 
-        transcribe(audio, model_name, fmt, language, filename, verbose)
+
+def check_options(model_name, fmt, language):
+    '''
+    Validate the model, format and language options, exit on invalid values.
+    '''
+    if fmt not in Audio2Text.available_formats:
+        click.echo(f'Format {fmt} is not supported. '
+                   'Use echoscript --help for more information.')
+        sys.exit(1)
+
+    if not Audio2Text.is_model_available(model_name):
+        click.echo(f'Model {model_name} is not available. '
+                   'Use echoscript list --models to see available models.')
+        sys.exit(1)
+
+    if language is not None and not Audio2Text.is_language_available(language):
+        click.echo(f'Language {language} is not available. '
+                   'Use echoscript list --langs to see available languages.')
+        sys.exit(1)
 
 
 def transcribe(audio, 
@@ -48,28 +160,190 @@ def transcribe(audio,
                fmt, 
                language,
                filename=None,
-               verbose=True):
+               verbose=True,
+               chunk_length=None,
+               workers=None,
+               cache=True,
+               **kwargs):
     '''
-    Transcribe an audio file using the Whisper model.
+    Transcribe an audio file using the Whisper model, `kwargs` are the preset, VAD and decode options.
     '''
-    if 'youtube.com' in audio: 
-        try:
-            audio = get_yt_audio(audio)
-        except:
-            click.echo('Failed to download audio from YouTube URL.')
-            sys.exit(1)
+    with tracing.trace(source='cli', model_name=model_name, language=language, fmt=fmt):
+        if is_remote(audio):
+            try:
+                audio = MediaCache().fetch(audio)
+            except Exception:
+                click.echo(f'Failed to download audio from {audio}.')
+                sys.exit(1)
 
-    text = audio2text(audio, model_name, fmt, language)
+        streamable = fmt != 'json' and not formats.get_formatter(fmt).words
+        if filename is not None and streamable and chunk_length is None:
+            return stream_transcript(audio, model_name, fmt, language, filename, verbose, cache, **kwargs)
 
-    if filename is not None:
-        with open(filename, 'w') as f:
-            f.write(text)
+        if chunk_length is not None:
+            from echoscript.longform import transcribe_long
+
+            text = transcribe_long(audio, model_name, fmt, language, chunk_length, workers=workers, cache=cache, **kwargs)
+        elif kwargs.get('vad') is None and kwargs.get('draft_model') is None:
+            text = audio2text(audio, model_name, fmt, language, cache=cache, **kwargs)
+        else:
+            engine = Audio2Text()
+            text = engine.transcribe(audio, model_name, fmt, language, cache=cache, **kwargs)
+            report_vad(engine.vad_report)
+            if verbose: report_draft(engine.draft_report)
+
+        if filename is not None:
+            with tracing.stage('write'):
+                write_transcript(text, filename)
+
+        if verbose:
+            click.echo(text)
+        return 0
+
+
+def check_outputs(files, fmt, output_dir):
+    '''
+    The transcript paths of a batch, exiting if two files would be written to the same transcript.
+    '''
+    try:
+        return output_paths(files, fmt, output_dir)
+    except ValueError as e:
+        click.echo(f'{e} Transcribe them separately or rename one of them.', err=True)
+        sys.exit(1)
+
+
+def stream_transcript(audio, model_name, fmt, language, filename, verbose=True, cache=True, **kwargs):
+    '''
+    Transcribe an audio file, writing each segment to the output file as soon as it is decoded.
+    '''
+    engine = Audio2Text()
+    with open(filename, 'w', encoding='utf-8') as f:
+        writer = TranscriptWriter(f, fmt)
+        for segment in engine.iter_segments(audio, model_name, language, cache=cache, **kwargs):
+            text = writer.write(segment)
+            if verbose: click.echo(text, nl=False)
+        text = writer.close()
 
     if verbose:
         click.echo(text)
+        report_draft(engine.draft_report)
+    report_vad(engine.vad_report)
     return 0
 
 
+def report_vad(report):
+    '''
+    Print how much audio the voice activity detector skipped.
+    '''
+    if not report:
+        return
+    skipped = report['skipped'] / report['duration'] if report['duration'] else 0.0
+    click.echo(f'VAD: transcribed {report["speech"]:.1f}s of speech in {report["regions"]} regions, '
+               f'skipped {report["skipped"]:.1f}s of {report["duration"]:.1f}s ({skipped:.0%})', err=True)
+
+
+def report_draft(report):
+    '''
+    Print how many draft model tokens were accepted.
+    '''
+    if not report:
+        return
+    click.echo(f'Draft model: accepted {report["accepted"]}/{report["drafted"]} drafted tokens '
+               f'({report["acceptance_rate"]:.0%}), {report["speedup"]:.2f} tokens per main model pass', err=True)
+
+
+@cli.command()
+@click.argument('sources', nargs=-1, required=True)
+@click.option('-m', '--model-name', help='The name of the Whisper model to use', default='base')
+@click.option('-q', '--quantize', help='Run the model with dynamic int8 quantization on the CPU',
+              type=click.Choice(QUANTIZATIONS), default=None)
+@click.option('-f', '--fmt', help=FORMAT_HELP, default=None)
+@click.option('-l', '--language', '--lang', help='The language of the audio', default=None)
+@click.option('-o', '--output-dir', help='The output directory, defaults to next to each input', default=None,
+              type=click.Path(file_okay=False))
+@click.option('-j', '--workers', help='The number of worker processes, defaults to transcribing in this process',
+              type=click.IntRange(min=1), default=None)
+@click.option('--threads-per-worker', help='The torch thread count of each worker process',
+              type=click.IntRange(min=1), default=None)
+@click.option('--prefetch', help='The number of URLs downloaded ahead of the one being transcribed',
+              type=click.IntRange(min=0), default=2)
+@click.option('--decode-workers', help='The number of concurrent ffmpeg decodes without --workers',
+              type=click.IntRange(min=1), default=1)
+@click.option('--infer-workers', help='The number of concurrent transcriptions without --workers, '
+              'each on its own model copy', type=click.IntRange(min=1), default=1)
+@click.option('--cache/--no-cache', help='Serve and store results in the on-disk result cache', default=True)
+@click.option('-v', '--verbose/--no-verbose', help='Verbose mode', is_flag=True, default=True)
+@with_decode_options
+def batch(sources, model_name, quantize, fmt, language, output_dir, workers, threads_per_worker, prefetch,
+          decode_workers, infer_workers, cache, verbose, **decode):
+    '''
+    Transcribe a batch of audio files with a single loaded model.
+
+    SOURCES are directories, glob patterns, audio files, youtube/http URLs or manifest files with one path or URL per line.
+    '''
+    model_name = model_variant(model_name, quantize)
+    check_options(model_name, fmt, language)
+
+    files = collect_audio_files(sources)
+    if not files:
+        click.echo('No audio files found.')
+        sys.exit(1)
+    check_outputs(files, fmt, output_dir)
+
+    def report(audio, output, error):
+        if error is not None:
+            click.echo(f'Failed to transcribe {audio}: {error}', err=True)
+        elif verbose:
+            click.echo(f'{audio} -> {output}')
+
+    stats = transcribe_batch(files, model_name, fmt, language, output_dir, callback=report,
+                             workers=workers, threads_per_worker=threads_per_worker, prefetch=prefetch,
+                             decode_workers=decode_workers, infer_workers=infer_workers, cache=cache,
+                             **decode_kwargs(**decode))
+    click.echo(f'Transcribed {stats["files"]}/{len(files)} files: '
+               f'{stats["audio_seconds"]:.1f} audio-seconds in {stats["wall_seconds"]:.1f} wall-seconds '
+               f'({stats["speed"]:.2f}x real time)')
+    if verbose and stats.get('stages'):
+        for name, stage in stats['stages'].items():
+            click.echo(f'\t- {name}: {stage["processed"]} done, {stage["failed"]} failed, '
+                       f'busy {stage["busy"]:.1f}s, waiting for input {stage["starved"]:.1f}s, '
+                       f'queue depth {stage["mean_queue_depth"]:.1f} mean / {stage["max_queue_depth"]} max')
+    if stats['failed']:
+        sys.exit(1)
+
+
+@cli.group(name='cache')
+def cache_group():
+    '''
+    Inspect or clear the on-disk result and media caches.
+    '''
+
+
+@cache_group.command(name='stats')
+def cache_stats():
+    '''
+    Show the number of entries and the size of the result and media caches.
+    '''
+    for name, cache in (('Result cache', get_result_cache()), ('Media cache', MediaCache())):
+        stats = cache.stats()
+        click.echo(f'{name}: {stats["root"]}\n'
+                   f'\t- entries: {stats["entries"]}\n'
+                   f'\t- size: {stats["nbytes"] / 1024 ** 2:.1f} MiB / {stats["max_bytes"] / 1024 ** 2:.1f} MiB')
+
+
+@cache_group.command(name='clear')
+@click.option('--media', help='Also remove the downloaded media', is_flag=True)
+def cache_clear(media):
+    '''
+    Remove all entries from the result cache.
+    '''
+    removed = get_result_cache().clear()
+    click.echo(f'Removed {removed} cached results.')
+    if media:
+        removed = MediaCache().clear()
+        click.echo(f'Removed {removed} downloaded media files.')
+
+
 @cli.command()
 @click.option('--models', is_flag=True)
 @click.option('--languages', '--langs', is_flag=True)
@@ -80,7 +354,7 @@ def list(models, languages):
     if models:
         text = '\n'.join(
             f'\t- {model}'
-            for model in Audio2Text.available_models
+            for model in Audio2Text.available_model_variants
         )
         text = f'Available models:\n{text}'
         click.echo_via_pager(text)
@@ -98,21 +372,401 @@ def list(models, languages):
         sys.exit(1)
 
 
+def parse_models(ctx, param, value):
+    '''
+    Split a comma-separated list of model names, failing on unavailable models.
+    '''
+    if not value:
+        return []
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    for name in names:
+        if not Audio2Text.is_model_available(name):
+            raise click.BadParameter(f'Model {name} is not available.')
+    return names
+
+
+def preload_models(model_names, replicas=1):
+    '''
+    Load models into the model cache before the first request, one copy per concurrent job.
+    '''
+    for model_name in model_names:
+        start = time.perf_counter()
+        for replica in range(replicas):
+            Audio2Text.load_whisper_model(model_name, replica=replica)
+        rss = tracing.peak_rss()
+        rss = f', peak RSS {rss / 1024 ** 2:.0f} MiB' if rss is not None else ''
+        click.echo(f'Preloaded {model_name} in {time.perf_counter() - start:.2f}s{rss}')
+
+
+PRELOAD_HELP = 'Comma-separated models to load before the first request, e.g. `turbo,base`'
+
+
 @cli.command(name='serve')
 @click.option('--port', type=int, default=7860)
 @click.option('--server_name', type=str, default='0.0.0.0')
 @click.option('--share2pub/--no-share2pub', default=False)
-def serve(port, server_name, share2pub):
+@click.option('--max-queue', help='The maximum number of queued transcription jobs', type=click.IntRange(min=1), default=32)
+@click.option('--workers', help='The number of concurrent transcription jobs', type=click.IntRange(min=1), default=1)
+@click.option('--model-concurrency', help='The maximum number of concurrent jobs per model, each on its own model copy',
+              type=click.IntRange(min=1), default=1)
+@click.option('--metrics-port', help='Serve Prometheus metrics of the transcription jobs at /metrics on this port',
+              type=int, default=None)
+@click.option('--preload', help=PRELOAD_HELP, callback=parse_models, default=None)
+def serve(port, server_name, share2pub, max_queue, workers, model_concurrency, metrics_port, preload):
     '''
     Launch the Gradio app.
     '''
-    app = TranscriptionApp()
+    from echoscript.gradio_app import TranscriptionApp
+
+    preload_models(preload, model_concurrency)
+    app = TranscriptionApp(max_queue, workers, model_concurrency, metrics_port=metrics_port)
     app.launch(port, server_name, share2pub)
 
 # Create aliases for the `serve` command
 cli.add_command(serve, name='app')
 
 
+@cli.command(name='api')
+@click.option('--host', type=str, default='127.0.0.1')
+@click.option('--port', type=int, default=8000)
+@click.option('--max-queue', help='The maximum number of queued transcription jobs, '
+              'further submissions get 429', type=click.IntRange(min=1), default=32)
+@click.option('--workers', help='The number of concurrent transcription jobs', type=click.IntRange(min=1), default=1)
+@click.option('--model-concurrency', help='The maximum number of concurrent jobs per model, each on its own model copy',
+              type=click.IntRange(min=1), default=1)
+@click.option('--preload', help=PRELOAD_HELP, callback=parse_models, default=None)
+def api(host, port, max_queue, workers, model_concurrency, preload):
+    '''
+    Launch the headless HTTP/JSON transcription API.
+    '''
+    from echoscript.api import TranscriptionAPI
+
+    preload_models(preload, model_concurrency)
+    click.echo(f'Serving the transcription API on http://{host}:{port}')
+    TranscriptionAPI(max_queue, workers, model_concurrency).run(host, port)
+
+
+@cli.command(name='live')
+@click.option('-m', '--model-name', help='The name of the Whisper model to use', default='base')
+@click.option('-q', '--quantize', help='Run the model with dynamic int8 quantization on the CPU',
+              type=click.Choice(QUANTIZATIONS), default=None)
+@click.option('-l', '--language', '--lang', help='The language of the audio', default=None)
+@click.option('--listen', help='Read the audio from the first TCP connection to this [HOST:]PORT instead of stdin',
+              default=None)
+@click.option('--sample-format', help='The format of the 16 kHz mono PCM samples',
+              type=click.Choice(['s16le', 'f32le']), default='s16le')
+@click.option('--step', help='The seconds of new audio between decodes', type=click.FloatRange(min=0.1), default=0.5)
+@click.option('--max-buffer', help='Finalize all complete segments once this many seconds are buffered',
+              type=click.FloatRange(min=1, max=30), default=15.0)
+@click.option('--json', 'as_json', help='Print all events, final and partial, as JSON lines', is_flag=True)
+@click.option('--partial/--no-partial', help='Show the provisional text on stderr if it is a terminal', default=True)
+def live(model_name, quantize, language, listen, sample_format, step, max_buffer, as_json, partial):
+    '''
+    Transcribe live 16 kHz mono PCM from stdin or a TCP connection, printing the final segments as they are decoded.
+
+    For example: ffmpeg -re -i talk.mp3 -f s16le -ac 1 -ar 16000 - | echoscript live -m tiny
+    '''
+    import json
+
+    from echoscript.live import transcribe_live
+
+    model_name = model_variant(model_name, quantize)
+    check_options(model_name, None, language)
+    partial = partial and sys.stderr.isatty()
+
+    connection = None
+    if listen is None:
+        stream = sys.stdin.buffer
+    else:
+        import socket
+
+        host, _, port = listen.rpartition(':')
+        with socket.create_server((host or '127.0.0.1', int(port))) as server:
+            click.echo(f'Listening for PCM on {host or "127.0.0.1"}:{port}', err=True)
+            connection, _ = server.accept()
+        stream = connection.makefile('rb')
+
+    try:
+        for event in transcribe_live(stream, model_name, language, sample_format, step=step, max_buffer=max_buffer):
+            if as_json:
+                click.echo(json.dumps(event, ensure_ascii=False))
+            elif event['type'] == 'final':
+                if partial: click.echo('\r\033[K', nl=False, err=True)
+                click.echo(event['text'].strip())
+            elif partial:
+                click.echo(f'\r\033[K{event["text"].strip()}', nl=False, err=True)
+    finally:
+        if connection is not None:
+            stream.close()
+            connection.close()
+
+
+def queue_option(command):
+    '''
+    Add the `--queue` option of the job queue commands.
+    '''
+    return click.option('--queue', 'queue_path', help='The job queue database shared by submitters and workers, '
+                        'defaults to ~/.echoscript/queue.db', envvar='ECHOSCRIPT_QUEUE',
+                        type=click.Path(dir_okay=False), default=None)(command)
+
+
+@cli.command()
+@click.argument('sources', nargs=-1, required=True)
+@click.option('-m', '--model-name', help='The name of the Whisper model to use', default='base')
+@click.option('-q', '--quantize', help='Run the model with dynamic int8 quantization on the CPU',
+              type=click.Choice(QUANTIZATIONS), default=None)
+@click.option('-f', '--fmt', help=FORMAT_HELP, default=None)
+@click.option('-l', '--language', '--lang', help='The language of the audio', default=None)
+@click.option('-o', '--output-dir', help='Have the workers write the transcripts to this directory, '
+              'otherwise they are only kept in the queue', type=click.Path(file_okay=False), default=None)
+@click.option('--priority', help='Jobs with a higher priority are run first', type=int, default=0)
+@click.option('--max-attempts', help='The number of times a job is run before it fails when its workers crash',
+              type=click.IntRange(min=1), default=3)
+@click.option('--wait', help='Wait for the jobs and print their transcripts', is_flag=True)
+@queue_option
+@with_decode_options
+def submit(sources, model_name, quantize, fmt, language, output_dir, priority, max_attempts, wait, queue_path,
+           **decode):
+    '''
+    Queue transcription jobs for `echoscript worker` processes on any host that shares the queue.
+
+    SOURCES are directories, glob patterns, audio files, youtube/http URLs or manifest files with one path or URL per line.
+    Files are queued with their absolute path, which the workers must be able to open.
+    '''
+    from echoscript.jobqueue import JobQueue
+
+    model_name = model_variant(model_name, quantize)
+    check_options(model_name, fmt, language)
+
+    files = collect_audio_files(sources)
+    if not files:
+        click.echo('No audio files found.')
+        sys.exit(1)
+
+    files = [audio if is_remote(audio) else os.path.abspath(audio) for audio in files]
+    outputs = check_outputs(files, fmt, output_dir) if output_dir is not None else {}
+
+    queue = JobQueue(queue_path)
+    kwargs = decode_kwargs(**decode)
+    job_ids = []
+    for audio in files:
+        output = os.path.abspath(outputs[audio]) if audio in outputs else None
+        job_ids.append(queue.submit(audio, model_name, fmt, language, priority=priority, output=output,
+                                    max_attempts=max_attempts, **kwargs))
+        click.echo(f'Submitted job {job_ids[-1]}: {audio}', err=wait)
+    if not wait:
+        return
+
+    failed = 0
+    for job in queue.wait(job_ids):
+        if job['status'] == 'failed':
+            click.echo(f'Job {job["id"]} failed: {job["error"]}', err=True)
+            failed += 1
+        else:
+            click.echo(Audio2Text.format_result(job['result'], fmt))
+    if failed:
+        sys.exit(1)
+
+
+@cli.command()
+@queue_option
+@click.option('--name', help='The unique name of the worker, defaults to <hostname>:<pid>', default=None)
+@click.option('--lease', help='The seconds after which the job of a worker that stopped sending heartbeats '
+              'is run by another worker', type=click.FloatRange(min=1), default=60.0)
+@click.option('--poll', help='The seconds between checks of an empty queue', type=click.FloatRange(min=0.01),
+              default=1.0)
+@click.option('--max-jobs', help='Stop after this many jobs', type=click.IntRange(min=1), default=None)
+@click.option('--exit-when-empty', help='Stop when no job is queued', is_flag=True)
+@click.option('--preload', help=PRELOAD_HELP, callback=parse_models, default=None)
+@click.option('-v', '--verbose/--no-verbose', help='Verbose mode', is_flag=True, default=True)
+def worker(queue_path, name, lease, poll, max_jobs, exit_when_empty, preload, verbose):
+    '''
+    Run the jobs of the job queue, preferring jobs for the models this worker has loaded.
+    '''
+    from echoscript.jobqueue import JobQueue, Worker
+
+    preload_models(preload)
+    queue = JobQueue(queue_path)
+    runner = Worker(queue, name, lease=lease, poll=poll)
+
+    def report(job, error):
+        if error is not None:
+            click.echo(f'Job {job["id"]} failed: {error}', err=True)
+        elif verbose:
+            output = f' -> {job["output"]}' if job['output'] is not None else ''
+            click.echo(f'Job {job["id"]} done: {job["audio"]}{output}')
+
+    click.echo(f'Worker {runner.name} running jobs of {queue.path}')
+    try:
+        n_jobs = runner.run(max_jobs, exit_when_empty, callback=report)
+    except KeyboardInterrupt:
+        click.echo('Stopped, the running job is back in the queue.')
+        return
+    click.echo(f'Ran {n_jobs} jobs.')
+
+
+@cli.command()
+@click.argument('job_ids', nargs=-1, type=int)
+@queue_option
+def status(job_ids, queue_path):
+    '''
+    Show the depth of the job queue and the throughput of each worker, or the status of the given jobs.
+    '''
+    from echoscript.jobqueue import JobQueue
+
+    queue = JobQueue(queue_path)
+    if job_ids:
+        for job_id in job_ids:
+            job = queue.job(job_id)
+            if job is None:
+                click.echo(f'Job {job_id}: not found')
+                continue
+            worker = f' on {job["worker"]}' if job['worker'] is not None else ''
+            error = f': {job["error"]}' if job['error'] is not None else ''
+            click.echo(f'Job {job_id}: {job["status"]}{worker}, attempt {job["attempts"]}/{job["max_attempts"]}, '
+                       f'{job["model_name"]}, {job["audio"]}{error}')
+        return
+
+    stats = queue.stats()
+    jobs = stats['jobs']
+    click.echo(f'Queue {queue.path}: {jobs["queued"]} queued, {jobs["running"]} running, '
+               f'{jobs["done"]} done, {jobs["failed"]} failed')
+    if stats['queued']:
+        click.echo('Queued per model: ' + ', '.join(f'{model} {count}' for model, count in stats['queued'].items()))
+    for worker in stats['workers']:
+        models = ', '.join(worker['models']) or 'no models'
+        click.echo(f'\t- {worker["name"]}: {worker["state"]}, {worker["jobs_done"]} done, '
+                   f'{worker["jobs_failed"]} failed, {worker["audio_seconds"]:.1f} audio-seconds at '
+                   f'{worker["speed"]:.2f}x real time, {worker["jobs_per_hour"]:.1f} jobs/hour, {models} loaded')
+
+
+def index_option(command):
+    '''
+    Add the `--index` option of the search commands.
+    '''
+    return click.option('--index', 'index_path', help='The search index file, defaults to ~/.echoscript/search.idx',
+                        envvar='ECHOSCRIPT_INDEX', type=click.Path(dir_okay=False), default=None)(command)
+
+
+@cli.command()
+@click.argument('sources', nargs=-1, required=True)
+@index_option
+def index(sources, index_path):
+    '''
+    Build the search index of a transcript archive for `echoscript search`, replacing the previous index.
+
+    SOURCES are directories (searched recursively), glob patterns or files of `json` results,
+    e.g. written by `echoscript batch -f json`, or columnar transcripts (`.ects`).
+    '''
+    from echoscript.search import SearchIndex, collect_transcripts
+
+    start = time.perf_counter()
+    files = [os.path.abspath(path) for path in collect_transcripts(sources)]
+    search_index = SearchIndex.build(files)
+    search_index.save(index_path)
+    for path in search_index.meta['skipped']:
+        click.echo(f'Skipped {path}: not a transcript', err=True)
+    click.echo(f'Indexed {search_index.n_segments} segments of {search_index.n_files} transcripts '
+               f'in {time.perf_counter() - start:.1f}s.')
+    if not search_index.n_files:
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('phrase', nargs=-1, required=True)
+@index_option
+@click.option('-n', '--limit', help='The maximum number of matches', type=click.IntRange(min=1), default=20)
+@click.option('--json', 'as_json', help='Print a JSON object per match', is_flag=True)
+def search(phrase, index_path, limit, as_json):
+    '''
+    Find a phrase in the transcripts indexed by `echoscript index`, printing the file and the timestamp of each match.
+    '''
+    import json
+
+    from echoscript.search import SearchIndex
+
+    start = time.perf_counter()
+    try:
+        search_index = SearchIndex.load(index_path)
+    except (OSError, ValueError) as e:
+        click.echo(f'Cannot load the search index, build it with `echoscript index`: {e}', err=True)
+        sys.exit(1)
+    matches = search_index.search(' '.join(phrase), limit)
+    elapsed = time.perf_counter() - start
+
+    timestamps = formats.format_timestamps([match['start'] for match in matches], '.')
+    for match, timestamp in zip(matches, timestamps):
+        if as_json:
+            click.echo(json.dumps(match, ensure_ascii=False))
+        else:
+            click.echo(f'{match["file"]}\t{timestamp}\t{match["text"].strip()}')
+    click.echo(f'{len(matches)} matches in {elapsed * 1000:.1f} ms', err=True)
+    if not matches:
+        sys.exit(1)
+
+
+@cli.command(name='bench')
+@click.option('-m', '--model-name', 'models', help='A model of the model suite, repeat for several',
+              multiple=True, default=('tiny',))
+@click.option('-s', '--suite', 'suites', help='A suite to run {startup, format, decode, mel, model}, '
+              'repeat for several, defaults to all', multiple=True)
+@click.option('-a', '--audio', help='The audio file of the decode and model suites',
+              default='This_is_an_example.mp3')
+@click.option('--repeat', help='The number of timed runs, the median is reported',
+              type=click.IntRange(min=1), default=3)
+@click.option('--segments', help='The number of synthetic segments of the format suite',
+              type=click.IntRange(min=1), default=100_000)
+@click.option('-o', '--output', help='Write the results to this JSON file', default=None,
+              type=click.Path(dir_okay=False))
+@click.option('--baseline', help='Compare the results with this JSON file and exit with 1 on regressions',
+              default=None, type=click.Path(exists=True, dir_okay=False))
+@click.option('--compare', 'results', help='Compare these saved results with --baseline instead of running',
+              default=None, type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', help='The tolerated slowdown against the baseline, as a fraction',
+              type=click.FloatRange(min=0), default=0.1)
+def bench(models, suites, audio, repeat, segments, output, baseline, results, threshold):
+    '''
+    Benchmark model loading, audio decoding, inference, formatting and CLI startup.
+    '''
+    from echoscript import bench as benchmarks
+
+    for suite in suites:
+        if suite not in benchmarks.SUITES:
+            click.echo(f'Suite {suite} is not available. '
+                       f'Available suites: {", ".join(benchmarks.SUITES)}.')
+            sys.exit(1)
+    for model_name in models:
+        if not Audio2Text.is_model_available(model_name):
+            click.echo(f'Model {model_name} is not available. '
+                       'Use echoscript list --models to see available models.')
+            sys.exit(1)
+
+    if results is not None:
+        if baseline is None:
+            click.echo('--compare needs a --baseline.')
+            sys.exit(1)
+        report = benchmarks.load_report(results)
+    else:
+        def progress(suite, metrics):
+            for name, result in metrics.items():
+                click.echo(f'{name:<40} {result["value"]:>12.4g} {result["unit"]}')
+
+        report = benchmarks.run_benchmarks(models, suites or benchmarks.SUITES, audio, repeat, segments,
+                                           callback=progress)
+        for suite, reason in report['skipped'].items():
+            click.echo(f'Skipped {suite}: {reason}', err=True)
+        if output is not None:
+            benchmarks.save_report(report, output)
+
+    if baseline is not None:
+        rows = benchmarks.compare(benchmarks.load_report(baseline), report, threshold)
+        click.echo(benchmarks.format_comparison(rows))
+        regressions = [row['name'] for row in rows if row['status'] == 'regression']
+        if regressions:
+            click.echo(f'{len(regressions)} regressions over {threshold:.0%}: {", ".join(regressions)}', err=True)
+            sys.exit(1)
+
+
 if __name__ == '__main_':
     sys.exit(cli())  # pragma: no cover
 
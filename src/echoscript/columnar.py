@@ -0,0 +1,314 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+
+MAGIC = b'ECHOCOL\x00'
+VERSION = 1
+# Arrays start at multiples of this many bytes, so every memory-mapped column is aligned.
+ALIGNMENT = 64
+EXTENSION = '.ects'
+
+# Optional per-segment fields of the Whisper results and their dtypes. The temperatures are
+# kept exact, the scores are stored with float32 precision.
+SCORE_DTYPES = {'temperature': '<f8', 'avg_logprob': '<f4', 'compression_ratio': '<f4', 'no_speech_prob': '<f4'}
+RESULT_KEYS = ('text', 'segments', 'language')
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def write_arrays(path: str, arrays: dict, kind: str, meta: dict = None):
+    '''
+    Write named arrays into a file that `read_arrays` can memory-map.
+
+    The file is the magic bytes, the length of a JSON header, the header with
+    the `kind` of the file, its `meta` data and the dtype, shape and offset of
+    each array, and then the raw arrays, each aligned to `ALIGNMENT` bytes.
+    The file is written to a temporary file that is renamed into place, so
+    readers never see a partial file.
+
+    Args:
+        path (str): The output file.
+        arrays (dict[str, ndarray]): The arrays.
+        kind (str): The kind of the file, checked by `read_arrays`.
+        meta (dict, optional): JSON-serializable meta data. Defaults to None.
+    '''
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = {'version': VERSION, 'kind': kind, 'meta': meta or {}, 'arrays': {}}
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += _aligned(array.nbytes)
+    encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix = MAGIC + struct.pack('<Q', len(encoded)) + encoded
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(prefix.ljust(_aligned(len(prefix)), b'\x00'))
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b'\x00' * (_aligned(array.nbytes) - array.nbytes))
+    os.replace(tmp, path)
+
+
+def read_arrays(path: str, kind: str, mmap_mode: bool = True):
+    '''
+    Read a file written by `write_arrays`.
+
+    Args:
+        path (str): The file.
+        kind (str): The expected kind of the file.
+        mmap_mode (bool, optional): Memory-map the file instead of reading it, the arrays are then
+            read-only views of the file. Defaults to True.
+
+    Returns:
+        tuple[dict, dict[str, ndarray]]: The meta data and the arrays.
+
+    Raises:
+        ValueError: If the file is not of the expected kind or version.
+    '''
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8 or not prefix.startswith(MAGIC):
+            raise ValueError(f'{path} is not an echoscript columnar file.')
+        (length,) = struct.unpack('<Q', prefix[len(MAGIC):])
+        header = json.loads(f.read(length).decode('utf-8'))
+        if header.get('kind') != kind or header.get('version') != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} {kind} file.')
+        if mmap_mode:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            f.seek(0)
+            buffer = f.read()
+
+    start = _aligned(len(MAGIC) + 8 + length)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=start + spec['offset']) if count else \
+            np.empty(0, dtype=dtype)
+        arrays[name] = array.reshape(spec['shape'])
+    return header['meta'], arrays
+
+
+def pack_strings(strings):
+    '''
+    Concatenate strings into one UTF-8 buffer.
+
+    Args:
+        strings (Iterable[str]): The strings.
+
+    Returns:
+        tuple[ndarray, ndarray]: The uint8 buffer and the int64 byte offsets, `n + 1` of them,
+            string `i` is `buffer[offsets[i]:offsets[i + 1]]`.
+    '''
+    encoded = [string.encode('utf-8') for string in strings]
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), _offsets(len(data) for data in encoded)
+
+
+def unpack_strings(buffer, offsets, start: int = 0, stop: int = None) -> list:
+    '''
+    The strings `start` to `stop` of a buffer packed with `pack_strings`.
+    '''
+    stop = len(offsets) - 1 if stop is None else stop
+    offsets = offsets[start:stop + 1].tolist()
+    data = buffer[offsets[0]:offsets[-1]].tobytes() if stop > start else b''
+    base = offsets[0]
+    return [data[a - base:b - base].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+
+
+class ColumnarTranscript:
+    '''
+    A compact columnar representation of a `json` transcription result.
+
+    The `json` result of `Audio2Text.transcribe` holds a dict per segment.
+    Here each segment field is a column instead: `start` and `end` (float64),
+    `seek` (int64), `temperature` (float64), the scores `avg_logprob`,
+    `compression_ratio` and `no_speech_prob` (float32), the segment texts in
+    one UTF-8 buffer with offsets, and the tokens in one int32 array with
+    offsets. Word timestamps, if present, are stored the same way. The result
+    text is only stored when it differs from the concatenated segment texts.
+
+    `save` writes a binary file (`.ects`) that `load` memory-maps, so loading
+    a transcript reads no data until a column is used.
+
+    `to_result` rebuilds the `json` result. Times and tokens are exact, the
+    scores have float32 precision, and segment keys other than the Whisper
+    ones are not stored.
+
+    Example:
+        >>> transcript = ColumnarTranscript.from_result(Audio2Text().transcribe('talk.mp3', fmt='json'))
+        >>> transcript.save('talk.ects')
+        >>> transcript = ColumnarTranscript.load('talk.ects')
+        >>> transcript.start[transcript.no_speech_prob < 0.5]
+    '''
+
+    KIND = 'transcript'
+
+    def __init__(self, columns: dict, meta: dict = None):
+        '''
+        Args:
+            columns (dict[str, ndarray]): The columns, see `from_result`.
+            meta (dict, optional): The `language` and the `extra` keys of the result. Defaults to None.
+        '''
+        self.columns = columns
+        self.meta = meta or {}
+
+    @classmethod
+    def from_result(cls, result: dict) -> 'ColumnarTranscript':
+        '''
+        Convert a `json` transcription result.
+
+        Args:
+            result (dict): The result, with `text`, `segments` and `language` keys.
+
+        Returns:
+            ColumnarTranscript: The transcript.
+        '''
+        segments = result['segments']
+        text, text_offsets = pack_strings(segment['text'] for segment in segments)
+        tokens = [segment.get('tokens', []) for segment in segments]
+        columns = {
+            'start': np.array([segment['start'] for segment in segments], dtype='<f8'),
+            'end': np.array([segment['end'] for segment in segments], dtype='<f8'),
+            'seek': np.array([segment.get('seek', 0) for segment in segments], dtype='<i8'),
+            'text': text,
+            'text_offsets': text_offsets,
+            'tokens': np.array([token for segment_tokens in tokens for token in segment_tokens], dtype='<i4'),
+            'token_offsets': _offsets(len(segment_tokens) for segment_tokens in tokens),
+        }
+        for key, dtype in SCORE_DTYPES.items():
+            if segments and all(key in segment for segment in segments):
+                columns[key] = np.array([segment[key] for segment in segments], dtype=dtype)
+
+        ids = [segment.get('id', i) for i, segment in enumerate(segments)]
+        if ids != list(range(len(segments))):
+            columns['id'] = np.array(ids, dtype='<i8')
+
+        if any('words' in segment for segment in segments):
+            words = [segment.get('words', []) for segment in segments]
+            flat = [word for segment_words in words for word in segment_words]
+            columns['word_text'], columns['word_text_offsets'] = pack_strings(word['word'] for word in flat)
+            columns['word_start'] = np.array([word['start'] for word in flat], dtype='<f8')
+            columns['word_end'] = np.array([word['end'] for word in flat], dtype='<f8')
+            columns['word_probability'] = np.array([word['probability'] for word in flat], dtype='<f4')
+            columns['word_offsets'] = _offsets(len(segment_words) for segment_words in words)
+
+        full_text = ''.join(segment['text'] for segment in segments)
+        if result.get('text', full_text) != full_text:
+            columns['result_text'] = np.frombuffer(result['text'].encode('utf-8'), dtype=np.uint8)
+        meta = {
+            'language': result.get('language'),
+            'extra': {key: value for key, value in result.items() if key not in RESULT_KEYS},
+        }
+        return cls(columns, meta)
+
+    def to_result(self) -> dict:
+        '''
+        Rebuild the `json` transcription result.
+
+        Returns:
+            dict: The result, with `text`, `segments` and `language` keys.
+        '''
+        columns = self.columns
+        n = len(self)
+        ids = columns['id'].tolist() if 'id' in columns else range(n)
+        seeks, starts, ends = columns['seek'].tolist(), columns['start'].tolist(), columns['end'].tolist()
+        texts = self.texts()
+        tokens = columns['tokens'].tolist()
+        token_offsets = columns['token_offsets'].tolist()
+        scores = {key: columns[key].tolist() for key in SCORE_DTYPES if key in columns}
+
+        segments = []
+        for i in range(n):
+            segment = {'id': ids[i], 'seek': seeks[i], 'start': starts[i], 'end': ends[i], 'text': texts[i],
+                       'tokens': tokens[token_offsets[i]:token_offsets[i + 1]]}
+            for key, values in scores.items():
+                segment[key] = values[i]
+            segments.append(segment)
+
+        if 'word_offsets' in columns:
+            words = [
+                {'word': word, 'start': start, 'end': end, 'probability': probability}
+                for word, start, end, probability in zip(
+                    unpack_strings(columns['word_text'], columns['word_text_offsets']),
+                    columns['word_start'].tolist(), columns['word_end'].tolist(),
+                    columns['word_probability'].tolist(),
+                )
+            ]
+            word_offsets = columns['word_offsets'].tolist()
+            for i, segment in enumerate(segments):
+                segment['words'] = words[word_offsets[i]:word_offsets[i + 1]]
+
+        text = columns['result_text'].tobytes().decode('utf-8') if 'result_text' in columns else ''.join(texts)
+        return {'text': text, 'segments': segments, 'language': self.meta.get('language'),
+                **self.meta.get('extra', {})}
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    @property
+    def start(self):
+        return self.columns['start']
+
+    @property
+    def end(self):
+        return self.columns['end']
+
+    @property
+    def avg_logprob(self):
+        return self.columns['avg_logprob']
+
+    @property
+    def no_speech_prob(self):
+        return self.columns['no_speech_prob']
+
+    @property
+    def language(self):
+        return self.meta.get('language')
+
+    def text(self, i: int) -> str:
+        '''
+        The text of segment `i`.
+        '''
+        return unpack_strings(self.columns['text'], self.columns['text_offsets'], i, i + 1)[0]
+
+    def texts(self, start: int = 0, stop: int = None) -> list:
+        '''
+        The texts of segments `start` to `stop`, all of them by default.
+        '''
+        return unpack_strings(self.columns['text'], self.columns['text_offsets'], start, stop)
+
+    def save(self, path: str):
+        '''
+        Write the transcript to a binary file, see `load`.
+        '''
+        write_arrays(path, self.columns, self.KIND, self.meta)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: bool = True) -> 'ColumnarTranscript':
+        '''
+        Load a transcript written by `save`.
+
+        Args:
+            path (str): The file.
+            mmap_mode (bool, optional): Memory-map the file instead of reading it. Defaults to True.
+
+        Returns:
+            ColumnarTranscript: The transcript, its columns are read-only.
+        '''
+        meta, columns = read_arrays(path, cls.KIND, mmap_mode)
+        return cls(columns, meta)
+
+
+def _offsets(lengths):
+    lengths = np.fromiter(lengths, dtype='<i8')
+    offsets = np.zeros(len(lengths) + 1, dtype='<i8')
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
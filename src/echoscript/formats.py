@@ -0,0 +1,238 @@
+import json
+
+
+# Formatted records are buffered and written to the sink in chunks of this many.
+WRITE_CHUNK = 1024
+
+
+def format_timestamps(times, decimal: str = ',', hours: bool = True) -> list:
+    '''
+    Format timestamps in seconds as `HH:MM:SS,mmm` strings in one pass.
+
+    Args:
+        times (Iterable[float]): The timestamps, e.g. the start times of all segments.
+        decimal (str, optional): The separator of the milliseconds, `,` for SRT and `.` for VTT. Defaults to ','.
+        hours (bool, optional): Whether to include the hours. Defaults to True.
+
+    Returns:
+        list[str]: The formatted timestamps.
+    '''
+    template = f'%02d:%02d:%02d{decimal}%03d' if hours else f'%02d:%02d{decimal}%03d'
+    formatted = []
+    append = formatted.append
+    for t in times:
+        seconds, milliseconds = divmod(round(t * 1000), 1000)
+        minutes, seconds = divmod(seconds, 60)
+        if hours:
+            append(template % (*divmod(minutes, 60), seconds, milliseconds))
+        else:
+            append(template % (minutes, seconds, milliseconds))
+    return formatted
+
+
+def milliseconds(times) -> list:
+    '''
+    Convert timestamps in seconds to integer milliseconds.
+    '''
+    return [round(t * 1000) for t in times]
+
+
+class Formatter:
+    '''
+    A transcript format: renders segments as text records.
+
+    `records` formats a list of segments in one pass, and `write` streams the
+    records to a file-like sink in chunks, so huge transcripts are never
+    joined into one string. A transcript is the `header` followed by the
+    records joined with `separator`. Subclasses implement `records` and are
+    added with `register_format`.
+
+    Attributes:
+        name (str): The format name, as passed to `-f`.
+        extension (str): The file extension of transcripts in the format.
+        header (str): The text before the first record.
+        separator (str): The text between records.
+        words (bool): Whether the format needs word timestamps (`word_timestamps=True`).
+    '''
+
+    name = None
+    extension = '.txt'
+    header = ''
+    separator = ''
+    words = False
+
+    def records(self, segments, start: int = 1) -> list:
+        '''
+        Format segments.
+
+        Args:
+            segments (list[dict]): The segments, with `start`, `end` and `text` keys.
+            start (int, optional): The 1-based index of the first segment in the transcript. Defaults to 1.
+
+        Returns:
+            list[str]: A record per segment, or per word for word-level formats.
+        '''
+        raise NotImplementedError
+
+    def write(self, segments, f, start: int = 1) -> int:
+        '''
+        Write a whole transcript to the text file object `f`, chunk by chunk.
+
+        Returns:
+            int: The number of segments written.
+        '''
+        f.write(self.header)
+        segments = segments if isinstance(segments, list) else list(segments)
+        for i in range(0, len(segments), WRITE_CHUNK):
+            records = self.records(segments[i:i + WRITE_CHUNK], start + i)
+            if i and records:
+                f.write(self.separator)
+            f.write(self.separator.join(records))
+        return len(segments)
+
+    def format(self, segments) -> str:
+        '''
+        Format a whole transcript as a string.
+        '''
+        return self.header + self.separator.join(self.records(list(segments)))
+
+
+class TextFormatter(Formatter):
+    '''
+    Plain text: the concatenated segment texts.
+    '''
+
+    name = None
+
+    def records(self, segments, start=1):
+        return [segment['text'] for segment in segments]
+
+
+class SubtitleFormatter(Formatter):
+    '''
+    SRT or VTT subtitles, a block per segment.
+    '''
+
+    def __init__(self, name: str, decimal: str, header: str = '', numbered: bool = True):
+        self.name = name
+        self.extension = f'.{name}'
+        self.decimal = decimal
+        self.header = header
+        self.numbered = numbered
+        self.separator = '\n'
+
+    def records(self, segments, start=1):
+        starts = format_timestamps([segment['start'] for segment in segments], self.decimal)
+        ends = format_timestamps([segment['end'] for segment in segments], self.decimal)
+        texts = [segment['text'] for segment in segments]
+        if self.numbered:
+            return [f'{i}\n{s} --> {e}\n{text}\n' for i, s, e, text in zip(range(start, start + len(texts)),
+                                                                              starts, ends, texts)]
+        return [f'{s} --> {e}\n{text}\n' for s, e, text in zip(starts, ends, texts)]
+
+
+class TSVFormatter(Formatter):
+    '''
+    Tab-separated `start`, `end` (in milliseconds) and `text` columns, a row per segment.
+    '''
+
+    name = 'tsv'
+    extension = '.tsv'
+    header = 'start\tend\ttext\n'
+
+    def records(self, segments, start=1):
+        starts = milliseconds([segment['start'] for segment in segments])
+        ends = milliseconds([segment['end'] for segment in segments])
+        return [f'{s}\t{e}\t{_cell(segment["text"])}\n' for s, e, segment in zip(starts, ends, segments)]
+
+
+class JSONLinesFormatter(Formatter):
+    '''
+    A JSON object per line with the `id`, `start`, `end` and `text` of each segment.
+    '''
+
+    name = 'jsonl'
+    extension = '.jsonl'
+
+    def records(self, segments, start=1):
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        return [
+            dumps({'id': i, 'start': segment['start'], 'end': segment['end'], 'text': segment['text']}) + '\n'
+            for i, segment in zip(range(start - 1, start - 1 + len(segments)), segments)
+        ]
+
+
+class WordsFormatter(Formatter):
+    '''
+    Word-level timestamps: tab-separated `start`, `end` (in milliseconds) and `word` columns, a row per word.
+    '''
+
+    name = 'words'
+    extension = '.words.tsv'
+    header = 'start\tend\tword\n'
+    words = True
+
+    def records(self, segments, start=1):
+        try:
+            words = [word for segment in segments for word in segment['words']]
+        except KeyError:
+            raise ValueError('Format `words` needs word timestamps, transcribe with `word_timestamps=True`.')
+        starts = milliseconds([word['start'] for word in words])
+        ends = milliseconds([word['end'] for word in words])
+        return [f'{s}\t{e}\t{_cell(word["word"].strip())}\n' for s, e, word in zip(starts, ends, words)]
+
+
+def _cell(text: str) -> str:
+    return text.strip().replace('\t', ' ').replace('\n', ' ')
+
+
+_FORMATTERS = {}
+
+
+def register_format(formatter: Formatter) -> Formatter:
+    '''
+    Add a transcript format, available as `formatter.name` everywhere a format is accepted.
+
+    Returns:
+        Formatter: The formatter.
+    '''
+    _FORMATTERS[formatter.name] = formatter
+    return formatter
+
+
+for _formatter in (
+    TextFormatter(),
+    SubtitleFormatter('vtt', '.', header='WEBVTT\n\n', numbered=False),
+    SubtitleFormatter('srt', ','),
+    TSVFormatter(),
+    JSONLinesFormatter(),
+    WordsFormatter(),
+):
+    register_format(_formatter)
+
+
+def available_formats() -> list:
+    '''
+    The names of the registered formats, `None` (plain text) last.
+    '''
+    return [name for name in _FORMATTERS if name is not None] + [None]
+
+
+def get_formatter(fmt: str = None) -> Formatter:
+    '''
+    Look up a registered format, `None` for plain text.
+
+    Raises:
+        ValueError: If the format is not registered.
+    '''
+    try:
+        return _FORMATTERS[fmt]
+    except KeyError:
+        raise ValueError(f'Format `{fmt}` is not supported.') from None
+
+
+def extension(fmt: str = None) -> str:
+    '''
+    The file extension of transcripts in a format, including `json` results.
+    '''
+    return '.json' if fmt == 'json' else get_formatter(fmt).extension
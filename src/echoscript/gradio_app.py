@@ -1,15 +1,32 @@
 
+from concurrent.futures import wait
+
 import gradio as gr
 
-from echoscript import audio2text, Audio2Text
-from echoscript.utils import get_yt_audio
+from echoscript import Audio2Text, tracing
+from echoscript.media import MediaCache
+from echoscript.scheduler import QueueFull, Scheduler
 
 
 class TranscriptionApp:
-    def __init__(self):
-        self.model_sizes = Audio2Text.available_models
+    def __init__(self,
+                 max_queue: int = 32,
+                 workers: int = 1,
+                 model_concurrency: int = 1,
+                 metrics_port: int = None):
+        self.model_sizes = Audio2Text.available_model_variants
         self.langs = [None] + list(Audio2Text.available_languages.values())
         self.formats = Audio2Text.available_formats
+        self.presets = Audio2Text.available_presets
+        self.max_queue = max_queue
+        self.scheduler = Scheduler(max_queue=max_queue,
+                                   workers=workers,
+                                   model_concurrency=model_concurrency)
+        self.media = MediaCache()
+        self.metrics = tracing.add_hook(tracing.PrometheusMetrics())
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = tracing.serve_metrics(self.metrics, port=metrics_port)
 
     def create_input_component(self):
         return gr.Textbox(placeholder='Youtube video URL', label='URL')
@@ -18,16 +35,18 @@ class TranscriptionApp:
         model_size = gr.Dropdown(choices=self.model_sizes, value='turbo', label='Model')
         lang = gr.Dropdown(choices=self.langs, value='Taiwan', label='Language (Optional)')
         format = gr.Dropdown(choices=self.formats, value=None, label='Format (Optional)')
-        return model_size, lang, format
+        preset = gr.Dropdown(choices=self.presets, value='balanced', label='Speed/Accuracy Preset')
+        return model_size, lang, format, preset
 
     def create_output_component(self):
         with gr.Column():
+            status = gr.Markdown()
             outputs = gr.Textbox(placeholder='Transcription of the video', 
                                  label='Transcription',
                                  show_label=True,
                                  show_copy_button=True,
                                  interactive=True)
-        return outputs
+        return status, outputs
 
     def build_interface(self):
         with gr.Blocks() as demo:
@@ -36,7 +55,7 @@ class TranscriptionApp:
                     with gr.Row():
                         url = self.create_input_component()
                     with gr.Row():
-                        model_size, lang, format = self.create_options_components()
+                        model_size, lang, format, preset = self.create_options_components()
 
                     with gr.Row():
                         mdtext = '''
@@ -54,14 +73,51 @@ class TranscriptionApp:
                         transcribe_btn = gr.Button('Transcribe')
 
                 with gr.Column():
-                    outputs = self.create_output_component()
+                    status, outputs = self.create_output_component()
+
+            transcribe_btn.click(self.get_transcript, 
+                                 inputs=[url, model_size, lang, format, preset], 
+                                 outputs=[status, outputs],
+                                 concurrency_limit=None)
 
-            transcribe_btn.click(self.get_transcript, inputs=[url, model_size, lang, format], outputs=outputs)
+        demo.queue(max_size=self.max_queue)
 
         return demo
 
-    def get_transcript(self, url, model_size, lang, format):
-        return audio2text(get_yt_audio(url), model_name=model_size, fmt=format, language=lang)
+    def format_status(self, job):
+        position = self.scheduler.position(job)
+        eta = self.scheduler.eta(job)
+        eta = '' if eta is None else f', ETA ~{eta:.0f}s'
+        if position:
+            return f'Queued: position {position}{eta}'
+        return f'Transcribing with `{job.model_name}`{eta}'
+
+    def get_transcript(self, url, model_size, lang, format, preset=None):
+        yield 'Downloading audio...', ''
+        # The trace is only active around calls, a generator must not keep it active across `yield`.
+        trace = tracing.Trace(source='gradio', model_name=model_size, language=lang, fmt=format)
+        audio = None
+        try:
+            with tracing.activate(trace):
+                # Each video is downloaded once, and kept from eviction until its job is done.
+                audio = self.media.fetch(url)
+                self.media.pin(audio)
+                job = self.scheduler.submit(audio, model_name=model_size, fmt=format, language=lang, preset=preset)
+        except QueueFull:
+            self.media.unpin(audio)
+            trace.finish('rejected')
+            raise gr.Error('The server is busy, please try again later.')
+        except Exception as e:
+            if audio is not None: self.media.unpin(audio)
+            trace.finish('error', e)
+            raise
+        job.future.add_done_callback(lambda future: self.media.unpin(audio))
+        job.future.add_done_callback(lambda future: tracing.finish_future(trace, future))
+
+        while not job.done():
+            yield self.format_status(job), ''
+            wait([job.future], timeout=1)
+        yield '', job.result()
 
     def launch(self, 
                server_port: int = 7860, 
@@ -0,0 +1,200 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from echoscript import tracing
+
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 1 << 16
+
+# Decoded audio larger than this is kept in a memory-mapped temporary file
+# instead of RAM, 256 MiB is about 70 minutes at 16 kHz.
+MMAP_THRESHOLD = 256 * 1024 * 1024
+
+
+def is_stream(audio) -> bool:
+    '''
+    Check if audio is encoded media in memory or in a stream rather than a path or a waveform.
+
+    Args:
+        audio: The audio input.
+
+    Returns:
+        bool: True for bytes, memoryviews, binary file objects and `-` (stdin).
+    '''
+    return (
+        isinstance(audio, (bytes, bytearray, memoryview))
+        or hasattr(audio, 'read')
+        or (isinstance(audio, str) and audio == '-')
+    )
+
+
+class PCMBuffer:
+    '''
+    A growable float32 buffer that spills to a memory-mapped temporary file.
+
+    Samples are read straight into the buffer, which doubles its capacity
+    when full. Once the capacity exceeds `mmap_threshold` bytes the samples
+    move to an unlinked temporary file mapped into memory, and later growth
+    only extends the file, so very long inputs never need two copies in RAM.
+    '''
+
+    def __init__(self, capacity: int = 60 * SAMPLE_RATE, mmap_threshold: int = MMAP_THRESHOLD):
+        '''
+        Args:
+            capacity (int, optional): The initial capacity in samples. Defaults to 60 seconds at 16 kHz.
+            mmap_threshold (int, optional): The size in bytes above which the buffer is memory-mapped. Defaults to 256 MiB.
+        '''
+        self.mmap_threshold = mmap_threshold
+        self.nbytes = 0
+        self.file = None
+        self.data = None
+        self._allocate(max(capacity, 1))
+
+    @property
+    def mapped(self) -> bool:
+        return self.file is not None
+
+    def _allocate(self, capacity):
+        n_samples = self.nbytes // 4
+        if self.file is None and capacity * 4 <= self.mmap_threshold:
+            data = np.empty(capacity, dtype=np.float32)
+            if self.data is not None:
+                data[:n_samples] = self.data[:n_samples]
+            self.data = data
+            return
+
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix='echoscript-pcm-')
+            if self.data is not None:
+                self.file.write(self.data[:n_samples].tobytes())
+        elif isinstance(self.data, np.memmap):
+            self.data.flush()
+        self.data = None
+        self.file.truncate(capacity * 4)
+        self.data = np.memmap(self.file, dtype=np.float32, mode='r+', shape=(capacity,))
+
+    def readinto(self, stream) -> int:
+        '''
+        Read from a binary stream into the free space of the buffer, growing it when full.
+
+        Returns:
+            int: The number of bytes read, 0 at the end of the stream.
+        '''
+        if self.nbytes == self.data.nbytes:
+            self._allocate(len(self.data) * 2)
+        view = memoryview(self.data).cast('B')[self.nbytes:]
+        n = stream.readinto(view)
+        view.release()
+        self.nbytes += n or 0
+        return n or 0
+
+    def array(self) -> np.ndarray:
+        '''
+        The samples read so far, without copying a memory-mapped buffer.
+        '''
+        n_samples = self.nbytes // 4
+        if self.mapped or n_samples * 5 >= len(self.data) * 4:
+            return self.data[:n_samples]
+        return self.data[:n_samples].copy()
+
+
+def _feed(stdin, source):
+    '''
+    Write encoded media to the stdin of ffmpeg, from bytes or a binary stream.
+    '''
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source).cast('B')
+            for start in range(0, len(view), CHUNK_SIZE):
+                stdin.write(view[start:start + CHUNK_SIZE])
+        else:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg exited early, its error is reported from the return code
+        pass
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def load_audio(source,
+               sr: int = SAMPLE_RATE,
+               duration: float = None,
+               mmap_threshold: int = MMAP_THRESHOLD) -> np.ndarray:
+    '''
+    Decode audio to a mono float32 waveform with ffmpeg, without temporary media files.
+
+    In-memory and streamed media is written to the stdin of ffmpeg from a
+    background thread while the decoded samples are read from its stdout into
+    a `PCMBuffer`.
+
+    Args:
+        source (str | bytes | memoryview | BinaryIO): A path, encoded media, a binary file object, or `-` for stdin.
+        sr (int, optional): The sample rate to resample to. Defaults to 16000.
+        duration (float, optional): The expected duration in seconds, to allocate the buffer once. Defaults to None.
+        mmap_threshold (int, optional): The size in bytes above which the samples are memory-mapped. Defaults to 256 MiB.
+
+    Returns:
+        ndarray: The waveform, a `numpy.memmap` for long inputs.
+
+    Raises:
+        RuntimeError: If ffmpeg is missing or fails to decode the audio.
+    '''
+    if isinstance(source, str) and source == '-':
+        source = sys.stdin.buffer
+    piped = not isinstance(source, (str, os.PathLike))
+    cmd = [
+        'ffmpeg', '-nostdin' if not piped else '-hide_banner',
+        '-loglevel', 'error',
+        '-threads', '0',
+        '-i', 'pipe:0' if piped else os.fspath(source),
+        '-f', 'f32le',
+        '-ac', '1',
+        '-acodec', 'pcm_f32le',
+        '-ar', str(sr),
+        'pipe:1',
+    ]
+    capacity = int(duration * sr) + sr if duration else 60 * sr
+    buffer = PCMBuffer(capacity, mmap_threshold)
+    with tracing.stage('audio_decode'), tempfile.TemporaryFile() as stderr:
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if piped else subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=stderr)
+        except FileNotFoundError:
+            raise RuntimeError('Failed to load audio: ffmpeg was not found.')
+
+        feeder = None
+        if piped:
+            feeder = threading.Thread(target=_feed, args=(proc.stdin, source), daemon=True)
+            feeder.start()
+        with proc.stdout:
+            while buffer.readinto(proc.stdout):
+                pass
+        if feeder is not None:
+            feeder.join()
+        if proc.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f'Failed to load audio: {stderr.read().decode(errors="replace").strip()}')
+    return buffer.array()
+
+
+def ingest(audio):
+    '''
+    Decode in-memory or streamed media to a waveform, leaving paths and waveforms as they are.
+
+    Args:
+        audio (str | bytes | memoryview | BinaryIO | ndarray | Tensor): The audio input.
+
+    Returns:
+        str | ndarray | Tensor: The path or waveform to transcribe.
+    '''
+    return load_audio(audio) if is_stream(audio) else audio
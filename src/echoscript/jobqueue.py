@@ -0,0 +1,519 @@
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from echoscript import formats
+from echoscript.audio2text import Audio2Text, loaded_models
+from echoscript.utils import get_echoscript_home
+
+
+_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        audio TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        fmt TEXT,
+        language TEXT,
+        options TEXT NOT NULL,
+        output TEXT,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        worker TEXT,
+        lease_expires REAL,
+        submitted REAL NOT NULL,
+        started REAL,
+        finished REAL,
+        audio_seconds REAL,
+        result TEXT,
+        error TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority DESC, id)',
+    '''
+    CREATE TABLE IF NOT EXISTS workers (
+        name TEXT PRIMARY KEY,
+        models TEXT NOT NULL DEFAULT '[]',
+        job INTEGER,
+        started REAL NOT NULL,
+        heartbeat REAL NOT NULL,
+        stopped REAL,
+        jobs_done INTEGER NOT NULL DEFAULT 0,
+        jobs_failed INTEGER NOT NULL DEFAULT 0,
+        audio_seconds REAL NOT NULL DEFAULT 0,
+        busy_seconds REAL NOT NULL DEFAULT 0
+    )
+    ''',
+)
+
+FINAL_STATUSES = ('done', 'failed')
+
+
+class JobQueue:
+    '''
+    A durable transcription job queue in an SQLite database.
+
+    Workers on any number of hosts share the queue by opening the same
+    database file, e.g. on a shared filesystem with working file locks. Each
+    change is a transaction of its own, so a crash leaves the queue consistent.
+
+    A worker claims a job with a lease, which it renews with heartbeats while
+    transcribing. Once the lease of a job expires, e.g. because its worker
+    crashed or lost the filesystem, the next claim puts it back in the queue,
+    or fails it after `max_attempts` claims. The attempt number fences stale
+    workers: a worker whose lease was lost cannot complete the job. Jobs are
+    claimed by descending priority, and within a priority the same way as
+    `echoscript.scheduler.Scheduler` picks them: a job that waited longer
+    than `max_wait` first, then jobs for the model the worker ran last, then
+    jobs for models it has loaded, then the oldest job.
+
+    Results are stored as the `json` result of `Audio2Text.transcribe`. Times
+    are wall clock timestamps, so the clocks of the hosts must be in sync.
+
+    Example:
+        >>> queue = JobQueue('/shared/echoscript/queue.db')
+        >>> job_id = queue.submit('/shared/audio/talk.mp3', 'turbo', priority=1)
+        >>> Worker(queue).run()  # on each host
+        >>> queue.result(job_id)['text']
+    '''
+
+    def __init__(self, path: str = None, timeout: float = 30.0):
+        '''
+        Args:
+            path (str, optional): The database file. Defaults to `$ECHOSCRIPT_HOME/queue.db`.
+            timeout (float, optional): The seconds to wait for the database lock. Defaults to 30.
+        '''
+        self.path = path or os.path.join(get_echoscript_home(), 'queue.db')
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._transaction() as db:
+            for statement in _SCHEMA:
+                db.execute(statement)
+
+    def submit(self,
+               audio: str,
+               model_name: str = 'base',
+               fmt: str = None,
+               language: str = None,
+               priority: int = 0,
+               output: str = None,
+               max_attempts: int = 3,
+               **options) -> int:
+        '''
+        Queue a transcription job.
+
+        Args:
+            audio (str): The audio file, which the workers must be able to open, or a URL.
+            model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+            fmt (str, optional): The format of the transcript written to `output`. Defaults to None.
+            language (str, optional): The language of the audio. Defaults to None.
+            priority (int, optional): Jobs with a higher priority are claimed first. Defaults to 0.
+            output (str, optional): The file the worker writes the transcript to, if any, stored as an
+                absolute path so workers in other directories write it to the same place. Defaults to None.
+            max_attempts (int, optional): The number of claims before a job whose lease keeps expiring
+                fails. Defaults to 3.
+            **options: Keyword arguments of `Audio2Text.transcribe`, e.g. `preset` or decode options.
+
+        Returns:
+            int: The job id.
+        '''
+        if fmt is not None and fmt not in Audio2Text.available_formats:
+            raise ValueError(f'Format `{fmt}` is not supported.')
+        if fmt not in (None, 'json') and formats.get_formatter(fmt).words:
+            options.setdefault('word_timestamps', True)
+        if output is not None:
+            output = os.path.abspath(output)
+        with self._transaction() as db:
+            cursor = db.execute(
+                'INSERT INTO jobs (audio, model_name, fmt, language, options, output, priority, max_attempts, '
+                'submitted) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (audio, model_name, fmt, language, json.dumps(options), output, priority, max_attempts, time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker: str, models=(), last_model: str = None, lease: float = 60.0, max_wait: float = 60.0):
+        '''
+        Claim the next job, first putting back the jobs whose lease expired.
+
+        Args:
+            worker (str): The name of the claiming worker.
+            models (list[str], optional): The models the worker has loaded. Defaults to ().
+            last_model (str, optional): The model of the last job of the worker. Defaults to None.
+            lease (float, optional): The seconds until the job is put back without a heartbeat. Defaults to 60.
+            max_wait (float, optional): The queueing time in seconds after which a job is claimed first
+                within its priority. Defaults to 60.
+
+        Returns:
+            dict | None: The claimed job, see `job`, or None if the queue is empty.
+        '''
+        now = time.time()
+        models = list(models)
+        with self._transaction() as db:
+            self._expire_leases(db, now)
+            row = db.execute(
+                'SELECT * FROM jobs WHERE status = \'queued\' ORDER BY priority DESC, '
+                'CASE WHEN submitted < ? THEN 0 WHEN model_name = ? THEN 1 '
+                f'WHEN model_name IN ({", ".join("?" * len(models))}) THEN 2 ELSE 3 END, id LIMIT 1',
+                (now - max_wait, last_model, *models),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                'UPDATE jobs SET status = \'running\', attempts = attempts + 1, worker = ?, lease_expires = ?, '
+                'started = ? WHERE id = ?',
+                (worker, now + lease, now, row['id']),
+            )
+            db.execute('UPDATE workers SET job = ?, heartbeat = ? WHERE name = ?', (row['id'], now, worker))
+        return self._decode({**dict(row), 'status': 'running', 'attempts': row['attempts'] + 1,
+                             'worker': worker, 'lease_expires': now + lease, 'started': now})
+
+    def heartbeat(self, worker: str, job: dict = None, lease: float = 60.0, models=None) -> bool:
+        '''
+        Record that a worker is alive and extend the lease of its job.
+
+        Args:
+            worker (str): The name of the worker.
+            job (dict, optional): The job the worker is running. Defaults to None.
+            lease (float, optional): The seconds until the job is put back without another heartbeat. Defaults to 60.
+            models (list[str], optional): The models the worker has loaded, if changed. Defaults to None.
+
+        Returns:
+            bool: False if the worker lost the lease of the job.
+        '''
+        now = time.time()
+        with self._transaction() as db:
+            if models is not None:
+                db.execute('UPDATE workers SET models = ? WHERE name = ?', (json.dumps(list(models)), worker))
+            db.execute('UPDATE workers SET heartbeat = ? WHERE name = ?', (now, worker))
+            if job is None:
+                return True
+            cursor = db.execute(
+                'UPDATE jobs SET lease_expires = ? WHERE id = ? AND attempts = ? AND status = \'running\'',
+                (now + lease, job['id'], job['attempts']),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: dict, result: dict, audio_seconds: float = None, busy_seconds: float = 0.0) -> bool:
+        '''
+        Store the result of a claimed job.
+
+        Args:
+            job (dict): The job, as returned by `claim`.
+            result (dict): The `json` result of the transcription.
+            audio_seconds (float, optional): The duration of the audio. Defaults to None.
+            busy_seconds (float, optional): The seconds the worker spent on the job. Defaults to 0.
+
+        Returns:
+            bool: False if the worker had lost the lease, in which case the result is dropped.
+        '''
+        return self._finish(job, 'done', busy_seconds, result=json.dumps(result, ensure_ascii=False),
+                            audio_seconds=audio_seconds)
+
+    def fail(self, job: dict, error: str, busy_seconds: float = 0.0) -> bool:
+        '''
+        Mark a claimed job as failed, e.g. because its audio cannot be decoded.
+
+        Returns:
+            bool: False if the worker had lost the lease.
+        '''
+        return self._finish(job, 'failed', busy_seconds, error=error)
+
+    def release(self, job: dict) -> bool:
+        '''
+        Put a claimed job back in the queue without counting the attempt, e.g. when its worker is stopped.
+
+        Returns:
+            bool: False if the worker had lost the lease.
+        '''
+        with self._transaction() as db:
+            cursor = db.execute(
+                'UPDATE jobs SET status = \'queued\', attempts = attempts - 1, worker = NULL, lease_expires = NULL, '
+                'started = NULL WHERE id = ? AND attempts = ? AND status = \'running\'',
+                (job['id'], job['attempts']),
+            )
+            db.execute('UPDATE workers SET job = NULL WHERE name = ?', (job['worker'],))
+            return cursor.rowcount == 1
+
+    def register_worker(self, worker: str, models=()):
+        '''
+        Add a worker to the queue statistics, resetting the counters of a previous worker of the same name.
+        '''
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO workers (name, models, started, heartbeat) VALUES (?, ?, ?, ?)',
+                (worker, json.dumps(list(models)), now, now),
+            )
+
+    def stop_worker(self, worker: str):
+        '''
+        Record that a worker stopped.
+        '''
+        with self._transaction() as db:
+            db.execute('UPDATE workers SET stopped = ?, job = NULL WHERE name = ?', (time.time(), worker))
+
+    def job(self, job_id: int):
+        '''
+        Look up a job.
+
+        Returns:
+            dict | None: The job with its `options` and `result` decoded, or None if there is no such job.
+        '''
+        with self._transaction(write=False) as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else self._decode(dict(row))
+
+    def result(self, job_id: int):
+        '''
+        The `json` result of a job, or None until it is done.
+        '''
+        job = self.job(job_id)
+        return None if job is None else job['result']
+
+    def wait(self, job_ids, poll: float = 1.0, timeout: float = None) -> list:
+        '''
+        Wait until the jobs are done or failed.
+
+        Args:
+            job_ids (list[int]): The jobs to wait for.
+            poll (float, optional): The seconds between checks. Defaults to 1.
+            timeout (float, optional): The maximum seconds to wait, use `None` to wait forever. Defaults to None.
+
+        Returns:
+            list[dict]: The jobs, in the order of `job_ids`.
+
+        Raises:
+            TimeoutError: If the jobs are not finished within `timeout`.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            jobs = [self.job(job_id) for job_id in job_ids]
+            if all(job is None or job['status'] in FINAL_STATUSES for job in jobs):
+                return jobs
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f'The jobs did not finish within {timeout} seconds.')
+            time.sleep(poll)
+
+    def stats(self, stale: float = 120.0) -> dict:
+        '''
+        Queue statistics: the number of jobs by status, the queued jobs per model and the workers.
+
+        Args:
+            stale (float, optional): The seconds without a heartbeat after which a worker counts as lost.
+                Defaults to 120.
+
+        Returns:
+            dict: `jobs` (counts by status), `queued` (counts by model) and `workers`, one dict per worker
+                with its `state` (`idle`, `busy`, `lost` or `stopped`), job counts, audio and busy seconds,
+                `speed` (audio seconds per busy second) and `jobs_per_hour` since it started.
+        '''
+        now = time.time()
+        with self._transaction(write=False) as db:
+            jobs = dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            queued = dict(db.execute(
+                'SELECT model_name, COUNT(*) FROM jobs WHERE status = \'queued\' GROUP BY model_name ORDER BY 2 DESC'
+            ).fetchall())
+            rows = db.execute('SELECT * FROM workers ORDER BY started').fetchall()
+
+        workers = []
+        for row in rows:
+            worker = dict(row)
+            worker['models'] = json.loads(worker['models'])
+            if worker['stopped'] is not None:
+                worker['state'] = 'stopped'
+            elif now - worker['heartbeat'] > stale:
+                worker['state'] = 'lost'
+            else:
+                worker['state'] = 'idle' if worker['job'] is None else 'busy'
+            end = worker['stopped'] or worker['heartbeat']
+            worker['speed'] = worker['audio_seconds'] / worker['busy_seconds'] if worker['busy_seconds'] else 0.0
+            uptime = end - worker['started']
+            worker['jobs_per_hour'] = worker['jobs_done'] * 3600 / uptime if uptime > 0 else 0.0
+            workers.append(worker)
+        return {
+            'jobs': {status: jobs.get(status, 0) for status in ('queued', 'running', 'done', 'failed')},
+            'queued': queued,
+            'workers': workers,
+        }
+
+    def _finish(self, job, status, busy_seconds, result=None, error=None, audio_seconds=None):
+        now = time.time()
+        counter = 'jobs_done' if status == 'done' else 'jobs_failed'
+        with self._transaction() as db:
+            cursor = db.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, audio_seconds = ?, finished = ?, '
+                'lease_expires = NULL WHERE id = ? AND attempts = ? AND status = \'running\'',
+                (status, result, error, audio_seconds, now, job['id'], job['attempts']),
+            )
+            if cursor.rowcount == 0:
+                db.execute('UPDATE workers SET job = NULL, heartbeat = ? WHERE name = ?', (now, job['worker']))
+                return False
+            db.execute(
+                f'UPDATE workers SET job = NULL, heartbeat = ?, {counter} = {counter} + 1, '
+                'audio_seconds = audio_seconds + ?, busy_seconds = busy_seconds + ? WHERE name = ?',
+                (now, audio_seconds or 0.0, busy_seconds, job['worker']),
+            )
+            return True
+
+    @staticmethod
+    def _expire_leases(db, now):
+        '''
+        Put back the running jobs whose lease expired, or fail them after their last attempt.
+        '''
+        db.execute(
+            'UPDATE jobs SET status = \'failed\', finished = ?, lease_expires = NULL, '
+            'error = \'The lease of worker \' || worker || \' expired on the last attempt.\' '
+            'WHERE status = \'running\' AND lease_expires < ? AND attempts >= max_attempts',
+            (now, now),
+        )
+        db.execute(
+            'UPDATE jobs SET status = \'queued\', worker = NULL, lease_expires = NULL, started = NULL '
+            'WHERE status = \'running\' AND lease_expires < ?',
+            (now,),
+        )
+
+    @staticmethod
+    def _decode(job):
+        job['options'] = json.loads(job['options'])
+        if job.get('result') is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    @contextlib.contextmanager
+    def _transaction(self, write: bool = True):
+        '''
+        A connection in a transaction, committed at the end of the block.
+
+        Write transactions take the database lock up front, so that the
+        selection and the update of a claim cannot interleave with another claim.
+        '''
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+
+def run_job(job: dict):
+    '''
+    The default job runner: transcribe the audio of a job and write its transcript to the job's `output`.
+
+    Returns:
+        tuple[dict, float]: The `json` result and the audio duration in seconds.
+    '''
+    from echoscript.batch import transcribe_file, write_transcript
+    from echoscript.media import MediaCache, is_remote
+
+    audio = job['audio']
+    if is_remote(audio):
+        audio = MediaCache().fetch(audio)
+    result, duration = transcribe_file(audio, job['model_name'], 'json', job['language'], **job['options'])
+    if job['output'] is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+        write_transcript(Audio2Text.format_result(result, job['fmt']), job['output'])
+    return result, duration
+
+
+class Worker:
+    '''
+    Runs the jobs of a `JobQueue` one at a time, renewing the lease of the running job with heartbeats.
+
+    Example:
+        >>> worker = Worker(JobQueue('/shared/echoscript/queue.db'))
+        >>> worker.run(exit_when_empty=True)
+    '''
+
+    def __init__(self, queue: JobQueue, name: str = None, lease: float = 60.0, poll: float = 1.0, runner=run_job):
+        '''
+        Args:
+            queue (JobQueue): The job queue.
+            name (str, optional): The unique name of the worker. Defaults to `<hostname>:<pid>`.
+            lease (float, optional): The seconds after which the job of a silent worker is put back. The worker
+                sends a heartbeat every third of it. Defaults to 60.
+            poll (float, optional): The seconds between claims while the queue is empty. Defaults to 1.
+            runner (callable, optional): Called as `runner(job)` to run a job, returns the `json` result and
+                the audio duration. Defaults to `run_job`.
+        '''
+        self.queue = queue
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.lease = lease
+        self.poll = poll
+        self.runner = runner
+
+    def run(self, max_jobs: int = None, exit_when_empty: bool = False, callback=None) -> int:
+        '''
+        Claim and run jobs until stopped.
+
+        A KeyboardInterrupt puts the running job back in the queue before it is raised.
+
+        Args:
+            max_jobs (int, optional): Stop after this many jobs. Defaults to None.
+            exit_when_empty (bool, optional): Stop when no job is queued. Defaults to False.
+            callback (callable, optional): Called as `callback(job, error)` after each job, `error` is None
+                on success. Defaults to None.
+
+        Returns:
+            int: The number of jobs run.
+        '''
+        last_model, n_jobs = None, 0
+        self.queue.register_worker(self.name, loaded_models())
+        try:
+            while max_jobs is None or n_jobs < max_jobs:
+                job = self.queue.claim(self.name, loaded_models(), last_model, self.lease)
+                if job is None:
+                    if exit_when_empty:
+                        break
+                    self.queue.heartbeat(self.name)
+                    time.sleep(self.poll)
+                    continue
+                error = self._run(job)
+                n_jobs += 1
+                last_model = job['model_name']
+                if callback is not None:
+                    callback(job, error)
+        finally:
+            self.queue.stop_worker(self.name)
+        return n_jobs
+
+    def _run(self, job):
+        stop = threading.Event()
+        heartbeats = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        heartbeats.start()
+        start = time.monotonic()
+        try:
+            result, duration = self.runner(job)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            self.queue.fail(job, error, time.monotonic() - start)
+            return error
+        except BaseException:
+            self.queue.release(job)
+            raise
+        finally:
+            stop.set()
+            heartbeats.join()
+        if not self.queue.complete(job, result, duration, time.monotonic() - start):
+            return 'The lease expired before the job finished.'
+        self.queue.heartbeat(self.name, models=loaded_models())
+        return None
+
+    def _heartbeat(self, job, stop):
+        while not stop.wait(self.lease / 3):
+            try:
+                self.queue.heartbeat(self.name, job, self.lease)
+            except sqlite3.Error:
+                # A busy or briefly unreachable database, the next heartbeat may still renew the lease.
+                pass
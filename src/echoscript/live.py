@@ -0,0 +1,398 @@
+import io
+import queue
+import struct
+import threading
+
+import numpy as np
+import torch
+
+from whisper.audio import N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+
+from echoscript.streaming import TIME_PRECISION, is_silent, make_segment, split_window
+
+
+SAMPLE_FORMATS = {
+    's16le': ('<i2', 1 / 32768),
+    'f32le': ('<f4', 1.0),
+}
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class LiveTranscriber:
+    '''
+    Transcribe a live 16 kHz mono audio stream with low latency.
+
+    Audio is appended to a rolling buffer of at most 30 seconds, the window
+    of the model. Every `step` seconds of new audio, the buffer is decoded
+    as one window and split into timestamped segments. The leading segments
+    that the last two decodes agree on are final: they are emitted once, their
+    audio is dropped from the buffer and their text becomes the prompt of the
+    following decodes. So only the unstable tail of the stream is decoded
+    again. The rest of the hypothesis is emitted as provisional text, which
+    the next decode may still change. The last segment of a decode is never
+    final, since its words may be cut by the end of the buffer, unless the
+    buffer grows beyond `max_buffer` seconds or the stream ends.
+
+    Events are dicts with a `type` (`final` or `partial`), the `start` and
+    `end` in seconds from the start of the stream and the `text`. Final events
+    also have the `id` of the segment.
+
+    Example:
+        >>> live = LiveTranscriber('base', language='en')
+        >>> for chunk in chunks:  # float32 samples
+        ...     for event in live.feed(chunk):
+        ...         print(event['type'], event['text'])
+        >>> events = live.finish()
+    '''
+
+    def __init__(self,
+                 model='base',
+                 language: str = None,
+                 initial_prompt: str = None,
+                 step: float = 0.5,
+                 min_audio: float = 1.0,
+                 max_buffer: float = 15.0,
+                 no_speech_threshold: float = 0.6,
+                 logprob_threshold: float = -1.0,
+                 condition_on_previous_text: bool = True,
+                 **decode_options):
+        '''
+        Args:
+            model (str | whisper.Whisper, optional): The Whisper model or the name of the model to load. Defaults to 'base'.
+            language (str, optional): The language of the audio, use `None` to detect it on the first speech. Defaults to None.
+            initial_prompt (str, optional): The prompt of the first decode. Defaults to None.
+            step (float, optional): The seconds of new audio between decodes. Defaults to 0.5.
+            min_audio (float, optional): The seconds of buffered audio needed for a decode. Defaults to 1.0.
+            max_buffer (float, optional): Finalize all timestamped segments once the buffer is longer than this
+                many seconds, at most 30. Defaults to 15.0.
+            no_speech_threshold (float, optional): Treat a decode as silence above this no-speech probability. Defaults to 0.6.
+            logprob_threshold (float, optional): ... and below this average log probability. Defaults to -1.0.
+            condition_on_previous_text (bool, optional): Whether to prompt each decode with the final text. Defaults to True.
+            **decode_options: Keyword arguments of `whisper.DecodingOptions`, e.g. `beam_size` or `fp16`.
+        '''
+        from echoscript.audio2text import Audio2Text, process_language
+
+        if isinstance(model, str):
+            if language is not None and not Audio2Text.is_language_available(language):
+                raise ValueError(f'Language `{language}` is not available.')
+            model = Audio2Text.load_whisper_model(model)
+        language, initial_prompt = process_language(language, initial_prompt)
+        if not 0 < max_buffer <= N_SAMPLES / SAMPLE_RATE:
+            raise ValueError('The maximum buffer length must be between 0 and 30 seconds.')
+
+        self.model = model
+        self.language = language
+        self.step = int(step * SAMPLE_RATE)
+        self.min_audio = int(min_audio * SAMPLE_RATE)
+        self.max_buffer = int(max_buffer * SAMPLE_RATE)
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+        self.condition_on_previous_text = condition_on_previous_text
+        decode_options.setdefault('fp16', model.device.type != 'cpu')
+        self.dtype = torch.float16 if decode_options['fp16'] else torch.float32
+        self.decode_options = decode_options
+        self.tokenizer = get_tokenizer(
+            model.is_multilingual,
+            num_languages=model.num_languages,
+            language=language,
+            task=decode_options.get('task', 'transcribe'),
+        )
+
+        self.buffer = np.zeros(N_SAMPLES, dtype=np.float32)
+        self.size = 0            # samples in the buffer
+        self.offset = 0          # samples of the stream before the buffer
+        self.undecoded = 0       # samples appended since the last decode
+        # Prompted like `whisper.transcribe`, the initial prompt is dropped once the final text fills the context.
+        self.prompt = self.tokenizer.encode(' ' + initial_prompt.strip()) if initial_prompt else []
+        self.n_final = 0
+        self._previous = []      # the normalized texts of the unstable segments of the last decode
+        self._partial = None
+        self._last = None        # the buffer position and result of the last decode
+
+    @property
+    def time(self) -> float:
+        '''
+        The seconds of audio received.
+        '''
+        return (self.offset + self.size) / SAMPLE_RATE
+
+    def feed(self, samples) -> list:
+        '''
+        Append audio to the buffer, decoding it when `step` seconds of new audio arrived.
+
+        Audio that arrives faster than it can be decoded is decoded together,
+        once per call, so the latency stays bounded.
+
+        Args:
+            samples (ndarray): 16 kHz mono float32 samples.
+
+        Returns:
+            list[dict]: The events of the decode, in order, empty if the buffer was not decoded.
+        '''
+        samples = np.asarray(samples, dtype=np.float32)
+        events = []
+        while len(samples):
+            if self.size == len(self.buffer):
+                # A full window without a decode agreeing on anything.
+                events.extend(self._decode(force=True))
+                if self.size == len(self.buffer):
+                    self._trim(self.size)
+            n = min(len(self.buffer) - self.size, len(samples))
+            self.buffer[self.size:self.size + n] = samples[:n]
+            self.size += n
+            self.undecoded += n
+            samples = samples[n:]
+        if self.undecoded >= self.step and self.size >= self.min_audio:
+            events.extend(self._decode(force=self.size > self.max_buffer))
+        return events
+
+    def finish(self) -> list:
+        '''
+        Decode the rest of the buffer at the end of the stream, finalizing all its segments.
+
+        Returns:
+            list[dict]: The last events, final segments followed by an empty partial.
+        '''
+        if self.size == 0:
+            return []
+        return self._decode(final=True)
+
+    def _decode(self, force=False, final=False) -> list:
+        '''
+        Decode the buffer, finalize the agreed segments and trim their audio.
+
+        Args:
+            force (bool): Finalize all segments, and if there is none the whole buffer.
+            final (bool): Finalize everything, at the end of the stream.
+        '''
+        self.undecoded = 0
+        # Padded as in `whisper.transcribe`, so the buffer is decoded like the start of a file.
+        mel = log_mel_spectrogram(self.buffer[:self.size], self.model.dims.n_mels, padding=N_SAMPLES)
+        segment_size = min(N_FRAMES, mel.shape[-1] - N_FRAMES)
+        if self._last is not None and self._last[0] == (self.offset, self.size):
+            # Nothing changed since the last decode, e.g. at the end of the stream.
+            result = self._last[1]
+        else:
+            mel = pad_or_trim(mel[:, :segment_size], N_FRAMES).to(self.model.device).to(self.dtype)
+            prompt = self.prompt[-(self.model.dims.n_text_ctx // 2 - 1):] if self.condition_on_previous_text else []
+            result = self.model.decode(mel, DecodingOptions(
+                **{'temperature': 0.0, **self.decode_options},
+                language=self.language,
+                prompt=prompt,
+            ))
+            self._last = ((self.offset, self.size), result)
+        if is_silent(result, self.logprob_threshold, self.no_speech_threshold):
+            # Keep the end of the buffer, where speech may be starting.
+            self._previous = []
+            self._trim(self.size - (0 if final else min(self.size, self.min_audio)))
+            return self._emit_partial('')
+        if self.language is None and self.model.is_multilingual:
+            self.language = result.language
+
+        time_offset = self.offset / SAMPLE_RATE
+        tokens = torch.tensor(result.tokens)
+        spans, _ = split_window(tokens, self.tokenizer, time_offset, segment_size)
+        if len(spans) == 1 and len(tokens) and tokens[0] >= self.tokenizer.timestamp_begin:
+            # `whisper.transcribe` starts a lone segment at the window, use its timestamp instead.
+            start = time_offset + (tokens[0].item() - self.tokenizer.timestamp_begin) * TIME_PRECISION
+            spans[0] = (start, *spans[0][1:])
+        segments = [make_segment(self.tokenizer, 0, start, end, span, result) for start, end, span in spans]
+        covered = sum(len(span) for _, _, span in spans)
+        tail = self.tokenizer.decode([token for token in result.tokens[covered:] if token < self.tokenizer.eot])
+
+        if final or force:
+            n = len(segments)
+        else:
+            # A segment is complete if more text follows it, and stable if the last decode agrees.
+            complete = len(segments) if tail.strip() else len(segments) - 1
+            n = 0
+            while (n < complete and n < len(self._previous)
+                   and _normalize(segments[n]['text']) == self._previous[n]):
+                n += 1
+
+        events = [
+            self._final(segment['start'], segment['end'], segment['text'], segment['tokens'])
+            for segment in segments[:n] if segment['text'].strip()
+        ]
+        if final or (force and n == 0):
+            # Finalize the text after the last segment at the end of the stream, or the whole
+            # hypothesis of a full buffer in which no segment ends.
+            if tail.strip():
+                start = segments[-1]['end'] if segments else time_offset
+                events.append(self._final(start, self.time, tail, self.tokenizer.encode(tail)))
+            self._previous = []
+            self._trim(self.size)
+            return events + self._emit_partial('')
+
+        if n > 0:
+            end = int(round(segments[n - 1]['end'] * SAMPLE_RATE)) - self.offset
+            self._trim(min(max(end, 0), self.size))
+        unstable = segments[n:]
+        self._previous = [_normalize(segment['text']) for segment in unstable]
+        return events + self._emit_partial(''.join(segment['text'] for segment in unstable) + tail)
+
+    def _final(self, start, end, text, tokens) -> dict:
+        self.prompt.extend(tokens)
+        self.n_final += 1
+        return {'type': 'final', 'id': self.n_final - 1, 'start': start, 'end': end, 'text': text}
+
+    def _trim(self, n):
+        '''
+        Drop the first `n` samples of the buffer.
+        '''
+        if n > 0:
+            self.buffer[:self.size - n] = self.buffer[n:self.size]
+            self.size -= n
+            self.offset += n
+
+    def _emit_partial(self, text) -> list:
+        '''
+        The provisional text after the final segments, emitted when it changed.
+        '''
+        partial = (text, self.offset)
+        if partial == self._partial:
+            return []
+        self._partial = partial
+        return [{'type': 'partial', 'start': self.offset / SAMPLE_RATE, 'end': self.time, 'text': text}]
+
+
+def read_wav_header(stream):
+    '''
+    Skip the header of a WAV stream, so decoded WAV files can be piped in.
+
+    Args:
+        stream (BinaryIO): The stream, positioned at `RIFF`.
+
+    Raises:
+        ValueError: If the audio is not 16 kHz mono 16-bit PCM.
+    '''
+    header = _read_exactly(stream, 12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise ValueError('Not a WAV stream.')
+    while True:
+        chunk_id, size = struct.unpack('<4sI', _read_exactly(stream, 8))
+        if chunk_id == b'data':
+            return
+        data = _read_exactly(stream, size + size % 2)
+        if chunk_id == b'fmt ':
+            audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', data[:16])
+            if (audio_format, channels, rate, bits) != (1, 1, SAMPLE_RATE, 16):
+                raise ValueError('Only 16 kHz mono 16-bit PCM WAV audio is supported.')
+
+
+def _read_exactly(stream, n):
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            raise ValueError('Unexpected end of the WAV header.')
+        data += chunk
+    return data
+
+
+def iter_pcm(stream, sample_format: str = 's16le', chunk_size: int = 3200):
+    '''
+    Read raw PCM from a binary stream as it arrives.
+
+    Reads return whatever is available, up to `chunk_size` samples, so a
+    slow producer is not waited for. A stream starting with a WAV header is
+    accepted, see `read_wav_header`.
+
+    Args:
+        stream (BinaryIO): The stream, e.g. `sys.stdin.buffer` or a socket file.
+        sample_format (str, optional): The sample format {`s16le`, `f32le`}. Defaults to 's16le'.
+        chunk_size (int, optional): The maximum number of samples per chunk. Defaults to 3200 (0.2 s).
+
+    Yields:
+        ndarray: float32 samples.
+    '''
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError(f'Sample format `{sample_format}` is not supported.')
+    dtype, scale = SAMPLE_FORMATS[sample_format]
+    width = np.dtype(dtype).itemsize
+    read = getattr(stream, 'read1', stream.read)
+
+    pending = read(chunk_size * width)
+    if pending[:4] == b'RIFF':
+        if sample_format != 's16le':
+            raise ValueError('WAV streams are read as `s16le`.')
+        prefix = io.BytesIO(pending)
+        read_wav_header(_Chain(prefix, stream))
+        pending = prefix.read()
+
+    while True:
+        n = len(pending) - len(pending) % width
+        if n:
+            yield np.frombuffer(pending[:n], dtype).astype(np.float32) * scale
+        data = read(chunk_size * width)
+        if not data:
+            return
+        pending = pending[n:] + data
+
+
+class _Chain:
+    '''
+    Read from a buffer, then from a stream.
+    '''
+
+    def __init__(self, first, stream):
+        self.first = first
+        self.stream = stream
+
+    def read(self, n):
+        data = self.first.read(n)
+        return data if data else self.stream.read(n)
+
+
+def transcribe_live(stream, model='base', language: str = None, sample_format: str = 's16le', **kwargs):
+    '''
+    Transcribe live PCM from a binary stream, yielding events as they are decoded.
+
+    The stream is read on a background thread, and all the audio received
+    while a decode runs is fed at once, so the transcription keeps up with
+    real time even if decodes take longer than `step`.
+
+    Args:
+        stream (BinaryIO): The stream of 16 kHz mono PCM, e.g. `sys.stdin.buffer` or a socket file.
+        model (str | whisper.Whisper, optional): The Whisper model or its name. Defaults to 'base'.
+        language (str, optional): The language of the audio, use `None` to detect it. Defaults to None.
+        sample_format (str, optional): The sample format {`s16le`, `f32le`}. Defaults to 's16le'.
+        **kwargs: Keyword arguments of `LiveTranscriber`.
+
+    Yields:
+        dict: The `final` and `partial` events, see `LiveTranscriber`.
+    '''
+    live = LiveTranscriber(model, language, **kwargs)
+    chunks = queue.Queue()
+    errors = []
+
+    def read():
+        try:
+            for chunk in iter_pcm(stream, sample_format):
+                chunks.put(chunk)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.put(None)
+
+    threading.Thread(target=read, name='echoscript-live-reader', daemon=True).start()
+    done = False
+    while not done:
+        received = [chunks.get()]
+        while True:
+            try:
+                received.append(chunks.get_nowait())
+            except queue.Empty:
+                break
+        done = received[-1] is None
+        received = [chunk for chunk in received if chunk is not None]
+        if received:
+            yield from live.feed(np.concatenate(received))
+    if errors:
+        raise errors[0]
+    yield from live.finish()
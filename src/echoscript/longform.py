@@ -0,0 +1,164 @@
+import os
+
+import numpy as np
+import whisper
+
+from echoscript.audio2text import Audio2Text
+from echoscript.batch import transcribe_file
+from echoscript.formats import get_formatter
+from echoscript.ingest import is_stream, load_audio
+from echoscript.vad import frame_energy
+
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+
+def split_on_silence(audio,
+                     chunk_length: float = 300,
+                     overlap: float = 1.0,
+                     search: float = 5.0,
+                     frame_length: int = 320,
+                     sr: int = SAMPLE_RATE) -> list:
+    '''
+    Split a long waveform into chunks at the quietest point near each chunk boundary.
+
+    Each chunk owns a core region between two split points and is extended by
+    `overlap` seconds on both sides, so that words cut at a boundary are still
+    heard in full by one of the chunks. A remainder shorter than half a chunk
+    is merged into the last chunk.
+
+    Args:
+        audio (ndarray): The waveform.
+        chunk_length (float, optional): The target chunk length in seconds. Defaults to 300.
+        overlap (float, optional): The overlap added on each side of a chunk in seconds. Defaults to 1.0.
+        search (float, optional): How far from the target boundary to look for silence, in seconds. Defaults to 5.0.
+        frame_length (int, optional): The energy frame length in samples. Defaults to 320.
+        sr (int, optional): The sample rate. Defaults to 16000.
+
+    Returns:
+        list[tuple[int, int, int, int]]: (start, end, core_start, core_end) of each chunk, in samples.
+    '''
+    n_samples = len(audio)
+    step = int(chunk_length * sr)
+    if n_samples <= step:
+        return [(0, n_samples, 0, n_samples)]
+
+    energy = frame_energy(audio, frame_length)
+    radius = int(search * sr) // frame_length
+    splits = [0]
+    target = step
+    while n_samples - target > step // 2:
+        center = target // frame_length
+        lo, hi = max(center - radius, 1), min(center + radius + 1, len(energy))
+        split = (lo + int(np.argmin(energy[lo:hi]))) * frame_length
+        splits.append(split)
+        target = split + step
+    splits.append(n_samples)
+
+    pad = int(overlap * sr)
+    return [
+        (max(core_start - pad, 0), min(core_end + pad, n_samples), core_start, core_end)
+        for core_start, core_end in zip(splits[:-1], splits[1:])
+    ]
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def stitch_segments(results, chunks, sr: int = SAMPLE_RATE) -> dict:
+    '''
+    Merge the results of overlapping chunks into one result on the global timeline.
+
+    Segment timestamps are shifted by the chunk offset, segments whose midpoint
+    falls outside the core region of their chunk are dropped, and a segment
+    repeating the text of the previous one across a boundary is removed.
+
+    Args:
+        results (list[dict]): The Whisper result of each chunk.
+        chunks (list[tuple[int, int, int, int]]): The chunks returned by `split_on_silence`.
+        sr (int, optional): The sample rate. Defaults to 16000.
+
+    Returns:
+        dict: A Whisper-style result with `text`, `segments` and `language`.
+    '''
+    segments = []
+    for result, (start, end, core_start, core_end) in zip(results, chunks):
+        offset = start / sr
+        for segment in result['segments']:
+            segment = dict(segment)
+            segment['start'] = round(segment['start'] + offset, 3)
+            segment['end'] = round(segment['end'] + offset, 3)
+            if 'words' in segment:
+                segment['words'] = [
+                    {**word, 'start': round(word['start'] + offset, 3), 'end': round(word['end'] + offset, 3)}
+                    for word in segment['words']
+                ]
+            middle = (segment['start'] + segment['end']) / 2 * sr
+            if middle < core_start or (middle >= core_end and core_end != end):
+                continue
+            if (segments
+                    and segment['start'] < segments[-1]['end']
+                    and _normalize(segment['text']) == _normalize(segments[-1]['text'])):
+                continue
+            segment['seek'] = segment.get('seek', 0) + int(offset * 100)
+            segments.append(segment)
+
+    for i, segment in enumerate(segments):
+        segment['id'] = i
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': results[0].get('language') if results else None,
+    }
+
+
+def transcribe_long(audio,
+                    model_name: str = 'base',
+                    fmt: str = None,
+                    language: str = None,
+                    chunk_length: float = 300,
+                    overlap: float = 1.0,
+                    workers: int = None,
+                    **kwargs):
+    '''
+    Transcribe a long recording by splitting it at silence and transcribing the chunks concurrently.
+
+    Args:
+        audio (str | bytes | BinaryIO | ndarray): The audio to transcribe, a file path, encoded audio or a waveform.
+        model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+        fmt (str, optional): The output format, see `Audio2Text.transcribe`. Defaults to None.
+        language (str, optional): The language of the audio, use `None` for multilingual. Defaults to None.
+        chunk_length (float, optional): The target chunk length in seconds. Defaults to 300.
+        overlap (float, optional): The overlap added on each side of a chunk in seconds. Defaults to 1.0.
+        workers (int, optional): The number of worker processes, use 1 to transcribe in this process. Defaults to the number of CPUs.
+        **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+    Returns:
+        str | dict: The transcription in the requested format.
+    '''
+    if fmt is not None and fmt not in Audio2Text.available_formats:
+        raise ValueError(f'Format `{fmt}` is not supported.')
+    if fmt not in ('json', None) and get_formatter(fmt).words:
+        kwargs.setdefault('word_timestamps', True)
+
+    if isinstance(audio, str) or is_stream(audio):
+        audio = load_audio(audio)
+
+    chunks = split_on_silence(audio, chunk_length, overlap)
+    waveforms = [audio[start:end] for start, end, _, _ in chunks]
+
+    if workers == 1 or len(chunks) == 1:
+        results = [
+            transcribe_file(waveform, model_name, 'json', language, **kwargs)[0]
+            for waveform in waveforms
+        ]
+    else:
+        from echoscript.pool import TranscriptionPool
+
+        workers = min(workers or os.cpu_count() or 1, len(chunks))
+        with TranscriptionPool(workers, model_name=model_name) as pool:
+            results = pool.map(waveforms, 'json', language, **kwargs)
+
+    return Audio2Text.format_result(stitch_segments(results, chunks), fmt)
@@ -0,0 +1,480 @@
+import collections
+import contextlib
+import contextvars
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from echoscript import tracing
+from echoscript.utils import get_echoscript_home
+
+
+def _env_budget():
+    '''
+    Read the media cache budget from `ECHOSCRIPT_MEDIA_CACHE_MB`.
+
+    Returns:
+        int: The budget in bytes, 2 GiB by default.
+    '''
+    value = os.environ.get('ECHOSCRIPT_MEDIA_CACHE_MB')
+    return int(float(value or 2048) * 1024 * 1024)
+
+
+class YouTubeBackend:
+    '''
+    Download the audio stream of YouTube videos with pytubefix.
+
+    The source id is the video id, so the watch, short and `youtu.be` URLs of
+    a video share one cache entry.
+    '''
+
+    name = 'youtube'
+    _ID = re.compile(r'^[\w-]{11}$')
+
+    def source_id(self, url: str):
+        '''
+        The cache id of a YouTube URL, None for other sources.
+        '''
+        parts = urlsplit(url)
+        host = parts.netloc.lower().split(':')[0]
+        if host.startswith('www.') or host.startswith('m.'):
+            host = host.split('.', 1)[1]
+        if host == 'youtu.be':
+            video_id = parts.path.strip('/').split('/')[0]
+        elif host in ('youtube.com', 'music.youtube.com', 'youtube-nocookie.com'):
+            path = parts.path.strip('/').split('/')
+            if path[0] == 'watch':
+                video_id = parse_qs(parts.query).get('v', [''])[0]
+            elif path[0] in ('shorts', 'embed', 'live', 'v') and len(path) > 1:
+                video_id = path[1]
+            else:
+                return None
+        else:
+            return None
+        return f'youtube-{video_id}' if self._ID.match(video_id) else None
+
+    def fetch(self, url: str, f):
+        '''
+        Write the audio stream of the video to the binary file object `f`.
+        '''
+        from pytubefix import YouTube
+
+        YouTube(url).streams.filter(only_audio=True)[0].stream_to_buffer(f)
+
+
+class HTTPBackend:
+    '''
+    Download media files over HTTP(S) with urllib.
+
+    The source id is a hash of the URL.
+    '''
+
+    name = 'http'
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout
+
+    def source_id(self, url: str):
+        '''
+        The cache id of an HTTP(S) URL, None for other sources.
+        '''
+        if urlsplit(url).scheme.lower() not in ('http', 'https'):
+            return None
+        return 'url-' + hashlib.sha256(url.encode()).hexdigest()[:32]
+
+    def fetch(self, url: str, f):
+        '''
+        Write the response body to the binary file object `f`.
+        '''
+        import urllib.request
+
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            shutil.copyfileobj(response, f, 1 << 20)
+
+
+# The source backends, tried in order.
+_backends = [YouTubeBackend(), HTTPBackend()]
+
+
+def register_backend(backend):
+    '''
+    Add a source backend, tried before the registered ones.
+
+    A backend has a `source_id(url)` method returning a cache id that is a
+    valid file name, or None for URLs it does not handle, and a `fetch(url, f)`
+    method writing the media to the binary file object `f`.
+
+    Returns:
+        The backend, for `unregister_backend`.
+    '''
+    _backends.insert(0, backend)
+    return backend
+
+
+def unregister_backend(backend):
+    '''
+    Remove a backend added with `register_backend`.
+    '''
+    if backend in _backends:
+        _backends.remove(backend)
+
+
+def get_backend(url: str):
+    '''
+    Find the backend of a remote source.
+
+    Returns:
+        tuple: (backend, source id), or (None, None) if no backend handles the URL.
+    '''
+    if not isinstance(url, str):
+        return None, None
+    for backend in _backends:
+        source_id = backend.source_id(url)
+        if source_id is not None:
+            return backend, source_id
+    return None, None
+
+
+def is_remote(source) -> bool:
+    '''
+    Check if a source is a URL handled by a backend, e.g. a YouTube video.
+    '''
+    return get_backend(source)[0] is not None
+
+
+# In-process pins and download locks, shared by all `MediaCache` instances.
+_pins = collections.Counter()
+_locks = {}
+_lock = threading.Lock()
+
+
+def _source_lock(path):
+    with _lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+class MediaCache:
+    '''
+    An on-disk cache of downloaded media, keyed by source id.
+
+    Each download goes to its own temporary file, which is atomically renamed
+    to the entry of the source once complete, so concurrent jobs never write
+    to the same file or read a partial one. Concurrent fetches of one source
+    in a process download it once. Hits refresh the modification time of an
+    entry, and the least recently used entries are evicted when the total size
+    exceeds `max_bytes`, except entries pinned by running jobs.
+
+    Example:
+        >>> cache = MediaCache()
+        >>> with cache.hold('https://www.youtube.com/watch?v=...') as path:
+        ...     text = Audio2Text().transcribe(path)
+    '''
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        '''
+        Args:
+            root (str, optional): The cache directory. Defaults to `$ECHOSCRIPT_HOME/cache/media`.
+            max_bytes (int, optional): The size budget in bytes. Defaults to `$ECHOSCRIPT_MEDIA_CACHE_MB` or 2 GiB.
+        '''
+        self.root = root or os.path.join(get_echoscript_home(), 'cache', 'media')
+        self.max_bytes = _env_budget() if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, source_id: str) -> str:
+        '''
+        The file path of a cache entry.
+        '''
+        return os.path.join(self.root, f'{source_id}.media')
+
+    def get(self, url: str):
+        '''
+        The path of a cached source.
+
+        Returns:
+            str | None: The path, or None on a miss.
+        '''
+        _, source_id = get_backend(url)
+        if source_id is None:
+            raise ValueError(f'No media backend handles `{url}`.')
+        path = self.path(source_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, url: str) -> str:
+        '''
+        Download a source unless it is cached.
+
+        Args:
+            url (str): The source URL, e.g. a YouTube video.
+
+        Returns:
+            str: The path of the cached media file.
+
+        Raises:
+            ValueError: If no backend handles the URL.
+        '''
+        backend, source_id = get_backend(url)
+        if backend is None:
+            raise ValueError(f'No media backend handles `{url}`.')
+        path = self.path(source_id)
+        with _source_lock(path):
+            cached = self.get(url)
+            if cached is not None:
+                self.hits += 1
+                tracing.annotate(media_cached=True)
+                return cached
+
+            self.misses += 1
+            os.makedirs(self.root, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f'{source_id}.', suffix='.part')
+            try:
+                with tracing.stage('download'), os.fdopen(fd, 'wb') as f:
+                    backend.fetch(url, f)
+                    size = f.tell()
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        tracing.annotate(download_bytes=size)
+        self.evict(keep=path)
+        return path
+
+    @contextlib.contextmanager
+    def hold(self, url: str):
+        '''
+        Fetch a source and keep it from being evicted within the block.
+
+        Yields:
+            str: The path of the cached media file.
+        '''
+        path = self.fetch(url)
+        self.pin(path)
+        try:
+            yield path
+        finally:
+            self.unpin(path)
+
+    @staticmethod
+    def pin(path: str):
+        '''
+        Keep an entry from being evicted by this process until `unpin`.
+        '''
+        with _lock:
+            _pins[path] += 1
+
+    @staticmethod
+    def unpin(path: str):
+        '''
+        Release a pin taken with `pin`.
+        '''
+        with _lock:
+            _pins[path] -= 1
+            if _pins[path] <= 0:
+                del _pins[path]
+
+    def entries(self) -> list:
+        '''
+        List the cache entries.
+
+        Returns:
+            list[tuple[str, int, float]]: (path, size in bytes, mtime) of each entry.
+        '''
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith('.media'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, keep: str = None) -> int:
+        '''
+        Remove least recently used entries until the cache fits its budget.
+
+        Pinned entries and `keep` are never removed, so the cache may exceed
+        its budget while they are in use.
+
+        Returns:
+            int: The number of removed entries.
+        '''
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            with _lock:
+                if path == keep or path in _pins:
+                    continue
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    def clear(self) -> int:
+        '''
+        Remove all entries that are not pinned.
+
+        Returns:
+            int: The number of removed entries.
+        '''
+        removed = 0
+        for path, _, _ in self.entries():
+            with _lock:
+                if path in _pins:
+                    continue
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self) -> dict:
+        '''
+        Cache statistics.
+
+        Returns:
+            dict: The cache directory, number of entries, total and maximum
+                size in bytes, and the hits/misses of this instance.
+        '''
+        entries = self.entries()
+        return {
+            'root': self.root,
+            'entries': len(entries),
+            'nbytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class Prefetcher:
+    '''
+    Download remote sources on a thread pool ahead of their transcription.
+
+    Example:
+        >>> with Prefetcher(ahead=2) as prefetcher:
+        ...     for source, path in prefetcher.iter_fetched(urls):
+        ...         transcribe(path)  # the next two sources download meanwhile
+    '''
+
+    def __init__(self, cache: MediaCache = None, workers: int = 2, ahead: int = 2):
+        '''
+        Args:
+            cache (MediaCache, optional): The media cache. Defaults to a `MediaCache()`.
+            workers (int, optional): The number of concurrent downloads. Defaults to 2.
+            ahead (int, optional): The number of sources `iter_fetched` downloads ahead. Defaults to 2.
+        '''
+        self.cache = cache or MediaCache()
+        self.ahead = ahead
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='echoscript-prefetch')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, url: str, pin: bool = False):
+        '''
+        Start downloading a source, once per source.
+
+        The download runs in a copy of the calling context, so it records into the active trace.
+
+        Args:
+            url (str): The source URL.
+            pin (bool, optional): Whether to pin the entry once downloaded, see `MediaCache.pin`. Defaults to False.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the path of the cached media file.
+        '''
+        with self._lock:
+            future = self._futures.get(url)
+            if future is None:
+                context = contextvars.copy_context()
+                future = self._futures[url] = self._executor.submit(context.run, self._fetch, url, pin)
+            return future
+
+    def _fetch(self, url, pin):
+        path = self.cache.fetch(url)
+        if pin: self.cache.pin(path)
+        return path
+
+    def iter_fetched(self, sources, unpin: bool = True):
+        '''
+        Yield each source with its local path, downloading the next `ahead` remote sources meanwhile.
+
+        Local sources are yielded as they are. A failed download yields the
+        exception in place of the path. Downloaded entries are pinned until
+        the next source is requested, so prefetching never evicts them.
+
+        Args:
+            sources (Iterable[str]): The sources.
+            unpin (bool, optional): Whether to unpin each download when the next source is requested. Use
+                False to keep the yielded downloads pinned until the caller unpins them with
+                `cache.unpin(path)`. Defaults to True.
+
+        Yields:
+            tuple[str, str | Exception]: (source, path)
+        '''
+        sources = list(sources)
+        remote = [is_remote(source) for source in sources]
+        # Prefetched with a pin and not yielded yet.
+        pinned = {}
+        try:
+            for i, source in enumerate(sources):
+                for j in range(i, min(i + self.ahead + 1, len(sources))):
+                    if remote[j] and sources[j] not in pinned:
+                        pinned[sources[j]] = self.prefetch(sources[j], pin=True)
+                if not remote[i]:
+                    yield source, source
+                    continue
+                future = pinned.pop(source)
+                with self._lock:
+                    self._futures.pop(source, None)
+                try:
+                    path = future.result()
+                except Exception as e:
+                    yield source, e
+                    continue
+                try:
+                    yield source, path
+                finally:
+                    if unpin: self.cache.unpin(path)
+        finally:
+            for source, future in pinned.items():
+                with self._lock:
+                    self._futures.pop(source, None)
+                if not future.cancel():
+                    future.add_done_callback(self._release)
+
+    def _release(self, future):
+        if future.exception() is None:
+            self.cache.unpin(future.result())
+
+    def shutdown(self, wait: bool = True):
+        '''
+        Stop the downloads that have not started.
+        '''
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
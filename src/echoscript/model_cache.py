@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+
+def _env_budget():
+    '''
+    Read the model cache budget from `ECHOSCRIPT_MODEL_CACHE_MB`.
+
+    Returns:
+        int | None: The budget in bytes, or None for no limit.
+    '''
+    value = os.environ.get('ECHOSCRIPT_MODEL_CACHE_MB')
+    if not value:
+        return None
+    return int(float(value) * 1024 * 1024)
+
+
+def model_nbytes(model) -> int:
+    '''
+    Estimate the memory footprint of a torch module.
+
+    Args:
+        model (torch.nn.Module): The model to measure.
+
+    Returns:
+        int: The number of bytes held by the parameters and buffers of the model.
+    '''
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        # quantized layers keep their packed weights outside the parameters
+        if callable(getattr(module, 'weight', None)):
+            tensors += [t for t in (module.weight(), module.bias()) if t is not None]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelCache:
+    '''
+    A thread-safe LRU cache of loaded models with a memory budget.
+
+    Models are keyed on an arbitrary hashable key, usually
+    `(model_name, device, dtype)`. When the total size of the cached models
+    exceeds `max_bytes`, the least recently used models are evicted. The most
+    recently used model is always kept, even if it alone exceeds the budget.
+    '''
+
+    def __init__(self, max_bytes: int = None, sizeof=model_nbytes):
+        '''
+        Args:
+            max_bytes (int, optional): The memory budget in bytes, use `None` for no limit. Defaults to None.
+            sizeof (callable, optional): A function returning the size of a model in bytes.
+        '''
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @property
+    def max_bytes(self):
+        '''
+        The memory budget in bytes, `None` means no limit.
+        '''
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        The total size of the cached models in bytes.
+        '''
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def keys(self):
+        '''
+        The cached keys, from least to most recently used.
+
+        Returns:
+            list: The cached keys.
+        '''
+        with self._lock:
+            return list(self._models)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._models
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+    def get(self, key, loader):
+        '''
+        Return the model cached under `key`, loading it with `loader` on a miss.
+
+        Concurrent calls for the same key load the model only once.
+
+        Args:
+            key (Hashable): The cache key.
+            loader (callable): A function without arguments that loads the model.
+
+        Returns:
+            The cached or newly loaded model.
+        '''
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                self._models.move_to_end(key)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self.hits += 1
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            try:
+                start = time.perf_counter()
+                model = loader()
+                elapsed = time.perf_counter() - start
+
+                with self._lock:
+                    self.misses += 1
+                    self.load_time += elapsed
+                    self._models[key] = model
+                    self._sizes[key] = self._sizeof(model)
+                    self._evict()
+            finally:
+                # Also after a failed load, so that the locks of failing keys do not accumulate.
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+            return model
+
+    def evict(self, key):
+        '''
+        Remove a model from the cache.
+
+        Args:
+            key (Hashable): The cache key.
+
+        Returns:
+            bool: True if the model was cached, False otherwise.
+        '''
+        with self._lock:
+            if key not in self._models:
+                return False
+            del self._models[key]
+            del self._sizes[key]
+            return True
+
+    def clear(self):
+        '''
+        Remove all models from the cache and reset the counters.
+        '''
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.load_time = 0.0
+
+    def stats(self) -> dict:
+        '''
+        Cache statistics.
+
+        Returns:
+            dict: hits, misses, evictions, total load time in seconds,
+                number of cached models, cached bytes and the budget.
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'load_time': self.load_time,
+                'models': len(self._models),
+                'nbytes': sum(self._sizes.values()),
+                'max_bytes': self._max_bytes,
+            }
+
+    def _evict(self):
+        if self._max_bytes is None:
+            return
+        while len(self._models) > 1 and sum(self._sizes.values()) > self._max_bytes:
+            key, _ = self._models.popitem(last=False)
+            del self._sizes[key]
+            self.evictions += 1
+
+
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+
+def get_model_cache() -> ModelCache:
+    '''
+    Return the process-wide model cache.
+
+    The budget is read from `ECHOSCRIPT_MODEL_CACHE_MB` on first use and can
+    be changed later through `ModelCache.max_bytes`.
+
+    Returns:
+        ModelCache: The shared model cache.
+    '''
+    global _model_cache
+    with _model_cache_lock:
+        if _model_cache is None:
+            _model_cache = ModelCache(max_bytes=_env_budget())
+    return _model_cache
@@ -0,0 +1,266 @@
+import queue
+import threading
+import time
+
+
+class Cancelled(Exception):
+    '''
+    Raised by the blocking operations of a cancelled `Pipeline`.
+    '''
+
+
+class Stage:
+    '''
+    A stage of a `Pipeline`: a function applied to each item by `workers` threads.
+    '''
+
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = 2):
+        '''
+        Args:
+            name (str): The stage name, used in `Pipeline.stats`.
+            fn (callable): Called with the output of the previous stage, or with the input item for the first stage.
+            workers (int, optional): The number of threads running the stage. Defaults to 1.
+            queue_size (int, optional): The capacity of the input queue of the stage. Defaults to 2.
+        '''
+        if workers < 1 or queue_size < 1:
+            raise ValueError('A stage needs at least one worker and a queue size of at least one.')
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class _Metrics:
+    '''
+    The counters of one stage, updated under the pipeline lock.
+    '''
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.depth_max = 0
+        self.depth_sum = 0
+        self.depth_samples = 0
+
+
+class Pipeline:
+    '''
+    Run items through stages connected by bounded queues, each stage on its own threads.
+
+    While one item is in the inference stage, the next ones are fetched and
+    decoded, so I/O and CPU work overlap with inference. A full queue blocks
+    the stage feeding it (backpressure), so at most `queue_size` items wait
+    before each stage and memory stays bounded. An item whose stage raises
+    skips the remaining stages and is reported with the exception.
+
+    `stats` reports per stage the items processed, the busy time, the time
+    the workers waited for input (`starved`) and the depth of the input queue,
+    e.g. a starved inference stage with empty input queues means decoding is
+    the bottleneck.
+
+    Example:
+        >>> pipeline = Pipeline([
+        ...     Stage('fetch', fetch, workers=4),
+        ...     Stage('decode', decode, workers=2),
+        ...     Stage('infer', infer),
+        ...     Stage('write', write),
+        ... ])
+        >>> for item, value, error in pipeline.run(sources):
+        ...     print(item, error or value)
+    '''
+
+    _DONE = object()
+
+    def __init__(self, stages, poll: float = 0.1):
+        '''
+        Args:
+            stages (list[Stage]): The stages, in order.
+            poll (float, optional): How often blocked threads check for cancellation, in seconds. Defaults to 0.1.
+        '''
+        if not stages:
+            raise ValueError('A pipeline needs at least one stage.')
+        self.stages = list(stages)
+        self.poll = poll
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._queues = []
+        self._metrics = {}
+        self._threads = []
+        self._error = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        '''
+        Stop the pipeline: items not yet processed are dropped and `run` returns.
+        '''
+        self._cancelled.set()
+
+    def run(self, items, ordered: bool = True):
+        '''
+        Run items through the stages.
+
+        Closing the generator early cancels the pipeline.
+
+        Args:
+            items (Iterable): The input items, consumed lazily as the first queue has room.
+            ordered (bool, optional): Whether to yield the results in input order, else as they complete.
+                Defaults to True.
+
+        Yields:
+            tuple: (item, value, error), where value is the output of the last stage, or on failure the
+                last value before the failing stage and error the exception it raised.
+
+        Raises:
+            Exception: The exception raised by `items`, which cancels the run.
+        '''
+        self._cancelled.clear()
+        self._error = None
+        self._queues = [queue.Queue(stage.queue_size) for stage in self.stages] + [queue.Queue()]
+        self._metrics = {stage.name: _Metrics(stage.workers) for stage in self.stages}
+        remaining = [stage.workers for stage in self.stages]
+        self._threads = [threading.Thread(target=self._feed, args=(items,), name='echoscript-pipeline-feed',
+                                          daemon=True)]
+        for i, stage in enumerate(self.stages):
+            self._threads.extend(
+                threading.Thread(target=self._work, args=(i, remaining), daemon=True,
+                                 name=f'echoscript-pipeline-{stage.name}-{n}')
+                for n in range(stage.workers)
+            )
+        for thread in self._threads:
+            thread.start()
+
+        pending, next_index = {}, 0
+        try:
+            while True:
+                try:
+                    message = self._get(self._queues[-1])
+                except Cancelled:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                if message is self._DONE:
+                    break
+                index, item, value, error = message
+                if not ordered:
+                    yield item, value, error
+                    continue
+                pending[index] = (item, value, error)
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+            for index in sorted(pending):
+                yield pending[index]
+        finally:
+            self.cancel()
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self) -> dict:
+        '''
+        Per-stage statistics of the current or last run.
+
+        Returns:
+            dict[str, dict]: By stage name, the `workers`, the items `processed` and `failed`, the `busy`
+                and `starved` (waiting for input) seconds summed over the workers, and the current,
+                maximum and mean depth of the input queue (`queue_depth`, `max_queue_depth`, `mean_queue_depth`).
+        '''
+        with self._lock:
+            return {
+                stage.name: {
+                    'workers': metrics.workers,
+                    'processed': metrics.processed,
+                    'failed': metrics.failed,
+                    'busy': metrics.busy,
+                    'starved': metrics.starved,
+                    'queue_depth': self._queues[i].qsize() if self._queues else 0,
+                    'max_queue_depth': metrics.depth_max,
+                    'mean_queue_depth': metrics.depth_sum / metrics.depth_samples if metrics.depth_samples else 0.0,
+                }
+                for i, (stage, metrics) in enumerate(zip(self.stages, self._metrics.values()))
+            }
+
+    def _get(self, q):
+        while True:
+            if self._cancelled.is_set():
+                raise Cancelled
+            try:
+                return q.get(timeout=self.poll)
+            except queue.Empty:
+                pass
+
+    def _put(self, i, message):
+        '''
+        Put a message into the input queue of stage `i`, blocking while it is full.
+        '''
+        q = self._queues[i]
+        while True:
+            if self._cancelled.is_set():
+                raise Cancelled
+            try:
+                q.put(message, timeout=self.poll)
+                break
+            except queue.Full:
+                pass
+        if i < len(self.stages) and message is not self._DONE:
+            depth = q.qsize()
+            with self._lock:
+                metrics = self._metrics[self.stages[i].name]
+                metrics.depth_max = max(metrics.depth_max, depth)
+                metrics.depth_sum += depth
+                metrics.depth_samples += 1
+
+    def _feed(self, items):
+        try:
+            for index, item in enumerate(items):
+                self._put(0, (index, item, item, None))
+            for _ in range(self.stages[0].workers):
+                self._put(0, self._DONE)
+        except Cancelled:
+            pass
+        except BaseException as e:
+            # A failing input iterator ends the run, `run` raises its exception.
+            self._error = e
+            self.cancel()
+
+    def _work(self, i, remaining):
+        stage = self.stages[i]
+        metrics = self._metrics[stage.name]
+        try:
+            while True:
+                start = time.perf_counter()
+                message = self._get(self._queues[i])
+                waited = time.perf_counter() - start
+                if message is self._DONE:
+                    break
+                index, item, value, error = message
+                with self._lock:
+                    metrics.starved += waited
+                if error is None:
+                    start = time.perf_counter()
+                    try:
+                        value = stage.fn(value)
+                    except Exception as e:
+                        error = e
+                    busy = time.perf_counter() - start
+                    with self._lock:
+                        metrics.busy += busy
+                        metrics.processed += error is None
+                        metrics.failed += error is not None
+                self._put(i + 1, (index, item, value, error))
+
+            with self._lock:
+                remaining[i] -= 1
+                last = remaining[i] == 0
+            if last:
+                # The last worker of a stage passes the end of the input on to the next stage.
+                workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+                for _ in range(workers):
+                    self._put(i + 1, self._DONE)
+        except Cancelled:
+            pass
@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.batch import transcribe_file
+
+
+def _init_worker(threads, model_name, preload):
+    '''
+    Initialize a worker process: pin its torch thread count and warm its model cache.
+    '''
+    torch.set_num_threads(threads)
+    if preload:
+        Audio2Text.load_whisper_model(model_name)
+
+
+def _transcribe(audio, model_name, fmt, language, kwargs):
+    '''
+    Transcribe one input inside a worker process.
+
+    Returns:
+        tuple[str | dict, float]: The transcript and the audio duration in seconds.
+    '''
+    return transcribe_file(audio, model_name, fmt, language, **kwargs)
+
+
+def _cost(audio):
+    '''
+    Estimate the relative cost of an input, used to start the longest jobs first.
+    '''
+    if isinstance(audio, str):
+        try:
+            return os.path.getsize(audio)
+        except OSError:
+            return 0
+    return len(audio)
+
+
+class TranscriptionPool:
+    '''
+    A pool of worker processes, each holding its own cached Whisper model.
+
+    Inputs are queued longest first and idle workers pull the next input from
+    a shared queue, so one long file does not hold up the others. Results are
+    returned in the original order.
+
+    Example:
+        >>> with TranscriptionPool(workers=4, model_name='base') as pool:
+        ...     texts = pool.map(['a.mp3', 'b.mp3'], fmt='srt')
+    '''
+
+    def __init__(self,
+                 workers: int = None,
+                 threads_per_worker: int = None,
+                 model_name: str = 'base',
+                 preload: bool = True,
+                 mp_context: str = 'spawn'):
+        '''
+        Args:
+            workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+            threads_per_worker (int, optional): The torch thread count of each worker. Defaults to an equal share of the CPUs.
+            model_name (str, optional): The Whisper model to preload in each worker. Defaults to 'base'.
+            preload (bool, optional): Whether to load the model when a worker starts. Defaults to True.
+            mp_context (str, optional): The multiprocessing start method. Defaults to 'spawn'.
+        '''
+        cpus = os.cpu_count() or 1
+        self.workers = workers or cpus
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.workers)
+        self.model_name = model_name
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(mp_context),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, model_name, preload),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Shut down the worker processes.
+        '''
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, audio, fmt=None, language=None, model_name=None, **kwargs):
+        '''
+        Queue one input for transcription.
+
+        Args:
+            audio (str | ndarray): The audio to transcribe, a file path or a waveform.
+            fmt (str, optional): The output format. Defaults to None.
+            language (str, optional): The language of the audio. Defaults to None.
+            model_name (str, optional): The Whisper model to use. Defaults to the pool model.
+            **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+        Returns:
+            concurrent.futures.Future: A future of (transcript, audio duration in seconds).
+        '''
+        model_name = model_name or self.model_name
+        return self._executor.submit(_transcribe, audio, model_name, fmt, language, kwargs)
+
+    def imap_unordered(self, audios, fmt=None, language=None, **kwargs):
+        '''
+        Transcribe many inputs, yielding results as they complete.
+
+        Args:
+            audios (Iterable[str | ndarray]): The audio inputs.
+            fmt (str, optional): The output format. Defaults to None.
+            language (str, optional): The language of the audio. Defaults to None.
+            **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+        Yields:
+            tuple[int, str | dict, float, Exception]: (input index, transcript,
+                audio duration in seconds, error). On failure the transcript and
+                duration are None and error holds the exception.
+        '''
+        audios = list(audios)
+        order = sorted(range(len(audios)), key=lambda i: _cost(audios[i]), reverse=True)
+        futures = {
+            self.submit(audios[i], fmt, language, **kwargs): i
+            for i in order
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                text, duration = future.result()
+            except Exception as e:
+                yield index, None, None, e
+            else:
+                yield index, text, duration, None
+
+    def map(self, audios, fmt=None, language=None, **kwargs) -> list:
+        '''
+        Transcribe many inputs and return the transcripts in the original order.
+
+        Args:
+            audios (Iterable[str | ndarray]): The audio inputs.
+            fmt (str, optional): The output format. Defaults to None.
+            language (str, optional): The language of the audio. Defaults to None.
+            **kwargs: Additional keyword arguments to pass to `Audio2Text.transcribe`.
+
+        Returns:
+            list[str | dict]: The transcripts.
+        '''
+        audios = list(audios)
+        results = [None] * len(audios)
+        for index, text, _, error in self.imap_unordered(audios, fmt, language, **kwargs):
+            if error is not None:
+                raise error
+            results[index] = text
+        return results
@@ -0,0 +1,172 @@
+import dataclasses
+import os
+import warnings
+
+import torch
+import whisper
+
+from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+from torch.ao.quantization import per_channel_dynamic_qconfig
+from whisper.model import Linear, ModelDimensions
+
+from echoscript.utils import get_echoscript_home
+from echoscript.weights import empty_model
+
+
+def quantize_linear(linear) -> DynamicLinear:
+    '''
+    Convert a linear layer to a dynamically quantized int8 linear layer.
+
+    The weights are quantized per output channel once, the activations are
+    quantized on the fly at each call.
+
+    Args:
+        linear (torch.nn.Linear): The linear layer.
+
+    Returns:
+        torch.ao.nn.quantized.dynamic.Linear: The quantized layer.
+    '''
+    weight = linear.weight.detach().float()
+    observer = per_channel_dynamic_qconfig.weight()
+    observer(weight)
+    scales, zero_points = observer.calculate_qparams()
+    qweight = torch.quantize_per_channel(weight, scales.double(), zero_points.long(), 0, torch.qint8)
+    bias = None if linear.bias is None else linear.bias.detach().float()
+    quantized = DynamicLinear(linear.in_features, linear.out_features, bias_=bias is not None, dtype=torch.qint8)
+    quantized.set_weight_bias(qweight, bias)
+    return quantized
+
+
+def quantize_model(model):
+    '''
+    Apply dynamic int8 quantization to the linear layers of a Whisper model, in place.
+
+    `torch.ao.quantization.quantize_dynamic` only converts exact `nn.Linear`
+    instances, while Whisper uses its own subclass, so the layers are swapped
+    here. The convolutions, embeddings and the output projection (which is
+    tied to the token embedding) stay in fp32.
+
+    Args:
+        model (whisper.Whisper): The fp32 model on the CPU.
+
+    Returns:
+        whisper.Whisper: The quantized model.
+    '''
+    with warnings.catch_warnings():
+        # torch deprecates its quantized tensors in favour of torchao, which is not a dependency
+        warnings.simplefilter('ignore', UserWarning)
+        for module in list(model.modules()):
+            for name, child in list(module.named_children()):
+                if isinstance(child, Linear):
+                    setattr(module, name, quantize_linear(child))
+    return model.eval()
+
+
+def save_quantized_model(model, path: str):
+    '''
+    Save a quantized model for `read_quantized_model`.
+
+    The file holds the model dimensions, the state dict and the buffers that
+    are not part of it, such as the alignment heads, so it can be read with
+    `torch.load(weights_only=True)`, which unpickles no code.
+
+    Args:
+        model (whisper.Whisper): The model returned by `quantize_model`.
+        path (str): The output file.
+    '''
+    state_dict = model.state_dict()
+    buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+    torch.save({'dims': dataclasses.asdict(model.dims), 'state_dict': state_dict, 'buffers': buffers}, path)
+
+
+def read_quantized_model(path: str):
+    '''
+    Read a model saved by `save_quantized_model`.
+
+    The model is built on the meta device, see `echoscript.weights.empty_model`,
+    and its linear layers are swapped for int8 ones before the saved tensors
+    are assigned, so the fp32 weights are never allocated or initialized.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        whisper.Whisper: The quantized model on the CPU.
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        checkpoint = torch.load(path, map_location='cpu', weights_only=True)
+    model = empty_model(ModelDimensions(**checkpoint['dims']))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for module in list(model.modules()):
+            for name, child in list(module.named_children()):
+                if isinstance(child, Linear):
+                    setattr(module, name, DynamicLinear(child.in_features, child.out_features,
+                                                        bias_=child.bias is not None, dtype=torch.qint8))
+        model.load_state_dict(checkpoint['state_dict'], assign=True)
+    for name, buffer in checkpoint['buffers'].items():
+        module, _, name = name.rpartition('.')
+        model.get_submodule(module).register_buffer(name, buffer, persistent=False)
+    return model.eval()
+
+
+def quantized_path(model_name: str, scheme: str = 'int8') -> str:
+    '''
+    The path of the cached quantized model.
+
+    The file holds the state dict of the quantized model, whose layout depends
+    on the whisper and torch versions that wrote it, both of which are part
+    of the name.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        scheme (str, optional): The quantization scheme. Defaults to 'int8'.
+
+    Returns:
+        str: The path under `$ECHOSCRIPT_HOME/models`.
+    '''
+    version = f'whisper-{whisper.__version__}-torch-{torch.__version__}'.replace('+', '_')
+    return os.path.join(get_echoscript_home(), 'models', f'{model_name}-{scheme}-{version}.pt')
+
+
+def load_quantized_model(model_name: str, scheme: str = 'int8', cache: bool = True):
+    '''
+    Load an int8 quantized Whisper model on the CPU.
+
+    The first load quantizes the fp32 model and saves the result, later loads
+    read the quantized weights directly, skipping the fp32 weights and the
+    quantization step.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        scheme (str, optional): The quantization scheme, only `int8` is supported. Defaults to 'int8'.
+        cache (bool, optional): Whether to read and write the quantized model on disk. Defaults to True.
+
+    Returns:
+        whisper.Whisper: The quantized model.
+    '''
+    if scheme != 'int8':
+        raise ValueError(f'Quantization `{scheme}` is not supported.')
+
+    path = quantized_path(model_name, scheme)
+    if cache and os.path.exists(path):
+        try:
+            return read_quantized_model(path)
+        except Exception as e:
+            warnings.warn(f'Failed to read the quantized model {path}, quantizing again: {e}')
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        model = whisper.load_model(model_name, device='cpu')
+    model = quantize_model(model)
+
+    if cache:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            save_quantized_model(model, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            warnings.warn(f'Failed to write the quantized model: {e}')
+    return model
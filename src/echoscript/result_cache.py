@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from echoscript.utils import get_echoscript_home
+
+
+# Eviction trims the cache to this fraction of its budget, so that a full cache is not scanned on every write.
+EVICT_TO = 0.9
+# The size of the cache is tracked between scans, and rescanned after this many writes to count the
+# entries written by other processes.
+RESCAN_WRITES = 256
+
+_result_caches = {}
+_result_caches_lock = threading.Lock()
+
+
+def _env_budget():
+    '''
+    Read the result cache budget from `ECHOSCRIPT_RESULT_CACHE_MB`.
+
+    Returns:
+        int: The budget in bytes, 1 GiB by default.
+    '''
+    value = os.environ.get('ECHOSCRIPT_RESULT_CACHE_MB')
+    return int(float(value or 1024) * 1024 * 1024)
+
+
+def hash_audio(audio, chunk_size: int = 1 << 20) -> str:
+    '''
+    Compute a content hash of an audio input.
+
+    Args:
+        audio (str | bytes | ndarray | Tensor): A file path, raw bytes or a waveform.
+        chunk_size (int, optional): The read size used when hashing files. Defaults to 1 MiB.
+
+    Returns:
+        str: The hex SHA-256 digest of the audio content.
+    '''
+    digest = hashlib.sha256()
+    if isinstance(audio, str):
+        with open(audio, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    elif isinstance(audio, (bytes, bytearray, memoryview)):
+        digest.update(audio)
+    else:
+        import numpy as np
+
+        if hasattr(audio, 'numpy'):
+            audio = audio.detach().cpu().numpy()
+        audio = np.ascontiguousarray(audio)
+        digest.update(f'{audio.dtype.str}{audio.shape}'.encode())
+        digest.update(audio.data)
+    return digest.hexdigest()
+
+
+def cache_key(audio_hash: str, **options) -> str:
+    '''
+    Build the cache key of a transcription.
+
+    Args:
+        audio_hash (str): The content hash of the audio, see `hash_audio`.
+        **options: The model name, language, prompt and decode options of the transcription.
+
+    Returns:
+        str: The hex SHA-256 digest of the audio hash and the options.
+    '''
+    payload = json.dumps({'audio': audio_hash, **options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    '''
+    A content-addressed on-disk cache of raw transcription results.
+
+    Each result is stored as a JSON file named after its key. Writes go to a
+    temporary file that is atomically renamed into place, so concurrent
+    processes never observe partial entries. Reads refresh the modification
+    time of an entry, and the least recently used entries are evicted when the
+    total size exceeds `max_bytes`. Writes keep a running estimate of the total
+    size, so the cache directory is only scanned when the estimate exceeds the
+    budget or every `RESCAN_WRITES` writes.
+    '''
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        '''
+        Args:
+            root (str, optional): The cache directory. Defaults to `$ECHOSCRIPT_HOME/cache/results`.
+            max_bytes (int, optional): The size budget in bytes. Defaults to `$ECHOSCRIPT_RESULT_CACHE_MB` or 1 GiB.
+        '''
+        self.root = root or os.path.join(get_echoscript_home(), 'cache', 'results')
+        self.max_bytes = _env_budget() if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._nbytes = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        '''
+        The file path of a cache entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The path of the entry.
+        '''
+        return os.path.join(self.root, key[:2], f'{key}.json')
+
+    def get(self, key: str):
+        '''
+        Read a cached result.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict | None: The cached result, or None on a miss.
+        '''
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: dict):
+        '''
+        Store a result atomically and evict old entries if over budget.
+
+        Args:
+            key (str): The cache key.
+            result (dict): The raw transcription result.
+        '''
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        written = os.path.getsize(path)
+        with self._lock:
+            self._writes += 1
+            if self._nbytes is None or self._writes % RESCAN_WRITES == 0:
+                self._nbytes = sum(size for _, size, _ in self.entries())
+            else:
+                self._nbytes += written - previous
+            if self._nbytes > self.max_bytes:
+                self.evict(int(self.max_bytes * EVICT_TO))
+
+    def entries(self) -> list:
+        '''
+        List the cache entries.
+
+        Returns:
+            list[tuple[str, int, float]]: (path, size in bytes, mtime) of each entry.
+        '''
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, max_bytes: int = None):
+        '''
+        Remove least recently used entries until the cache fits its budget.
+
+        Args:
+            max_bytes (int, optional): The size to trim the cache to. Defaults to `max_bytes` of the cache.
+
+        Returns:
+            int: The number of removed entries.
+        '''
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._nbytes = total
+        return removed
+
+    def clear(self) -> int:
+        '''
+        Remove all entries.
+
+        Returns:
+            int: The number of removed entries.
+        '''
+        removed = 0
+        for path, _, _ in self.entries():
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        self._nbytes = None
+        return removed
+
+    def stats(self) -> dict:
+        '''
+        Cache statistics.
+
+        Returns:
+            dict: The cache directory, number of entries, total and maximum
+                size in bytes, and the hits/misses of this instance.
+        '''
+        entries = self.entries()
+        return {
+            'root': self.root,
+            'entries': len(entries),
+            'nbytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def get_result_cache(root: str = None) -> ResultCache:
+    '''
+    Return the process-wide result cache of a directory.
+
+    Transcriptions share one instance per cache directory, so its running size
+    estimate survives between jobs and the directory is not scanned on every
+    first write. The budget is read from `ECHOSCRIPT_RESULT_CACHE_MB` on first
+    use and can be changed later through `ResultCache.max_bytes`.
+
+    Args:
+        root (str, optional): The cache directory. Defaults to `$ECHOSCRIPT_HOME/cache/results`.
+
+    Returns:
+        ResultCache: The shared result cache.
+    '''
+    root = root or os.path.join(get_echoscript_home(), 'cache', 'results')
+    with _result_caches_lock:
+        if root not in _result_caches:
+            _result_caches[root] = ResultCache(root)
+        return _result_caches[root]
@@ -0,0 +1,260 @@
+import contextvars
+import itertools
+import threading
+import time
+
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+from echoscript import tracing
+from echoscript.audio2text import Audio2Text, loaded_models
+
+
+class QueueFull(Exception):
+    '''
+    Raised when a job is submitted to a scheduler whose queue is full.
+    '''
+
+
+def transcribe_job(audio, model_name, fmt=None, language=None, replica=0, **kwargs):
+    '''
+    The default job runner: transcribe with the given replica of the cached model.
+    '''
+    return Audio2Text().transcribe(audio, model_name, fmt, language, replica=replica, **kwargs)
+
+
+class Job:
+    '''
+    A transcription job queued in a `Scheduler`.
+
+    Attributes:
+        id (int): The job id, unique within the scheduler.
+        model_name (str): The Whisper model the job runs on.
+        status (str): One of `queued`, `running`, `done` or `failed`.
+        future (concurrent.futures.Future): Resolves to the transcription result.
+        submitted, started, finished (float): `time.monotonic()` timestamps, None until reached.
+        trace (echoscript.tracing.Trace): The trace active when the job was submitted, if any.
+    '''
+
+    def __init__(self, id, model_name, args, kwargs):
+        self.id = id
+        self.model_name = model_name
+        self.args = args
+        self.kwargs = kwargs
+        self.status = 'queued'
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.replica = None
+        # The job runs in a copy of the submitting context, so it records into the submitter's trace.
+        self.context = contextvars.copy_context()
+        self.trace = tracing.current()
+
+    def result(self, timeout=None):
+        '''
+        Wait for the job and return its result, raising the job's exception on failure.
+        '''
+        return self.future.result(timeout)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+class Scheduler:
+    '''
+    A bounded job queue served by worker threads, grouping jobs by model.
+
+    Each worker prefers jobs for the model it ran last, then jobs for any
+    model already loaded in the model cache, then the oldest job, so a loaded
+    model serves a series of requests before another one is loaded. A job
+    that has waited longer than `max_wait` seconds is served first regardless.
+    At most `model_concurrency` jobs run on the same model at once, each on
+    its own replica of the model, since one model instance must not decode
+    two inputs concurrently.
+
+    Example:
+        >>> scheduler = Scheduler(max_queue=16, workers=2)
+        >>> job = scheduler.submit('audio.mp3', model_name='base', fmt='srt')
+        >>> scheduler.position(job), scheduler.eta(job)
+        >>> text = job.result()
+    '''
+
+    def __init__(self,
+                 max_queue: int = 32,
+                 workers: int = 1,
+                 model_concurrency: int = 1,
+                 max_wait: float = 60.0,
+                 runner=transcribe_job):
+        '''
+        Args:
+            max_queue (int, optional): The maximum number of queued jobs. Defaults to 32.
+            workers (int, optional): The number of worker threads. Defaults to 1.
+            model_concurrency (int, optional): The maximum number of concurrent jobs per model. Defaults to 1.
+            max_wait (float, optional): The queueing time in seconds after which a job is served first. Defaults to 60.
+            runner (callable, optional): Called as `runner(*args, replica=replica, **kwargs)` to run a job.
+        '''
+        self.max_queue = max_queue
+        self.workers = workers
+        self.model_concurrency = model_concurrency
+        self.max_wait = max_wait
+        self.runner = runner
+        self._queue = deque()
+        self._running = defaultdict(set)
+        self._durations = {}
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f'echoscript-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, audio, model_name: str = 'base', fmt: str = None, language: str = None, **kwargs) -> Job:
+        '''
+        Queue a transcription job.
+
+        Args:
+            audio (str | ndarray | bytes): The audio to transcribe.
+            model_name (str, optional): The name of the Whisper model to use. Defaults to 'base'.
+            fmt (str, optional): The output format. Defaults to None.
+            language (str, optional): The language of the audio. Defaults to None.
+            **kwargs: Additional keyword arguments to pass to the runner.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFull: If `max_queue` jobs are already waiting.
+        '''
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Scheduler is shut down.')
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(f'The queue is full ({self.max_queue} jobs).')
+            job = Job(next(self._ids), model_name, (audio, model_name, fmt, language), kwargs)
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job
+
+    def position(self, job: Job) -> int:
+        '''
+        The 1-based position of a job in the queue, 0 once it has started.
+        '''
+        with self._cond:
+            try:
+                return self._queue.index(job) + 1
+            except ValueError:
+                return 0
+
+    def eta(self, job: Job):
+        '''
+        Estimate the seconds until a job finishes from the recent duration of jobs per model.
+
+        Returns:
+            float | None: The estimate, or None before any job has finished.
+        '''
+        with self._cond:
+            durations = list(self._durations.values())
+            if job.done():
+                return 0.0
+            if not durations:
+                return None
+            own = self._durations.get(job.model_name, sum(durations) / len(durations))
+            if job.status == 'running':
+                return max(own - (time.monotonic() - job.started), 0.0)
+            if job not in self._queue:
+                return None
+            ahead = itertools.islice(self._queue, self._queue.index(job))
+            waiting = sum(self._durations.get(j.model_name, own) for j in ahead)
+            return waiting / self.workers + own
+
+    def stats(self) -> dict:
+        '''
+        Scheduler statistics: queued jobs, running jobs per model and the mean job duration per model.
+        '''
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'running': {model: len(jobs) for model, jobs in self._running.items() if jobs},
+                'durations': dict(self._durations),
+            }
+
+    def shutdown(self, wait: bool = True):
+        '''
+        Stop the workers, cancelling jobs that have not started.
+        '''
+        with self._cond:
+            self._closed = True
+            while self._queue:
+                self._queue.popleft().future.cancel()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_job(self, last_model):
+        '''
+        Pick the next job to run, must be called with the lock held.
+        '''
+        candidates = [
+            job for job in self._queue
+            if len(self._running[job.model_name]) < self.model_concurrency
+        ]
+        if not candidates:
+            return None
+
+        oldest = candidates[0]
+        if time.monotonic() - oldest.submitted > self.max_wait:
+            return oldest
+
+        loaded = set(loaded_models())
+        return (
+            next((job for job in candidates if job.model_name == last_model), None)
+            or next((job for job in candidates if job.model_name in loaded), None)
+            or oldest
+        )
+
+    def _work(self):
+        last_model = None
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if self._closed:
+                        return
+                    job = self._next_job(last_model)
+                    if job is None:
+                        self._cond.wait()
+
+                self._queue.remove(job)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                replicas = {j.replica for j in self._running[job.model_name]}
+                job.replica = min(set(range(self.model_concurrency)) - replicas)
+                self._running[job.model_name].add(job)
+                job.status = 'running'
+                job.started = time.monotonic()
+
+            if job.trace is not None:
+                job.trace.add('queue', job.started - job.submitted)
+                job.trace.set(replica=job.replica)
+            try:
+                result = job.context.run(self.runner, *job.args, replica=job.replica, **job.kwargs)
+            except BaseException as e:
+                job.status = 'failed'
+                job.future.set_exception(e)
+            else:
+                job.status = 'done'
+                job.future.set_result(result)
+
+            with self._cond:
+                job.finished = time.monotonic()
+                duration = job.finished - job.started
+                previous = self._durations.get(job.model_name)
+                self._durations[job.model_name] = duration if previous is None else 0.7 * previous + 0.3 * duration
+                self._running[job.model_name].discard(job)
+                last_model = job.model_name
+                self._cond.notify_all()
@@ -0,0 +1,266 @@
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from echoscript.columnar import EXTENSION, ColumnarTranscript, pack_strings, read_arrays, unpack_strings, write_arrays
+from echoscript.utils import get_echoscript_home
+
+
+TRANSCRIPT_EXTENSIONS = ('.json', EXTENSION)
+
+# Scripts written without spaces between words, each of their characters is a term.
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TERM = re.compile(f'[{_CJK}]|[^\\W{_CJK}]+')
+
+
+def default_index_path() -> str:
+    '''
+    The default search index file, `$ECHOSCRIPT_HOME/search.idx`.
+    '''
+    return os.path.join(get_echoscript_home(), 'search.idx')
+
+
+def tokenize(text: str) -> list:
+    '''
+    Split a text into lowercase search terms: words, and single characters of Chinese and Japanese.
+    '''
+    return _TERM.findall(text.casefold())
+
+
+def term_hash(term: str) -> int:
+    '''
+    The 64-bit hash a term is stored under in the index.
+    '''
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def collect_transcripts(sources) -> list:
+    '''
+    Expand directories and glob patterns into transcript paths.
+
+    Args:
+        sources (Iterable[str]): Directories (searched recursively for `.json` results and `.ects` columnar
+            transcripts), transcript files or glob patterns.
+
+    Returns:
+        list[str]: The transcript paths, in order and without duplicates.
+    '''
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, names in os.walk(source):
+                dirs.sort()
+                files.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if os.path.splitext(name)[1].lower() in TRANSCRIPT_EXTENSIONS
+                )
+        elif os.path.isfile(source):
+            files.append(source)
+        else:
+            files.extend(sorted(glob.glob(source, recursive=True)))
+    return list(dict.fromkeys(files))
+
+
+def read_segments(path: str):
+    '''
+    Read the segment times and texts of a `json` result or a columnar transcript.
+
+    Returns:
+        tuple[list[float], list[float], list[str]] | None: The starts, ends and texts of the segments,
+            or None if the file cannot be read or is not a transcript.
+    '''
+    try:
+        if path.endswith(EXTENSION):
+            transcript = ColumnarTranscript.load(path)
+            return transcript.start.tolist(), transcript.end.tolist(), transcript.texts()
+        with open(path, encoding='utf-8') as f:
+            result = json.load(f)
+        segments = result['segments']
+        return ([segment['start'] for segment in segments], [segment['end'] for segment in segments],
+                [segment['text'] for segment in segments])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+class SearchIndex:
+    '''
+    An inverted index of the segments of a transcript archive, for phrase search.
+
+    The index is one memory-mapped file with a segment table, the files with
+    their segment ranges, and the segment `start` and `end` times and texts,
+    stored the same way as `echoscript.columnar.ColumnarTranscript`. It also
+    holds the postings: the sorted 64-bit hashes of the terms, see
+    `tokenize`, and for each term the sorted ids of the segments that contain
+    it. A search looks up the terms of the phrase with a binary search and
+    intersects their postings. It then checks the phrase in the texts of the
+    remaining segments only, so no transcript is parsed. A phrase may run
+    into the next segment of the same file. Matches are reported at the start of
+    the segment they start in.
+
+    Example:
+        >>> SearchIndex.build(collect_transcripts(['archive/'])).save('archive.idx')
+        >>> SearchIndex.load('archive.idx').search('machine learning')
+        [{'file': 'archive/talk.json', 'start': 312.4, 'end': 318.0, 'text': ' about machine learning'}]
+    '''
+
+    KIND = 'search-index'
+
+    def __init__(self, columns: dict, meta: dict = None):
+        '''
+        Args:
+            columns (dict[str, ndarray]): The columns, see `build`.
+            meta (dict, optional): The paths that were `skipped` as they cannot be read or are not
+                transcripts. Defaults to None.
+        '''
+        self.columns = columns
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, paths) -> 'SearchIndex':
+        '''
+        Index transcripts.
+
+        Args:
+            paths (Iterable[str]): `json` results, e.g. written by `echoscript batch -f json`, or `.ects`
+                columnar transcripts. Files that cannot be read or are not transcripts are skipped.
+
+        Returns:
+            SearchIndex: The index.
+        '''
+        files, skipped, file_segments = [], [], [0]
+        starts, ends, texts = [], [], []
+        postings = {}
+        for path in paths:
+            segments = read_segments(path)
+            if segments is None:
+                skipped.append(path)
+                continue
+            for text in segments[2]:
+                segment_id = len(texts)
+                for term in set(tokenize(text)):
+                    postings.setdefault(term_hash(term), []).append(segment_id)
+                texts.append(text)
+            files.append(path)
+            starts.extend(segments[0])
+            ends.extend(segments[1])
+            file_segments.append(len(texts))
+        if len(texts) >= 2 ** 32:
+            raise ValueError('The index holds at most 2 ** 32 segments.')
+
+        terms = np.array(sorted(postings), dtype='<u8')
+        lists = [postings[term] for term in terms.tolist()]
+        posting_offsets = np.zeros(len(lists) + 1, dtype='<i8')
+        np.cumsum([len(segment_ids) for segment_ids in lists], out=posting_offsets[1:])
+        columns = {
+            'start': np.array(starts, dtype='<f8'),
+            'end': np.array(ends, dtype='<f8'),
+            'file_segments': np.array(file_segments, dtype='<i8'),
+            'terms': terms,
+            'posting_offsets': posting_offsets,
+            'postings': np.array([segment_id for segment_ids in lists for segment_id in segment_ids], dtype='<u4'),
+        }
+        columns['files'], columns['file_offsets'] = pack_strings(files)
+        columns['text'], columns['text_offsets'] = pack_strings(texts)
+        return cls(columns, {'skipped': skipped})
+
+    def save(self, path: str = None):
+        '''
+        Write the index to a binary file, see `load`. Defaults to `$ECHOSCRIPT_HOME/search.idx`.
+        '''
+        path = path or default_index_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        write_arrays(path, self.columns, self.KIND, self.meta)
+
+    @classmethod
+    def load(cls, path: str = None, mmap_mode: bool = True) -> 'SearchIndex':
+        '''
+        Load an index written by `save`, memory-mapped by default.
+
+        Args:
+            path (str, optional): The index file. Defaults to `$ECHOSCRIPT_HOME/search.idx`.
+            mmap_mode (bool, optional): Memory-map the file instead of reading it. Defaults to True.
+
+        Returns:
+            SearchIndex: The index.
+        '''
+        meta, columns = read_arrays(path or default_index_path(), cls.KIND, mmap_mode)
+        return cls(columns, meta)
+
+    @property
+    def n_files(self) -> int:
+        return len(self.columns['file_segments']) - 1
+
+    @property
+    def n_segments(self) -> int:
+        return len(self.columns['start'])
+
+    def postings(self, term: str):
+        '''
+        The sorted ids of the segments that contain a term.
+        '''
+        terms = self.columns['terms']
+        key = np.uint64(term_hash(term))
+        i = int(np.searchsorted(terms, key))
+        if i == len(terms) or terms[i] != key:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.columns['posting_offsets']
+        return self.columns['postings'][offsets[i]:offsets[i + 1]].astype(np.int64)
+
+    def search(self, phrase: str, limit: int = None) -> list:
+        '''
+        Find a phrase, ignoring case and punctuation.
+
+        Args:
+            phrase (str): The phrase.
+            limit (int, optional): The maximum number of matches. Defaults to None.
+
+        Returns:
+            list[dict]: The matches in archive order, with the transcript `file`, the `start` and `end`
+                of the segments the phrase is in, and their `text`.
+        '''
+        terms = tokenize(phrase)
+        if not terms:
+            return []
+        # The phrase starts in a segment with its first term, and each other term is in it or in the next segment.
+        candidates = self.postings(terms[0])
+        for segment_ids in sorted((self.postings(term) for term in set(terms[1:])), key=len):
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, np.union1d(segment_ids, segment_ids - 1), assume_unique=True)
+
+        query = f' {" ".join(terms)} '
+        file_segments = self.columns['file_segments']
+        files = np.searchsorted(file_segments, candidates, side='right') - 1
+        matches = []
+        for segment_id, file in zip(candidates.tolist(), files.tolist()):
+            last = min(segment_id + 1, int(file_segments[file + 1]) - 1)
+            texts = self._texts(segment_id, last + 1)
+            first = f' {" ".join(tokenize(texts[0]))}'
+            position = f'{first} {" ".join(tokenize("".join(texts[1:])))} '.find(query)
+            # The first match must start in this segment, matches in the next one are found from there.
+            if position < 0 or position >= len(first):
+                continue
+            stop = last if position + len(query) - 1 > len(first) else segment_id
+            matches.append({
+                'file': self.file(file),
+                'start': float(self.columns['start'][segment_id]),
+                'end': float(self.columns['end'][stop]),
+                'text': ''.join(texts[:stop - segment_id + 1]),
+            })
+            if limit is not None and len(matches) >= limit:
+                break
+        return matches
+
+    def file(self, i: int) -> str:
+        '''
+        The path of file `i`.
+        '''
+        return unpack_strings(self.columns['files'], self.columns['file_offsets'], i, i + 1)[0]
+
+    def _texts(self, start, stop):
+        return unpack_strings(self.columns['text'], self.columns['text_offsets'], start, stop)
@@ -0,0 +1,283 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+import whisper
+
+from whisper.decoding import DecodingOptions, DecodingTask
+
+from echoscript import tracing
+
+
+DRAFT_TOKENS = 4
+
+
+class SpeculativeStats:
+    '''
+    Token counts of speculative decoding, accumulated over windows.
+
+    Attributes:
+        drafted (int): The tokens proposed by the draft model.
+        accepted (int): The proposed tokens the main model agreed with.
+        tokens (int): The tokens decoded.
+        passes (int): The forward passes of the main model decoder.
+    '''
+
+    def __init__(self):
+        self.drafted = 0
+        self.accepted = 0
+        self.tokens = 0
+        self.passes = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def speedup(self) -> float:
+        '''
+        The tokens decoded per main model pass, 1 for plain greedy decoding.
+        '''
+        return self.tokens / self.passes if self.passes else 1.0
+
+    def report(self) -> dict:
+        return {
+            'drafted': self.drafted,
+            'accepted': self.accepted,
+            'tokens': self.tokens,
+            'passes': self.passes,
+            'acceptance_rate': self.acceptance_rate,
+            'speedup': self.speedup,
+        }
+
+
+class _KVCache:
+    '''
+    The key/value cache of a decoder, fed only the tokens it has not seen and truncated on rejection.
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        self.cache, self.hooks = model.install_kv_cache_hooks()
+        # Self-attention only, the cross-attention cache holds the audio features.
+        self.modules = [module for block in model.decoder.blocks for module in (block.attn.key, block.attn.value)]
+
+    def __len__(self):
+        first = self.modules[0]
+        return self.cache[first].shape[1] if first in self.cache else 0
+
+    def logits(self, tokens, audio_features):
+        '''
+        The decoder logits of the tokens that are not in the cache yet.
+        '''
+        offset = len(self)
+        tokens = tokens[:, offset:]
+        if offset == 0 or tokens.shape[-1] == 1:
+            return self.model.decoder(tokens, audio_features, kv_cache=self.cache)
+        return self._forward(tokens, audio_features, offset)
+
+    def _forward(self, tokens, audio_features, offset: int):
+        '''
+        `TextDecoder.forward` for several tokens after cached ones.
+
+        The attention of `whisper` masks several tokens as a sequence of their
+        own, so this pass offsets the causal mask by the cached positions.
+        '''
+        decoder = self.model.decoder
+        n_tokens = tokens.shape[-1]
+        x = decoder.token_embedding(tokens) + decoder.positional_embedding[offset:offset + n_tokens]
+        x = x.to(audio_features.dtype)
+        positions = torch.arange(offset + n_tokens, device=x.device)
+        mask = positions[None, :] <= positions[offset:, None]
+        for block in decoder.blocks:
+            x = x + self._attention(block.attn, block.attn_ln(x), mask=mask)
+            x = x + self._attention(block.cross_attn, block.cross_attn_ln(x), audio_features)
+            x = x + block.mlp(block.mlp_ln(x))
+        x = decoder.ln(x)
+        return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+    def _attention(self, attn, x, xa=None, mask=None):
+        q = attn.query(x)
+        if xa is None or attn.key not in self.cache:
+            # The cache hooks append the keys and values of the new tokens to the cached ones.
+            k = attn.key(x if xa is None else xa)
+            v = attn.value(x if xa is None else xa)
+        else:
+            k = self.cache[attn.key]
+            v = self.cache[attn.value]
+        q, k, v = (t.view(*t.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3) for t in (q, k, v))
+        out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask)
+        return attn.out(out.permute(0, 2, 1, 3).flatten(start_dim=2))
+
+    def truncate(self, length: int):
+        for module in self.modules:
+            if module in self.cache:
+                self.cache[module] = self.cache[module][:, :length]
+
+    def remove(self):
+        for hook in self.hooks:
+            hook.remove()
+        self.cache = {}
+
+
+class SpeculativeDecodingTask(DecodingTask):
+    '''
+    Greedy decoding in which a small draft model proposes tokens that the main model checks in one pass.
+
+    Each step, the draft model decodes `draft_tokens` tokens ahead. The main
+    model decoder then runs once over all of them, giving its own next-token
+    logits after each proposed prefix. Walking these in order with the logit
+    filters and the greedy decoder of `whisper`, the proposals are kept while
+    the main model picks the same token, and the first token it picks
+    differently replaces the rest. So every token is the one plain greedy
+    decoding with the main model picks, up to floating point differences of
+    the batched forward pass, and each pass yields one to `draft_tokens + 1`
+    tokens. The rejected positions are dropped from both key/value caches.
+
+    Sampling (temperature > 0), beam search and batches fall back to the
+    plain decoding loop.
+    '''
+
+    def __init__(self, model, draft_model, options: DecodingOptions, draft_tokens: int = DRAFT_TOKENS, stats=None):
+        super().__init__(model, options)
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        self.stats = SpeculativeStats() if stats is None else stats
+        self.draft_features = None
+
+    def _get_audio_features(self, mel):
+        audio_features = super()._get_audio_features(mel)
+        speculates = (mel.shape[0] == 1 and self.options.temperature == 0 and self.options.beam_size is None
+                      and mel.shape[-2:] != (self.model.dims.n_audio_ctx, self.model.dims.n_audio_state))
+        if speculates:
+            self.draft_features = self.draft_model.encoder(mel.half() if self.options.fp16 else mel)
+        return audio_features
+
+    def _main_loop(self, audio_features, tokens):
+        if self.draft_features is None:
+            return super()._main_loop(audio_features, tokens)
+
+        sum_logprobs = torch.zeros(1, device=audio_features.device)
+        no_speech_probs = [np.nan]
+        target, draft = _KVCache(self.model), _KVCache(self.draft_model)
+        n_sampled, done = 0, False
+        try:
+            while not done:
+                n_draft = min(self.draft_tokens, self.sample_len - n_sampled - 1, self.n_ctx - tokens.shape[-1])
+                drafted = self._draft(draft, tokens, n_draft)
+
+                start = len(target)
+                candidates = torch.cat([tokens, tokens.new_tensor([drafted])], dim=-1) if drafted else tokens
+                logits = target.logits(candidates, audio_features)
+                self.stats.passes += 1
+                if start == 0 and self.tokenizer.no_speech is not None:
+                    probs_at_sot = logits[:, self.sot_index].float().softmax(dim=-1)
+                    no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+
+                for i in range(len(drafted) + 1):
+                    # The logits after the accepted tokens, as plain decoding computes them.
+                    next_logits = logits[:, tokens.shape[-1] - 1 - start]
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(next_logits, tokens)
+                    tokens, completed = self.decoder.update(tokens, next_logits, sum_logprobs)
+                    n_sampled += 1
+                    accepted = i < len(drafted) and tokens[0, -1].item() == drafted[i]
+                    self.stats.accepted += accepted
+                    if completed or tokens.shape[-1] > self.n_ctx or n_sampled >= self.sample_len:
+                        done = True
+                        break
+                    if not accepted:
+                        break
+
+                self.stats.drafted += len(drafted)
+                tracing.count('draft_tokens', len(drafted))
+                # The last token is not in the caches yet, and the rejected proposals must go.
+                target.truncate(tokens.shape[-1] - 1)
+                draft.truncate(min(len(draft), tokens.shape[-1] - 1))
+        finally:
+            target.remove()
+            draft.remove()
+
+        self.stats.tokens += n_sampled
+        return tokens, sum_logprobs, no_speech_probs
+
+    def _draft(self, cache, tokens, n_draft: int) -> list:
+        '''
+        Greedily decode up to `n_draft` tokens with the draft model, stopping at the end of text.
+        '''
+        drafted = []
+        for _ in range(n_draft):
+            logits = cache.logits(tokens, self.draft_features)[:, -1]
+            for logit_filter in self.logit_filters:
+                logit_filter.apply(logits, tokens)
+            token = logits.argmax(dim=-1)
+            drafted.append(token.item())
+            if drafted[-1] == self.tokenizer.eot:
+                break
+            tokens = torch.cat([tokens, token[:, None]], dim=-1)
+        return drafted
+
+
+class SpeculativeModel:
+    '''
+    A Whisper model whose `decode` uses speculative decoding with a draft model.
+
+    Everything else is the main model's, so the wrapper can be passed to
+    `whisper.transcribe` and `echoscript.streaming.iter_transcribe`. The
+    token counts of all decoded windows are accumulated in `stats`.
+
+    Example:
+        >>> model = SpeculativeModel(load_model('medium'), load_model('tiny'))
+        >>> result = model.transcribe('audio.mp3', temperature=0.0)
+        >>> model.stats.acceptance_rate
+    '''
+
+    def __init__(self, model, draft_model, draft_tokens: int = DRAFT_TOKENS):
+        '''
+        Args:
+            model (whisper.Whisper): The main model, whose greedy output is reproduced.
+            draft_model (whisper.Whisper): The faster draft model, with the same tokenizer and mel bins.
+            draft_tokens (int, optional): The number of tokens drafted per main model pass. Defaults to 4.
+
+        Raises:
+            ValueError: If the models are the same or do not share the vocabulary, languages and mel bins.
+        '''
+        if draft_model is model:
+            raise ValueError('The draft model must be a different model.')
+        for name in ('n_vocab', 'n_mels'):
+            if getattr(model.dims, name) != getattr(draft_model.dims, name):
+                raise ValueError(f'The draft model must have the same `{name}` as the main model.')
+        if model.num_languages != draft_model.num_languages:
+            raise ValueError('The draft model must support the same languages as the main model.')
+        if draft_tokens < 1:
+            raise ValueError('The number of draft tokens must be at least 1.')
+        self.model = model
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        self.stats = SpeculativeStats()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    @torch.no_grad()
+    def decode(self, mel, options: DecodingOptions = DecodingOptions(), **kwargs):
+        '''
+        `whisper.decode` with speculative greedy decoding.
+        '''
+        if single := mel.ndim == 2:
+            mel = mel.unsqueeze(0)
+        if kwargs:
+            from dataclasses import replace
+
+            options = replace(options, **kwargs)
+        task = SpeculativeDecodingTask(self.model, self.draft_model, options, self.draft_tokens, self.stats)
+        result = task.run(mel)
+        return result[0] if single else result
+
+    def transcribe(self, audio, **kwargs):
+        '''
+        `whisper.transcribe` with speculative greedy decoding.
+        '''
+        return whisper.transcribe(self, audio, **kwargs)
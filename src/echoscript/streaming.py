@@ -0,0 +1,354 @@
+import base64
+
+import torch
+
+from whisper.audio import (
+    HOP_LENGTH,
+    N_FRAMES,
+    N_SAMPLES,
+    N_SAMPLES_PER_TOKEN,
+    SAMPLE_RATE,
+    log_mel_spectrogram,
+    pad_or_trim,
+)
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import exact_div
+
+from echoscript import tracing
+
+
+INPUT_STRIDE = exact_div(N_SAMPLES_PER_TOKEN, HOP_LENGTH)  # mel frames per audio token
+TIME_PRECISION = INPUT_STRIDE * HOP_LENGTH / SAMPLE_RATE  # seconds per timestamp token
+
+
+# Options of `whisper.transcribe` that the streaming loop does not implement,
+# with the values meaning "disabled".
+UNSUPPORTED_OPTIONS = {
+    'word_timestamps': False,
+    'clip_timestamps': '0',
+    'hallucination_silence_threshold': None,
+}
+
+
+def iter_transcribe(model,
+                    audio,
+                    *,
+                    verbose=None,
+                    temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+                    compression_ratio_threshold=2.4,
+                    logprob_threshold=-1.0,
+                    no_speech_threshold=0.6,
+                    condition_on_previous_text=True,
+                    initial_prompt=None,
+                    carry_initial_prompt=False,
+                    state=None,
+                    resume=None,
+                    checkpoint=None,
+                    **decode_options):
+    '''
+    Transcribe audio with a Whisper model, yielding segments as each 30-second window is decoded.
+
+    This follows the window loop of `whisper.transcribe`, so the yielded
+    segments are the `segments` of the result `whisper.transcribe` returns for
+    the same options. Word timestamps, clip timestamps and hallucination
+    silence skipping are not supported.
+
+    Args:
+        model (whisper.Whisper): The Whisper model.
+        audio (str | ndarray | Tensor): The path to the audio file or the 16 kHz waveform.
+        verbose: Accepted for compatibility with `whisper.transcribe`, ignored.
+        temperature (float | tuple[float, ...]): The temperatures tried in turn when decoding fails.
+        compression_ratio_threshold (float): Treat the decoding as failed above this gzip compression ratio.
+        logprob_threshold (float): Treat the decoding as failed below this average log probability.
+        no_speech_threshold (float): Skip a window as silent above this no-speech probability.
+        condition_on_previous_text (bool): Whether to prompt each window with the previous output.
+        initial_prompt (str): The prompt of the first window.
+        carry_initial_prompt (bool): Whether to prepend `initial_prompt` to the prompt of every window.
+        state (dict, optional): Updated with the detected `language` and the `seek` position in frames as decoding progresses.
+        resume (dict, optional): Continue from a state passed to `checkpoint`, with the `segments` decoded
+            up to it. The remaining segments are yielded, identical to those of an uninterrupted run.
+        checkpoint (callable, optional): Called at each window boundary, after the segments of the window
+            are yielded, with the decoder state needed to `resume` there (JSON serializable).
+        **decode_options: Keyword arguments of `whisper.DecodingOptions`.
+
+    Yields:
+        dict: Segments with `id`, `seek`, `start`, `end`, `text`, `tokens`, `temperature`,
+            `avg_logprob`, `compression_ratio` and `no_speech_prob`.
+    '''
+    for name, disabled in UNSUPPORTED_OPTIONS.items():
+        if decode_options.pop(name, disabled) != disabled:
+            raise ValueError(f'Option `{name}` is not supported when streaming.')
+
+    dtype = torch.float16 if decode_options.get('fp16', True) else torch.float32
+    if model.device == torch.device('cpu'):
+        if dtype == torch.float16:
+            dtype = torch.float32
+    if dtype == torch.float32:
+        decode_options['fp16'] = False
+
+    with tracing.stage('mel'):
+        mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+
+    if resume is not None:
+        decode_options['language'] = resume['language']
+    if decode_options.get('language', None) is None:
+        if not model.is_multilingual:
+            decode_options['language'] = 'en'
+        else:
+            mel_segment = pad_or_trim(mel, N_FRAMES).to(model.device).to(dtype)
+            _, probs = model.detect_language(mel_segment)
+            decode_options['language'] = max(probs, key=probs.get)
+
+    state = {} if state is None else state
+    state['language'] = decode_options['language']
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=decode_options['language'],
+        task=decode_options.get('task', 'transcribe'),
+    )
+
+    def decode_with_fallback(segment):
+        temperatures = [temperature] if isinstance(temperature, (int, float)) else temperature
+        decode_result = None
+        for t in temperatures:
+            kwargs = {**decode_options}
+            if t > 0:
+                kwargs.pop('beam_size', None)
+                kwargs.pop('patience', None)
+            else:
+                kwargs.pop('best_of', None)
+
+            if decode_result is not None:
+                tracing.count('fallbacks')
+            decode_result = model.decode(segment, DecodingOptions(**kwargs, temperature=t))
+            if not needs_fallback(decode_result, compression_ratio_threshold,
+                                  logprob_threshold, no_speech_threshold):
+                break
+        return decode_result
+
+    seek = 0
+    all_tokens = []
+    n_segments = 0
+    prompt_reset_since = 0
+
+    remaining_prompt_length = model.dims.n_text_ctx // 2 - 1
+    initial_prompt_tokens = []
+    if initial_prompt is not None:
+        initial_prompt_tokens = tokenizer.encode(' ' + initial_prompt.strip())
+        all_tokens.extend(initial_prompt_tokens)
+        remaining_prompt_length -= len(initial_prompt_tokens)
+
+    if resume is not None:
+        # The prompt context is the initial prompt followed by the tokens of all previous segments.
+        seek = resume['seek']
+        prompt_reset_since = resume['prompt_reset_since']
+        all_tokens.extend(token for segment in resume['segments'] for token in segment['tokens'])
+        n_segments = len(resume['segments'])
+        set_rng_state(resume['rng'], model.device)
+        state['seek'] = seek
+
+    def window_state():
+        return {
+            'seek': seek,
+            'language': decode_options['language'],
+            'prompt_reset_since': prompt_reset_since,
+            'rng': get_rng_state(model.device),
+        }
+
+    while seek < content_frames:
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_size = min(N_FRAMES, content_frames - seek)
+        mel_segment = mel[:, seek:seek + segment_size]
+        mel_segment = pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
+
+        if carry_initial_prompt:
+            nignored = max(len(initial_prompt_tokens), prompt_reset_since)
+            remaining_prompt = all_tokens[nignored:][-remaining_prompt_length:]
+            decode_options['prompt'] = initial_prompt_tokens + remaining_prompt
+        else:
+            decode_options['prompt'] = all_tokens[prompt_reset_since:]
+
+        tracing.count('windows')
+        result = decode_with_fallback(mel_segment)
+        tokens = torch.tensor(result.tokens)
+
+        if is_silent(result, logprob_threshold, no_speech_threshold):
+            seek += segment_size
+            state['seek'] = seek
+            if checkpoint is not None: checkpoint(window_state())
+            continue
+
+        spans, consumed = split_window(tokens, tokenizer, time_offset, segment_size)
+        current_segments = [
+            make_segment(tokenizer, seek, start, end, span, result)
+            for start, end, span in spans
+        ]
+        seek += consumed
+
+        all_tokens.extend(token for segment in current_segments for token in segment['tokens'])
+        if not condition_on_previous_text or result.temperature > 0.5:
+            prompt_reset_since = len(all_tokens)
+
+        state['seek'] = seek
+        window = window_state() if checkpoint is not None else None
+        for segment in current_segments:
+            yield {'id': n_segments, **segment}
+            n_segments += 1
+        if checkpoint is not None: checkpoint(window)
+
+
+def get_rng_state(device) -> dict:
+    '''
+    The state of the random number generators used when sampling at a temperature above 0.
+
+    Args:
+        device (torch.device): The device of the model.
+
+    Returns:
+        dict: The base64-encoded `cpu` state and, on a CUDA device, the `cuda` state.
+    '''
+    state = {'cpu': base64.b64encode(torch.get_rng_state().numpy().tobytes()).decode()}
+    if device.type == 'cuda':
+        state['cuda'] = base64.b64encode(torch.cuda.get_rng_state(device).numpy().tobytes()).decode()
+    return state
+
+
+def set_rng_state(state: dict, device):
+    '''
+    Restore a state returned by `get_rng_state`.
+    '''
+    torch.set_rng_state(torch.frombuffer(bytearray(base64.b64decode(state['cpu'])), dtype=torch.uint8))
+    if 'cuda' in state and device.type == 'cuda':
+        torch.cuda.set_rng_state(torch.frombuffer(bytearray(base64.b64decode(state['cuda'])), dtype=torch.uint8),
+                                 device)
+
+
+def needs_fallback(result, compression_ratio_threshold, logprob_threshold, no_speech_threshold) -> bool:
+    '''
+    Whether a decoding failed and should be retried at the next temperature, as in `whisper.transcribe`.
+    '''
+    failed = False
+    if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+        failed = True
+    if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+        failed = True
+    if (no_speech_threshold is not None
+            and result.no_speech_prob > no_speech_threshold
+            and logprob_threshold is not None
+            and result.avg_logprob < logprob_threshold):
+        failed = False
+    return failed
+
+
+def is_silent(result, logprob_threshold, no_speech_threshold) -> bool:
+    '''
+    Whether a window is skipped as silence: a high no-speech probability and no confident text.
+    '''
+    if no_speech_threshold is None or result.no_speech_prob <= no_speech_threshold:
+        return False
+    return logprob_threshold is None or result.avg_logprob <= logprob_threshold
+
+
+def split_window(tokens, tokenizer, time_offset: float, segment_size: int):
+    '''
+    Split the decoded tokens of a window into timestamped spans, as `whisper.transcribe` does.
+
+    Args:
+        tokens (Tensor): The decoded tokens of the window.
+        tokenizer (whisper.tokenizer.Tokenizer): The tokenizer of the model.
+        time_offset (float): The start of the window in seconds.
+        segment_size (int): The number of mel frames of the window.
+
+    Returns:
+        tuple[list[tuple[float, float, Tensor]], int]: (start, end, tokens) of each span,
+            and the number of frames after which the next window starts.
+    '''
+    spans = []
+    timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+    single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+
+    consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+    consecutive.add_(1)
+    if len(consecutive) > 0:
+        slices = consecutive.tolist()
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+
+        last_slice = 0
+        for current_slice in slices:
+            sliced_tokens = tokens[last_slice:current_slice]
+            start_timestamp_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+            end_timestamp_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+            spans.append((
+                time_offset + start_timestamp_pos * TIME_PRECISION,
+                time_offset + end_timestamp_pos * TIME_PRECISION,
+                sliced_tokens,
+            ))
+            last_slice = current_slice
+
+        if single_timestamp_ending:
+            return spans, segment_size
+        last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+        return spans, last_timestamp_pos * INPUT_STRIDE
+
+    duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+    timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+    if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+        last_timestamp_pos = timestamps[-1].item() - tokenizer.timestamp_begin
+        duration = last_timestamp_pos * TIME_PRECISION
+    spans.append((time_offset, time_offset + duration, tokens))
+    return spans, segment_size
+
+
+def make_segment(tokenizer, seek: int, start: float, end: float, tokens, result) -> dict:
+    '''
+    Build a Whisper segment, clearing segments without duration or text.
+
+    Args:
+        tokenizer (whisper.tokenizer.Tokenizer): The tokenizer of the model.
+        seek (int): The start of the window in mel frames.
+        start, end (float): The segment timestamps in seconds.
+        tokens (Tensor): The tokens of the segment.
+        result (whisper.DecodingResult): The decoding result of the window.
+
+    Returns:
+        dict: The segment, without `id`.
+    '''
+    tokens = tokens.tolist()
+    text = tokenizer.decode([token for token in tokens if token < tokenizer.eot])
+    segment = {
+        'seek': seek,
+        'start': start,
+        'end': end,
+        'text': text,
+        'tokens': tokens,
+        'temperature': result.temperature,
+        'avg_logprob': result.avg_logprob,
+        'compression_ratio': result.compression_ratio,
+        'no_speech_prob': result.no_speech_prob,
+    }
+    if start == end or text.strip() == '':
+        segment.update(text='', tokens=[], words=[])
+    return segment
+
+
+def collect_segments(segments, language=None) -> dict:
+    '''
+    Build a Whisper-style result from streamed segments.
+
+    Args:
+        segments (Iterable[dict]): The segments yielded by `iter_transcribe`.
+        language (str, optional): The language of the audio. Defaults to None.
+
+    Returns:
+        dict: A result with `text`, `segments` and `language`.
+    '''
+    segments = list(segments)
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language,
+    }
@@ -0,0 +1,451 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import sys
+import threading
+import time
+
+from collections import defaultdict
+
+
+_current = contextvars.ContextVar('echoscript_trace', default=None)
+_hooks = []
+_ids = itertools.count()
+
+
+def peak_rss() -> int:
+    '''
+    The peak resident set size of the process in bytes.
+
+    Returns:
+        int | None: The peak RSS, or None where the `resource` module is not available.
+    '''
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Trace:
+    '''
+    The timings of one transcription job.
+
+    A trace accumulates the wall time spent in named stages (`download`,
+    `audio_decode`, `model_load`, `encoder`, `decoder`, `format`, ...),
+    counters such as the number of decoded windows and temperature fallbacks,
+    and attributes such as the model name and the audio duration. `finish`
+    adds the total time, the real-time factor and the peak RSS and passes the
+    record to the hooks registered with `add_hook`.
+
+    Stages are usually recorded with the module-level `stage`, `count` and
+    `annotate` functions, which act on the trace active in the current
+    context and do nothing when there is none.
+    '''
+
+    def __init__(self, **attrs):
+        '''
+        Args:
+            **attrs: Attributes of the job, e.g. `source`, `model_name`, `language`.
+        '''
+        self.id = next(_ids)
+        self.attrs = attrs
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._open = {}
+        self._lock = threading.Lock()
+        self.record = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        '''
+        Add the time spent in the block to the stage `name`.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        '''
+        Add `seconds` to the stage `name`.
+        '''
+        with self._lock:
+            self.stages[name] += seconds
+
+    def start(self, name: str):
+        '''
+        Start timing the stage `name`, for callbacks where a `with` block is not possible.
+        '''
+        self._open[name] = time.perf_counter()
+
+    def stop(self, name: str):
+        '''
+        Stop timing the stage `name` started with `start`.
+        '''
+        start = self._open.pop(name, None)
+        if start is not None:
+            self.add(name, time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1):
+        '''
+        Increment the counter `name`.
+        '''
+        with self._lock:
+            self.counters[name] += n
+
+    def set(self, **attrs):
+        '''
+        Set attributes of the job.
+        '''
+        self.attrs.update(attrs)
+
+    def finish(self, status: str = 'ok', error: BaseException = None) -> dict:
+        '''
+        Complete the trace and pass its record to the hooks, only the first call has an effect.
+
+        Args:
+            status (str, optional): The job status, e.g. `ok` or `error`. Defaults to 'ok'.
+            error (BaseException, optional): The exception the job failed with. Defaults to None.
+
+        Returns:
+            dict: The record, see `to_dict`.
+        '''
+        if self.record is not None:
+            return self.record
+        total = time.perf_counter() - self._start
+        duration = self.attrs.get('audio_duration')
+        self.record = {
+            'id': self.id,
+            **self.attrs,
+            'status': status,
+            'error': None if error is None else f'{type(error).__name__}: {error}',
+            'started': self.started,
+            'total': total,
+            'rtf': total / duration if duration else None,
+            'peak_rss': peak_rss(),
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+        }
+        emit(self.record)
+        return self.record
+
+    def to_dict(self) -> dict:
+        '''
+        The record of a finished trace, or a snapshot of a running one.
+        '''
+        if self.record is not None:
+            return self.record
+        return {'id': self.id, **self.attrs, 'status': 'running',
+                'stages': dict(self.stages), 'counters': dict(self.counters)}
+
+
+def current():
+    '''
+    The trace active in the current context.
+
+    Returns:
+        Trace | None: The active trace.
+    '''
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(trace: Trace):
+    '''
+    Make `trace` the active trace within the block.
+
+    Jobs submitted to a `Scheduler` within the block record into the trace
+    too, since the scheduler runs each job in the context it was submitted from.
+    '''
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def trace(**attrs):
+    '''
+    Trace the block as one job, unless a trace is already active.
+
+    A new trace is finished when the block exits, with the `error` status if
+    it raised. Inside an active trace, the attributes are added to it and it
+    is left for its owner to finish.
+
+    Example:
+        >>> with trace(source='cli', model_name='base') as t:
+        ...     with stage('download'):
+        ...         ...
+    '''
+    active = _current.get()
+    if active is not None:
+        for name, value in attrs.items():
+            active.attrs.setdefault(name, value)
+        yield active
+        return
+
+    new = Trace(**attrs)
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.finish('error', e)
+        raise
+    else:
+        new.finish()
+    finally:
+        _current.reset(token)
+
+
+def finish_future(trace: Trace, future) -> dict:
+    '''
+    Finish a trace with the outcome of a future: `ok`, `error` or `cancelled`.
+
+    Example:
+        >>> job.future.add_done_callback(lambda future: finish_future(t, future))
+    '''
+    if future.cancelled():
+        return trace.finish('cancelled')
+    error = future.exception()
+    return trace.finish('ok' if error is None else 'error', error)
+
+
+def stage(name: str):
+    '''
+    Time the block as the stage `name` of the active trace, does nothing without one.
+    '''
+    active = _current.get()
+    if active is None:
+        return contextlib.nullcontext()
+    return active.stage(name)
+
+
+def count(name: str, n: int = 1):
+    '''
+    Increment the counter `name` of the active trace, if any.
+    '''
+    active = _current.get()
+    if active is not None:
+        active.count(name, n)
+
+
+def annotate(**attrs):
+    '''
+    Set attributes of the active trace, if any.
+    '''
+    active = _current.get()
+    if active is not None:
+        active.set(**attrs)
+
+
+@contextlib.contextmanager
+def instrument_model(model, fallbacks: bool = False):
+    '''
+    Time the encoder and decoder of a Whisper model into the active trace within the block.
+
+    Args:
+        model (whisper.Whisper): The model, which must not be used by another job meanwhile.
+        fallbacks (bool, optional): Whether to count the decoded `windows` and the temperature `fallbacks`
+            of `whisper.transcribe`, which retries a window by decoding the same mel segment again. Defaults to False.
+    '''
+    active = _current.get()
+    if active is None:
+        yield
+        return
+
+    handles = []
+    for name in ('encoder', 'decoder'):
+        module = getattr(model, name)
+        handles.append(module.register_forward_pre_hook(lambda *_, name=name: active.start(name)))
+        handles.append(module.register_forward_hook(lambda *_, name=name: active.stop(name)))
+
+    patched = vars(model).copy()
+    if fallbacks:
+        decode, last = model.decode, [None]
+
+        def counted(mel, *args, **kwargs):
+            active.count('fallbacks' if mel is last[0] else 'windows')
+            last[0] = mel
+            return decode(mel, *args, **kwargs)
+
+        vars(model)['decode'] = counted
+    try:
+        yield
+    finally:
+        for handle in handles:
+            handle.remove()
+        if fallbacks:
+            if 'decode' in patched:
+                vars(model)['decode'] = patched['decode']
+            else:
+                vars(model).pop('decode', None)
+
+
+def add_hook(callback):
+    '''
+    Call `callback(record)` with the record of every finished trace, see `Trace.finish`.
+
+    Hooks run in the thread finishing the trace and must be quick and thread-safe,
+    exceptions they raise are ignored.
+
+    Returns:
+        callable: The callback, for `remove_hook`.
+    '''
+    _hooks.append(callback)
+    return callback
+
+
+def remove_hook(callback):
+    '''
+    Remove a hook added with `add_hook`.
+    '''
+    if callback in _hooks:
+        _hooks.remove(callback)
+
+
+def emit(record: dict):
+    '''
+    Pass a record to the hooks.
+    '''
+    for hook in list(_hooks):
+        try:
+            hook(record)
+        except Exception:
+            pass
+
+
+class JSONLinesWriter:
+    '''
+    A hook appending each record as a JSON line to a file.
+
+    Example:
+        >>> add_hook(JSONLinesWriter('metrics.jsonl'))
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+def _escape_label(value) -> str:
+    '''
+    Escape a label value for the Prometheus text exposition format.
+    '''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusMetrics:
+    '''
+    A hook aggregating records into Prometheus metrics.
+
+    `render` returns the text exposition format: job counts by status,
+    the total time per stage, a histogram of the real-time factor, the
+    transcribed audio seconds, the decoded windows and fallbacks, and the
+    peak RSS of the process.
+    '''
+
+    RTF_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.job_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.rtf_buckets = [0] * len(self.RTF_BUCKETS)
+        self.rtf_sum = 0.0
+        self.rtf_count = 0
+
+    def __call__(self, record: dict):
+        with self._lock:
+            self.jobs[(record.get('source') or 'python', record['status'])] += 1
+            self.job_seconds += record['total']
+            self.audio_seconds += record.get('audio_duration') or 0.0
+            for name, seconds in record['stages'].items():
+                self.stage_seconds[name] += seconds
+            for name, n in record['counters'].items():
+                self.counters[name] += n
+            if record['rtf'] is not None:
+                self.rtf_sum += record['rtf']
+                self.rtf_count += 1
+                for i, bound in enumerate(self.RTF_BUCKETS):
+                    if record['rtf'] <= bound:
+                        self.rtf_buckets[i] += 1
+
+    def render(self) -> str:
+        '''
+        The metrics in the Prometheus text exposition format.
+        '''
+        lines = []
+
+        def family(name, kind, help, samples):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                label = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+                lines.append(f'{name}{suffix}{{{label}}} {value}' if label else f'{name}{suffix} {value}')
+
+        with self._lock:
+            family('echoscript_jobs_total', 'counter', 'Finished transcription jobs.',
+                   [('', {'source': source, 'status': status}, n)
+                    for (source, status), n in sorted(self.jobs.items())])
+            family('echoscript_job_seconds_total', 'counter', 'Wall time of finished jobs.',
+                   [('', {}, self.job_seconds)])
+            family('echoscript_stage_seconds_total', 'counter', 'Wall time per job stage.',
+                   [('', {'stage': name}, seconds) for name, seconds in sorted(self.stage_seconds.items())])
+            family('echoscript_audio_seconds_total', 'counter', 'Duration of the transcribed audio.',
+                   [('', {}, self.audio_seconds)])
+            for name, n in sorted(self.counters.items()):
+                family(f'echoscript_{name}_total', 'counter', f'Total {name} of finished jobs.', [('', {}, n)])
+            family('echoscript_rtf', 'histogram', 'Real-time factor (wall time / audio duration) of jobs.', [
+                *(('_bucket', {'le': str(bound)}, n) for bound, n in zip(self.RTF_BUCKETS, self.rtf_buckets)),
+                ('_bucket', {'le': '+Inf'}, self.rtf_count),
+                ('_sum', {}, self.rtf_sum),
+                ('_count', {}, self.rtf_count),
+            ])
+        rss = peak_rss()
+        if rss is not None:
+            family('echoscript_peak_rss_bytes', 'gauge', 'Peak resident set size of the process.', [('', {}, rss)])
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(metrics: PrometheusMetrics, host: str = '0.0.0.0', port: int = 9090):
+    '''
+    Serve `metrics.render()` at `/metrics` over HTTP from a daemon thread.
+
+    Returns:
+        http.server.ThreadingHTTPServer: The server, call `shutdown` to stop it.
+    '''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='echoscript-metrics', daemon=True).start()
+    return server
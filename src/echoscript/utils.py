@@ -1,7 +1,11 @@
 
+import ast
+import functools
+import importlib.util
 import os
 
-from pytubefix import YouTube
+from echoscript import tracing
+from echoscript.formats import get_formatter
 
 
 class classproperty(property):
@@ -12,75 +16,186 @@ class classproperty(property):
         return self.fget(owner)
 
 
+@functools.lru_cache(maxsize=None)
+def _whisper_constant(module: str, name: str):
+    spec = importlib.util.find_spec('whisper')
+    path = os.path.join(spec.submodule_search_locations[0], f'{module}.py')
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        targets = node.targets if isinstance(node, ast.Assign) else [getattr(node, 'target', None)]
+        if any(isinstance(target, ast.Name) and target.id == name for target in targets):
+            return ast.literal_eval(node.value)
+    raise LookupError(f'`{name}` not found in whisper.{module}')
+
+
+def whisper_constant(module: str, name: str):
+    '''
+    Read a literal constant from a whisper module without importing whisper.
+
+    Importing whisper pulls in torch and numba, which takes seconds. Constants
+    such as the model list and the language table are plain literals, so they
+    are read from the installed sources instead. Falls back to importing
+    whisper if the sources cannot be parsed.
+
+    Args:
+        module (str): The whisper module, e.g. `__init__` or `tokenizer`.
+        name (str): The name of the constant, e.g. `_MODELS` or `LANGUAGES`.
+
+    Returns:
+        A copy of the constant.
+    '''
+    try:
+        value = _whisper_constant(module, name)
+    except (AttributeError, LookupError, OSError, SyntaxError, TypeError, ValueError):
+        package = 'whisper' if module == '__init__' else f'whisper.{module}'
+        value = getattr(importlib.import_module(package), name)
+    return value.copy()
+
+
+def get_echoscript_home() -> str:
+    '''
+    The echoscript data directory, `$ECHOSCRIPT_HOME` or `~/.echoscript`.
+
+    Returns:
+        str: The expanded path of the data directory.
+    '''
+    return os.path.expanduser(os.environ.get('ECHOSCRIPT_HOME', '~/.echoscript'))
+
+
 def get_yt_audio(url: str, 
-                 output_path: str = '~/.echoscript/tmp',
-                 filename: str = 'tmp.mp4') -> str: # pragma: no cover
+                 output_path: str = None,
+                 filename: str = None) -> str: # pragma: no cover
     '''
     Download the audio from a YouTube video and return the filename
 
+    Each call writes a new file unless `filename` is given, so concurrent
+    downloads do not overwrite each other. `echoscript.media.MediaCache`
+    downloads each video only once.
+
     Args:
         url (str): The URL of the YouTube video
-        output_path (str, optional): The path to save the audio to
-        filename    (str, optional): The filename of the downloaded audio
+        output_path (str, optional): The directory to save the audio to, `$ECHOSCRIPT_HOME/tmp` by default
+        filename    (str, optional): The filename of the downloaded audio, a unique name by default
 
     Returns:
         str: The filename of the downloaded audio
     '''
-    
+    import tempfile
+
+    from pytubefix import YouTube
+
+    output_path = os.path.expanduser(output_path or os.path.join(get_echoscript_home(), 'tmp'))
     os.makedirs(output_path, exist_ok=True)
+    if filename is None:
+        fd, path = tempfile.mkstemp(dir=output_path, suffix='.mp4')
+        os.close(fd)
+        filename = os.path.basename(path)
+
+    with tracing.stage('download'):
+        return (
+            YouTube(url)
+            .streams.filter(only_audio=True)[0]
+            .download(output_path=output_path, filename=filename)
+        )
+
+
+def format_segment(segment, index: int, fmt='srt') -> str:
+    '''
+    Format one segment as an SRT or VTT block
+
+    Args:
+        segment: A segment dict with `start`, `end` and `text` keys
+        index: The 1-based index of the segment
+        fmt: The format name, see `echoscript.formats` (default: 'srt')
 
-    return (
-        YouTube(url)
-        .streams.filter(only_audio=True)[0]
-        .download(output_path=output_path, filename=filename)
-    )
+    Returns:
+        str: The subtitle block, ending with a newline
+    '''
+    return get_formatter(fmt).records([segment], index)[0]
 
 
 def segments2subtitle(segments, fmt='srt') -> str:
     '''
     Convert a list of segments to a subtitle string in SRT or VTT format
 
+    Any registered format is accepted, see `echoscript.formats`. To write a
+    large transcript to a file, `get_formatter(fmt).write(segments, f)`
+    avoids building the whole string.
+
     Args:
         segments: A list of segment dicts, each with the following keys:
             - start: The start time of the segment, in seconds
             - end: The end time of the segment, in seconds
             - text: The text of the segment
-        fmt: The subtitle format, either 'srt' or 'vtt' (default: 'srt')
+        fmt: The format name, e.g. 'srt', 'vtt', 'tsv' or 'jsonl' (default: 'srt')
 
     Returns:
         str: The subtitle string in the specified format
     '''
-    formats = {
-        'srt': {
-            'time_template': '{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}',
-            'segment_template': '{index}\n{start} --> {end}\n{text}\n',
-            'header': '',
-        },
-        'vtt': {
-            'time_template': '{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}',
-            'segment_template': '{start} --> {end}\n{text}\n',
-            'header': 'WEBVTT\n\n',
-        }
-    }
-
-    if fmt not in formats:
-        raise ValueError(f'Format `{fmt}` is not supported.')
-    
-    format_config = formats[fmt]
-    time_template = format_config['time_template']
-    segment_template = format_config['segment_template']
-    header = format_config['header']
-
-    formatted_segments = [
-        segment_template.format(
-            index=i + 1,
-            start=format_timestamp(segment['start'], template=time_template),
-            end=format_timestamp(segment['end'], template=time_template),
-            text=segment['text']
-        )
-        for i, segment in enumerate(segments)
-    ]
-    return header + '\n'.join(formatted_segments)
+    return get_formatter(fmt).format(segments)
+
+
+class TranscriptWriter:
+    '''
+    Write segments to a file object as they arrive
+
+    The concatenated output equals `segments2subtitle(segments, fmt)` for
+    every format, with plain text for `None`.
+
+    Example:
+        >>> with open('out.srt', 'w') as f:
+        ...     writer = TranscriptWriter(f, fmt='srt')
+        ...     for segment in segments:
+        ...         writer.write(segment)
+        ...     writer.close()
+    '''
+
+    def __init__(self, f, fmt=None, flush: bool = True):
+        '''
+        Args:
+            f: A text file object
+            fmt: The output format, see `echoscript.formats`, or None for plain text (default: None)
+            flush: Whether to flush the file object after each segment (default: True)
+        '''
+        self.formatter = get_formatter(fmt)
+        self.f = f
+        self.fmt = fmt
+        self.flush = flush
+        self.count = 0
+
+    def write(self, segment) -> str:
+        '''
+        Write one segment
+
+        Args:
+            segment: A segment dict with `start`, `end` and `text` keys
+
+        Returns:
+            str: The text written to the file object
+        '''
+        formatter = self.formatter
+        text = formatter.separator.join(formatter.records([segment], self.count + 1))
+        text = (formatter.header if self.count == 0 else formatter.separator) + text
+
+        self.count += 1
+        self.f.write(text)
+        if self.flush: self.f.flush()
+        return text
+
+    def close(self) -> str:
+        '''
+        Finish the output, writing the header if no segment was written
+
+        Returns:
+            str: The text written to the file object
+        '''
+        text = ''
+        if self.count == 0:
+            text = self.formatter.header
+            self.f.write(text)
+        if self.flush: self.f.flush()
+        return text
 
 
 def format_timestamp(
@@ -90,6 +205,8 @@ def format_timestamp(
     '''
     Format a timestamp in seconds into a string of the form HH:MM:SS,mmm
 
+    Use `echoscript.formats.format_timestamps` to format many timestamps.
+
     Args:
         t: The timestamp to format, in seconds
         template: The format string to use. Defaults to 
@@ -98,16 +215,7 @@ def format_timestamp(
     Returns:
         A string representation of the timestamp
     '''
-    total_seconds = int(t)
-    hours, remainder = divmod(total_seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    milliseconds = round((t - total_seconds) * 1000)
-    
-    format_dict = {
-        'hours': hours,
-        'minutes': minutes,
-        'seconds': seconds,
-        'milliseconds': milliseconds
-    }
-    return template.format(**format_dict)
-
+    seconds, milliseconds = divmod(round(t * 1000), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return template.format(hours=hours, minutes=minutes, seconds=seconds, milliseconds=milliseconds)
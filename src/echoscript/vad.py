@@ -0,0 +1,286 @@
+import functools
+import json
+import types
+
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from echoscript.ingest import is_stream, load_audio
+
+
+SAMPLE_RATE = 16000
+
+
+def frame_energy(audio, frame_length: int = 320) -> np.ndarray:
+    '''
+    Compute the mean energy of consecutive frames.
+
+    Args:
+        audio (ndarray): The waveform.
+        frame_length (int, optional): The frame length in samples. Defaults to 320 (20 ms at 16 kHz).
+
+    Returns:
+        ndarray: The energy of each full frame.
+    '''
+    n_frames = len(audio) // frame_length
+    frames = np.asarray(audio[:n_frames * frame_length], dtype=np.float32)
+    return np.square(frames.reshape(n_frames, frame_length)).mean(axis=1)
+
+
+class EnergyVAD:
+    '''
+    An energy-based voice activity detector.
+
+    A frame is speech when its energy is `margin_db` above the noise floor
+    (the 10th percentile of the frame energies), or within `dynamic_range_db`
+    of the loudest frame, and above `floor_db` in any case. Speech separated
+    by less than `min_silence` seconds is merged, shorter regions than
+    `min_speech` seconds are dropped and every region is padded by `pad`
+    seconds so that word onsets and endings are kept.
+
+    Any callable taking `(audio, sr)` and returning (start, end) sample
+    ranges can be used instead, see `register_vad`.
+    '''
+
+    def __init__(self,
+                 frame_length: int = 320,
+                 margin_db: float = 12.0,
+                 dynamic_range_db: float = 30.0,
+                 floor_db: float = -60.0,
+                 min_speech: float = 0.25,
+                 min_silence: float = 0.5,
+                 pad: float = 0.2):
+        self.frame_length = frame_length
+        self.margin_db = margin_db
+        self.dynamic_range_db = dynamic_range_db
+        self.floor_db = floor_db
+        self.min_speech = min_speech
+        self.min_silence = min_silence
+        self.pad = pad
+
+    def __repr__(self):
+        params = ', '.join(f'{name}={value!r}' for name, value in vars(self).items())
+        return f'{type(self).__name__}({params})'
+
+    def __call__(self, audio, sr: int = SAMPLE_RATE) -> list:
+        '''
+        Find the speech regions of a waveform.
+
+        Args:
+            audio (ndarray): The waveform.
+            sr (int, optional): The sample rate. Defaults to 16000.
+
+        Returns:
+            list[tuple[int, int]]: The (start, end) sample ranges of speech, sorted and disjoint.
+        '''
+        energy = frame_energy(audio, self.frame_length)
+        if len(energy) == 0:
+            return []
+        db = 10 * np.log10(energy + 1e-10)
+        threshold = min(np.percentile(db, 10) + self.margin_db, db.max() - self.dynamic_range_db)
+        speech = db > max(threshold, self.floor_db)
+
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+        regions = []
+        min_gap = self.min_silence * sr
+        for start, end in zip(edges[::2] * self.frame_length, edges[1::2] * self.frame_length):
+            if regions and start - regions[-1][1] < min_gap:
+                regions[-1][1] = end
+            else:
+                regions.append([start, end])
+
+        pad = int(self.pad * sr)
+        merged = []
+        for start, end in regions:
+            if end - start < self.min_speech * sr:
+                continue
+            start, end = max(start - pad, 0), min(end + pad, len(audio))
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], int(end))
+            else:
+                merged.append((int(start), int(end)))
+        return merged
+
+
+_VADS = {
+    'energy': EnergyVAD,
+}
+
+
+def register_vad(name: str, factory):
+    '''
+    Register a voice activity detector.
+
+    Args:
+        name (str): The name used by `get_vad` and the `--vad-method` CLI option.
+        factory (callable): Called without arguments to create the detector, a callable
+            taking `(audio, sr)` and returning (start, end) sample ranges of speech.
+    '''
+    _VADS[name] = factory
+
+
+def available_vads() -> list:
+    '''
+    The names of the registered voice activity detectors.
+    '''
+    return list(_VADS)
+
+
+def get_vad(vad):
+    '''
+    Resolve a voice activity detector.
+
+    Args:
+        vad (bool | str | callable | None): `None`/`False` for none, `True` for the energy
+            detector, the name of a registered detector, or a detector.
+
+    Returns:
+        callable | None: The detector.
+    '''
+    if vad is None or vad is False:
+        return None
+    if vad is True:
+        vad = 'energy'
+    if isinstance(vad, str):
+        if vad not in _VADS:
+            raise ValueError(f'VAD `{vad}` is not available.')
+        return _VADS[vad]()
+    return vad
+
+
+def vad_key(detector):
+    '''
+    A stable description of a voice activity detector, for the result cache key.
+
+    A detector is described by the qualified name of its function or class
+    and, for an instance or a `functools.partial`, its parameters. Lambdas,
+    nested functions, bound methods and detectors with parameters that are not plain values
+    have no stable description.
+
+    Args:
+        detector (callable): The detector.
+
+    Returns:
+        str | None: The description, or None if the detector has none.
+    '''
+    params = {}
+    if isinstance(detector, functools.partial):
+        params = {'args': list(detector.args), 'kwargs': detector.keywords}
+        detector = detector.func
+    if isinstance(detector, types.MethodType):
+        return None
+    if not isinstance(detector, (types.FunctionType, type)):
+        params = vars(detector) if hasattr(detector, '__dict__') else None
+        detector = type(detector)
+    name = f'{detector.__module__}.{detector.__qualname__}'
+    if params is None or '<' in name:
+        return None
+    try:
+        return f'{name}{json.dumps(params, sort_keys=True)}'
+    except (TypeError, ValueError):
+        return None
+
+
+class SpeechTimeline:
+    '''
+    Maps times on the concatenated speech regions back to the original recording.
+
+    Example:
+        >>> timeline = SpeechTimeline(EnergyVAD()(audio), len(audio))
+        >>> result = model.transcribe(timeline.compact(audio))
+        >>> segments = [timeline.remap_segment(segment) for segment in result['segments']]
+    '''
+
+    def __init__(self, regions, n_samples: int, sr: int = SAMPLE_RATE):
+        '''
+        Args:
+            regions (list[tuple[int, int]]): The (start, end) sample ranges of speech, sorted and disjoint.
+            n_samples (int): The length of the original audio in samples.
+            sr (int, optional): The sample rate. Defaults to 16000.
+        '''
+        self.regions = list(regions)
+        self.n_samples = n_samples
+        self.sr = sr
+        self.offsets = []
+        offset = 0
+        for start, end in self.regions:
+            self.offsets.append(offset)
+            offset += end - start
+        self.n_speech = offset
+
+    def compact(self, audio) -> np.ndarray:
+        '''
+        Concatenate the speech regions of the original audio.
+        '''
+        if not self.regions:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, t: float, end: bool = False) -> float:
+        '''
+        Map a time in seconds on the compacted audio to the original recording.
+
+        Args:
+            t (float): The time on the compacted audio.
+            end (bool, optional): Whether `t` ends a span, so that a time on the boundary
+                of two regions maps to the end of the first one. Defaults to False.
+
+        Returns:
+            float: The time on the original recording.
+        '''
+        if not self.regions:
+            return t
+        sample = t * self.sr
+        find = bisect_left if end else bisect_right
+        i = min(max(find(self.offsets, sample) - 1, 0), len(self.regions) - 1)
+        start, stop = self.regions[i]
+        return round(min(start + sample - self.offsets[i], stop) / self.sr, 3)
+
+    def remap_segment(self, segment: dict) -> dict:
+        '''
+        Map the timestamps of a segment, and of its words if any, to the original recording.
+        '''
+        segment = dict(segment)
+        segment['start'] = self.to_original(segment['start'])
+        segment['end'] = self.to_original(segment['end'], end=True)
+        if segment.get('words'):
+            segment['words'] = [
+                {**word, 'start': self.to_original(word['start']), 'end': self.to_original(word['end'], end=True)}
+                for word in segment['words']
+            ]
+        return segment
+
+    def report(self) -> dict:
+        '''
+        How much audio was skipped.
+
+        Returns:
+            dict: The `duration`, `speech` and `skipped` seconds and the number of speech `regions`.
+        '''
+        return {
+            'duration': self.n_samples / self.sr,
+            'speech': self.n_speech / self.sr,
+            'skipped': (self.n_samples - self.n_speech) / self.sr,
+            'regions': len(self.regions),
+        }
+
+
+def detect_speech(audio, vad, sr: int = SAMPLE_RATE):
+    '''
+    Run a voice activity detector on audio.
+
+    Args:
+        audio (str | bytes | BinaryIO | ndarray | Tensor): The path to the audio file, encoded audio or the 16 kHz waveform.
+        vad (bool | str | callable): The detector, see `get_vad`.
+        sr (int, optional): The sample rate. Defaults to 16000.
+
+    Returns:
+        tuple[ndarray, SpeechTimeline]: The concatenated speech and its timeline.
+    '''
+    if isinstance(audio, str) or is_stream(audio):
+        audio = load_audio(audio)
+    elif hasattr(audio, 'numpy'):
+        audio = audio.detach().cpu().numpy()
+    timeline = SpeechTimeline(get_vad(vad)(audio, sr), len(audio), sr)
+    return timeline.compact(audio), timeline
@@ -0,0 +1,155 @@
+import os
+import warnings
+
+import numpy as np
+import torch
+import whisper
+
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder, Whisper
+
+from echoscript.utils import get_echoscript_home
+
+
+# The weight precisions of the converted checkpoints.
+DTYPES = {'fp32': torch.float32, 'fp16': torch.float16}
+
+
+def converted_path(model_name: str, dtype: str = 'fp32') -> str:
+    '''
+    The path of the converted checkpoint of a Whisper model.
+
+    The name includes the checksum of the original checkpoint, so a new
+    release of the model is converted again.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        dtype (str, optional): The weight precision {`fp32`, `fp16`}. Defaults to 'fp32'.
+
+    Returns:
+        str: The path under `$ECHOSCRIPT_HOME/models`.
+    '''
+    checksum = whisper._MODELS[model_name].split('/')[-2]
+    return os.path.join(get_echoscript_home(), 'models', f'{model_name}-{checksum[:12]}-{dtype}.pt')
+
+
+def _download_root() -> str:
+    '''
+    The download directory of `whisper.load_model`, where the original checkpoints are.
+    '''
+    default = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(os.getenv('XDG_CACHE_HOME', default), 'whisper')
+
+
+def convert_model(model_name: str, dtype: str = 'fp32') -> str:
+    '''
+    Convert the checkpoint of a Whisper model into a memory-mappable file.
+
+    The original checkpoints store fp16 weights, which `whisper.load_model`
+    unpickles and copies into a freshly initialized fp32 model. The converted
+    file stores the state dict in the precision the model runs in, with the
+    model dimensions and alignment heads, in the zip format that
+    `torch.load(mmap=True)` maps without copying. The original checkpoint is
+    downloaded first if needed.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        dtype (str, optional): The weight precision {`fp32`, `fp16`}. Defaults to 'fp32'.
+
+    Returns:
+        str: The path of the converted checkpoint, see `converted_path`.
+    '''
+    checkpoint_file = whisper._download(whisper._MODELS[model_name], _download_root(), in_memory=False)
+    checkpoint = torch.load(checkpoint_file, map_location='cpu', weights_only=True)
+    state_dict = {
+        name: tensor.to(DTYPES[dtype]).contiguous() if tensor.is_floating_point() else tensor
+        for name, tensor in checkpoint['model_state_dict'].items()
+    }
+
+    path = converted_path(model_name, dtype)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    torch.save({
+        'dims': checkpoint['dims'],
+        'model_state_dict': state_dict,
+        'alignment_heads': whisper._ALIGNMENT_HEADS[model_name],
+    }, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def empty_model(dims: ModelDimensions):
+    '''
+    `Whisper(dims)` with its weights on the meta device, so they are neither allocated nor initialized.
+
+    `Whisper.__init__` cannot run on the meta device, which has no sparse
+    tensors for the default alignment heads, so the encoder and decoder are
+    built here and the alignment heads are left to `set_alignment_heads`.
+    '''
+    model = Whisper.__new__(Whisper)
+    torch.nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device('meta'):
+        model.encoder = AudioEncoder(dims.n_mels, dims.n_audio_ctx, dims.n_audio_state,
+                                     dims.n_audio_head, dims.n_audio_layer)
+        model.decoder = TextDecoder(dims.n_vocab, dims.n_text_ctx, dims.n_text_state,
+                                    dims.n_text_head, dims.n_text_layer)
+    return model
+
+
+def load_converted_model(path: str):
+    '''
+    Load a converted checkpoint with memory-mapped weights.
+
+    The model is built without allocating or initializing weights, and its
+    parameters are then assigned the tensors mapped from the file, in the
+    precision they were converted to. The weights are read from disk as they
+    are first used, and the page cache holds one copy of them for all
+    processes that load the file.
+
+    Args:
+        path (str): The converted checkpoint, see `convert_model`.
+
+    Returns:
+        whisper.Whisper: The model on the CPU.
+    '''
+    checkpoint = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint['dims'])
+    model = empty_model(dims)
+    model.load_state_dict(checkpoint['model_state_dict'], assign=True)
+    # The causal mask and the alignment heads are not part of the state dict.
+    dtype = model.decoder.token_embedding.weight.dtype
+    model.decoder.mask = torch.empty(dims.n_text_ctx, dims.n_text_ctx, dtype=dtype).fill_(-np.inf).triu_(1)
+    model.set_alignment_heads(checkpoint['alignment_heads'])
+    return model
+
+
+def load_model(model_name: str, device='cpu', dtype: str = 'fp32'):
+    '''
+    Load a Whisper model from its memory-mapped converted checkpoint.
+
+    The first load in a precision converts the original checkpoint, see
+    `convert_model`. On the CPU the weights stay mapped from the file. On
+    another device they are copied from the mapping to the device once, so
+    only the page cache is shared there. On any failure to convert or load,
+    it falls back to `whisper.load_model`.
+
+    Args:
+        model_name (str): The name of the Whisper model.
+        device (str, optional): The torch device to move the model to. Defaults to 'cpu'.
+        dtype (str, optional): The weight precision {`fp32`, `fp16`}. Defaults to 'fp32'.
+
+    Returns:
+        whisper.Whisper: The model on `device`.
+    '''
+    path = converted_path(model_name, dtype)
+    try:
+        if not os.path.exists(path):
+            convert_model(model_name, dtype)
+        model = load_converted_model(path)
+    except Exception as e:
+        warnings.warn(f'Failed to load the converted model {path}, loading the original checkpoint: {e}')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            model = whisper.load_model(model_name, device=device)
+        return model if dtype == 'fp32' else model.to(DTYPES[dtype])
+    return model.to(device)
@@ -0,0 +1,32 @@
+import pytest
+import torch
+
+from whisper.model import ModelDimensions, Whisper
+
+
+# A Whisper model small enough to run in the tests, with the vocabulary and context sizes of the released ones.
+TINY_DIMS = dict(n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=2,
+                 n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=2)
+
+
+@pytest.fixture(scope='module')
+def tiny_model():
+    '''
+    A factory of random Whisper models, `tiny_model(seed=0, **dims)` with `dims` overriding `TINY_DIMS`.
+
+    Torch runs on a single thread in the module that uses it, which keeps the
+    reductions, and so the greedy decoding of the random models, identical
+    between runs.
+    '''
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+
+    def make(seed: int = 0, **dims):
+        torch.manual_seed(seed)
+        model = Whisper(ModelDimensions(**{**TINY_DIMS, **dims})).eval()
+        # Whisper leaves the decoder positional embedding uninitialized (`torch.empty`).
+        torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+        return model
+
+    yield make
+    torch.set_num_threads(threads)
@@ -0,0 +1,183 @@
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+from unittest.mock import patch
+
+from echoscript import tracing
+from echoscript.api import TranscriptionAPI
+
+
+class Runner:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.audio = []
+        self.kwargs = []
+
+    def __call__(self, audio, model_name, fmt, language, replica=0, **kwargs):
+        self.kwargs.append(kwargs)
+        if isinstance(audio, bytes):
+            self.audio.append((None, audio))
+        else:
+            with open(audio, 'rb') as f:
+                self.audio.append((audio, f.read()))
+        self.gate.wait(5)
+        if fmt == 'json':
+            return {'text': 'hello', 'language': language}
+        return f'{model_name}:{language}:hello'
+
+
+@pytest.fixture
+def server():
+    runner = Runner()
+    api = TranscriptionAPI(max_queue=1, runner=runner)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(api.start('127.0.0.1', 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield api, runner, server.sockets[0].getsockname()[1]
+    runner.gate.set()
+
+    async def close():
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run_coroutine_threadsafe(close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    api.scheduler.shutdown()
+    tracing.remove_hook(api.metrics)
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    payload = json.loads(response.read())
+    conn.close()
+    return response, payload
+
+
+def test_submit_upload_and_wait(server):
+    api, runner, port = server
+    response, payload = request(port, 'POST', '/jobs?model_name=tiny&quantize=int8&language=en&preset=fast&wait=5',
+                                b'RIFF')
+    assert response.status == 200
+    assert runner.kwargs == [{'preset': 'fast'}]
+    assert payload['status'] == 'done'
+    assert payload['result'] == 'tiny:int8:en:hello'
+    assert runner.audio == [(None, b'RIFF')]
+
+
+def test_submit_path_and_poll(server, tmp_path):
+    api, runner, port = server
+    audio = tmp_path / 'a.mp3'
+    audio.write_bytes(b'ID3')
+    runner.gate.clear()
+    body = json.dumps({'audio': str(audio), 'model_name': 'tiny', 'fmt': 'json'})
+    response, payload = request(port, 'POST', '/jobs', body, {'Content-Type': 'application/json'})
+    assert response.status == 202
+    assert response.getheader('Location') == f'/jobs/{payload["id"]}'
+
+    response, pending = request(port, 'GET', f'/jobs/{payload["id"]}/result')
+    assert response.status == 202
+    assert pending['status'] in ('queued', 'running')
+
+    runner.gate.set()
+    response, status = request(port, 'GET', f'/jobs/{payload["id"]}?wait=5')
+    assert status['status'] == 'done'
+    response, result = request(port, 'GET', f'/jobs/{payload["id"]}/result')
+    assert response.status == 200
+    assert result['result'] == {'text': 'hello', 'language': None}
+    assert audio.exists()
+
+
+def test_queue_full_returns_429(server):
+    api, runner, port = server
+    runner.gate.clear()
+    first, _ = request(port, 'POST', '/jobs?model_name=tiny', b'a')
+    while not runner.audio: pass
+    second, _ = request(port, 'POST', '/jobs?model_name=tiny', b'b')
+    third, payload = request(port, 'POST', '/jobs?model_name=tiny', b'c')
+    assert (first.status, second.status, third.status) == (202, 202, 429)
+    assert int(third.getheader('Retry-After')) >= 1
+    assert 'queue is full' in payload['error']
+
+
+@pytest.mark.parametrize('method, path, body, headers, status', [
+    ('POST', '/jobs?model_name=invalid', b'a', {}, 400),
+    ('POST', '/jobs?fmt=pdf', b'a', {}, 400),
+    ('POST', '/jobs?preset=slow', b'a', {}, 400),
+    ('POST', '/jobs?quantize=int4', b'a', {}, 400),
+    ('POST', '/jobs', b'', {}, 400),
+    ('POST', '/jobs', b'{"audio": "missing.mp3"}', {'Content-Type': 'application/json'}, 400),
+    ('POST', '/jobs', b'{', {'Content-Type': 'application/json'}, 400),
+    ('POST', '/jobs', b'[1]', {'Content-Type': 'application/json'}, 400),
+    ('GET', '/jobs/42', None, {}, 404),
+    ('GET', '/unknown', None, {}, 404),
+])
+def test_errors(server, method, path, body, headers, status):
+    _, _, port = server
+    response, payload = request(port, method, path, body, headers)
+    assert response.status == status
+    assert payload['error']
+
+
+def test_unexpected_errors(server, caplog):
+    api, _, port = server
+    with patch.object(api, 'route', side_effect=RuntimeError('bug')):
+        response, payload = request(port, 'GET', '/health')
+    assert response.status == 500
+    assert payload == {'error': 'Internal server error.'}
+    assert 'Failed to handle GET /health' in caplog.text
+
+    with patch.object(api, 'read_request', side_effect=RuntimeError('bug')):
+        response, payload = request(port, 'GET', '/health')
+    assert response.status == 500
+    assert response.getheader('Connection') == 'close'
+
+    response, _ = request(port, 'GET', '/health')
+    assert response.status == 200
+
+
+@pytest.mark.parametrize('option', [{'language': 1}, {'model_name': ['base']}, {'fmt': {}}, {'preset': True}])
+def test_submit_invalid_option_type(server, tmp_path, option):
+    _, _, port = server
+    audio = tmp_path / 'a.mp3'
+    audio.write_bytes(b'ID3')
+    body = json.dumps({'audio': str(audio), **option})
+    response, payload = request(port, 'POST', '/jobs', body, {'Content-Type': 'application/json'})
+    assert response.status == 400
+    assert payload['error'] == f'The `{next(iter(option))}` option must be a string.'
+
+
+def test_health_and_keep_alive(server):
+    _, _, port = server
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    for _ in range(2):
+        conn.request('GET', '/health')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())['status'] == 'ok'
+    conn.close()
+
+
+def test_metrics(server):
+    _, _, port = server
+    response, payload = request(port, 'POST', '/jobs?model_name=tiny&wait=5', body=b'RIFF')
+    assert response.status == 200
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/metrics')
+    response = conn.getresponse()
+    text = response.read().decode()
+    conn.close()
+    assert response.status == 200
+    assert response.getheader('Content-Type').startswith('text/plain')
+    assert 'echoscript_jobs_total{source="api",status="ok"} 1' in text
+    assert 'echoscript_stage_seconds_total{stage="queue"}' in text
@@ -1,8 +1,11 @@
 
+import numpy as np
 import pytest
 import whisper
 
-from echoscript.audio2text import Audio2Text, audio2text
+from unittest.mock import MagicMock, patch
+
+from echoscript.audio2text import Audio2Text, audio2text, decode_options
 
 class TestAudio2Text:
     def test_available_models(self):
@@ -51,3 +54,34 @@ class TestAudio2Text:
             audio2text(filename, fmt='invalid_format', language='en', model_name='tiny')
         assert 'Format `invalid_format` is not supported.' in str(excinfo.value)
 
+    def test_decode_options(self):
+        assert Audio2Text.available_presets == ['fast', 'balanced', 'accurate']
+        assert decode_options() == {}
+        assert decode_options('fast', beam_size=2) == {
+            'temperature': 0.0, 'condition_on_previous_text': False, 'beam_size': 2,
+        }
+        assert decode_options('accurate', temperature=0.0)['temperature'] == 0.0
+
+        with pytest.raises(ValueError) as excinfo:
+            decode_options('slow')
+        assert 'Preset `slow` is not available.' in str(excinfo.value)
+
+    def test_transcribe_passes_decode_options(self):
+        audio = np.zeros(16000, dtype=np.float32)
+        model = MagicMock()
+        model.device.type = 'cpu'
+        model.transcribe.return_value = {'text': ' Hi', 'segments': []}
+        with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+            text = audio2text(audio, 'tiny', language='zh-tw', cache=False,
+                              preset='accurate', beam_size=3, initial_prompt='Hi')
+            assert text == ' Hi'
+            model.transcribe.assert_called_once_with(
+                audio, language='zh', initial_prompt='使用繁體中文回答: Hi',
+                temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0), beam_size=3, best_of=5, fp16=False,
+            )
+
+            model.device.type = 'cuda'
+            audio2text(audio, 'tiny', cache=False, condition_on_previous_text=False)
+            assert model.transcribe.call_args[1] == {
+                'language': None, 'initial_prompt': None, 'condition_on_previous_text': False, 'fp16': True,
+            }
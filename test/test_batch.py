@@ -0,0 +1,178 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from unittest.mock import patch
+
+from echoscript.batch import collect_audio_files, output_path, output_paths, transcribe_batch, write_transcript
+
+
+@pytest.fixture
+def audio_tree(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ('b.mp3', 'a.wav', 'notes.md', 'sub/c.m4a'):
+        (tmp_path / name).touch()
+    return tmp_path
+
+
+def test_collect_audio_files_directory(audio_tree):
+    files = collect_audio_files([str(audio_tree)])
+    assert files == [
+        str(audio_tree / 'a.wav'),
+        str(audio_tree / 'b.mp3'),
+        str(audio_tree / 'sub' / 'c.m4a'),
+    ]
+
+
+def test_collect_audio_files_glob_manifest(audio_tree):
+    manifest = audio_tree / 'files.txt'
+    manifest.write_text('# comment\nb.mp3\n\nsub/c.m4a\n')
+    files = collect_audio_files([str(manifest), str(audio_tree / '*.mp3'), str(audio_tree / 'a.wav')])
+    assert files == [
+        str(audio_tree / 'b.mp3'),
+        str(audio_tree / 'sub' / 'c.m4a'),
+        str(audio_tree / 'a.wav'),
+    ]
+
+
+def test_output_path():
+    assert output_path('/data/a.mp3') == '/data/a.txt'
+    assert output_path('/data/a.mp3', 'srt', '/out') == '/out/a.srt'
+    assert output_path('a.wav', 'json') == 'a.json'
+
+
+def test_output_paths(audio_tree):
+    files = collect_audio_files([str(audio_tree)])
+    (audio_tree / 'sub' / 'a.mp3').touch()
+    files.append(str(audio_tree / 'sub' / 'a.mp3'))
+    assert output_paths(files, 'srt') == {audio: output_path(audio, 'srt') for audio in files}
+    # Files with the same name in different directories keep their directory layout.
+    assert output_paths(files, 'srt', '/out') == {
+        str(audio_tree / 'a.wav'): '/out/a.srt',
+        str(audio_tree / 'b.mp3'): '/out/b.srt',
+        str(audio_tree / 'sub' / 'c.m4a'): '/out/sub/c.srt',
+        str(audio_tree / 'sub' / 'a.mp3'): '/out/sub/a.srt',
+    }
+    assert output_paths([str(audio_tree / 'sub' / 'c.m4a'), 'https://youtu.be/dQw4w9WgXcQ'], None, '/out') == {
+        str(audio_tree / 'sub' / 'c.m4a'): '/out/c.txt',
+        'https://youtu.be/dQw4w9WgXcQ': '/out/youtube-dQw4w9WgXcQ.txt',
+    }
+    with pytest.raises(ValueError, match='would both be transcribed to'):
+        output_paths([str(audio_tree / 'a.wav'), str(audio_tree / 'sub' / 'a.mp3'), str(audio_tree / 'a.mp3')],
+                     'srt', '/out')
+
+
+def test_write_transcript(tmp_path):
+    write_transcript({'text': 'hi'}, tmp_path / 'a.json')
+    assert json.loads((tmp_path / 'a.json').read_text()) == {'text': 'hi'}
+    write_transcript('hi', tmp_path / 'a.txt')
+    assert (tmp_path / 'a.txt').read_text() == 'hi'
+
+
+def test_transcribe_batch(audio_tree, tmp_path):
+    files = [str(audio_tree / 'a.wav'), str(audio_tree / 'b.mp3')]
+    calls = []
+    with patch('whisper.load_audio') as load_audio, \
+         patch('echoscript.batch.Audio2Text.transcribe') as transcribe:
+        load_audio.side_effect = [np.zeros(16000 * 2, dtype=np.float32), RuntimeError('broken')]
+        transcribe.return_value = 'Transcribed text'
+        stats = transcribe_batch(files, 'tiny', 'srt', output_dir=str(tmp_path / 'out'),
+                                 callback=lambda *args: calls.append(args))
+
+    assert stats['files'] == 1
+    assert stats['failed'] == [(files[1], 'broken')]
+    assert stats['audio_seconds'] == 2.0
+    assert stats['speed'] > 0
+    assert (tmp_path / 'out' / 'a.srt').read_text() == 'Transcribed text'
+    assert calls[0] == (files[0], str(tmp_path / 'out' / 'a.srt'), None)
+    assert calls[1][2] is not None
+
+
+def test_transcribe_batch_pipeline(tmp_path, monkeypatch):
+    from echoscript import media
+
+    class Backend:
+        def source_id(self, url):
+            return f'test-{url[7:]}' if url.startswith('test://') else None
+
+        def fetch(self, url, f):
+            f.write(b'RIFF')
+
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    backend = media.register_backend(Backend())
+    try:
+        with patch('whisper.load_audio', return_value=np.zeros(16000, dtype=np.float32)) as load_audio, \
+             patch('echoscript.batch.Audio2Text.transcribe', return_value='Transcribed text'):
+            stats = transcribe_batch(['test://a', 'test://b'], 'tiny', output_dir=str(tmp_path / 'out'),
+                                     prefetch=2, infer_workers=2)
+    finally:
+        media.unregister_backend(backend)
+
+    assert stats['files'] == 2 and stats['audio_seconds'] == 2.0
+    # The two fetch workers may hand the downloads to the decode stage in either order.
+    assert {call[0][0] for call in load_audio.call_args_list} == {
+        str(tmp_path / 'cache' / 'media' / f'test-{name}.media') for name in 'ab'
+    }
+    assert (tmp_path / 'out' / 'test-b.txt').read_text() == 'Transcribed text'
+    assert list(stats['stages']) == ['fetch', 'decode', 'infer', 'write']
+    assert stats['stages']['infer']['processed'] == 2
+    assert not media._pins
+
+
+def test_transcribe_batch_pool_pins_downloads(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from echoscript import media
+
+    class Backend:
+        def source_id(self, url):
+            return f'test-{url[7:]}' if url.startswith('test://') else None
+
+        def fetch(self, url, f):
+            if url == 'test://broken':
+                raise OSError('unreachable')
+            if url == 'test://b':
+                # The pool is fed before the last download completes.
+                fed.append(started.wait(5))
+            f.write(b'RIFF')
+
+    jobs, fed, started = [], [], threading.Event()
+
+    class Pool:
+        def __init__(self, workers, threads_per_worker, model_name):
+            self.workers = workers
+            self.executor = ThreadPoolExecutor(workers)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.executor.shutdown()
+
+        def submit(self, audio, fmt=None, language=None, **kwargs):
+            def run():
+                # The download is still pinned while its job runs.
+                jobs.append((audio, audio in media._pins))
+                started.set()
+                return 'Transcribed text', 1.0
+            return self.executor.submit(run)
+
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    local = tmp_path / 'local.wav'
+    local.touch()
+    files = ['test://a', 'test://broken', str(local), 'test://b']
+    backend = media.register_backend(Backend())
+    try:
+        with patch('echoscript.pool.TranscriptionPool', Pool):
+            stats = transcribe_batch(files, 'tiny', output_dir=str(tmp_path / 'out'), workers=1, prefetch=1)
+    finally:
+        media.unregister_backend(backend)
+
+    assert stats['files'] == 3 and fed == [True]
+    assert [audio for audio, _ in stats['failed']] == ['test://broken']
+    cached = str(tmp_path / 'cache' / 'media' / 'test-{}.media')
+    assert jobs == [(cached.format('a'), True), (str(local), False), (cached.format('b'), True)]
+    assert (tmp_path / 'out' / 'test-b.txt').read_text() == 'Transcribed text'
+    assert not media._pins
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import whisper
+
+from unittest.mock import patch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.batched import iter_windows, transcribe_batched
+
+
+@pytest.fixture(scope='module')
+def model(tiny_model):
+    return tiny_model()
+
+
+@pytest.fixture(scope='module')
+def clips():
+    rng = np.random.default_rng(0)
+    return [rng.normal(0, 0.1, 16000 * seconds).astype(np.float32) for seconds in (5, 12, 40)]
+
+
+OPTIONS = dict(language='en', temperature=0.0, fp16=False)
+
+
+def test_iter_windows(model, clips):
+    windows = list(iter_windows(model, clips[2]))
+    assert [(seek, size) for seek, size, _ in windows] == [(0, 3000), (3000, 1000)]
+    assert all(mel.shape == (80, 3000) for _, _, mel in windows)
+    assert list(iter_windows(model, np.zeros(0, dtype=np.float32))) == []
+
+
+def test_short_clips_match_whisper(model, clips):
+    results = transcribe_batched(model, clips[:2], batch_size=1, **OPTIONS)
+    for clip, result in zip(clips[:2], results):
+        expected = whisper.transcribe(model, clip, condition_on_previous_text=False, **OPTIONS)
+        assert result['segments'] == expected['segments']
+        assert result['text'] == expected['text']
+        assert result['language'] == 'en'
+
+
+def test_batching_keeps_results(model, clips):
+    sequential = transcribe_batched(model, clips, batch_size=1, **OPTIONS)
+    batched = transcribe_batched(model, clips, batch_size=4, **OPTIONS)
+    assert len(batched) == len(clips)
+    for expected, result in zip(sequential, batched):
+        assert result['text'] == expected['text']
+        for segment, expected_segment in zip(result['segments'], expected['segments']):
+            assert segment['tokens'] == expected_segment['tokens']
+            assert (segment['seek'], segment['start'], segment['end']) == \
+                (expected_segment['seek'], expected_segment['start'], expected_segment['end'])
+            assert segment['avg_logprob'] == pytest.approx(expected_segment['avg_logprob'], abs=1e-4)
+    assert {segment['seek'] for segment in batched[2]['segments']} == {0, 3000}
+
+
+def test_language_detection_and_empty_input(model, clips):
+    results = transcribe_batched(model, [clips[0], np.zeros(0, dtype=np.float32)], batch_size=2, temperature=0.0)
+    assert results[0]['language'] in whisper.tokenizer.LANGUAGES
+    assert results[1] == {'text': '', 'segments': [], 'language': None}
+
+    with pytest.raises(ValueError) as excinfo:
+        transcribe_batched(model, clips, word_timestamps=True)
+    assert 'Option `word_timestamps` is not supported when batching.' in str(excinfo.value)
+
+
+def test_transcribe_many(model, clips, tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    audios = clips[:2]
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model) as load:
+        texts = Audio2Text().transcribe_many(audios, 'tiny', language='en', batch_size=2, temperature=0.0)
+        assert load.call_count == 1
+        subtitles = Audio2Text().transcribe_many(audios[::-1], 'tiny', 'srt', 'en', batch_size=2, temperature=0.0)
+        assert load.call_count == 1
+
+    expected = transcribe_batched(model, audios, batch_size=2, **OPTIONS)
+    assert texts == [result['text'] for result in expected]
+    assert subtitles[1].startswith('1\n00:00:00,000 --> ')
+
+    with pytest.raises(ValueError):
+        Audio2Text().transcribe_many(audios, fmt='pdf')
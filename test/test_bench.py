@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.bench import (
+    bench_format,
+    compare,
+    format_comparison,
+    metric,
+    run_benchmarks,
+    synthetic_audio,
+    synthetic_segments,
+    wav_bytes,
+)
+from echoscript.cli import cli
+
+
+@pytest.fixture
+def model(tiny_model):
+    return tiny_model()
+
+
+def test_synthetic_audio():
+    tone = synthetic_audio('tone', 2)
+    noise = synthetic_audio('noise', 2)
+    assert tone.shape == noise.shape == (32000,)
+    assert tone.dtype == noise.dtype == np.float32
+    assert np.abs(tone).max() <= 1 and np.abs(noise).max() <= 1
+    np.testing.assert_array_equal(noise, synthetic_audio('noise', 2))
+    with pytest.raises(ValueError):
+        synthetic_audio('speech')
+
+    data = wav_bytes(tone)
+    assert data[:4] == b'RIFF' and len(data) == 44 + 2 * len(tone)
+
+
+def test_bench_format():
+    assert len(synthetic_segments(10)) == 10
+    results = bench_format(100, repeat=1)
+    assert set(results) == {'format.srt', 'format.vtt'}
+    assert results['format.srt']['value'] > 0
+
+
+def test_compare():
+    baseline = {'results': {
+        'a': metric(1.0), 'b': metric(1.0), 'c': metric(100, 'tokens/s', 'higher'),
+        'd': metric(1.0), 'gone': metric(1.0),
+    }}
+    current = {'results': {
+        'a': metric(1.05), 'b': metric(1.5), 'c': metric(50, 'tokens/s', 'higher'),
+        'd': metric(0.5), 'new': metric(1.0),
+    }}
+    rows = {row['name']: row for row in compare(baseline, current, threshold=0.1)}
+    assert {name: row['status'] for name, row in rows.items()} == {
+        'a': 'ok', 'b': 'regression', 'c': 'regression', 'd': 'improvement', 'gone': 'missing', 'new': 'new',
+    }
+    assert rows['b']['change'] == pytest.approx(0.5)
+    assert rows['c']['change'] == pytest.approx(0.5)
+    table = format_comparison(list(rows.values()))
+    assert 'regression' in table and '+50.0%' in table
+
+
+def test_run_benchmarks_model(model):
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+        report = run_benchmarks(['tiny'], suites=['model'], audio=None, repeat=1)
+    results = report['results']
+    assert results['model.tiny.decode']['better'] == 'higher'
+    assert {'model.tiny.load_cold', 'model.tiny.load_warm', 'model.tiny.encode',
+            'model.tiny.transcribe.tone', 'model.tiny.transcribe.noise'} <= set(results)
+    assert report['meta']['torch'] == torch.__version__
+
+    with pytest.raises(ValueError):
+        run_benchmarks(suites=['gpu'])
+
+
+def test_cli_bench(tmp_path):
+    runner = CliRunner()
+    output = tmp_path / 'results.json'
+    result = runner.invoke(cli, ['bench', '-s', 'format', '--segments', '100', '--repeat', '1', '-o', str(output)])
+    assert result.exit_code == 0
+    assert 'format.srt' in result.output
+    report = json.loads(output.read_text())
+    assert set(report['results']) == {'format.srt', 'format.vtt'}
+
+    baseline = tmp_path / 'baseline.json'
+    report['results']['format.srt']['value'] /= 10
+    baseline.write_text(json.dumps(report))
+    result = runner.invoke(cli, ['bench', '--compare', str(output), '--baseline', str(baseline)])
+    assert result.exit_code == 1
+    assert 'format.srt' in result.output and 'regression' in result.output
+
+    result = runner.invoke(cli, ['bench', '--compare', str(output), '--baseline', str(output)])
+    assert result.exit_code == 0
+
+    result = runner.invoke(cli, ['bench', '-s', 'gpu'])
+    assert result.exit_code == 1
+    assert 'Suite gpu is not available' in result.output
@@ -0,0 +1,123 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+
+from unittest.mock import patch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.checkpoint import Checkpoint
+from echoscript.streaming import iter_transcribe
+
+
+@pytest.fixture(scope='module')
+def model(tiny_model):
+    return tiny_model()
+
+
+@pytest.fixture(scope='module')
+def audio():
+    return np.random.default_rng(0).normal(0, 0.1, 16000 * 70).astype(np.float32)
+
+
+# The random model fails every greedy decoding, so each window is also sampled at temperature 0.4.
+OPTIONS = dict(temperature=(0.0, 0.4), sample_len=16, fp16=False, initial_prompt='Hello')
+
+
+def test_checkpoint_file(tmp_path):
+    path = str(tmp_path / 'job.checkpoint')
+    checkpoint = Checkpoint('key', path)
+    assert checkpoint.load() is None
+    checkpoint.commit([{'id': 0}], {'seek': 3000})
+    checkpoint.commit([], {'seek': 6000})
+    checkpoint.close()
+    with open(path, 'a') as f:
+        f.write('{"state": {"seek": 9')
+
+    checkpoint = Checkpoint('key', path)
+    assert checkpoint.load() == {'seek': 6000, 'segments': [{'id': 0}]}
+    checkpoint.commit([{'id': 1}], {'seek': 9000})
+    checkpoint.close()
+    assert Checkpoint('key', path).load() == {'seek': 9000, 'segments': [{'id': 0}, {'id': 1}]}
+    with open(path) as f:
+        assert [json.loads(line) for line in f][0] == {'key': 'key', 'version': 1}
+
+    assert Checkpoint('other', path).load() is None
+    Checkpoint('key', path).remove()
+    Checkpoint('key', path).remove()
+
+
+@pytest.mark.parametrize('record', ['{"state": {"seek": 9000}}', '{"segments": []}', '[1, 2]',
+                                    '{"state": 1, "segments": []}'])
+def test_checkpoint_malformed_record(tmp_path, record):
+    path = str(tmp_path / 'job.checkpoint')
+    checkpoint = Checkpoint('key', path)
+    checkpoint.commit([{'id': 0}], {'seek': 3000})
+    checkpoint.close()
+    with open(path, 'a') as f:
+        f.write(record + '\n{"state": {"seek": 12000}, "segments": []}\n')
+
+    checkpoint = Checkpoint('key', path)
+    assert checkpoint.load() == {'seek': 3000, 'segments': [{'id': 0}]}
+    checkpoint.commit([], {'seek': 6000})
+    checkpoint.close()
+    assert Checkpoint('key', path).load() == {'seek': 6000, 'segments': [{'id': 0}]}
+
+
+@pytest.mark.parametrize('header', ['[1]', '"key"', '1', 'null'])
+def test_checkpoint_malformed_header(tmp_path, header):
+    path = tmp_path / 'job.checkpoint'
+    path.write_text(header + '\n{"state": {"seek": 3000}, "segments": []}\n')
+    checkpoint = Checkpoint('key', str(path))
+    assert checkpoint.load() is None
+    checkpoint.commit([], {'seek': 6000})
+    checkpoint.close()
+    assert Checkpoint('key', str(path)).load() == {'seek': 6000, 'segments': []}
+
+
+def test_iter_transcribe_resume(model, audio):
+    states = []
+    torch.manual_seed(1)
+    expected = list(iter_transcribe(model, audio, language='en', checkpoint=states.append, **OPTIONS))
+    assert len(states) == 3 and len(expected) >= 3
+
+    first = [segment for segment in expected if segment['seek'] < states[0]['seek']]
+    torch.manual_seed(2)
+    resumed = list(iter_transcribe(model, audio, language='en', resume={**states[0], 'segments': first}, **OPTIONS))
+    assert first + resumed == expected
+
+
+def test_iter_segments_resumes_interrupted_job(model, audio, tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    path = str(tmp_path / 'out.srt.checkpoint')
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model) as load:
+        torch.manual_seed(1)
+        expected = list(Audio2Text().iter_segments(audio, 'tiny', 'en', cache=False, **OPTIONS))
+
+        torch.manual_seed(1)
+        segments = Audio2Text().iter_segments(audio, 'tiny', 'en', cache=False, checkpoint=path, **OPTIONS)
+        for segment in segments:
+            if segment['seek'] > 0:
+                break
+        # The job dies after committing its first window.
+        segments.close()
+        committed = Checkpoint(None, path)
+        with open(path) as f:
+            committed.key = json.loads(f.readline())['key']
+        assert 0 < len(committed.load()['segments']) < len(expected)
+
+        torch.manual_seed(2)
+        engine = Audio2Text()
+        assert list(engine.iter_segments(audio, 'tiny', 'en', cache=False, checkpoint=path, **OPTIONS)) == expected
+        assert engine.language == 'en'
+        assert not (tmp_path / 'out.srt.checkpoint').exists()
+
+        torch.manual_seed(1)
+        text = Audio2Text().transcribe(audio, 'tiny', 'json', 'en', cache=False, checkpoint=True, **OPTIONS)
+        assert text['segments'] == expected
+        assert not list((tmp_path / 'cache' / 'checkpoints').iterdir())
+    assert load.call_count == 4
+
+    with pytest.raises(ValueError):
+        Audio2Text().transcribe(audio, 'tiny', 'words', 'en', checkpoint=True)
@@ -53,3 +53,184 @@ def test_list_languages(runner):
     assert 'fr: French' in result.output
     assert 'zh: Chinese' in result.output
 
+
+
+def test_batch(tmp_path, runner):
+    (tmp_path / 'a.wav').touch()
+    stats = {'files': 1, 'failed': [], 'audio_seconds': 2.0, 'wall_seconds': 1.0, 'speed': 2.0}
+    with patch('echoscript.cli.transcribe_batch', return_value=stats) as transcribe_batch:
+        result = runner.invoke(cli, ['batch', str(tmp_path), '-m', 'tiny', '-f', 'srt', '-j', '2'])
+    assert result.exit_code == 0
+    assert transcribe_batch.call_args[0][0] == [str(tmp_path / 'a.wav')]
+    assert transcribe_batch.call_args[1]['workers'] == 2
+    assert 'preset' not in transcribe_batch.call_args[1]
+
+    with patch('echoscript.cli.transcribe_batch', return_value=stats) as transcribe_batch:
+        result = runner.invoke(cli, ['batch', str(tmp_path), '--preset', 'accurate'])
+    assert transcribe_batch.call_args[1]['preset'] == 'accurate'
+    assert '2.00x real time' in result.output
+
+
+def test_batch_no_files(tmp_path, runner):
+    result = runner.invoke(cli, ['batch', str(tmp_path)])
+    assert result.exit_code == 1
+    assert 'No audio files found.' in result.output
+
+
+def test_batch_duplicate_outputs(tmp_path, runner):
+    (tmp_path / 'talk.wav').touch()
+    (tmp_path / 'talk.mp3').touch()
+    with patch('echoscript.cli.transcribe_batch') as transcribe_batch:
+        result = runner.invoke(cli, ['batch', str(tmp_path), '-o', str(tmp_path / 'out')])
+    assert result.exit_code == 1
+    assert 'would both be transcribed to' in result.output
+    transcribe_batch.assert_not_called()
+
+
+def test_batch_invalid_format(tmp_path, runner):
+    result = runner.invoke(cli, ['batch', str(tmp_path), '-f', 'doc'])
+    assert result.exit_code == 1
+    assert 'Format doc is not supported.' in result.output
+
+
+def test_cli_chunk_length(tmp_path, runner):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    with patch('echoscript.longform.transcribe_long', return_value='Long text') as transcribe_long:
+        result = runner.invoke(cli, ['-a', str(temp_audio), '--chunk-length', '600', '-j', '4'])
+    assert result.exit_code == 0
+    assert 'Long text' in result.output
+    assert transcribe_long.call_args[1]['workers'] == 4
+
+
+def test_cache_stats_clear(tmp_path, runner, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    from echoscript.result_cache import ResultCache
+    ResultCache().put('ab12', {'text': 'hi'})
+
+    result = runner.invoke(cli, ['cache', 'stats'])
+    assert result.exit_code == 0
+    assert 'entries: 1' in result.output
+
+    result = runner.invoke(cli, ['cache', 'clear'])
+    assert result.exit_code == 0
+    assert 'Removed 1 cached results.' in result.output
+
+
+def test_cli_no_cache(tmp_path, runner, mocker):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    mocker.return_value = 'Transcribed text'
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--no-cache'])
+    assert result.exit_code == 0
+    assert mocker.call_args[1]['cache'] is False
+
+
+def test_cli_decode_options(tmp_path, runner, mocker):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    mocker.return_value = 'Transcribed text'
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--preset', 'fast', '--beam-size', '3',
+                                 '--temperature', '0', '--temperature', '0.4', '--fp32'])
+    assert result.exit_code == 0
+    assert mocker.call_args[1] == {'cache': True, 'preset': 'fast', 'beam_size': 3,
+                                   'temperature': (0.0, 0.4), 'fp16': False}
+
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--temperature', '0.2', '--no-condition-on-previous-text'])
+    assert mocker.call_args[1] == {'cache': True, 'temperature': 0.2, 'condition_on_previous_text': False}
+
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--preset', 'slow'])
+    assert result.exit_code == 2
+
+
+def test_cli_streams_output_file(tmp_path, runner):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    output = tmp_path / 'out.srt'
+    segments = [{'start': 0, 'end': 1, 'text': 'Hello'}, {'start': 1, 'end': 2, 'text': 'World'}]
+    with patch('echoscript.cli.Audio2Text.iter_segments', return_value=iter(segments)):
+        result = runner.invoke(cli, ['-a', str(temp_audio), '-f', 'srt', '-o', str(output)])
+    assert result.exit_code == 0
+    assert output.read_text() == '1\n00:00:00,000 --> 00:00:01,000\nHello\n\n2\n00:00:01,000 --> 00:00:02,000\nWorld\n'
+    assert 'World' in result.output
+
+
+def test_cli_resume(tmp_path, runner, mocker):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    mocker.return_value = 'Transcribed text'
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--resume'])
+    assert result.exit_code == 0
+    assert mocker.call_args[1]['checkpoint'] is True
+
+    output = tmp_path / 'out.srt'
+    with patch('echoscript.cli.Audio2Text.iter_segments', return_value=iter([])) as iter_segments:
+        result = runner.invoke(cli, ['-a', str(temp_audio), '-f', 'srt', '-o', str(output), '--resume'])
+    assert result.exit_code == 0
+    assert iter_segments.call_args[1]['checkpoint'] == f'{output}.checkpoint'
+
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--resume', '--chunk-length', '60'])
+    assert result.exit_code == 1
+
+
+def test_serve_options(runner):
+    with patch('echoscript.gradio_app.TranscriptionApp') as app:
+        result = runner.invoke(cli, ['serve', '--max-queue', '8', '--workers', '2', '--model-concurrency', '2'])
+    assert result.exit_code == 0
+    app.assert_called_once_with(8, 2, 2, metrics_port=None)
+    app.return_value.launch.assert_called_once_with(7860, '0.0.0.0', False)
+
+    with patch('echoscript.gradio_app.TranscriptionApp') as app:
+        result = runner.invoke(cli, ['serve', '--metrics-port', '9090'])
+    assert result.exit_code == 0
+    app.assert_called_once_with(32, 1, 1, metrics_port=9090)
+
+
+def test_serve_preload(runner):
+    with patch('echoscript.gradio_app.TranscriptionApp'), \
+            patch('echoscript.cli.Audio2Text.load_whisper_model') as load:
+        result = runner.invoke(cli, ['serve', '--preload', 'turbo, base:int8', '--model-concurrency', '2'])
+    assert result.exit_code == 0
+    assert [(c.args, c.kwargs) for c in load.call_args_list] == [
+        (('turbo',), {'replica': 0}), (('turbo',), {'replica': 1}),
+        (('base:int8',), {'replica': 0}), (('base:int8',), {'replica': 1}),
+    ]
+    assert 'Preloaded turbo in' in result.output
+
+    with patch('echoscript.api.TranscriptionAPI'), patch('echoscript.cli.Audio2Text.load_whisper_model') as load:
+        result = runner.invoke(cli, ['api', '--preload', 'tiny'])
+    assert result.exit_code == 0
+    load.assert_called_once_with('tiny', replica=0)
+
+    result = runner.invoke(cli, ['serve', '--preload', 'huge'])
+    assert result.exit_code == 2
+
+
+def test_api_options(runner):
+    with patch('echoscript.api.TranscriptionAPI') as api:
+        result = runner.invoke(cli, ['api', '--port', '8080', '--max-queue', '4', '--workers', '2'])
+    assert result.exit_code == 0
+    api.assert_called_once_with(4, 2, 1)
+    api.return_value.run.assert_called_once_with('127.0.0.1', 8080)
+
+
+def test_cli_vad(tmp_path, runner):
+    temp_audio = tmp_path / 'test.wav'
+    temp_audio.touch()
+    calls = []
+
+    def transcribe(self, *args, **kwargs):
+        calls.append(kwargs)
+        self.vad_report = {'duration': 10.0, 'speech': 4.0, 'skipped': 6.0, 'regions': 3}
+        return 'Transcribed text'
+
+    with patch('echoscript.cli.Audio2Text.transcribe', transcribe):
+        result = runner.invoke(cli, ['-a', str(temp_audio), '--vad'])
+    assert result.exit_code == 0
+    assert calls[0]['vad'] == 'energy'
+    assert 'Transcribed text' in result.output
+    assert 'skipped 6.0s of 10.0s (60%)' in result.output
+
+    result = runner.invoke(cli, ['-a', str(temp_audio), '--vad', '--vad-method', 'invalid'])
+    assert result.exit_code == 1
+    assert 'VAD invalid is not available.' in result.output
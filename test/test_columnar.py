@@ -0,0 +1,80 @@
+import mmap
+
+import numpy as np
+import pytest
+
+from echoscript.columnar import ColumnarTranscript, pack_strings, unpack_strings
+
+
+RESULT = {
+    'text': ' Hello world. 你好',
+    'segments': [
+        {'id': 0, 'seek': 0, 'start': 0.0, 'end': 2.4000000000000004, 'text': ' Hello world.',
+         'tokens': [50364, 2425, 1002, 13], 'temperature': 0.0, 'avg_logprob': -0.25,
+         'compression_ratio': 0.5, 'no_speech_prob': 0.125,
+         'words': [{'word': ' Hello', 'start': 0.0, 'end': 0.5, 'probability': 0.75},
+                   {'word': ' world.', 'start': 0.5, 'end': 1.24, 'probability': 0.5}]},
+        {'id': 1, 'seek': 3000, 'start': 30.0, 'end': 31.5, 'text': ' 你好', 'tokens': [],
+         'temperature': 0.2, 'avg_logprob': -1.5, 'compression_ratio': 1.0, 'no_speech_prob': 0.5,
+         'words': []},
+    ],
+    'language': 'zh',
+}
+
+
+def test_pack_strings():
+    buffer, offsets = pack_strings(['a', '', 'ünï', '字'])
+    assert offsets.tolist() == [0, 1, 1, 6, 9]
+    assert unpack_strings(buffer, offsets) == ['a', '', 'ünï', '字']
+    assert unpack_strings(buffer, offsets, 2, 4) == ['ünï', '字']
+    assert unpack_strings(buffer, offsets, 1, 1) == []
+
+
+@pytest.mark.parametrize('mmap_mode', [True, False])
+def test_round_trip(tmp_path, mmap_mode):
+    path = str(tmp_path / 'talk.ects')
+    ColumnarTranscript.from_result(RESULT).save(path)
+    transcript = ColumnarTranscript.load(path, mmap_mode)
+    # The scores are chosen to be exact in float32.
+    assert transcript.to_result() == RESULT
+    assert len(transcript) == 2 and transcript.language == 'zh'
+    assert transcript.texts() == [' Hello world.', ' 你好'] and transcript.text(1) == ' 你好'
+    assert transcript.start.dtype == np.float64 and transcript.avg_logprob.dtype == np.float32
+    assert transcript.start[transcript.no_speech_prob < 0.5].tolist() == [0.0]
+    assert not transcript.start.flags.writeable
+    base = transcript.start
+    while isinstance(base, np.ndarray):
+        base = base.base
+    assert isinstance(getattr(base, 'obj', base), mmap.mmap) == mmap_mode
+
+
+def test_partial_results(tmp_path):
+    path = str(tmp_path / 'partial.ects')
+    result = {
+        'text': 'different text',
+        'segments': [{'id': 5, 'start': 1.0, 'end': 2.0, 'text': ' a'}, {'id': 7, 'start': 2.0, 'end': 3.0, 'text': ' b'}],
+        'language': 'en',
+        'source': 'talk.mp3',
+    }
+    ColumnarTranscript.from_result(result).save(path)
+    rebuilt = ColumnarTranscript.load(path).to_result()
+    assert rebuilt['text'] == 'different text' and rebuilt['source'] == 'talk.mp3'
+    assert [segment['id'] for segment in rebuilt['segments']] == [5, 7]
+    assert rebuilt['segments'][0] == {'id': 5, 'seek': 0, 'start': 1.0, 'end': 2.0, 'text': ' a', 'tokens': []}
+
+    empty = {'text': '', 'segments': [], 'language': None}
+    ColumnarTranscript.from_result(empty).save(path)
+    assert ColumnarTranscript.load(path).to_result() == empty
+
+
+def test_float32_scores():
+    result = {**RESULT, 'segments': [{**RESULT['segments'][0], 'avg_logprob': -0.1}]}
+    segment = ColumnarTranscript.from_result(result).to_result()['segments'][0]
+    assert segment['avg_logprob'] == pytest.approx(-0.1, rel=1e-6)
+
+
+def test_load_invalid(tmp_path):
+    path = tmp_path / 'broken.ects'
+    path.write_bytes(b'{"text": ""}')
+    with pytest.raises(ValueError, match='not an echoscript columnar file'):
+        ColumnarTranscript.load(str(path))
@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytest
+
+from echoscript import formats
+from echoscript.audio2text import Audio2Text
+from echoscript.batch import output_path
+from echoscript.utils import TranscriptWriter, format_timestamp, segments2subtitle
+
+
+segments = [
+    {'start': 0, 'end': 2.5, 'text': ' Hello,\tworld!',
+     'words': [{'word': ' Hello,', 'start': 0.0, 'end': 1.0}, {'word': ' world!', 'start': 1.2, 'end': 2.5}]},
+    {'start': 2.5, 'end': 3661.05, 'text': ' This is a test.',
+     'words': [{'word': ' This', 'start': 2.5, 'end': 2.8}]},
+]
+
+
+def test_format_timestamps():
+    times = [0, 0.5, 0.9996, 3661.05, 10665.25]
+    assert formats.format_timestamps(times) == [format_timestamp(t) for t in times]
+    assert formats.format_timestamps([61.5], decimal='.', hours=False) == ['01:01.500']
+
+
+def test_tsv_and_jsonl():
+    assert formats.get_formatter('tsv').format(segments) == (
+        'start\tend\ttext\n'
+        '0\t2500\tHello, world!\n'
+        '2500\t3661050\tThis is a test.\n'
+    )
+    lines = formats.get_formatter('jsonl').format(segments).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'id': 0, 'start': 0, 'end': 2.5, 'text': ' Hello,\tworld!'},
+        {'id': 1, 'start': 2.5, 'end': 3661.05, 'text': ' This is a test.'},
+    ]
+
+
+def test_words():
+    assert formats.get_formatter('words').format(segments) == (
+        'start\tend\tword\n'
+        '0\t1000\tHello,\n'
+        '1200\t2500\tworld!\n'
+        '2500\t2800\tThis\n'
+    )
+    with pytest.raises(ValueError):
+        formats.get_formatter('words').format([{'start': 0, 'end': 1, 'text': 'a'}])
+
+
+@pytest.mark.parametrize('fmt', formats.available_formats())
+def test_write_matches_format_and_writer(fmt, monkeypatch):
+    monkeypatch.setattr(formats, 'WRITE_CHUNK', 3)
+    many = segments * 4
+    formatter = formats.get_formatter(fmt)
+    expected = formatter.format(many)
+
+    f = io.StringIO()
+    assert formatter.write(iter(many), f) == len(many)
+    assert f.getvalue() == expected
+
+    f = io.StringIO()
+    writer = TranscriptWriter(f, fmt)
+    for segment in many:
+        writer.write(segment)
+    writer.close()
+    assert f.getvalue() == expected
+    assert Audio2Text.format_result({'text': 'text', 'segments': many}, fmt) == (
+        'text' if fmt is None else expected)
+
+
+def test_registry():
+    assert Audio2Text.available_formats == ('json', 'vtt', 'srt', 'tsv', 'jsonl', 'words', None)
+    assert output_path('a/b.mp3', 'words') == 'a/b.words.tsv'
+    assert output_path('a/b.mp3', 'json') == 'a/b.json'
+    with pytest.raises(ValueError):
+        formats.get_formatter('doc')
+
+    class CSVFormatter(formats.Formatter):
+        name, extension, header = 'csv', '.csv', 'start,end\n'
+
+        def records(self, segments, start=1):
+            return [f"{s['start']},{s['end']}\n" for s in segments]
+
+    formats.register_format(CSVFormatter())
+    try:
+        assert 'csv' in Audio2Text.available_formats
+        assert segments2subtitle(segments, 'csv') == 'start,end\n0,2.5\n2.5,3661.05\n'
+        assert output_path('b.mp3', 'csv') == 'b.csv'
+    finally:
+        del formats._FORMATTERS['csv']
+
+
+def test_transcribe_many_rejects_word_formats():
+    with pytest.raises(ValueError):
+        Audio2Text().transcribe_many([], fmt='words')
@@ -0,0 +1,36 @@
+import pytest
+
+from echoscript.bench import HEAVY_MODULES, import_profile
+
+
+# Generous budget for the whole interpreter startup, it only catches a heavy
+# dependency sneaking back into the import path of the CLI.
+BUDGET_SECONDS = 1.5
+
+
+@pytest.mark.parametrize('code', [
+    'import echoscript',
+    "from echoscript.cli import cli; cli(['--help'])",
+    "from echoscript.cli import cli; cli(['list', '--models', '--langs'])",
+])
+def test_cli_entry_points_skip_heavy_imports(code):
+    milliseconds, packages = import_profile(code)
+    assert not packages & set(HEAVY_MODULES)
+    assert milliseconds < BUDGET_SECONDS * 1000
+
+
+def test_lazy_package_attributes():
+    from echoscript import TranscriptionPool, transcribe_long
+    assert TranscriptionPool.__name__ == 'TranscriptionPool'
+    assert callable(transcribe_long)
+
+    import echoscript
+    with pytest.raises(AttributeError):
+        echoscript.missing
+
+
+def test_available_constants_match_whisper():
+    import whisper
+    from echoscript import Audio2Text
+    assert Audio2Text.available_models == whisper.available_models()
+    assert set(Audio2Text.available_languages) == set(whisper.tokenizer.LANGUAGES) | {'zh-tw'}
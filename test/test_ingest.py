@@ -0,0 +1,141 @@
+import io
+import os
+import stat
+import sys
+
+import numpy as np
+import pytest
+
+from click.testing import CliRunner
+from unittest.mock import MagicMock, patch
+
+from echoscript import Audio2Text
+from echoscript.cli import cli
+from echoscript.ingest import PCMBuffer, ingest, is_stream, load_audio
+
+
+# Stands in for ffmpeg: the "encoded" audio is `FAKE` followed by raw float32 samples.
+FAKE_FFMPEG = '''#!{python}
+import sys
+
+args = sys.argv[1:]
+source = args[args.index('-i') + 1]
+if source == 'pipe:0':
+    data = sys.stdin.buffer.read()
+else:
+    with open(source, 'rb') as f:
+        data = f.read()
+if not data.startswith(b'FAKE'):
+    sys.stderr.write('Invalid data found when processing input\\n')
+    sys.exit(1)
+sys.stdout.buffer.write(data[4:])
+'''
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch):
+    path = tmp_path / 'bin' / 'ffmpeg'
+    path.parent.mkdir()
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f'{path.parent}{os.pathsep}{os.environ["PATH"]}')
+    return path
+
+
+def encode(samples):
+    return b'FAKE' + np.asarray(samples, dtype=np.float32).tobytes()
+
+
+@pytest.fixture
+def samples():
+    return np.random.default_rng(0).uniform(-1, 1, 50_000).astype(np.float32)
+
+
+def test_is_stream():
+    assert is_stream(b'a') and is_stream(memoryview(b'a')) and is_stream(io.BytesIO()) and is_stream('-')
+    assert not is_stream('audio.mp3')
+    assert not is_stream(np.zeros(3, dtype=np.float32))
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview, io.BytesIO])
+def test_load_audio_in_memory(ffmpeg, samples, wrap):
+    audio = load_audio(wrap(encode(samples)))
+    assert audio.dtype == np.float32
+    np.testing.assert_array_equal(audio, samples)
+
+
+def test_load_audio_path_and_stdin(ffmpeg, samples, tmp_path, monkeypatch):
+    path = tmp_path / 'audio.fake'
+    path.write_bytes(encode(samples))
+    np.testing.assert_array_equal(load_audio(str(path)), samples)
+
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(encode(samples))))
+    np.testing.assert_array_equal(load_audio('-'), samples)
+
+
+def test_load_audio_memory_maps_long_audio(ffmpeg, samples):
+    audio = load_audio(encode(samples), mmap_threshold=64 * 1024)
+    assert isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, samples)
+
+    audio = load_audio(encode(samples), duration=len(samples) / 16000)
+    assert not isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, samples)
+
+
+def test_load_audio_errors(ffmpeg, monkeypatch):
+    with pytest.raises(RuntimeError) as excinfo:
+        load_audio(b'not audio' * 100_000)
+    assert 'Invalid data found' in str(excinfo.value)
+
+    monkeypatch.setenv('PATH', '')
+    with pytest.raises(RuntimeError) as excinfo:
+        load_audio(b'FAKE')
+    assert 'ffmpeg was not found' in str(excinfo.value)
+
+
+def test_pcm_buffer_grows():
+    buffer = PCMBuffer(capacity=4, mmap_threshold=64)
+    stream = io.BytesIO(np.arange(40, dtype=np.float32).tobytes())
+    while buffer.readinto(stream):
+        pass
+    assert buffer.mapped
+    np.testing.assert_array_equal(buffer.array(), np.arange(40))
+
+    buffer = PCMBuffer(capacity=4)
+    stream = io.BytesIO(np.arange(10, dtype=np.float32).tobytes())
+    while buffer.readinto(stream):
+        pass
+    assert not buffer.mapped
+    np.testing.assert_array_equal(buffer.array(), np.arange(10))
+
+
+def test_ingest_keeps_paths_and_waveforms(samples):
+    assert ingest('audio.mp3') == 'audio.mp3'
+    assert ingest(samples) is samples
+
+
+def test_transcribe_bytes(ffmpeg, samples, tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    model = MagicMock()
+    model.device.type = 'cpu'
+    model.transcribe.return_value = {'text': ' Hi', 'segments': []}
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+        assert Audio2Text().transcribe(encode(samples), 'tiny') == ' Hi'
+        np.testing.assert_array_equal(model.transcribe.call_args[0][0], samples)
+
+        # served from the result cache without decoding again
+        assert Audio2Text().transcribe(encode(samples), 'tiny') == ' Hi'
+        assert model.transcribe.call_count == 1
+
+        assert Audio2Text().transcribe(io.BytesIO(encode(samples)), 'tiny', cache=False) == ' Hi'
+        np.testing.assert_array_equal(model.transcribe.call_args[0][0], samples)
+
+
+def test_cli_reads_stdin(ffmpeg, samples):
+    runner = CliRunner()
+    with patch('echoscript.cli.audio2text', return_value='Transcribed text') as audio2text:
+        result = runner.invoke(cli, ['-a', '-', '--no-cache'], input=encode(samples))
+    assert result.exit_code == 0
+    assert audio2text.call_args[0][0] == '-'
+    assert 'Transcribed text' in result.output
@@ -0,0 +1,178 @@
+import threading
+import time
+
+import pytest
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from echoscript.cli import cli
+from echoscript.jobqueue import JobQueue, Worker, run_job
+
+
+RESULT = {'text': 'hello', 'segments': [], 'language': 'en'}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'queue.db'))
+
+
+def runner(job):
+    if job['audio'] == 'broken.mp3':
+        raise RuntimeError('broken')
+    return {**RESULT, 'text': f'{job["model_name"]}:{job["audio"]}'}, 10.0
+
+
+def test_claim_order(queue):
+    queue.register_worker('w')
+    ids = {
+        'small': queue.submit('a.mp3', 'small'),
+        'base': queue.submit('b.mp3', 'base'),
+        'tiny': queue.submit('c.mp3', 'tiny'),
+        'urgent': queue.submit('d.mp3', 'large', priority=1),
+    }
+    assert queue.claim('w', max_wait=60)['id'] == ids['urgent']
+    # The model of the last job, then the loaded models, then the oldest job.
+    assert queue.claim('w', models=['base'], last_model='tiny', max_wait=60)['id'] == ids['tiny']
+    assert queue.claim('w', models=['base'], max_wait=60)['id'] == ids['base']
+    assert queue.claim('w', max_wait=60)['id'] == ids['small']
+    assert queue.claim('w') is None
+
+
+def test_claim_overdue_first(queue):
+    old = queue.submit('a.mp3', 'small')
+    time.sleep(0.05)
+    queue.submit('b.mp3', 'base')
+    assert queue.claim('w', models=['base'], max_wait=0.01)['id'] == old
+
+
+def test_expired_lease(queue):
+    job_id = queue.submit('a.mp3', 'base', max_attempts=2)
+    crashed = queue.claim('w1', lease=0.01)
+    assert crashed['attempts'] == 1
+    time.sleep(0.05)
+
+    job = queue.claim('w2', lease=60)
+    assert job['id'] == job_id and job['attempts'] == 2 and job['worker'] == 'w2'
+    # The crashed worker is fenced out once its job was given to another worker.
+    assert not queue.heartbeat('w1', crashed)
+    assert not queue.complete(crashed, RESULT)
+    assert queue.heartbeat('w2', job)
+    assert queue.complete(job, RESULT, 10.0)
+    assert queue.result(job_id) == RESULT
+
+    failing = queue.submit('b.mp3', 'base', max_attempts=1)
+    queue.claim('w1', lease=0.01)
+    time.sleep(0.05)
+    assert queue.claim('w2') is None
+    job = queue.job(failing)
+    assert job['status'] == 'failed' and 'expired' in job['error']
+
+
+def test_release(queue):
+    job_id = queue.submit('a.mp3', 'base', max_attempts=1)
+    job = queue.claim('w')
+    assert queue.release(job)
+    assert queue.job(job_id)['status'] == 'queued'
+    assert queue.claim('w')['attempts'] == 1
+
+
+def test_worker(queue):
+    ids = [queue.submit(audio, 'base', fmt='srt') for audio in ('a.mp3', 'broken.mp3', 'b.mp3')]
+    done = []
+    worker = Worker(queue, 'w', runner=runner)
+    assert worker.run(exit_when_empty=True, callback=lambda job, error: done.append((job['id'], error))) == 3
+    assert done == [(ids[0], None), (ids[1], 'RuntimeError: broken'), (ids[2], None)]
+
+    jobs = queue.wait(ids, timeout=1)
+    assert [job['status'] for job in jobs] == ['done', 'failed', 'done']
+    assert jobs[0]['result']['text'] == 'base:a.mp3'
+
+    stats = queue.stats()
+    assert stats['jobs'] == {'queued': 0, 'running': 0, 'done': 2, 'failed': 1}
+    [stat] = stats['workers']
+    assert stat['state'] == 'stopped'
+    assert (stat['jobs_done'], stat['jobs_failed'], stat['audio_seconds']) == (2, 1, 20.0)
+    assert stat['speed'] > 0 and stat['jobs_per_hour'] > 0
+
+
+def test_worker_heartbeats(queue):
+    job_id = queue.submit('a.mp3', 'base')
+
+    def slow(job):
+        time.sleep(0.3)
+        return runner(job)
+
+    # The lease is shorter than the job, the heartbeats keep it from expiring.
+    worker = Worker(queue, 'w', lease=0.15, runner=slow)
+    thread = threading.Thread(target=worker.run, kwargs={'max_jobs': 1})
+    thread.start()
+    time.sleep(0.2)
+    assert queue.claim('other') is None
+    assert queue.stats()['workers'][0]['state'] == 'busy'
+    thread.join(5)
+    assert queue.job(job_id)['status'] == 'done'
+
+
+def test_worker_interrupted(queue):
+    job_id = queue.submit('a.mp3', 'base')
+
+    def interrupted(job):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        Worker(queue, 'w', runner=interrupted).run()
+    job = queue.job(job_id)
+    assert (job['status'], job['attempts']) == ('queued', 0)
+
+
+def test_relative_output(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job_id = queue.submit('a.mp3', 'base', output='talk.txt')
+    assert queue.job(job_id)['output'] == str(tmp_path / 'talk.txt')
+
+    # The runner also writes an output that is a bare file name, into the working directory.
+    job = {**queue.claim('w'), 'output': 'bare.txt'}
+    with patch('echoscript.batch.transcribe_file', return_value=(RESULT, 10.0)):
+        assert run_job(job) == (RESULT, 10.0)
+    assert (tmp_path / 'bare.txt').read_text().strip() == 'hello'
+
+
+def test_wait_timeout(queue):
+    job_id = queue.submit('a.mp3', 'base')
+    with pytest.raises(TimeoutError):
+        queue.wait([job_id], poll=0.01, timeout=0.05)
+
+
+def test_cli_queue(tmp_path):
+    db = str(tmp_path / 'queue.db')
+    audio = tmp_path / 'talk.mp3'
+    audio.touch()
+    cli_runner = CliRunner()
+
+    result = cli_runner.invoke(cli, ['submit', str(audio), '-o', str(tmp_path / 'out'),
+                                     '--priority', '2', '--temperature', '0', '--queue', db])
+    assert result.exit_code == 0, result.output
+    assert f'Submitted job 1: {audio}' in result.output
+    job = JobQueue(db).job(1)
+    assert job['priority'] == 2 and job['options'] == {'temperature': 0.0}
+    assert job['output'] == str(tmp_path / 'out' / 'talk.txt')
+
+    result = cli_runner.invoke(cli, ['status', '--queue', db])
+    assert '1 queued, 0 running' in result.output
+    assert 'Queued per model: base 1' in result.output
+
+    with patch('echoscript.batch.transcribe_file', return_value=(RESULT, 10.0)) as transcribe:
+        result = cli_runner.invoke(cli, ['worker', '--queue', db, '--name', 'w', '--exit-when-empty'])
+    assert result.exit_code == 0, result.output
+    assert 'Ran 1 jobs.' in result.output
+    assert transcribe.call_args.args[:4] == (str(audio), 'base', 'json', None)
+    assert (tmp_path / 'out' / 'talk.txt').read_text().strip() == 'hello'
+
+    result = cli_runner.invoke(cli, ['status', '--queue', db])
+    assert '0 queued, 0 running, 1 done, 0 failed' in result.output
+    assert 'w: stopped, 1 done, 0 failed, 10.0 audio-seconds' in result.output
+    result = cli_runner.invoke(cli, ['status', '1', '2', '--queue', db])
+    assert 'Job 1: done on w, attempt 1/3' in result.output
+    assert 'Job 2: not found' in result.output
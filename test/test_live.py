@@ -0,0 +1,172 @@
+import io
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from whisper.tokenizer import get_tokenizer
+
+from echoscript.cli import cli
+from echoscript.live import LiveTranscriber, iter_pcm, transcribe_live
+
+
+SR = 16000
+SCRIPT = [(0.0, 1.8, ' One two.'), (2.0, 3.8, ' Three four.'), (4.0, 5.8, ' Five six.')]
+
+
+class ScriptedModel:
+    '''
+    Decodes the buffer of a `LiveTranscriber` as the sentences of `SCRIPT` it contains.
+
+    A sentence cut by the end of the buffer is decoded as its first word, without an end timestamp.
+    '''
+
+    dims = SimpleNamespace(n_mels=80, n_text_ctx=448)
+    device = torch.device('cpu')
+    is_multilingual = False
+    num_languages = 99
+
+    def __init__(self):
+        self.tokenizer = get_tokenizer(False)
+        self.live = None
+        self.prompts = []
+
+    def timestamp(self, t):
+        return self.tokenizer.timestamp_begin + round(t / 0.02)
+
+    def decode(self, mel, options):
+        self.prompts.append(list(options.prompt))
+        t0 = self.live.offset / SR
+        t1 = self.live.time
+        tokens = []
+        for start, end, text in SCRIPT:
+            if end <= t0 + 0.01 or start >= t1:
+                continue
+            if end <= t1:
+                tokens += [self.timestamp(start - t0), *self.tokenizer.encode(text), self.timestamp(end - t0)]
+            elif t1 >= (start + end) / 2:
+                tokens += [self.timestamp(start - t0), *self.tokenizer.encode(' ' + text.split()[0])]
+        return SimpleNamespace(tokens=tokens, temperature=0.0, avg_logprob=-0.1, compression_ratio=1.0,
+                               no_speech_prob=0.0 if tokens else 0.9, language='en')
+
+
+def run(model, samples, chunk, **kwargs):
+    live = model.live = LiveTranscriber(model, 'en', **kwargs)
+    events = []
+    for i in range(0, len(samples), chunk):
+        events += live.feed(samples[i:i + chunk])
+    return live, events + live.finish()
+
+
+def test_final_and_partial_events():
+    model = ScriptedModel()
+    live, events = run(model, np.zeros(7 * SR, dtype=np.float32), SR // 2)
+    finals = [event for event in events if event['type'] == 'final']
+    assert [(e['id'], e['start'], e['end'], e['text']) for e in finals] == [
+        (i, start, end, text) for i, (start, end, text) in enumerate(SCRIPT)
+    ]
+    partials = [event['text'] for event in events if event['type'] == 'partial']
+    assert ' Three' in partials and ' Three four.' in partials
+    # Each sentence is final once the next one is heard, so only the unstable tail is decoded again.
+    assert events[events.index(finals[0]) + 1] == {'type': 'partial', 'start': 1.8, 'end': 3.0, 'text': ' Three'}
+    assert live.size == 0 and live.offset == 7 * SR
+    assert model.tokenizer.decode([t for t in model.prompts[-1] if t < model.tokenizer.eot]) == ' One two. Three four.'
+
+
+def test_late_audio_is_decoded_together():
+    model = ScriptedModel()
+    with patch.object(ScriptedModel, 'decode', autospec=True, side_effect=ScriptedModel.decode) as decode:
+        live, events = run(model, np.zeros(7 * SR, dtype=np.float32), 7 * SR)
+    # One decode of the whole buffer, reused to finalize it at the end of the stream.
+    assert decode.call_count == 1
+    assert [event['text'] for event in events if event['type'] == 'final'] == [text for _, _, text in SCRIPT]
+
+
+def test_max_buffer_forces_final():
+    model = ScriptedModel()
+    live, events = run(model, np.zeros(3 * SR, dtype=np.float32), SR // 2, max_buffer=1.9)
+    finals = [event for event in events if event['type'] == 'final']
+    assert finals[0]['text'] == ' One two.' and finals[0]['end'] == 1.8
+
+    with pytest.raises(ValueError):
+        LiveTranscriber(model, max_buffer=31)
+
+
+def wav(samples):
+    data = (samples * 32767).astype('<i2').tobytes()
+    fmt = struct.pack('<HHIIHH', 1, 1, SR, SR * 2, 2, 16)
+    return (b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + fmt
+            + b'data' + struct.pack('<I', len(data)) + data)
+
+
+def test_traditional_chinese_prompt():
+    model = ScriptedModel()
+    model.is_multilingual = True
+    model.tokenizer = get_tokenizer(True, num_languages=99, language='zh')
+    live = model.live = LiveTranscriber(model, 'zh-tw', initial_prompt='台灣')
+    assert live.language == 'zh'
+    live.feed(np.zeros(2 * SR, dtype=np.float32))
+    assert live.tokenizer.decode(model.prompts[0]) == ' 使用繁體中文回答: 台灣'
+
+
+def test_iter_pcm():
+    samples = np.linspace(-0.5, 0.5, 5001, dtype=np.float32)
+    chunks = list(iter_pcm(io.BytesIO(wav(samples)), chunk_size=1000))
+    assert max(len(chunk) for chunk in chunks) <= 1000
+    np.testing.assert_allclose(np.concatenate(chunks), samples, atol=2 / 32768)
+
+    raw = samples.astype('<f4').tobytes()
+    np.testing.assert_array_equal(np.concatenate(list(iter_pcm(io.BytesIO(raw), 'f32le'))), samples)
+
+    with pytest.raises(ValueError):
+        list(iter_pcm(io.BytesIO(wav(samples).replace(struct.pack('<HH', 1, 1), struct.pack('<HH', 1, 2), 1))))
+    with pytest.raises(ValueError):
+        list(iter_pcm(io.BytesIO(raw), 'u8'))
+
+
+class TrackedTranscriber(LiveTranscriber):
+    def __init__(self, model, *args, **kwargs):
+        super().__init__(model, *args, **kwargs)
+        model.live = self
+
+
+def test_transcribe_live_from_pipe():
+    model = ScriptedModel()
+    read, write = os.pipe()
+
+    def produce():
+        # Half a second of audio at a time, as from a live source.
+        with open(write, 'wb') as f:
+            data = wav(np.zeros(7 * SR, dtype=np.float32))
+            for i in range(0, len(data), SR):
+                f.write(data[i:i + SR])
+                f.flush()
+                time.sleep(0.01)
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    with open(read, 'rb') as stream, patch('echoscript.live.LiveTranscriber', TrackedTranscriber):
+        events = list(transcribe_live(stream, model, 'en'))
+    thread.join()
+    assert [event['text'] for event in events if event['type'] == 'final'] == [text for _, _, text in SCRIPT]
+
+
+def test_cli_live(tiny_model):
+    model = tiny_model()
+    audio = np.random.default_rng(0).normal(0, 0.1, 3 * SR).astype(np.float32)
+    with patch('echoscript.audio2text.Audio2Text.load_whisper_model', return_value=model):
+        result = CliRunner().invoke(cli, ['live', '-m', 'tiny', '-l', 'en', '--json', '--step', '1'],
+                                    input=wav(audio))
+    assert result.exit_code == 0, result.output
+    events = [json.loads(line) for line in result.output.splitlines()]
+    assert {event['type'] for event in events} <= {'final', 'partial'}
+    assert all(event['end'] <= 3.0 for event in events)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from unittest.mock import patch
+
+from echoscript.longform import split_on_silence, stitch_segments, transcribe_long
+from echoscript.utils import segments2subtitle
+
+
+SR = 16000
+
+
+def speech_with_gaps(seconds, gaps):
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.1, seconds * SR).astype(np.float32)
+    for start, end in gaps:
+        audio[int(start * SR):int(end * SR)] = 0
+    return audio
+
+
+def test_split_on_silence_short_audio():
+    audio = np.zeros(SR * 10, dtype=np.float32)
+    assert split_on_silence(audio, chunk_length=30) == [(0, SR * 10, 0, SR * 10)]
+
+
+def test_split_on_silence_snaps_to_silence():
+    audio = speech_with_gaps(100, [(32, 33), (64, 65)])
+    chunks = split_on_silence(audio, chunk_length=30, overlap=1.0, search=5.0)
+    assert len(chunks) == 3
+    splits = [core_start for _, _, core_start, _ in chunks[1:]]
+    assert 32 * SR <= splits[0] < 33 * SR
+    assert 64 * SR <= splits[1] < 65 * SR
+    for start, end, core_start, core_end in chunks:
+        assert start == max(core_start - SR, 0)
+        assert end == min(core_end + SR, len(audio))
+    assert chunks[-1][3] == len(audio)
+
+
+def test_stitch_segments():
+    chunks = [(0, 11 * SR, 0, 10 * SR), (9 * SR, 20 * SR, 10 * SR, 20 * SR)]
+    results = [
+        {'language': 'en', 'segments': [
+            {'id': 0, 'seek': 0, 'start': 0.0, 'end': 4.0, 'text': ' Hello'},
+            {'id': 1, 'seek': 0, 'start': 8.0, 'end': 10.5, 'text': ' world.'},
+        ]},
+        {'language': 'en', 'segments': [
+            {'id': 0, 'seek': 0, 'start': 0.0, 'end': 1.5, 'text': ' World.'},
+            {'id': 1, 'seek': 0, 'start': 2.0, 'end': 5.0, 'text': ' Bye.',
+             'words': [{'word': ' Bye.', 'start': 2.5, 'end': 4.0}]},
+        ]},
+    ]
+    result = stitch_segments(results, chunks)
+    assert [s['text'] for s in result['segments']] == [' Hello', ' world.', ' Bye.']
+    assert [s['id'] for s in result['segments']] == [0, 1, 2]
+    assert result['segments'][2]['start'] == 11.0
+    assert result['segments'][2]['end'] == 14.0
+    assert result['segments'][2]['seek'] == 900
+    assert result['segments'][2]['words'] == [{'word': ' Bye.', 'start': 11.5, 'end': 13.0}]
+    assert results[1]['segments'][1]['words'][0]['start'] == 2.5
+    assert result['text'] == ' Hello world. Bye.'
+    assert result['language'] == 'en'
+    assert segments2subtitle(result['segments']).startswith('1\n00:00:00,000 --> 00:00:04,000')
+
+
+def fake_transcribe_file(audio, model_name, fmt, language, **kwargs):
+    seconds = len(audio) / SR
+    return {'language': 'en', 'segments': [
+        {'id': 0, 'seek': 0, 'start': 0.0, 'end': seconds, 'text': f' {seconds:.0f}s'},
+    ]}, seconds
+
+
+def test_transcribe_long_in_process():
+    audio = speech_with_gaps(70, [(32, 33)])
+    with patch('echoscript.longform.transcribe_file', side_effect=fake_transcribe_file) as transcribe_file:
+        result = transcribe_long(audio, 'tiny', fmt='json', chunk_length=30, workers=1)
+    assert transcribe_file.call_count == 2
+    assert len(result['segments']) == 2
+    assert result['segments'][0]['start'] == 0.0
+
+    with pytest.raises(ValueError):
+        transcribe_long(audio, fmt='doc')
+
+
+def test_transcribe_long_pool():
+    audio = speech_with_gaps(70, [(32, 33)])
+    with patch('echoscript.pool.TranscriptionPool') as pool_cls:
+        pool = pool_cls.return_value.__enter__.return_value
+        pool.map.side_effect = lambda waveforms, *args, **kwargs: [
+            fake_transcribe_file(waveform, None, None, None)[0] for waveform in waveforms
+        ]
+        text = transcribe_long(audio, 'tiny', chunk_length=30, workers=4)
+    assert pool_cls.call_args[0][0] == 2
+    assert isinstance(text, str)
@@ -0,0 +1,189 @@
+import functools
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from echoscript import media
+from echoscript.batch import collect_audio_files, output_path
+from echoscript.cli import cli
+from echoscript.media import HTTPBackend, MediaCache, Prefetcher, YouTubeBackend
+
+
+class Backend:
+    '''
+    A stand-in source backend for `test://` URLs, serving `test://<name>` as `<name>` repeated.
+    '''
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def source_id(self, url):
+        return f'test-{url[7:]}' if url.startswith('test://') else None
+
+    def fetch(self, url, f):
+        with self.lock:
+            self.fetched.append(url)
+        time.sleep(self.delay)
+        if url.endswith('broken'):
+            f.write(b'partial')
+            raise OSError('connection reset')
+        f.write(url[7:].encode() * 10)
+
+
+@pytest.fixture
+def backend():
+    backend = media.register_backend(Backend())
+    yield backend
+    media.unregister_backend(backend)
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'www').mkdir()
+    (tmp_path / 'www' / 'a.mp3').write_bytes(b'ID3' + b'\0' * 1000)
+    requests = []
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), functools.partial(Handler, directory=str(tmp_path / 'www')))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}', requests
+    httpd.shutdown()
+
+
+def test_source_ids():
+    youtube = YouTubeBackend()
+    ids = {youtube.source_id(url) for url in (
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42',
+        'https://youtu.be/dQw4w9WgXcQ',
+        'https://m.youtube.com/shorts/dQw4w9WgXcQ',
+    )}
+    assert ids == {'youtube-dQw4w9WgXcQ'}
+    assert youtube.source_id('https://www.youtube.com/feed') is None
+    assert youtube.source_id('https://example.com/watch?v=dQw4w9WgXcQ') is None
+
+    assert HTTPBackend().source_id('https://example.com/a.mp3').startswith('url-')
+    assert HTTPBackend().source_id('/data/a.mp3') is None
+    assert media.is_remote('https://youtu.be/dQw4w9WgXcQ')
+    assert not media.is_remote('a.mp3') and not media.is_remote(b'RIFF')
+
+
+def test_fetch_http(tmp_path, server):
+    url, requests = server
+    cache = MediaCache(str(tmp_path / 'cache'))
+    path = cache.fetch(f'{url}/a.mp3')
+    assert open(path, 'rb').read() == b'ID3' + b'\0' * 1000
+    assert cache.fetch(f'{url}/a.mp3') == path
+    assert requests == ['/a.mp3']
+    assert cache.stats()['entries'] == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    with pytest.raises(OSError):
+        cache.fetch(f'{url}/missing.mp3')
+    assert os.listdir(cache.root) == [os.path.basename(path)]
+
+    with pytest.raises(ValueError):
+        cache.fetch('ftp://example.com/a.mp3')
+
+
+def test_concurrent_fetch_downloads_once(tmp_path, backend):
+    backend.delay = 0.1
+    cache = MediaCache(str(tmp_path))
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(cache.fetch('test://a'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.fetched == ['test://a']
+    assert len(set(paths)) == 1
+
+    with pytest.raises(OSError):
+        cache.fetch('test://broken')
+    assert not any(name.endswith('.part') for name in os.listdir(tmp_path))
+
+
+def test_eviction_spares_pinned(tmp_path, backend):
+    cache = MediaCache(str(tmp_path), max_bytes=25)
+    with cache.hold('test://a') as a:
+        os.utime(a, (0, 0))
+        b = cache.fetch('test://b')
+        c = cache.fetch('test://c')
+        assert os.path.exists(a) and os.path.exists(c)
+        assert not os.path.exists(b)
+    cache.fetch('test://d')
+    assert not os.path.exists(a)
+    assert cache.clear() == 2
+
+
+def test_prefetcher(tmp_path, backend):
+    sources = ['test://a', 'local.wav', 'test://b', 'test://broken', 'test://c']
+    with Prefetcher(MediaCache(str(tmp_path)), workers=2, ahead=2) as prefetcher:
+        results = []
+        for source, path in prefetcher.iter_fetched(sources):
+            if source == 'test://a':
+                # The next remote sources download while the first one is in use.
+                deadline = time.monotonic() + 5
+                while len(backend.fetched) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                assert 'test://b' in backend.fetched
+                assert 'test://c' not in backend.fetched
+            results.append((source, path))
+
+    assert [source for source, _ in results] == sources
+    assert results[1][1] == 'local.wav'
+    assert open(results[0][1], 'rb').read() == b'a' * 10
+    assert isinstance(results[3][1], OSError)
+    assert not media._pins
+
+    with Prefetcher(MediaCache(str(tmp_path)), ahead=1) as prefetcher:
+        paths = [path for _, path in prefetcher.iter_fetched(['test://a', 'test://b'], unpin=False)]
+    # The caller unpins the yielded downloads.
+    assert set(media._pins) == set(paths)
+    for path in paths:
+        prefetcher.cache.unpin(path)
+    assert not media._pins
+
+
+def test_batch_sources(tmp_path):
+    manifest = tmp_path / 'list.txt'
+    manifest.write_text('https://youtu.be/dQw4w9WgXcQ\nb.wav\n')
+    assert collect_audio_files(['https://example.com/a.mp3', str(manifest)]) == [
+        'https://example.com/a.mp3', 'https://youtu.be/dQw4w9WgXcQ', str(tmp_path / 'b.wav'),
+    ]
+    assert output_path('https://youtu.be/dQw4w9WgXcQ', 'srt') == os.path.join('.', 'youtube-dQw4w9WgXcQ.srt')
+    assert output_path('https://youtu.be/dQw4w9WgXcQ', None, 'out') == os.path.join('out', 'youtube-dQw4w9WgXcQ.txt')
+
+
+def test_cli_url(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    runner = CliRunner()
+    with patch('echoscript.cli.audio2text', return_value='Transcribed text') as transcribe:
+        result = runner.invoke(cli, ['-a', 'test://a'])
+    assert result.exit_code == 0
+    assert transcribe.call_args[0][0] == str(tmp_path / 'cache' / 'media' / 'test-a.media')
+
+    result = runner.invoke(cli, ['-a', 'test://broken'])
+    assert result.exit_code == 1
+    assert 'Failed to download audio from test://broken.' in result.output
+
+    result = runner.invoke(cli, ['-a', str(tmp_path / 'missing.wav')])
+    assert result.exit_code == 2
+
+    result = runner.invoke(cli, ['cache', 'clear', '--media'])
+    assert 'Removed 1 downloaded media files.' in result.output
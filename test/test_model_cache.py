@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+import torch
+
+from unittest.mock import patch, MagicMock
+
+from echoscript.audio2text import Audio2Text
+from echoscript.model_cache import ModelCache, get_model_cache, model_nbytes
+
+
+def test_model_cache_hit_and_miss():
+    cache = ModelCache(sizeof=lambda model: 1)
+    loader = MagicMock(return_value='model')
+    assert cache.get('a', loader) == 'model'
+    assert cache.get('a', loader) == 'model'
+    assert loader.call_count == 1
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['models'] == 1
+    assert stats['load_time'] >= 0
+
+
+def test_model_cache_lru_eviction():
+    cache = ModelCache(max_bytes=25, sizeof=lambda model: 10)
+    cache.get('a', lambda: 'a')
+    cache.get('b', lambda: 'b')
+    cache.get('a', lambda: 'a')
+    cache.get('c', lambda: 'c')
+    assert cache.keys() == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+    assert cache.nbytes == 20
+
+    cache.max_bytes = 5
+    assert cache.keys() == ['c']
+    assert 'c' in cache
+    assert len(cache) == 1
+
+
+def test_model_cache_evict_and_clear():
+    cache = ModelCache(sizeof=lambda model: 1)
+    cache.get('a', lambda: 'a')
+    assert cache.evict('a') is True
+    assert cache.evict('a') is False
+    cache.get('b', lambda: 'b')
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()['misses'] == 0
+
+
+def test_model_cache_loads_once_concurrently():
+    cache = ModelCache(sizeof=lambda model: 1)
+    event = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        event.wait(1)
+        return object()
+
+    threads = [threading.Thread(target=cache.get, args=('a', loader)) for _ in range(4)]
+    for thread in threads: thread.start()
+    event.set()
+    for thread in threads: thread.join()
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 3
+
+
+def test_model_cache_failed_load():
+    cache = ModelCache(sizeof=lambda model: 1)
+    with pytest.raises(OSError):
+        cache.get('a', MagicMock(side_effect=OSError('no weights')))
+    assert cache._key_locks == {}
+    assert len(cache) == 0
+    assert cache.get('a', lambda: 'a') == 'a'
+    assert cache._key_locks == {}
+
+
+def test_model_nbytes():
+    model = torch.nn.Linear(4, 2)
+    assert model_nbytes(model) == (4 * 2 + 2) * 4
+
+
+def test_get_model_cache_budget(monkeypatch):
+    monkeypatch.setattr('echoscript.model_cache._model_cache', None)
+    monkeypatch.setenv('ECHOSCRIPT_MODEL_CACHE_MB', '2')
+    cache = get_model_cache()
+    assert cache.max_bytes == 2 * 1024 * 1024
+    assert get_model_cache() is cache
+
+
+def test_load_whisper_model_uses_cache(monkeypatch):
+    monkeypatch.setattr('echoscript.model_cache._model_cache', ModelCache())
+    with patch('echoscript.weights.load_model') as load_model:
+        load_model.return_value = torch.nn.Linear(1, 1)
+        first = Audio2Text.load_whisper_model('tiny', device='cpu')
+        second = Audio2Text.load_whisper_model('tiny', device='cpu')
+        assert first is second
+        assert load_model.call_count == 1
+
+        Audio2Text.load_whisper_model('tiny', device='cpu', dtype='fp16')
+        assert load_model.call_count == 2
+        assert load_model.call_args.kwargs == {'device': 'cpu', 'dtype': 'fp16'}
+
+        Audio2Text.load_whisper_model('tiny', device='cpu', use_cache=False)
+        assert load_model.call_count == 3
+
+        replica = Audio2Text.load_whisper_model('tiny', device='cpu', replica=1)
+        assert replica is Audio2Text.load_whisper_model('tiny', device='cpu', replica=1)
+        assert load_model.call_count == 4
+
+    assert Audio2Text.model_cache.stats()['hits'] == 2
+
+    with pytest.raises(ValueError) as excinfo:
+        Audio2Text.load_whisper_model('tiny', dtype='int4')
+    assert 'Dtype `int4` is not supported.' in str(excinfo.value)
@@ -0,0 +1,98 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from echoscript.pipeline import Pipeline, Stage
+
+
+def test_pipeline_order_and_errors():
+    def parse(item):
+        if item == 'x':
+            raise ValueError('not a number')
+        time.sleep(0.01 * (int(item) % 3))
+        return int(item)
+
+    pipeline = Pipeline([Stage('parse', parse, workers=3), Stage('square', lambda n: n * n, workers=2)])
+    results = list(pipeline.run(['1', '2', 'x', '4', '5']))
+    assert [(item, value) for item, value, _ in results] == [('1', 1), ('2', 4), ('x', 'x'), ('4', 16), ('5', 25)]
+    assert isinstance(results[2][2], ValueError)
+
+    stats = pipeline.stats()
+    assert stats['parse']['processed'] == 4 and stats['parse']['failed'] == 1
+    assert stats['square']['processed'] == 4 and stats['square']['failed'] == 0
+    assert list(pipeline.run([])) == []
+
+
+def test_pipeline_backpressure():
+    consumed = []
+
+    def source():
+        for i in itertools.count():
+            consumed.append(i)
+            yield i
+
+    gate = threading.Event()
+    pipeline = Pipeline([Stage('fast', lambda i: i, queue_size=1),
+                         Stage('slow', lambda i: gate.wait(5) and i, queue_size=1)])
+    results = pipeline.run(source())
+    blocked = []
+
+    def release():
+        time.sleep(0.3)
+        blocked.append(len(consumed))
+        gate.set()
+
+    thread = threading.Thread(target=release)
+    thread.start()
+    assert next(results) == (0, 0, None)
+    thread.join()
+    # Items 0 and 1 in the stages, one in each input queue, one blocked in the feeder.
+    assert blocked[0] <= 6
+    results.close()
+    assert pipeline.cancelled
+
+
+def test_pipeline_cancel():
+    started = threading.Event()
+
+    def work(i):
+        started.set()
+        time.sleep(0.05)
+        return i
+
+    pipeline = Pipeline([Stage('work', work)], poll=0.01)
+    threading.Thread(target=lambda: started.wait(5) and pipeline.cancel()).start()
+    results = list(pipeline.run(range(1000)))
+    assert len(results) < 1000
+    assert all(not thread.is_alive() for thread in pipeline._threads)
+
+
+def test_pipeline_input_error():
+    def items():
+        yield from range(3)
+        raise OSError('unreadable manifest')
+
+    pipeline = Pipeline([Stage('work', lambda i: i)], poll=0.01)
+    with pytest.raises(OSError, match='unreadable manifest'):
+        list(pipeline.run(items()))
+    assert all(not thread.is_alive() for thread in pipeline._threads)
+    assert list(pipeline.run(range(2))) == [(0, 0, None), (1, 1, None)]
+
+
+def test_pipeline_stats_show_starved_stage():
+    pipeline = Pipeline([Stage('decode', lambda i: time.sleep(0.05) or i), Stage('infer', lambda i: i)])
+    list(pipeline.run(range(4)))
+    stats = pipeline.stats()
+    assert stats['infer']['starved'] > 0.1
+    assert stats['decode']['busy'] >= 0.2
+    assert stats['decode']['max_queue_depth'] >= 1
+    assert stats['infer']['queue_depth'] == 0
+
+
+def test_stage_validation():
+    with pytest.raises(ValueError):
+        Stage('decode', str, workers=0)
+    with pytest.raises(ValueError):
+        Pipeline([])
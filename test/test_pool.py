@@ -0,0 +1,48 @@
+import pytest
+
+from unittest.mock import patch
+
+from echoscript.pool import TranscriptionPool, _cost
+
+
+def fake_transcribe_file(audio, model_name, fmt, language, **kwargs):
+    if audio == 'broken.mp3':
+        raise RuntimeError('broken')
+    return f'{model_name}:{fmt}:{audio}', 1.0
+
+
+@pytest.fixture
+def pool():
+    with patch('echoscript.pool.transcribe_file', fake_transcribe_file):
+        with TranscriptionPool(workers=2, model_name='tiny', preload=False, mp_context='fork') as pool:
+            yield pool
+
+
+def test_pool_map_keeps_order(pool):
+    audios = [f'{i}.mp3' for i in range(6)]
+    assert pool.map(audios, fmt='srt') == [f'tiny:srt:{audio}' for audio in audios]
+
+
+def test_pool_imap_unordered_errors(pool):
+    results = sorted(pool.imap_unordered(['a.mp3', 'broken.mp3']))
+    assert results[0] == (0, 'tiny:None:a.mp3', 1.0, None)
+    assert results[1][:3] == (1, None, None)
+    assert isinstance(results[1][3], RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        pool.map(['broken.mp3'])
+
+
+def test_pool_threads_per_worker():
+    with patch('echoscript.pool.os.cpu_count', return_value=8):
+        pool = TranscriptionPool(workers=2, preload=False)
+        assert pool.threads_per_worker == 4
+        pool.close()
+
+
+def test_cost(tmp_path):
+    audio = tmp_path / 'a.mp3'
+    audio.write_bytes(b'123')
+    assert _cost(str(audio)) == 3
+    assert _cost(str(tmp_path / 'missing.mp3')) == 0
+    assert _cost([0.0] * 5) == 5
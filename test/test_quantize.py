@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+from whisper.model import Linear
+
+from echoscript.audio2text import Audio2Text, model_variant
+from echoscript.cli import cli
+from echoscript.model_cache import ModelCache, model_nbytes
+from echoscript.quantize import load_quantized_model, quantize_linear, quantize_model, quantized_path
+
+
+def test_quantize_linear():
+    torch.manual_seed(0)
+    linear = Linear(64, 32)
+    quantized = quantize_linear(linear)
+    assert isinstance(quantized, DynamicLinear)
+    x = torch.randn(8, 64)
+    with torch.no_grad():
+        expected = linear(x)
+    assert torch.allclose(quantized(x), expected, atol=0.05 * expected.abs().max().item())
+
+
+def test_quantize_model(tiny_model):
+    model = tiny_model()
+    mel = torch.randn(1, 80, 3000)
+    tokens = torch.tensor([[50258, 50259, 50359]])
+    with torch.no_grad():
+        expected = model(mel, tokens)
+    size = model_nbytes(model)
+
+    quantized = quantize_model(tiny_model())
+    assert not any(isinstance(module, Linear) for module in quantized.modules())
+    assert model_nbytes(quantized) < size
+    with torch.no_grad():
+        logits = quantized(mel, tokens)
+    assert logits.argmax(-1).equal(expected.argmax(-1))
+
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 5).astype(np.float32)
+    result = quantized.transcribe(audio, language='en', temperature=0.0, fp16=False)
+    assert isinstance(result['text'], str)
+
+
+def test_load_quantized_model_caches_on_disk(tmp_path, monkeypatch, tiny_model):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    with patch('whisper.load_model', side_effect=lambda *args, **kwargs: tiny_model()) as load_model:
+        first = load_quantized_model('tiny')
+        assert load_model.call_args[1] == {'device': 'cpu'}
+        assert os.path.exists(quantized_path('tiny'))
+        assert quantized_path('tiny').startswith(str(tmp_path / 'models'))
+
+        second = load_quantized_model('tiny')
+        assert load_model.call_count == 1
+        assert isinstance(second.encoder.blocks[0].attn.query, DynamicLinear)
+        assert second.state_dict().keys() == first.state_dict().keys()
+        # The file is read without unpickling code, and the rebuilt model has no meta tensors left.
+        assert torch.load(quantized_path('tiny'), weights_only=True).keys() == {'dims', 'state_dict', 'buffers'}
+        assert not any(tensor.is_meta for tensor in [*second.parameters(), *second.buffers()])
+        assert second.alignment_heads.is_sparse
+        mel = torch.randn(1, 80, 3000)
+        tokens = torch.tensor([[50258, 50259, 50359]])
+        with torch.no_grad():
+            assert torch.equal(second(mel, tokens), first(mel, tokens))
+
+        with open(quantized_path('tiny'), 'wb') as f:
+            f.write(b'broken')
+        with pytest.warns(UserWarning, match='Failed to read the quantized model'):
+            load_quantized_model('tiny')
+        assert load_model.call_count == 2
+
+        load_quantized_model('tiny', cache=False)
+        assert load_model.call_count == 3
+
+    with pytest.raises(ValueError):
+        load_quantized_model('tiny', scheme='int4')
+
+
+def test_load_whisper_model_int8(monkeypatch):
+    monkeypatch.setattr('echoscript.model_cache._model_cache', ModelCache())
+    with patch('echoscript.quantize.load_quantized_model') as load_quantized:
+        model = Audio2Text.load_whisper_model('tiny:int8')
+        assert model is Audio2Text.load_whisper_model('tiny', dtype='int8', device='cpu')
+        load_quantized.assert_called_once_with('tiny')
+        assert ('tiny', 'cpu', 'int8') in Audio2Text.model_cache
+
+    with pytest.raises(ValueError, match='only run on the CPU'):
+        Audio2Text.load_whisper_model('tiny:int8', device='cuda')
+    with pytest.raises(ValueError, match='not available'):
+        Audio2Text.load_whisper_model('tiny:int4')
+
+
+def test_model_variants():
+    assert 'tiny:int8' in Audio2Text.available_model_variants
+    assert Audio2Text.is_model_available('base:int8')
+    assert not Audio2Text.is_model_available('base:int4')
+    assert model_variant('base') == 'base'
+    assert model_variant('base', 'int8') == 'base:int8'
+    with pytest.raises(ValueError):
+        model_variant('base', 'int4')
+
+
+def test_cli_quantize(tmp_path):
+    runner = CliRunner()
+    audio = tmp_path / 'test.wav'
+    audio.touch()
+    with patch('echoscript.cli.audio2text', return_value='text') as audio2text:
+        result = runner.invoke(cli, ['-a', str(audio), '-m', 'tiny', '--quantize', 'int8'])
+    assert result.exit_code == 0
+    assert audio2text.call_args[0][1] == 'tiny:int8'
+
+    result = runner.invoke(cli, ['list', '--models'])
+    assert '\t- tiny:int8' in result.output
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from unittest.mock import patch, MagicMock
+
+from echoscript.audio2text import Audio2Text
+from echoscript.result_cache import ResultCache, cache_key, get_result_cache, hash_audio
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    return tmp_path
+
+
+def test_hash_audio(tmp_path):
+    audio = tmp_path / 'a.mp3'
+    audio.write_bytes(b'audio bytes')
+    assert hash_audio(str(audio)) == hash_audio(b'audio bytes')
+    assert hash_audio(memoryview(b'audio bytes')) == hash_audio(b'audio bytes')
+
+    waveform = np.arange(10, dtype=np.float32)
+    assert hash_audio(waveform) == hash_audio(torch.from_numpy(waveform))
+    assert hash_audio(waveform) != hash_audio(waveform.astype(np.float64))
+
+    with pytest.raises(OSError):
+        hash_audio(str(tmp_path / 'missing.mp3'))
+
+
+def test_cache_key():
+    assert cache_key('abc', model_name='tiny') == cache_key('abc', model_name='tiny')
+    assert cache_key('abc', model_name='tiny') != cache_key('abc', model_name='base')
+    assert cache_key('abc', options={'a': 1, 'b': 2}) == cache_key('abc', options={'b': 2, 'a': 1})
+
+
+def test_result_cache_get_put(home):
+    cache = ResultCache()
+    assert cache.root == os.path.join(str(home), 'cache', 'results')
+    assert cache.get('ab12') is None
+    cache.put('ab12', {'text': '你好'})
+    assert cache.get('ab12') == {'text': '你好'}
+    assert os.listdir(os.path.dirname(cache.path('ab12'))) == ['ab12.json']
+
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    assert cache.clear() == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=3 * 22)
+    for i, key in enumerate(('aa1', 'bb2', 'cc3')):
+        cache.put(key, {'text': 'x' * 10})
+        os.utime(cache.path(key), (i, i))
+
+    cache.get('aa1')
+    cache.put('dd4', {'text': 'x' * 10})
+    # Eviction trims the cache below its budget, to 90% of it.
+    keys = sorted(os.path.basename(path) for path, _, _ in cache.entries())
+    assert keys == ['aa1.json', 'dd4.json']
+
+    cache.evict(22)
+    assert [os.path.basename(path) for path, _, _ in cache.entries()] == ['dd4.json']
+
+
+def test_result_cache_scans(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 22)
+    with patch.object(ResultCache, 'entries', wraps=cache.entries) as entries:
+        for i in range(9):
+            cache.put(f'k{i:02d}', {'text': 'x' * 10})
+        # Only the first write scans the cache while it is under budget.
+        assert entries.call_count == 1
+        cache.put('k09', {'text': 'x' * 10})
+        cache.put('k10', {'text': 'x' * 10})
+        assert entries.call_count == 2
+    assert len(cache.entries()) == 9
+
+
+def test_result_cache_budget_env(monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_RESULT_CACHE_MB', '2')
+    assert ResultCache('/tmp/unused').max_bytes == 2 * 1024 * 1024
+
+
+def test_get_result_cache(home, tmp_path):
+    cache = get_result_cache()
+    assert cache.root == os.path.join(str(home), 'cache', 'results')
+    assert get_result_cache() is cache
+    assert get_result_cache(str(tmp_path / 'other')) is not cache
+
+
+def test_transcribe_shares_result_cache(home):
+    model = MagicMock()
+    model.transcribe.return_value = {'text': ' Hi', 'segments': [{'start': 0, 'end': 1, 'text': ' Hi'}]}
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model), \
+            patch.object(ResultCache, 'entries', autospec=True, return_value=[]) as entries:
+        Audio2Text().transcribe(np.zeros(16000, dtype=np.float32), 'tiny')
+        Audio2Text().transcribe(np.ones(16000, dtype=np.float32), 'tiny')
+    assert model.transcribe.call_count == 2
+    assert entries.call_count == 1
+
+
+def test_transcribe_uses_result_cache(home):
+    model = MagicMock()
+    model.transcribe.return_value = {'text': ' Hi', 'segments': [{'start': 0, 'end': 1, 'text': ' Hi'}]}
+    audio = np.zeros(16000, dtype=np.float32)
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model) as load:
+        assert Audio2Text().transcribe(audio, 'tiny') == ' Hi'
+        assert Audio2Text().transcribe(audio, 'tiny', fmt='srt').startswith('1\n')
+        assert load.call_count == 1
+
+        Audio2Text().transcribe(audio, 'tiny', cache=False)
+        Audio2Text().transcribe(audio, 'base')
+        assert model.transcribe.call_count == 3
+
+        model.transcribe.reset_mock()
+        Audio2Text().transcribe('https://example.com/a.mp3', 'tiny')
+        Audio2Text().transcribe('https://example.com/a.mp3', 'tiny')
+        assert model.transcribe.call_count == 2
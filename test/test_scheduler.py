@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from unittest.mock import MagicMock, patch
+
+from echoscript.scheduler import QueueFull, Scheduler, transcribe_job
+
+
+class Runner:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def __call__(self, audio, model_name, fmt, language, replica=0, **kwargs):
+        with self.lock:
+            self.calls.append((audio, model_name, replica))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.gate.wait(5)
+        with self.lock:
+            self.active -= 1
+        if audio == 'broken':
+            raise RuntimeError('broken')
+        return f'{model_name}:{audio}'
+
+
+def test_scheduler_runs_jobs():
+    runner = Runner()
+    runner.gate.set()
+    scheduler = Scheduler(workers=2, runner=runner)
+    jobs = [scheduler.submit(f'{i}.mp3', 'tiny') for i in range(4)]
+    assert [job.result(5) for job in jobs] == [f'tiny:{i}.mp3' for i in range(4)]
+    assert all(job.status == 'done' for job in jobs)
+    assert scheduler.eta(jobs[0]) == 0.0
+    assert 'tiny' in scheduler.stats()['durations']
+
+    job = scheduler.submit('broken', 'tiny')
+    with pytest.raises(RuntimeError):
+        job.result(5)
+    assert job.status == 'failed'
+    scheduler.shutdown()
+
+    with pytest.raises(RuntimeError):
+        scheduler.submit('a.mp3')
+
+
+def test_scheduler_queue_full_and_position():
+    runner = Runner()
+    scheduler = Scheduler(max_queue=2, workers=1, runner=runner)
+    running = scheduler.submit('a', 'tiny')
+    while not runner.calls: time.sleep(0.01)
+
+    first = scheduler.submit('b', 'tiny')
+    second = scheduler.submit('c', 'tiny')
+    with pytest.raises(QueueFull):
+        scheduler.submit('d', 'tiny')
+
+    assert scheduler.position(running) == 0
+    assert scheduler.position(first) == 1
+    assert scheduler.position(second) == 2
+    assert scheduler.eta(first) is None
+    assert scheduler.stats()['queued'] == 2
+
+    runner.gate.set()
+    second.result(5)
+    scheduler.shutdown()
+
+
+def test_scheduler_groups_jobs_by_model():
+    runner = Runner()
+    scheduler = Scheduler(workers=1, runner=runner)
+    scheduler.submit('a', 'tiny')
+    while not runner.calls: time.sleep(0.01)
+
+    jobs = [
+        scheduler.submit('b', 'base'),
+        scheduler.submit('c', 'tiny'),
+        scheduler.submit('d', 'base'),
+        scheduler.submit('e', 'tiny'),
+    ]
+    runner.gate.set()
+    for job in jobs: job.result(5)
+    assert [model for _, model, _ in runner.calls] == ['tiny', 'tiny', 'tiny', 'base', 'base']
+    scheduler.shutdown()
+
+
+def test_scheduler_prefers_loaded_models():
+    runner = Runner()
+    scheduler = Scheduler(workers=1, runner=runner)
+    scheduler.submit('a', 'tiny')
+    while not runner.calls: time.sleep(0.01)
+
+    jobs = [scheduler.submit('b', 'base'), scheduler.submit('c', 'base:int8')]
+    # Only the int8 variant of `base` is loaded, its job runs first.
+    cache = MagicMock()
+    cache.keys.return_value = [('base', 'cpu', 'int8')]
+    with patch('echoscript.audio2text.get_model_cache', return_value=cache):
+        runner.gate.set()
+        for job in jobs: job.result(5)
+    assert [model for _, model, _ in runner.calls] == ['tiny', 'base:int8', 'base']
+    scheduler.shutdown()
+
+
+def test_scheduler_max_wait_prevents_starvation():
+    runner = Runner()
+    scheduler = Scheduler(workers=1, max_wait=0, runner=runner)
+    scheduler.submit('a', 'tiny')
+    while not runner.calls: time.sleep(0.01)
+    jobs = [scheduler.submit('b', 'base'), scheduler.submit('c', 'tiny')]
+    time.sleep(0.01)
+    runner.gate.set()
+    for job in jobs: job.result(5)
+    assert [audio for audio, _, _ in runner.calls] == ['a', 'b', 'c']
+    scheduler.shutdown()
+
+
+def test_scheduler_model_concurrency_uses_replicas():
+    runner = Runner()
+    scheduler = Scheduler(workers=4, model_concurrency=2, runner=runner)
+    jobs = [scheduler.submit(f'{i}', 'tiny') for i in range(4)]
+    while len(runner.calls) < 2: time.sleep(0.01)
+    time.sleep(0.05)
+    assert len(runner.calls) == 2
+    assert sorted(replica for _, _, replica in runner.calls) == [0, 1]
+    runner.gate.set()
+    for job in jobs: job.result(5)
+    assert runner.max_active == 2
+    scheduler.shutdown()
+
+
+def test_scheduler_shutdown_cancels_queued_jobs():
+    runner = Runner()
+    scheduler = Scheduler(workers=1, runner=runner)
+    scheduler.submit('a', 'tiny')
+    while not runner.calls: time.sleep(0.01)
+    queued = scheduler.submit('b', 'tiny')
+    runner.gate.set()
+    scheduler.shutdown()
+    assert queued.future.cancelled() or queued.done()
+
+
+def test_transcribe_job():
+    with patch('echoscript.scheduler.Audio2Text.transcribe', return_value='text') as transcribe:
+        assert transcribe_job('a.mp3', 'tiny', 'srt', 'en', replica=1) == 'text'
+    transcribe.assert_called_once_with('a.mp3', 'tiny', 'srt', 'en', replica=1)
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from click.testing import CliRunner
+
+from echoscript.cli import cli
+from echoscript.columnar import ColumnarTranscript
+from echoscript.search import SearchIndex, collect_transcripts, tokenize
+
+
+def result(*segments):
+    return {
+        'text': ''.join(text for _, _, text in segments),
+        'segments': [{'id': i, 'start': start, 'end': end, 'text': text} for i, (start, end, text) in enumerate(segments)],
+        'language': 'en',
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    root = tmp_path / 'archive'
+    (root / 'day2').mkdir(parents=True)
+    (root / 'talk.json').write_text(json.dumps(result(
+        (0.0, 2.0, ' Welcome to the talk about machine'),
+        (2.0, 4.0, ' learning. Machine learning is fun.'),
+        (4.0, 6.0, ' 我們今天談機器學習'),
+    )))
+    (root / 'day2' / 'intro.json').write_text(json.dumps(result((10.0, 12.0, ' And machine'))))
+    ColumnarTranscript.from_result(result((0.0, 1.5, ' learning, again!'))).save(str(root / 'day2' / 'outro.ects'))
+    (root / 'notes.json').write_text('[1, 2]')
+    (root / 'talk.mp3').touch()
+    return root
+
+
+def test_skip_unreadable(archive, tmp_path):
+    outro = archive / 'day2' / 'outro.ects'
+    (archive / 'truncated.ects').write_bytes(outro.read_bytes()[:100])
+    (archive / 'empty.ects').touch()
+    (archive / 'latin1.json').write_bytes('{"segments": "caf\xe9"}'.encode('latin-1'))
+    missing = str(archive / 'missing.json')
+    files = [str(archive / name) for name in ('truncated.ects', 'empty.ects', 'latin1.json')] + [missing, str(outro)]
+
+    index = SearchIndex.build(files)
+    assert index.n_files == 1
+    assert index.meta['skipped'] == files[:4]
+
+
+def test_tokenize():
+    assert tokenize(' Machine-learning, ISN\'T fun!') == ['machine', 'learning', 'isn', 't', 'fun']
+    assert tokenize('我們談 GPT-4 モデル') == ['我', '們', '談', 'gpt', '4', 'モ', 'デ', 'ル']
+
+
+def test_search(archive, tmp_path):
+    files = collect_transcripts([str(archive)])
+    assert [path.split('archive/')[1] for path in files] == [
+        'notes.json', 'talk.json', 'day2/intro.json', 'day2/outro.ects',
+    ]
+    path = str(tmp_path / 'archive.idx')
+    SearchIndex.build(files).save(path)
+    index = SearchIndex.load(path)
+    assert (index.n_files, index.n_segments) == (3, 5)
+    assert index.meta['skipped'] == [str(archive / 'notes.json')]
+
+    talk = str(archive / 'talk.json')
+    # Across two segments, and within the second one.
+    assert index.search('machine learning') == [
+        {'file': talk, 'start': 0.0, 'end': 4.0,
+         'text': ' Welcome to the talk about machine learning. Machine learning is fun.'},
+        {'file': talk, 'start': 2.0, 'end': 4.0, 'text': ' learning. Machine learning is fun.'},
+    ]
+    assert index.search('machine learning', limit=1)[0]['start'] == 0.0
+    assert [(match['file'], match['start']) for match in index.search('LEARNING')] == [
+        (talk, 2.0), (str(archive / 'day2' / 'outro.ects'), 0.0),
+    ]
+    assert index.search('機器學習')[0]['start'] == 4.0
+    # Not across files, not out of order, and no unknown terms.
+    assert index.search('and machine learning again') == []
+    assert index.search('learning machine welcome') == []
+    assert index.search('machine unknown') == []
+    assert index.search('...') == []
+
+
+def test_empty_index(tmp_path):
+    path = str(tmp_path / 'empty.idx')
+    SearchIndex.build([]).save(path)
+    assert SearchIndex.load(path).search('anything') == []
+
+
+def test_cli_search(archive, tmp_path):
+    runner = CliRunner()
+    index = str(tmp_path / 'archive.idx')
+    result = runner.invoke(cli, ['index', str(archive), '--index', index])
+    assert result.exit_code == 0, result.output
+    assert 'Indexed 5 segments of 3 transcripts' in result.output
+
+    result = runner.invoke(cli, ['search', 'machine', 'learning', '-n', '1', '--index', index])
+    assert result.exit_code == 0, result.output
+    assert f'{archive / "talk.json"}\t00:00:00.000\tWelcome to the talk about machine learning.' in result.output
+
+    result = runner.invoke(cli, ['search', '機器學習', '--json', '--index', index])
+    assert json.loads(result.output.splitlines()[0])['start'] == 4.0
+
+    result = runner.invoke(cli, ['search', 'nothing', '--index', index])
+    assert result.exit_code == 1
+    result = runner.invoke(cli, ['search', 'learning', '--index', str(tmp_path / 'missing.idx')])
+    assert result.exit_code == 1 and 'echoscript index' in result.output
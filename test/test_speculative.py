@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import torch
+import whisper
+
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from whisper.decoding import DecodingOptions
+
+from echoscript.audio2text import Audio2Text
+from echoscript.cli import cli
+from echoscript.speculative import SpeculativeModel
+
+
+@pytest.fixture(scope='module')
+def models(tiny_model):
+    return {'base': tiny_model(0), 'tiny': tiny_model(1, n_text_layer=1)}
+
+
+@pytest.fixture(scope='module')
+def audio():
+    return np.random.default_rng(0).normal(0, 0.1, 16000 * 40).astype(np.float32)
+
+
+def test_decode_matches_greedy(models, audio):
+    mel = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio), whisper.audio.N_FRAMES)
+    options = DecodingOptions(language='en', fp16=False, temperature=0.0, sample_len=64)
+    expected = models['base'].decode(mel, options)
+
+    model = SpeculativeModel(models['base'], models['tiny'])
+    result = model.decode(mel, options)
+    assert result.tokens == expected.tokens and result.text == expected.text
+    assert result.no_speech_prob == pytest.approx(expected.no_speech_prob)
+    assert result.avg_logprob == pytest.approx(expected.avg_logprob, abs=1e-5)
+
+    stats = model.stats
+    # The decoded tokens include the end of text, if it was reached.
+    assert stats.tokens - len(result.tokens) in (0, 1)
+    assert stats.passes < stats.tokens
+    assert 0 < stats.accepted <= stats.drafted
+    assert stats.speedup == stats.tokens / stats.passes
+
+
+def test_sampling_falls_back_to_plain_decoding(models, audio):
+    mel = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio), whisper.audio.N_FRAMES)
+    options = DecodingOptions(language='en', fp16=False, temperature=0.4, sample_len=16)
+    torch.manual_seed(0)
+    expected = models['base'].decode(mel, options)
+    model = SpeculativeModel(models['base'], models['tiny'])
+    torch.manual_seed(0)
+    assert model.decode(mel, options).tokens == expected.tokens
+    assert model.stats.passes == 0
+
+
+def test_incompatible_draft_model(models, tiny_model):
+    with pytest.raises(ValueError):
+        SpeculativeModel(models['base'], tiny_model(0, n_vocab=51866))
+    with pytest.raises(ValueError):
+        SpeculativeModel(models['base'], tiny_model(0, n_mels=128))
+    with pytest.raises(ValueError):
+        SpeculativeModel(models['base'], models['base'])
+
+
+# The random model fails every greedy decoding, so each window is also sampled at temperature 0.4.
+OPTIONS = dict(temperature=(0.0, 0.4), sample_len=16, fp16=False)
+
+
+def test_transcribe_with_draft_model(models, audio):
+    with patch.object(Audio2Text, 'load_whisper_model', side_effect=lambda name, **_: models[name]):
+        torch.manual_seed(0)
+        expected = Audio2Text().transcribe(audio, 'base', 'json', 'en', cache=False, **OPTIONS)
+
+        engine = Audio2Text()
+        torch.manual_seed(0)
+        result = engine.transcribe(audio, 'base', 'json', 'en', cache=False, draft_model='tiny', **OPTIONS)
+        assert [s['tokens'] for s in result['segments']] == [s['tokens'] for s in expected['segments']]
+        assert engine.draft_report['passes'] > 0
+
+        torch.manual_seed(0)
+        segments = list(engine.iter_segments(audio, 'base', 'en', cache=False, draft_model='tiny', **OPTIONS))
+        assert [s['tokens'] for s in segments] == [s['tokens'] for s in expected['segments']]
+        assert engine.draft_report['passes'] > 0
+
+    with pytest.raises(ValueError):
+        Audio2Text().transcribe(audio, 'base', draft_model='huge')
+
+
+def test_cli_draft_model(models, audio):
+    with patch.object(Audio2Text, 'load_whisper_model', side_effect=lambda name, **_: models[name]), \
+            patch('echoscript.audio2text._ingest', return_value=audio):
+        result = CliRunner().invoke(cli, ['-a', __file__, '-l', 'en', '--no-cache', '--temperature', '0',
+                                          '--draft-model', 'tiny'])
+    assert result.exit_code == 0, result.output
+    assert 'Draft model: accepted' in result.output
+
+    result = CliRunner().invoke(cli, ['-a', __file__, '--draft-model', 'huge'])
+    assert result.exit_code == 1
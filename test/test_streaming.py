@@ -0,0 +1,93 @@
+import io
+
+import numpy as np
+import pytest
+import whisper
+
+from unittest.mock import patch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.streaming import collect_segments, iter_transcribe
+from echoscript.utils import TranscriptWriter, segments2subtitle
+
+
+@pytest.fixture(scope='module')
+def model(tiny_model):
+    return tiny_model()
+
+
+@pytest.fixture(scope='module')
+def audio():
+    return np.random.default_rng(0).normal(0, 0.1, 16000 * 40).astype(np.float32)
+
+
+OPTIONS = dict(language='en', temperature=0.0, fp16=False, initial_prompt='Hello')
+
+
+def test_iter_transcribe_matches_whisper(model, audio):
+    expected = whisper.transcribe(model, audio, **OPTIONS)
+    state = {}
+    segments = list(iter_transcribe(model, audio, state=state, **OPTIONS))
+    assert segments == expected['segments']
+    assert state['language'] == 'en'
+    assert state['seek'] >= 4000
+
+    result = collect_segments(segments, 'en')
+    assert result['text'] == ''.join(segment['text'] for segment in segments)
+    assert result['language'] == 'en'
+
+
+def test_iter_transcribe_unsupported_options(model, audio):
+    with pytest.raises(ValueError) as excinfo:
+        next(iter_transcribe(model, audio, word_timestamps=True))
+    assert 'Option `word_timestamps` is not supported when streaming.' in str(excinfo.value)
+
+
+def test_iter_segments_is_lazy_and_cached(model, audio, tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model) as load:
+        segments = Audio2Text().iter_segments(audio, 'tiny', 'en', temperature=0.0)
+        assert load.call_count == 0
+        first = next(segments)
+        assert load.call_count == 1
+        streamed = [first, *segments]
+
+        cached = list(Audio2Text().iter_segments(audio, 'tiny', 'en', temperature=0.0))
+        assert load.call_count == 1
+    assert cached == streamed
+
+    with pytest.raises(ValueError):
+        next(Audio2Text().iter_segments(audio, language='invalid_language'))
+
+
+segments = [
+    {'start': 0, 'end': 2.5, 'text': 'Hello, world!'},
+    {'start': 2.5, 'end': 5.0, 'text': 'This is a test.'},
+]
+
+
+@pytest.mark.parametrize('fmt', ['srt', 'vtt'])
+def test_transcript_writer_matches_segments2subtitle(fmt):
+    f = io.StringIO()
+    writer = TranscriptWriter(f, fmt)
+    written = [writer.write(segment) for segment in segments]
+    written.append(writer.close())
+    assert f.getvalue() == ''.join(written) == segments2subtitle(segments, fmt)
+
+
+@pytest.mark.parametrize('fmt', ['srt', 'vtt'])
+def test_transcript_writer_empty(fmt):
+    f = io.StringIO()
+    TranscriptWriter(f, fmt).close()
+    assert f.getvalue() == segments2subtitle([], fmt)
+
+
+def test_transcript_writer_text():
+    f = io.StringIO()
+    writer = TranscriptWriter(f)
+    for segment in segments: writer.write(segment)
+    writer.close()
+    assert f.getvalue() == 'Hello, world!This is a test.'
+
+    with pytest.raises(ValueError):
+        TranscriptWriter(f, 'doc')
@@ -0,0 +1,171 @@
+import json
+import urllib.request
+
+import numpy as np
+import pytest
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+from echoscript import tracing
+from echoscript.audio2text import Audio2Text
+from echoscript.cli import cli
+from echoscript.scheduler import Scheduler
+
+
+@pytest.fixture
+def records():
+    records = []
+    hook = tracing.add_hook(records.append)
+    yield records
+    tracing.remove_hook(hook)
+
+
+@pytest.fixture
+def model(tiny_model):
+    return tiny_model()
+
+
+def test_trace(records):
+    with tracing.trace(source='test', model_name='tiny') as trace:
+        with tracing.stage('download'):
+            pass
+        with tracing.trace(source='inner', language='en') as inner:
+            assert inner is trace
+            tracing.count('windows', 2)
+            tracing.count('fallbacks')
+        tracing.annotate(audio_duration=10.0)
+        trace.add('download', 1.0)
+    assert tracing.current() is None
+
+    record, = records
+    assert record['source'] == 'test' and record['language'] == 'en' and record['status'] == 'ok'
+    assert record['stages']['download'] >= 1.0
+    assert record['counters'] == {'windows': 2, 'fallbacks': 1}
+    assert record['rtf'] == pytest.approx(record['total'] / 10.0)
+    assert trace.finish('error') is record and len(records) == 1
+
+    with tracing.stage('download'):
+        tracing.count('windows')
+    assert len(records) == 1
+
+
+def test_trace_error(records):
+    with pytest.raises(ValueError):
+        with tracing.trace(source='test'):
+            raise ValueError('bad audio')
+    assert records[0]['status'] == 'error'
+    assert records[0]['error'] == 'ValueError: bad audio'
+
+
+def test_hook_errors_are_ignored(records):
+    def broken(record):
+        raise RuntimeError
+
+    tracing.add_hook(broken)
+    try:
+        tracing.Trace().finish()
+    finally:
+        tracing.remove_hook(broken)
+    assert len(records) == 1
+
+
+def test_scheduler_propagates_trace(records):
+    def runner(audio, model_name, fmt, language, replica=0):
+        with tracing.stage('inference'):
+            return tracing.current()
+
+    scheduler = Scheduler(runner=runner)
+    trace = tracing.Trace(source='test')
+    with tracing.activate(trace):
+        job = scheduler.submit('a.wav', model_name='tiny')
+    job.future.add_done_callback(lambda future: tracing.finish_future(trace, future))
+    assert job.result(5) is trace
+    scheduler.shutdown()
+    assert {'queue', 'inference'} <= set(trace.stages)
+    assert records[0]['status'] == 'ok' and records[0]['replica'] == 0
+
+
+def test_json_lines_writer(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    writer = tracing.JSONLinesWriter(str(path))
+    writer(tracing.Trace(source='a').finish())
+    writer(tracing.Trace(source='b').finish())
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['source'] for line in lines] == ['a', 'b']
+
+
+def test_prometheus_metrics():
+    metrics = tracing.PrometheusMetrics()
+    for rtf in (0.07, 0.3, 3.0):
+        trace = tracing.Trace(source='api', audio_duration=10.0)
+        trace.add('encoder', 1.5)
+        trace.count('windows', 2)
+        record = trace.to_dict()
+        metrics({**record, 'status': 'ok', 'total': rtf * 10, 'rtf': rtf, 'peak_rss': None})
+    metrics({**tracing.Trace().to_dict(), 'status': 'error', 'total': 0.5, 'rtf': None})
+
+    text = metrics.render()
+    assert 'echoscript_jobs_total{source="api",status="ok"} 3' in text
+    assert 'echoscript_jobs_total{source="python",status="error"} 1' in text
+    assert 'echoscript_stage_seconds_total{stage="encoder"} 4.5' in text
+    assert 'echoscript_windows_total 6' in text
+    assert 'echoscript_audio_seconds_total 30.0' in text
+    assert 'echoscript_rtf_bucket{le="0.1"} 1' in text
+    assert 'echoscript_rtf_bucket{le="0.5"} 2' in text
+    assert 'echoscript_rtf_bucket{le="+Inf"} 3' in text
+    assert 'echoscript_rtf_count 3' in text
+
+    metrics({**tracing.Trace(source='a"b\\c\nd').to_dict(), 'status': 'ok', 'total': 0.5, 'rtf': None})
+    assert 'echoscript_jobs_total{source="a\\"b\\\\c\\nd",status="ok"} 1' in metrics.render()
+
+    server = tracing.serve_metrics(metrics, host='127.0.0.1', port=0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            assert response.read().decode() == metrics.render()
+    finally:
+        server.shutdown()
+
+
+def test_transcribe_records_stages(records, model):
+    audio = np.zeros(16000, dtype=np.float32)
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+        Audio2Text().transcribe(audio, 'tiny', language='en', cache=False, temperature=0.0, fp16=False)
+
+    record, = records
+    assert record['source'] == 'python' and record['model_name'] == 'tiny'
+    assert record['audio_duration'] == 1.0
+    assert {'model_load', 'inference', 'encoder', 'decoder', 'format'} <= set(record['stages'])
+    assert record['stages']['encoder'] < record['stages']['inference']
+    assert record['counters']['windows'] == 1
+    assert 'decode' not in vars(model)
+
+
+def test_transcribe_many_records_stages(records, model):
+    rng = np.random.default_rng(0)
+    audios = [rng.normal(0, 0.1, 16000 * seconds).astype(np.float32) for seconds in (1, 2)]
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+        Audio2Text().transcribe_many(audios, 'tiny', language='en', cache=False, batch_size=2, temperature=0.0)
+
+    record, = records
+    assert record['inputs'] == 2
+    # The batched decoding runs within the inference stage.
+    assert record['stages']['encoder'] > 0 and record['stages']['decoder'] > 0
+    assert record['stages']['encoder'] + record['stages']['decoder'] < record['stages']['inference']
+    assert record['counters']['windows'] == 2
+
+
+def test_cli_metrics_out(tmp_path, records):
+    audio = tmp_path / 'test.wav'
+    audio.touch()
+    path = tmp_path / 'metrics.jsonl'
+    output = tmp_path / 'out.json'
+    with patch('echoscript.cli.audio2text', return_value={'text': 'hi'}):
+        result = CliRunner().invoke(cli, ['--metrics-out', str(path), '-a', str(audio), '-f', 'json',
+                                          '-o', str(output), '--no-verbose'])
+    assert result.exit_code == 0
+    record, = [json.loads(line) for line in path.read_text().splitlines()]
+    assert record['source'] == 'cli' and record['fmt'] == 'json'
+    assert 'write' in record['stages']
+    assert len(tracing._hooks) == 1
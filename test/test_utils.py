@@ -79,3 +79,26 @@ def test_format_timestamp():
     assert format_timestamp(3661.05) == '01:01:01,050'
     assert format_timestamp(10665.25) == '02:57:45,250'
 
+
+
+def test_whisper_constant():
+    models = whisper_constant('__init__', '_MODELS')
+    assert 'tiny' in models
+    models.clear()
+    assert 'tiny' in whisper_constant('__init__', '_MODELS')
+
+
+def test_whisper_constant_fallback(monkeypatch):
+    def fail(module, name):
+        raise OSError('no sources')
+
+    monkeypatch.setattr('echoscript.utils._whisper_constant', fail)
+    assert whisper_constant('tokenizer', 'LANGUAGES')['en'] == 'english'
+    assert 'tiny' in whisper_constant('__init__', '_MODELS')
+
+
+def test_get_echoscript_home(monkeypatch):
+    monkeypatch.delenv('ECHOSCRIPT_HOME', raising=False)
+    assert not get_echoscript_home().startswith('~')
+    monkeypatch.setenv('ECHOSCRIPT_HOME', '/data/echoscript')
+    assert get_echoscript_home() == '/data/echoscript'
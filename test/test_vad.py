@@ -0,0 +1,159 @@
+import functools
+
+import numpy as np
+import pytest
+
+from unittest.mock import MagicMock, patch
+
+from echoscript.audio2text import Audio2Text
+from echoscript.vad import EnergyVAD, SpeechTimeline, available_vads, frame_energy, get_vad, register_vad, vad_key
+
+
+SR = 16000
+
+
+def make_audio(spans, seconds):
+    '''
+    Noise at -80 dB with loud noise in the given (start, end) spans in seconds.
+    '''
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 1e-4, int(seconds * SR)).astype(np.float32)
+    for start, end in spans:
+        start, end = round(start * SR), round(end * SR)
+        audio[start:end] = rng.normal(0, 0.1, end - start)
+    return audio
+
+
+def test_frame_energy():
+    audio = np.concatenate([np.zeros(320), np.ones(320), np.ones(100)])
+    assert frame_energy(audio).tolist() == [0.0, 1.0]
+
+
+def test_energy_vad():
+    audio = make_audio([(1, 3), (6, 7)], 8)
+    assert EnergyVAD()(audio) == [(int(0.8 * SR), int(3.2 * SR)), (int(5.8 * SR), int(7.2 * SR))]
+
+    # Short gaps are merged and short blips are dropped
+    audio = make_audio([(1, 2), (2.3, 3), (5, 5.1)], 8)
+    assert EnergyVAD(pad=0)(audio) == [(SR, 3 * SR)]
+
+    assert EnergyVAD()(make_audio([(0, 4)], 4)) == [(0, 4 * SR)]
+    assert EnergyVAD()(np.zeros(4 * SR, dtype=np.float32)) == []
+    assert EnergyVAD()(np.zeros(0, dtype=np.float32)) == []
+    assert repr(EnergyVAD(pad=0.1)).startswith('EnergyVAD(frame_length=320, ')
+
+
+def test_get_vad():
+    assert get_vad(None) is None
+    assert get_vad(False) is None
+    assert isinstance(get_vad(True), EnergyVAD)
+    assert isinstance(get_vad('energy'), EnergyVAD)
+
+    def detector(audio, sr):
+        return [(0, len(audio))]
+
+    assert get_vad(detector) is detector
+    register_vad('everything', lambda: detector)
+    assert 'everything' in available_vads()
+    assert get_vad('everything') is detector
+
+    with pytest.raises(ValueError) as excinfo:
+        get_vad('invalid_vad')
+    assert 'VAD `invalid_vad` is not available.' in str(excinfo.value)
+
+
+def test_vad_key():
+    assert vad_key(EnergyVAD(pad=0.1)) == vad_key(EnergyVAD(pad=0.1))
+    assert vad_key(EnergyVAD(pad=0.1)) != vad_key(EnergyVAD())
+    assert vad_key(EnergyVAD()).startswith('echoscript.vad.EnergyVAD{')
+    assert vad_key(frame_energy) == 'echoscript.vad.frame_energy{}'
+    assert vad_key(functools.partial(frame_energy, frame_length=160)) != vad_key(frame_energy)
+
+    def detector(audio, sr):
+        return [(0, len(audio))]
+
+    # No stable description: a nested function, a lambda, a bound method and an instance holding an array.
+    assert vad_key(detector) is None
+    assert vad_key(lambda audio, sr: []) is None
+    assert vad_key(EnergyVAD().__call__) is None
+    vad = EnergyVAD()
+    vad.weights = np.zeros(3)
+    assert vad_key(vad) is None
+
+
+def test_speech_timeline():
+    audio = np.arange(10 * SR, dtype=np.float32)
+    timeline = SpeechTimeline([(SR, 3 * SR), (6 * SR, 7 * SR)], len(audio))
+    compact = timeline.compact(audio)
+    assert len(compact) == 3 * SR
+    assert compact[2 * SR] == 6 * SR
+
+    assert timeline.to_original(0.5) == 1.5
+    assert timeline.to_original(2.0) == 6.0
+    assert timeline.to_original(2.0, end=True) == 3.0
+    assert timeline.to_original(2.5) == 6.5
+    assert timeline.to_original(3.5) == 7.0
+
+    segment = {'start': 1.5, 'end': 2.5, 'text': ' Hi', 'words': [{'word': ' Hi', 'start': 1.5, 'end': 2.0}]}
+    assert timeline.remap_segment(segment) == {
+        'start': 2.5, 'end': 6.5, 'text': ' Hi', 'words': [{'word': ' Hi', 'start': 2.5, 'end': 3.0}],
+    }
+    assert timeline.report() == {'duration': 10.0, 'speech': 3.0, 'skipped': 7.0, 'regions': 2}
+
+    empty = SpeechTimeline([], len(audio))
+    assert len(empty.compact(audio)) == 0
+    assert empty.report()['skipped'] == 10.0
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    return tmp_path
+
+
+def test_transcribe_with_vad(home):
+    audio = make_audio([(1, 3), (6, 7)], 8)
+    model = MagicMock()
+    model.device.type = 'cpu'
+    model.transcribe.return_value = {
+        'text': ' Hello world',
+        'segments': [{'start': 0.0, 'end': 2.0, 'text': ' Hello'}, {'start': 2.6, 'end': 3.8, 'text': ' world'}],
+        'language': 'en',
+    }
+    with patch.object(Audio2Text, 'load_whisper_model', return_value=model):
+        engine = Audio2Text()
+        result = engine.transcribe(audio, 'tiny', 'json', vad=True)
+        assert len(model.transcribe.call_args[0][0]) == int(3.8 * SR)
+        assert [(s['start'], s['end']) for s in result['segments']] == [(0.8, 2.8), (6.0, 7.2)]
+        assert engine.vad_report == result['vad'] == {'duration': 8.0, 'speech': 3.8, 'skipped': 4.2, 'regions': 2}
+
+        engine = Audio2Text()
+        subtitle = engine.transcribe(audio, 'tiny', 'srt', vad=True)
+        assert '00:00:06,000 --> 00:00:07,200' in subtitle
+        assert engine.vad_report['skipped'] == 4.2
+        assert model.transcribe.call_count == 1
+
+        engine.transcribe(audio, 'tiny', 'json', cache=False)
+        assert len(model.transcribe.call_args[0][0]) == len(audio)
+        assert engine.vad_report is None
+
+        model.transcribe.reset_mock()
+        result = engine.transcribe(np.zeros(SR, dtype=np.float32), 'tiny', 'json', vad=True)
+        assert result['text'] == '' and result['segments'] == []
+        assert model.transcribe.call_count == 0
+
+
+def test_iter_segments_with_vad(home):
+    audio = make_audio([(1, 3), (6, 7)], 8)
+    segments = [{'id': 0, 'start': 0.0, 'end': 2.0, 'text': ' Hello'}, {'id': 1, 'start': 2.6, 'end': 3.8, 'text': ' world'}]
+    with patch.object(Audio2Text, 'load_whisper_model'), \
+            patch('echoscript.streaming.iter_transcribe', return_value=iter(segments)) as iter_transcribe:
+        engine = Audio2Text()
+        streamed = list(engine.iter_segments(audio, 'tiny', vad='energy'))
+        assert len(iter_transcribe.call_args[0][1]) == int(3.8 * SR)
+    assert [(s['start'], s['end']) for s in streamed] == [(0.8, 2.8), (6.0, 7.2)]
+    assert engine.vad_report['regions'] == 2
+
+    engine = Audio2Text()
+    assert list(engine.iter_segments(audio, 'tiny', vad='energy')) == streamed
+    assert engine.vad_report['speech'] == 3.8
@@ -0,0 +1,94 @@
+import base64
+import gzip
+import os
+
+import numpy as np
+import pytest
+import torch
+import whisper
+
+from dataclasses import asdict
+from unittest.mock import patch
+
+from echoscript.weights import converted_path, load_model
+
+
+@pytest.fixture
+def checkpoint(tmp_path, monkeypatch, tiny_model):
+    '''
+    An fp16 checkpoint in the format of the Whisper releases, downloaded as `tiny`.
+    '''
+    monkeypatch.setenv('ECHOSCRIPT_HOME', str(tmp_path))
+    path = str(tmp_path / 'tiny.pt')
+    model = tiny_model()
+    torch.save({'dims': asdict(model.dims), 'model_state_dict': model.half().state_dict()}, path)
+    heads = np.zeros((model.dims.n_text_layer, model.dims.n_text_head), dtype=bool)
+    heads[1, 0] = True
+    dump = base64.b85encode(gzip.compress(heads.tobytes()))
+    with patch('whisper._download', return_value=path) as download, \
+            patch.dict(whisper._ALIGNMENT_HEADS, {'tiny': dump}):
+        yield path, dump, download
+
+
+def mapped_file(tensor):
+    '''
+    The file that the memory of a tensor is mapped from, if any.
+    '''
+    address = tensor.data_ptr()
+    with open('/proc/self/maps') as f:
+        for line in f:
+            fields = line.split()
+            start, end = (int(value, 16) for value in fields[0].split('-'))
+            if start <= address < end:
+                return fields[5] if len(fields) > 5 else None
+
+
+def test_load_converted_model(checkpoint):
+    path, dump, download = checkpoint
+    expected = whisper.load_model(path, device='cpu')
+    expected.set_alignment_heads(dump)
+
+    model = load_model('tiny')
+    assert download.call_count == 1
+    assert os.path.exists(converted_path('tiny'))
+    assert converted_path('tiny').startswith(os.environ['ECHOSCRIPT_HOME'])
+    assert model.dims == expected.dims
+    for (name, tensor), other in zip(model.state_dict().items(), expected.state_dict().values()):
+        assert tensor.dtype == torch.float32 and torch.equal(tensor, other), name
+    assert torch.equal(model.decoder.mask, expected.decoder.mask)
+    assert torch.equal(model.alignment_heads.to_dense(), expected.alignment_heads.to_dense())
+    if os.path.exists('/proc/self/maps'):
+        assert mapped_file(model.decoder.token_embedding.weight) == converted_path('tiny')
+
+    mel = torch.randn(1, model.dims.n_mels, 3000)
+    tokens = torch.tensor([[50258, 50259, 50359]])
+    with torch.no_grad():
+        assert torch.equal(model(mel, tokens), expected(mel, tokens))
+
+    load_model('tiny')
+    assert download.call_count == 1
+
+
+def test_load_converted_fp16_model(checkpoint):
+    path, _, download = checkpoint
+    model = load_model('tiny', dtype='fp16')
+    assert os.path.exists(converted_path('tiny', 'fp16'))
+    assert not os.path.exists(converted_path('tiny'))
+    original = torch.load(path, weights_only=True)['model_state_dict']
+    for name, tensor in model.state_dict().items():
+        assert tensor.dtype == torch.float16 and torch.equal(tensor, original[name]), name
+    assert model.decoder.mask.dtype == torch.float16
+    # The fp16 weights are mapped from the file instead of being cast from the fp32 ones.
+    if os.path.exists('/proc/self/maps'):
+        assert mapped_file(model.decoder.token_embedding.weight) == converted_path('tiny', 'fp16')
+
+
+def test_load_broken_converted_model(checkpoint):
+    path, _, _ = checkpoint
+    os.makedirs(os.path.dirname(converted_path('tiny')))
+    with open(converted_path('tiny'), 'wb') as f:
+        f.write(b'broken')
+    with patch('whisper.load_model', return_value='original') as load_original, \
+            pytest.warns(UserWarning, match='Failed to load the converted model'):
+        assert load_model('tiny') == 'original'
+    load_original.assert_called_once_with('tiny', device='cpu')